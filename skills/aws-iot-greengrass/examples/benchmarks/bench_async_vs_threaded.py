@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Threaded vs asyncio benchmark for the IPC publisher and subscriber examples.
+
+Publishing: readings/second and peak thread count for the blocking
+IPCPublisher (one thread, and a pool of threads each blocking on a publish),
+the pipelined IPCPublisher, and AsyncIPCPublisher on one event loop.
+
+Subscribing: delivery latency percentiles for IPCSubscriber and
+AsyncIPCSubscriber with many concurrent subscriptions.
+
+Usage:
+    python3 bench_async_vs_threaded.py [--messages 3000] [--concurrency 32] [--topics 100]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_ipc
+from helpers import percentile
+
+
+class ThreadSampler:
+    """Track the peak number of live threads while a scenario runs"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.001)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        # Don't count the sampler itself
+        return self.peak - 1
+
+
+def configure_publisher(mode, max_in_flight):
+    os.environ.update({
+        'GG_PUBLISH_MODE': mode,
+        'GG_MAX_IN_FLIGHT': str(max_in_flight),
+        'GG_BATCH_SIZE': '1',
+    })
+
+
+def bench_threaded_sync(module, readings, threads):
+    configure_publisher('sync', 1)
+    publisher = module.IPCPublisher()
+    sampler = ThreadSampler()
+    start = time.perf_counter()
+    if threads == 1:
+        for reading in readings:
+            publisher.publish_to_ipc(reading)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(publisher.publish_to_ipc, readings))
+    elapsed = time.perf_counter() - start
+    return elapsed, sampler.stop()
+
+
+def bench_threaded_pipelined(module, readings, max_in_flight):
+    configure_publisher('pipelined', max_in_flight)
+    publisher = module.IPCPublisher()
+    sampler = ThreadSampler()
+    start = time.perf_counter()
+    for reading in readings:
+        publisher.publish(reading)
+    publisher.flush(timeout=60)
+    elapsed = time.perf_counter() - start
+    return elapsed, sampler.stop()
+
+
+def bench_async(async_module, readings, max_in_flight):
+    configure_publisher('pipelined', max_in_flight)
+    publisher = async_module.AsyncIPCPublisher()
+
+    async def publish_all():
+        publisher.in_flight_limit = asyncio.Semaphore(max_in_flight)
+        for reading in readings:
+            publisher.submit(reading)
+            if len(publisher.tasks) >= max_in_flight:
+                await asyncio.wait(set(publisher.tasks), return_when=asyncio.FIRST_COMPLETED)
+        await publisher.flush_async(timeout=60)
+
+    sampler = ThreadSampler()
+    start = time.perf_counter()
+    asyncio.run(publish_all())
+    elapsed = time.perf_counter() - start
+    return elapsed, sampler.stop()
+
+
+def publish_test_messages(endpoint, topics, count):
+    for i in range(count):
+        message = json.dumps({"messageType": "status", "sentAt": time.perf_counter(), "n": i})
+        endpoint.publish_local(topics[i % len(topics)], fake_ipc.PublishMessage(
+            binary_message=fake_ipc.BinaryMessage(message=message.encode('utf-8'))))
+
+
+def recording_process_message(latencies, done, expected):
+    def process_message(topic, message, received=None):
+        latencies.append(time.perf_counter() - json.loads(message)['sentAt'])
+        if len(latencies) >= expected:
+            done.set()
+    return process_message
+
+
+def bench_threaded_subscriber(module, endpoint, topics, count):
+    subscriber = module.IPCSubscriber()
+    latencies, done = [], threading.Event()
+    subscriber.process_message = recording_process_message(latencies, done, count)
+    subscriber.subscribe_to_topics()
+    sampler = ThreadSampler()
+    publish_test_messages(endpoint, topics, count)
+    done.wait(60)
+    threads = sampler.stop()
+    for operation in subscriber.subscriptions.values():
+        operation.close()
+    return latencies, threads
+
+
+def bench_async_subscriber(async_module, endpoint, topics, count):
+    subscriber = async_module.AsyncIPCSubscriber()
+    latencies, done = [], threading.Event()
+    subscriber.process_message = recording_process_message(latencies, done, count)
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(subscriber.run_async())
+        while len(subscriber.subscriptions) < len(topics):
+            await asyncio.sleep(0.001)
+        await asyncio.get_running_loop().run_in_executor(None, publish_test_messages, endpoint, topics, count)
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    sampler = ThreadSampler()
+    asyncio.run(run())
+    return latencies, sampler.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=3000, help='messages per scenario')
+    parser.add_argument('--concurrency', type=int, default=32, help='threads or in-flight publishes')
+    parser.add_argument('--topics', type=int, default=100, help='concurrent subscriptions')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC round-trip latency')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+    publisher_module = fake_ipc.load_component('ipc-publisher')
+    async_publisher_module = fake_ipc.load_component('ipc-publisher', filename='async_main.py')
+    logging.disable(logging.CRITICAL)
+
+    readings = [publisher_module.IPCPublisher().generate_message_data() for _ in range(args.messages)]
+    print(f"Publishing {args.messages} readings, {args.latency_ms} ms simulated IPC latency")
+    print(f"{'variant':<34} {'readings/s':>11} {'peak threads':>13}")
+    scenarios = [
+        ('threaded sync, 1 thread', lambda: bench_threaded_sync(publisher_module, readings, 1)),
+        (f'threaded sync, {args.concurrency} threads',
+         lambda: bench_threaded_sync(publisher_module, readings, args.concurrency)),
+        (f'threaded pipelined, {args.concurrency} in flight',
+         lambda: bench_threaded_pipelined(publisher_module, readings, args.concurrency)),
+        (f'asyncio, {args.concurrency} in flight',
+         lambda: bench_async(async_publisher_module, readings, args.concurrency)),
+    ]
+    for name, scenario in scenarios:
+        elapsed, threads = scenario()
+        print(f"{name:<34} {args.messages / elapsed:>11.0f} {threads:>13}")
+
+    os.environ.update({
+        'GG_TOPICS': ','.join(f"bench/topic/{i}" for i in range(args.topics)),
+        'GG_PROCESSING_MODE': 'process',
+        'GG_QUEUE_SIZE': str(args.messages),
+    })
+    subscriber_module = fake_ipc.load_component('ipc-subscriber')
+    async_subscriber_module = fake_ipc.load_component('ipc-subscriber', filename='async_main.py')
+    topics = os.environ['GG_TOPICS'].split(',')
+
+    print()
+    print(f"Delivering {args.messages} messages across {args.topics} subscriptions")
+    print(f"{'variant':<34} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'peak threads':>13}")
+    for name, scenario in (
+        ('threaded IPCSubscriber', lambda: bench_threaded_subscriber(subscriber_module, endpoint, topics, args.messages)),
+        ('AsyncIPCSubscriber', lambda: bench_async_subscriber(async_subscriber_module, endpoint, topics, args.messages)),
+    ):
+        latencies, threads = scenario()
+        print(f"{name:<34} {1000 * percentile(latencies, 0.5):>8.2f} {1000 * percentile(latencies, 0.99):>8.2f} "
+              f"{1000 * statistics.mean(latencies):>8.2f} {threads:>13}")
+
+    endpoint.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Payload size and CPU benchmark for IoTCorePublisher encodings.
+
+Encodes the same stream of readings with every available combination of
+encoding (json, cbor, msgpack), payload layout (record, columnar) and
+timestamp format, verifies that each payload decodes back to the original
+readings, and reports bytes per reading, IoT Core messages, and encode and
+decode cost per reading. cbor and msgpack rows are skipped when cbor2 or
+msgpack are not installed.
+
+Usage:
+    python3 bench_encodings.py [--readings 3000] [--batch-size 20]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import fake_ipc
+
+# IoT Core meters messages in 5 KB increments
+IOT_CORE_BILLING_UNIT = 5 * 1024
+
+
+def generate_readings(module, count, interval):
+    os.environ['GG_SPOOL_DIR'] = ''
+    publisher = module.IoTCorePublisher()
+    readings = []
+    for _ in range(count):
+        readings.append(publisher.generate_sensor_data())
+    # Space readings at the publish interval as they would be on a device
+    start = module.datetime.now(module.timezone.utc).timestamp()
+    for i, reading in enumerate(readings):
+        when = start + i * interval
+        reading['timestamp'] = module.datetime.fromtimestamp(when, module.timezone.utc).isoformat()
+    return readings
+
+
+def run_case(encoding_module, readings, encoding, layout, batch_size, delta):
+    encoder = encoding_module.PayloadEncoder(encoding=encoding, layout=layout,
+                                             batch_size=batch_size, delta_timestamps=delta)
+    start = time.process_time()
+    payloads = [p for p in (encoder.encode(r) for r in readings) if p is not None]
+    tail = encoder.flush()
+    if tail is not None:
+        payloads.append(tail)
+    encode_cpu = time.process_time() - start
+
+    start = time.process_time()
+    decoded = [r for p in payloads for r in encoding_module.decode_payload(p, encoding)]
+    decode_cpu = time.process_time() - start
+
+    values_match = [r['value'] for r in decoded] == [r['value'] for r in readings]
+    sequence_match = [r['sequenceNumber'] for r in decoded] == [r['sequenceNumber'] for r in readings]
+    total_bytes = sum(len(p) for p in payloads)
+    return {
+        'payloads': len(payloads),
+        'bytes_per_reading': total_bytes / len(readings),
+        'billed_messages': sum(-(-len(p) // IOT_CORE_BILLING_UNIT) for p in payloads),
+        'encode_us': 1e6 * encode_cpu / len(readings),
+        'decode_us': 1e6 * decode_cpu / len(readings),
+        'roundtrip_ok': values_match and sequence_match,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readings', type=int, default=3000, help='readings encoded per case')
+    parser.add_argument('--batch-size', type=int, default=20, help='readings per columnar payload')
+    parser.add_argument('--interval', type=float, default=30.0, help='seconds between readings')
+    args = parser.parse_args()
+
+    fake_ipc.install()
+    module = fake_ipc.load_component('iot-core-publisher')
+    encoding_module = fake_ipc.sys.modules['encoding']
+    logging.disable(logging.INFO)
+    readings = generate_readings(module, args.readings, args.interval)
+
+    encodings = ['json']
+    encodings += ['cbor'] if encoding_module.CBOR_AVAILABLE else []
+    encodings += ['msgpack'] if encoding_module.MSGPACK_AVAILABLE else []
+    skipped = sorted(set(encoding_module.ENCODINGS) - set(encodings))
+
+    cases = []
+    for encoding in encodings:
+        cases.append((encoding, 'record', 1, False))
+        cases.append((encoding, 'columnar', args.batch_size, False))
+        cases.append((encoding, 'columnar', args.batch_size, True))
+
+    print(f"{args.readings} readings, columnar batches of {args.batch_size}")
+    print(f"{'encoding':<9} {'layout':<9} {'timestamps':<10} {'payloads':>8} {'bytes/rdg':>9} "
+          f"{'vs json':>8} {'billed':>7} {'enc us':>7} {'dec us':>7}  roundtrip")
+    baseline = None
+    for encoding, layout, batch_size, delta in cases:
+        result = run_case(encoding_module, readings, encoding, layout, batch_size, delta)
+        baseline = baseline or result['bytes_per_reading']
+        timestamps = '-' if layout == 'record' else ('delta' if delta else 'absolute')
+        print(f"{encoding:<9} {layout:<9} {timestamps:<10} {result['payloads']:>8} "
+              f"{result['bytes_per_reading']:>9.1f} {result['bytes_per_reading'] / baseline:>7.0%} "
+              f"{result['billed_messages']:>7} {result['encode_us']:>7.1f} {result['decode_us']:>7.1f}  "
+              f"{'ok' if result['roundtrip_ok'] else 'MISMATCH'}")
+
+    if skipped:
+        print(f"Skipped (package not installed): {', '.join(skipped)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Component install time: pip install from the package index in the install
+lifecycle (as the s3-uploader recipe did) against the prebuilt dependency
+bundles from component_runtime.bundle.
+
+- Build: a cold build of the component's site-packages bundle, the same
+  build again from the cache, and a rebuild without the cache, which must
+  give a byte-identical ZIP.
+- Install, each into a fresh directory: pip install from the index; pip
+  install with the index unreachable (an offline device), which must fail;
+  the wheelhouse bundle unzipped and installed with pip --no-index; and the
+  site-packages bundle unzipped, which is all the nucleus does for an
+  artifact with "Unarchive": "ZIP". The unpacked bundle must import with no
+  other site-packages on the path.
+
+Needs access to the package index (for the build and the "before" install).
+
+Usage:
+    python3 bench_install.py [--component s3-uploader] [--repeat 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import fake_ipc
+from helpers import check
+
+from component_runtime import bundle
+
+# Modules each component's bundle must provide
+IMPORTS = {
+    's3-uploader': 'import boto3, botocore.exceptions, watchdog.observers',
+    'iot-core-publisher': 'import cbor2, msgpack',
+    'component-runtime': 'import awsiot.greengrasscoreipc.clientv2',
+}
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def timed(function, repeat):
+    """Median seconds of function(directory), each run in a fresh directory; the last run's result"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            result = function(directory)
+            times.append(time.perf_counter() - started)
+    return median(times), result
+
+
+def pip_install(directory, requirements, *options):
+    command = [sys.executable, '-m', 'pip', 'install', '--no-cache-dir', '--disable-pip-version-check', '--quiet',
+               '--target', os.path.join(directory, 'site-packages'), '--requirement', requirements, *options]
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True).returncode == 0
+
+
+def unpack(directory, artifact):
+    with zipfile.ZipFile(artifact) as archive:
+        archive.extractall(directory)
+    return directory
+
+
+def imports(site_packages, statement):
+    """Whether the statement runs with only the bundle (and the standard library) on the path"""
+    environment = {**os.environ, 'PYTHONPATH': site_packages}
+    return subprocess.run([sys.executable, '-S', '-c', statement], env=environment,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+
+def bench_build(component_dir, work):
+    cache = os.path.join(work, 'cache')
+    cold = bundle.build(component_dir, os.path.join(work, 'cold'), cache_dir=cache)
+    warm = bundle.build(component_dir, os.path.join(work, 'warm'), cache_dir=cache)
+    rebuilt = bundle.build(component_dir, os.path.join(work, 'rebuilt'))
+    print(f"{cold['component']}: {len(cold['distributions'])} distributions, {cold['bytes'] / 2**20:.1f} MiB bundle")
+    print(f"  build {cold['seconds']:.1f} s, from the cache {warm['seconds'] * 1000:.0f} ms, "
+          f"rebuild without the cache {rebuilt['seconds']:.1f} s")
+    ok = check(warm['cached'] and warm['digest'] == cold['digest'], "unchanged requirements come from the cache")
+    ok &= check(rebuilt['digest'] == cold['digest'], f"a rebuild gives the same artifact (SHA-256 {cold['digest']})")
+    return ok, cold
+
+
+def bench_install(component_dir, built, work, repeat):
+    name = built['component']
+    requirements = os.path.join(component_dir, 'requirements.txt')
+    statement = IMPORTS.get(name, 'pass')
+    wheelhouse = bundle.build(component_dir, os.path.join(work, 'wheelhouse'), kind='wheelhouse')
+
+    def offline_pip(directory):
+        unpack(directory, wheelhouse['path'])
+        return pip_install(directory, os.path.join(directory, 'requirements.txt'), '--no-index',
+                           '--find-links', os.path.join(directory, 'wheels'))
+
+    online, online_ok = timed(lambda directory: pip_install(directory, requirements), repeat)
+    # --isolated: no mirrors or find-links from pip's configuration either
+    unreachable, unreachable_ok = timed(lambda directory: pip_install(
+        directory, requirements, '--isolated', '--index-url', 'http://127.0.0.1:9/simple/', '--retries', '0',
+        '--timeout', '1'), 1)
+    offline, offline_ok = timed(offline_pip, repeat)
+    unpacked, _ = timed(lambda directory: unpack(directory, built['path']), repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        site_ok = imports(os.path.join(unpack(directory, built['path']), 'site-packages'), statement)
+
+    print()
+    indexes = ' '.join(filter(None, (os.environ.get('PIP_INDEX_URL'), os.environ.get('PIP_EXTRA_INDEX_URL'))))
+    print(f"Install step for {name} (median of {repeat}; index: {indexes or 'pip default'})")
+    print(f"{'':<42} {'seconds':>8}  network")
+    print(f"{'pip install from the index (before)':<42} {online:>8.2f}  package index")
+    print(f"{'pip install, index unreachable':<42} {'fails' if not unreachable_ok else 'works':>8}  -")
+    print(f"{'wheelhouse bundle: unzip + pip --no-index':<42} {offline:>8.2f}  none")
+    print(f"{'site-packages bundle: unzip (after)':<42} {unpacked:>8.2f}  none")
+    print(f"  {online / unpacked:.0f}x faster than pip install from the index")
+
+    ok = check(online_ok and not unreachable_ok, "pip install needs the package index and fails without it")
+    ok &= check(offline_ok, "the wheelhouse installs with pip --no-index")
+    ok &= check(site_ok, f"the unpacked site-packages bundle imports on its own ({statement})")
+    ok &= check(unpacked < online, "unpacking the bundle is faster than pip install from the index")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--component', default='s3-uploader', help='example component with a requirements.txt')
+    parser.add_argument('--repeat', type=int, default=3, help='installs of each kind')
+    args = parser.parse_args()
+    component_dir = str(fake_ipc.EXAMPLES_DIR / args.component)
+
+    with tempfile.TemporaryDirectory() as work:
+        try:
+            ok, built = bench_build(component_dir, work)
+        except RuntimeError as e:
+            print(f"Could not build the bundle (this benchmark needs the package index): {e}")
+            sys.exit(1)
+        ok &= bench_install(component_dir, built, work, args.repeat)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Messages-per-second benchmark for IPCPublisher publish modes.
+
+Drives the ipc-publisher example against the fake IPC endpoint with a
+simulated round-trip latency and compares blocking publishes, pipelined
+publishes at several in-flight limits, and batched pipelined publishes.
+
+Usage:
+    python3 bench_ipc_publisher.py [--messages 2000] [--latency-ms 2]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import fake_ipc
+
+
+def run_scenario(module, endpoint, messages, mode, max_in_flight, batch_size):
+    os.environ['GG_PUBLISH_MODE'] = mode
+    os.environ['GG_MAX_IN_FLIGHT'] = str(max_in_flight)
+    os.environ['GG_BATCH_SIZE'] = str(batch_size)
+    publisher = module.IPCPublisher()
+    readings = [publisher.generate_message_data() for _ in range(messages)]
+
+    payloads_before = endpoint.publish_count
+    start = time.perf_counter()
+    for reading in readings:
+        publisher.publish(reading)
+    publisher.flush(timeout=60)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'payloads': endpoint.publish_count - payloads_before,
+        'elapsed': elapsed,
+        'readings_per_sec': messages / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help='readings published per scenario')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC round-trip latency')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+    module = fake_ipc.load_component('ipc-publisher')
+    logging.disable(logging.INFO)
+
+    scenarios = [
+        ('sync', 1, 1),
+        ('pipelined', 1, 1),
+        ('pipelined', 4, 1),
+        ('pipelined', 16, 1),
+        ('pipelined', 64, 1),
+        ('sync', 1, 10),
+        ('pipelined', 16, 10),
+    ]
+
+    print(f"{args.messages} readings per scenario, {args.latency_ms} ms simulated IPC latency")
+    print(f"{'mode':<10} {'inFlight':>8} {'batch':>6} {'payloads':>9} {'seconds':>8} {'readings/s':>11}")
+    baseline = None
+    for mode, max_in_flight, batch_size in scenarios:
+        result = run_scenario(module, endpoint, args.messages, mode, max_in_flight, batch_size)
+        baseline = baseline or result['readings_per_sec']
+        print(f"{mode:<10} {max_in_flight:>8} {batch_size:>6} {result['payloads']:>9} "
+              f"{result['elapsed']:>8.3f} {result['readings_per_sec']:>11.0f}  "
+              f"(x{result['readings_per_sec'] / baseline:.1f})")
+
+    endpoint.close()
+
+
+if __name__ == '__main__':
+    main()
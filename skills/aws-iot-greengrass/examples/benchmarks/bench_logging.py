@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cost per logged message: the components' previous logging against the
+component runtime's background, lazy and sampled logging.
+
+Every case logs the sensor simulator's per-reading message ("Sensor
+reading: {json}") for readings from --sensors sensors to a file:
+
+- before: f-string arguments and a StreamHandler that formats and writes on
+  the calling thread, as the components logged until now
+- after: %-style arguments with lazy(json.dumps, reading), records handed to
+  the background writer (configure_logging), unsampled, sampled per sensor,
+  and as JSON lines
+- disabled: the same call below the logger's level, where the f-string is
+  still built but lazy() is never rendered
+
+caller us is what the logging call costs the component's thread; total us
+adds the time the writer needed to catch up (flush_logging). --flush-ms
+makes every flush of the log stream sleep, like a slow SD card or a busy
+log pipe.
+
+Usage:
+    python3 bench_logging.py [--messages 5000] [--runs 5] [--sensors 4] [--flush-ms 0]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import fake_ipc  # noqa: F401  (puts component_runtime on sys.path)
+from component_runtime import LOG_FORMAT, configure_logging, flush_logging, lazy, sampled
+
+
+class SlowStream:
+    """File whose flush() takes at least delay seconds"""
+
+    def __init__(self, path, delay):
+        self.file = open(path, 'a')
+        self.delay = delay
+
+    def write(self, text):
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+        if self.delay:
+            time.sleep(self.delay)
+
+    def close(self):
+        self.file.close()
+
+
+def readings(count, sensors):
+    return [{
+        'sensorId': f"temp-{i % sensors:03d}", 'sensorType': 'temperature', 'value': 20.0 + (i % 100) / 10,
+        'unit': 'celsius', 'timestamp': '2026-01-01T00:00:00.000000+00:00', 'quality': 'good',
+    } for i in range(count)]
+
+
+def log_before(logger, items, level):
+    start = time.perf_counter()
+    for reading in items:
+        logger.log(level, f"Sensor reading: {json.dumps(reading)}")
+    return time.perf_counter() - start
+
+
+def log_after(logger, items, level, sample):
+    start = time.perf_counter()
+    for reading in items:
+        logger.log(level, "Sensor reading: %s", lazy(json.dumps, reading),
+                   extra=sampled(f"reading:{reading['sensorId']}") if sample else None)
+    return time.perf_counter() - start
+
+
+def run_case(case, path, items, flush_delay):
+    """Log items once; returns (caller seconds, total seconds, lines written, records dropped)"""
+    stream = SlowStream(path, flush_delay)
+    root = logging.getLogger()
+    logger = logging.getLogger('bench')
+    level = logging.DEBUG if case['disabled'] else logging.INFO
+    dropped = 0
+
+    if case['style'] == 'before':
+        flush_logging()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        caller = log_before(logger, items, level)
+        total = caller
+    else:
+        handler = configure_logging(log_format=case['format'], sample_rate=case['rate'], stream=stream)
+        start = time.perf_counter()
+        caller = log_after(logger, items, level, case['rate'] > 0)
+        flush_logging()
+        total = time.perf_counter() - start
+        dropped = handler.dropped
+    root.removeHandler(root.handlers[0])
+    stream.close()
+
+    with open(path) as f:
+        lines = sum(1 for _ in f)
+    os.remove(path)
+    return caller, total, lines, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000, help='messages per run (keep below the queue size)')
+    parser.add_argument('--runs', type=int, default=5, help='runs per case (medians are reported)')
+    parser.add_argument('--sensors', type=int, default=4, help='distinct sample keys')
+    parser.add_argument('--rate', type=float, default=10.0, help='sample rate for the sampled case')
+    parser.add_argument('--flush-ms', type=float, default=0.0, help='delay added to every stream flush')
+    args = parser.parse_args()
+
+    cases = [
+        {'name': 'before: f-string, write on caller', 'style': 'before', 'disabled': False},
+        {'name': 'after: background, lazy', 'style': 'after', 'format': 'text', 'rate': 0, 'disabled': False},
+        {'name': f'after: + sampled {args.rate:g}/s per sensor', 'style': 'after', 'format': 'text',
+         'rate': args.rate, 'disabled': False},
+        {'name': 'after: background, JSON lines', 'style': 'after', 'format': 'json', 'rate': 0, 'disabled': False},
+        {'name': 'disabled level: f-string', 'style': 'before', 'disabled': True},
+        {'name': 'disabled level: lazy', 'style': 'after', 'format': 'text', 'rate': 0, 'disabled': True},
+    ]
+    items = readings(args.messages, args.sensors)
+
+    print(f"{args.messages} messages x {args.runs} runs, {args.sensors} sensors, "
+          f"{args.flush_ms:g} ms per stream flush; medians")
+    print(f"{'case':<38} {'caller us':>10} {'total us':>9} {'written':>8} {'dropped':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'component.log')
+        for case in cases:
+            results = [run_case(case, path, items, args.flush_ms / 1000.0) for _ in range(args.runs)]
+            caller = statistics.median(r[0] for r in results) / args.messages * 1e6
+            total = statistics.median(r[1] for r in results) / args.messages * 1e6
+            print(f"{case['name']:<38} {caller:>10.2f} {total:>9.2f} {results[-1][2]:>8} {results[-1][3]:>8}")
+
+
+if __name__ == '__main__':
+    main()
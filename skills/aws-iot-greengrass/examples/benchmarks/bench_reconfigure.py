@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Reconfiguration pause: live configuration updates vs a component restart.
+
+Runs the IPC publisher, IoT Core publisher and IPC subscriber against the
+fake IPC endpoint, with their configuration served by the endpoint's
+configuration store, and changes settings while they run. For each change:
+
+- apply ms: how long the component's work was blocked while the change was
+  applied (ConfigWatcher.last_pause, including waiting for the current tick)
+- effective ms: from the deployment's update until the change was visible
+  (applied, or the first message on a new topic)
+- max gap ms: the longest gap between consecutive messages around the
+  change, against the configured interval
+
+The restart row is the spawn-to-ready time of a fresh publisher process
+(bench_startup.py), the minimum outage when a change restarts the component,
+before counting shutdown and the state it loses (sequence numbers, batches,
+subscriptions).
+
+It also checks that the publisher's scheduler, with and without virtual
+devices, applies an interval dropped from 30 s to 50 ms at once instead of
+after the 30 s wait it was in, and that stopping it ends that wait.
+
+Usage:
+    python3 bench_reconfigure.py [--interval 0.01] [--latency-ms 1] [--restarts 3]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import Recorder, check, wait_for
+
+
+def change(endpoint, component, recorder, key, value, settle, topic=None, gap_topic=None):
+    """Update one key through the endpoint and measure the pause it caused
+
+    topic: the change is effective once a message arrives on it. gap_topic:
+    only count gaps between messages on this topic.
+    """
+    watcher = component.config_watcher
+    updates = watcher.updates
+    time.sleep(settle)
+    changed_at = time.monotonic()
+    endpoint.update_configuration([key], value)
+    applied = wait_for(lambda: watcher.updates > updates)
+    applied_at = time.monotonic()
+    if topic:
+        wait_for(lambda: recorder.first_after(changed_at, topic) is not None)
+        effective_at = recorder.first_after(changed_at, topic) or applied_at
+    else:
+        effective_at = applied_at
+    time.sleep(settle)
+    return {
+        'change': f"{key}={json.dumps(value)}",
+        'applied': applied,
+        'applyMs': 1000 * (watcher.last_pause or 0.0),
+        'effectiveMs': 1000 * (effective_at - changed_at),
+        'maxGapMs': 1000 * recorder.max_gap(changed_at - settle / 2, changed_at + settle, gap_topic),
+    }
+
+
+def bench_ipc_publisher(endpoint, interval):
+    endpoint.configuration = {
+        'topic': 'local/sensor/data', 'interval': interval, 'publishMode': 'sync',
+        'maxInFlight': 1, 'batchSize': 1, 'statsInterval': 60,
+    }
+    recorder = Recorder()
+    endpoint.subscribe_local('local/#', lambda event: recorder.add(
+        event.binary_message.context.topic, event.binary_message.message))
+    module = fake_ipc.load_component('ipc-publisher')
+    publisher = module.IPCPublisher()
+    thread = threading.Thread(target=publisher.run, daemon=True)
+    thread.start()
+
+    settle = max(0.3, 20 * interval)
+    results = [
+        change(endpoint, publisher, recorder, 'interval', interval / 2, settle),
+        change(endpoint, publisher, recorder, 'topic', 'local/sensor/data-v2', settle, topic='local/sensor/data-v2'),
+        change(endpoint, publisher, recorder, 'publishMode', 'pipelined', settle),
+        change(endpoint, publisher, recorder, 'maxInFlight', 8, settle),
+        change(endpoint, publisher, recorder, 'batchSize', 5, settle),
+        change(endpoint, publisher, recorder, 'batchSize', 1, settle),
+    ]
+    publisher.scheduler.stop()
+    thread.join(timeout=10)
+
+    sequence = []
+    for _, _, payload in recorder.snapshot():
+        message = json.loads(payload)
+        sequence.extend(item['sequenceNumber'] for item in message.get('messages', [message]))
+    continuous = sequence == list(range(1, len(sequence) + 1))
+    return results, f"{len(sequence)} readings, sequence {'continuous' if continuous else 'BROKEN'} across changes"
+
+
+def check_interval_drop(endpoint, devices):
+    """Drop a 30 s interval to 50 ms while the scheduler waits, then stop it during a 30 s wait"""
+    name = f"{sum(group.get('count', 1) for group in devices)} virtual devices" if devices else "fixed rate"
+    endpoint.configuration = {
+        'topic': 'local/drop/data', 'interval': 30, 'publishMode': 'sync',
+        'maxInFlight': 1, 'batchSize': 1, 'statsInterval': 60, 'devices': devices,
+    }
+    recorder = Recorder()
+    endpoint.subscribe_local('local/drop/#', lambda event: recorder.add(
+        event.binary_message.context.topic, event.binary_message.message))
+    module = fake_ipc.load_component('ipc-publisher')
+    publisher = module.IPCPublisher()
+    thread = threading.Thread(target=publisher.run, daemon=True)
+    thread.start()
+
+    # The first tick is due at once; the next one 30 s later
+    ok = check(wait_for(lambda: recorder.snapshot()), f"{name}: first reading published")
+    time.sleep(0.2)
+    changed_at = time.monotonic()
+    endpoint.update_configuration(['interval'], 0.05)
+    wait_for(lambda: recorder.first_after(changed_at, 'local/drop/data') is not None)
+    first = recorder.first_after(changed_at, 'local/drop/data')
+    ok &= check(first is not None and first - changed_at < 0.5,
+                f"{name}: next reading {1000 * (first - changed_at):.0f} ms after interval 30 s -> 50 ms"
+                if first else f"{name}: no reading within 5 s of interval 30 s -> 50 ms")
+
+    endpoint.update_configuration(['interval'], 30)
+    wait_for(lambda: publisher.config['interval'] == 30)
+    time.sleep(0.2)
+    stopped_at = time.monotonic()
+    publisher.scheduler.stop()
+    thread.join(timeout=10)
+    ok &= check(not thread.is_alive() and time.monotonic() - stopped_at < 1.0,
+                f"{name}: stopped {1000 * (time.monotonic() - stopped_at):.0f} ms into a 30 s wait")
+    return ok
+
+
+def bench_iot_core_publisher(endpoint, interval, spool_dir):
+    endpoint.configuration = {
+        'topic': 'sensor/data', 'interval': interval, 'spoolDirectory': spool_dir,
+        'encoding': 'json', 'payloadLayout': 'record', 'batchSize': 1,
+    }
+    recorder = Recorder()
+    publish_iot_core = endpoint.publish_iot_core
+
+    def recording_publish(topic, payload, qos=None):
+        publish_iot_core(topic, payload, qos)
+        recorder.add(topic, bytes(payload))
+
+    endpoint.publish_iot_core = recording_publish
+    module = fake_ipc.load_component('iot-core-publisher')
+    publisher = module.IoTCorePublisher()
+    thread = threading.Thread(target=publisher.run, daemon=True)
+    thread.start()
+
+    settle = max(0.3, 20 * interval)
+    results = [
+        change(endpoint, publisher, recorder, 'interval', interval / 2, settle),
+        change(endpoint, publisher, recorder, 'payloadLayout', 'columnar', settle),
+        change(endpoint, publisher, recorder, 'batchSize', 10, settle),
+        change(endpoint, publisher, recorder, 'topic', 'sensor/data-v2', settle, topic='sensor/data-v2'),
+    ]
+    publisher.scheduler.stop()
+    thread.join(timeout=10)
+    endpoint.publish_iot_core = publish_iot_core
+    return results, f"{len(recorder.snapshot())} payloads"
+
+
+def bench_ipc_subscriber(endpoint, interval, output_dir):
+    endpoint.configuration = {
+        'topics': ['local/a'], 'processingMode': 'log', 'outputFile': os.path.join(output_dir, 'messages.log'),
+    }
+    recorder = Recorder()
+    module = fake_ipc.load_component('ipc-subscriber')
+    subscriber = module.IPCSubscriber()
+    process_message = subscriber.process_message
+
+    def recording_process_message(topic, message, received=None):
+        recorder.add(topic, message)
+        process_message(topic, message, received)
+
+    subscriber.process_message = recording_process_message
+    subscriber.subscribe_to_topics()
+    subscriber.config_watcher.watch()
+
+    stop = threading.Event()
+
+    def publish_both():
+        # Both topics always carry traffic; the subscriber only sees what it is subscribed to
+        client = fake_ipc.FakeIPCClient(endpoint)
+        while not stop.wait(interval):
+            for topic in ('local/a', 'local/b'):
+                request = fake_ipc.PublishToTopicRequest(topic=topic, publish_message=fake_ipc.PublishMessage(
+                    binary_message=fake_ipc.BinaryMessage(message=b'{"messageType": "bench"}')))
+                client.new_publish_to_topic().activate(request)
+
+    publisher = threading.Thread(target=publish_both, daemon=True)
+    publisher.start()
+
+    settle = max(0.3, 20 * interval)
+    # Gaps are measured on the topic that stays subscribed throughout
+    results = [
+        change(endpoint, subscriber, recorder, 'topics', ['local/a', 'local/b'], settle,
+               topic='local/b', gap_topic='local/a'),
+        change(endpoint, subscriber, recorder, 'outputFile', os.path.join(output_dir, 'messages-v2.log'), settle,
+               gap_topic='local/a'),
+        change(endpoint, subscriber, recorder, 'topics', ['local/a'], settle, gap_topic='local/a'),
+    ]
+    stop.set()
+    publisher.join(timeout=5)
+    subscriber.config_watcher.stop()
+    for operation in subscriber.subscriptions.values():
+        operation.close()
+    received = recorder.snapshot()
+    return results, (f"{len(received)} messages received, "
+                     f"{sum(1 for message in received if message[1] == 'local/b')} on the added topic")
+
+
+def bench_restart(runs):
+    import bench_startup
+    with tempfile.TemporaryDirectory() as tmp:
+        ready = [bench_startup.run_component('ipc-publisher', tmp, eager=False)['readyMs'] for _ in range(runs)]
+    return statistics.median(ready)
+
+
+def print_results(name, interval, results, note):
+    print(f"\n{name} (interval {1000 * interval:g} ms)")
+    print(f"  {'change':<44} {'apply ms':>9} {'effective ms':>13} {'max gap ms':>11}")
+    for result in results:
+        flag = '' if result['applied'] else '  (not applied)'
+        print(f"  {result['change'][:44]:<44} {result['applyMs']:>9.2f} {result['effectiveMs']:>13.1f} "
+              f"{result['maxGapMs']:>11.1f}{flag}")
+    print(f"  {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interval', type=float, default=0.01, help='publish interval in seconds')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated IPC round-trip latency')
+    parser.add_argument('--restarts', type=int, default=3, help='publisher restarts to time (0 to skip)')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+    logging.disable(logging.WARNING)
+    print(f"Fake IPC endpoint, {args.latency_ms} ms latency; configuration changed through the endpoint's store")
+
+    results, note = bench_ipc_publisher(endpoint, args.interval)
+    print_results('IPCPublisher', args.interval, results, note)
+    print()
+    ok = check_interval_drop(endpoint, [])
+    ok &= check_interval_drop(endpoint, [{'count': 3, 'idFormat': 'drop-{index}'}])
+    with tempfile.TemporaryDirectory() as tmp:
+        results, note = bench_iot_core_publisher(endpoint, args.interval, tmp)
+        print_results('IoTCorePublisher', args.interval, results, note)
+        results, note = bench_ipc_subscriber(endpoint, args.interval, tmp)
+        print_results('IPCSubscriber', args.interval, results, note)
+
+    if args.restarts:
+        print(f"\nRestart instead: IPCPublisher spawn to ready {bench_restart(args.restarts):.0f} ms "
+              f"(median of {args.restarts}), then sequence numbers and pending batches start over")
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Sensor simulator readings per second against the number of cores: the
+in-process sensors against sharded mode, which partitions the sensors across
+worker processes that hand their readings to one writer through shared
+memory rings.
+
+- In-process: take_reading for every sensor in turn on one thread, as the
+  sensor threads (or the low-memory loop) do, with nothing else running.
+  This is the most the component gets from one core; the GIL keeps it there
+  whatever the number of threads. Also reported: generating and encoding the
+  readings alone, without writing them.
+- Sharded: the component with --shards workers (default 1, 2, 4... up to
+  the number of cores), every sensor due again as soon as it is read. Reports
+  readings written per second, the speed-up over one worker and the share
+  of the writer thread's time spent writing. Every reading must be written
+  once, as valid JSON, and every sensor must be read.
+- Reconfiguration: sensors removed by a configuration change stop, on every
+  worker, and switching the output from the store to a file writes only
+  whole JSON lines, with no write errors.
+
+Scaling needs as many free cores as workers; with fewer, the workers share
+them and readings per second stays level.
+
+Usage:
+    python3 bench_shards.py [--sensors 1000] [--seconds 5] [--shards 1,2,4] [--output file]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import fake_ipc
+from helpers import check, create
+
+
+def sensor_config(sensors, shards):
+    return json.dumps({
+        'sensors': [{'id': f"sensor-{index:05d}", 'type': ('temperature', 'humidity', 'pressure')[index % 3],
+                     'interval': 0, 'baseValue': 22.0, 'variance': 3.0, 'unit': '°C'} for index in range(sensors)],
+        'shards': shards,
+    })
+
+
+def component(module, work, sensors, shards, output):
+    return create(module.SensorSimulatorComponent, GG_SENSOR_CONFIG=sensor_config(sensors, shards),
+                  GG_OUTPUT_MODE=output, GG_OUTPUT_PATH=os.path.join(work, f"readings-{shards}.json"),
+                  GG_STORE_DIR=os.path.join(work, f"store-{shards}"), GG_STORE_RAW_POINTS='1024',
+                  GG_STORE_MINUTE_POINTS='60', GG_STORE_HOUR_POINTS='24')
+
+
+def bench_in_process(module, work, sensors, seconds, output):
+    simulator = component(module, work, sensors, 0, output)
+    simulators = list(simulator.simulators.values())
+
+    def rate(function):
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            for sensor in simulators:
+                function(sensor)
+            count += len(simulators)
+        return count / (time.perf_counter() - started)
+
+    written = rate(simulator.take_reading)
+    encoded = rate(lambda sensor: module.shards.encode(sensor.generate_reading()))
+    simulator.close_output()
+    print(f"{'in-process, take_reading':<28} {written:>12,.0f}")
+    print(f"{'  generate + encode only':<28} {encoded:>12,.0f}")
+    return written
+
+
+def bench_sharded(module, work, sensors, shards, seconds, output):
+    """Readings per second with this many workers, and whether the output has every reading once"""
+    simulator = component(module, work, sensors, shards, output)
+    # The metrics registry is shared by every component in this process
+    initial = simulator.readings.value()
+    simulator.pool.start()
+    # Workers are spawned: let them import and start before measuring
+    deadline = time.monotonic() + 30
+    while simulator.readings.value() - initial < sensors and time.monotonic() < deadline:
+        time.sleep(0.1)
+    before, busy_before = simulator.readings.value(), simulator.write_time.totals()[2]
+    started = time.perf_counter()
+    time.sleep(seconds)
+    after, busy_after = simulator.readings.value(), simulator.write_time.totals()[2]
+    elapsed = time.perf_counter() - started
+    simulator.pool.stop()
+    busy = (busy_after - busy_before) / 1e6 / elapsed
+
+    valid, seen = written_once(simulator, output, simulator.readings.value() - initial)
+    simulator.close_output()
+    return (after - before) / elapsed, busy, valid, seen
+
+
+def written_once(simulator, output, total):
+    """(lines written == readings counted and every line valid, sensors seen); the store only keeps the newest"""
+    if output != 'file':
+        return None, len(simulator.store.sensors())
+    lines = 0
+    seen = set()
+    try:
+        with open(simulator.config['outputPath'], encoding='utf-8') as f:
+            for line in f:
+                seen.add(json.loads(line)['sensorId'])
+                lines += 1
+    except ValueError:
+        return False, len(seen)
+    return lines == total, len(seen)
+
+
+def check_reconfigure(module, work, sensors):
+    simulator = component(module, work, sensors, 2, 'file')
+    path = simulator.config['outputPath']
+    simulator.pool.start()
+    time.sleep(2)
+    kept = simulator.config['sensors'][:sensors // 2]
+    simulator.apply_configuration({'sensors': kept})
+    time.sleep(0.5)
+    offset = os.path.getsize(path)
+    time.sleep(1)
+    simulator.pool.stop()
+    with open(path, encoding='utf-8') as f:
+        f.seek(offset)
+        ids = {json.loads(line)['sensorId'] for line in f}
+    expected = {sensor_config['id'] for sensor_config in kept}
+    return check(ids and ids <= expected,
+                 f"after removing {sensors - len(kept)} sensors, only the {len(ids)} kept ones are written")
+
+
+def check_output_switch(module, work, sensors):
+    simulator = component(module, work, sensors, 2, 'store')
+    path = simulator.config['outputPath']
+    offset = os.path.getsize(path) if os.path.exists(path) else 0
+    errors = simulator.write_errors.value()
+    simulator.pool.start()
+    time.sleep(2)
+    simulator.apply_configuration({'outputMode': 'file'})
+    time.sleep(1)
+    simulator.pool.stop()
+    simulator.close_output()
+    errors = simulator.write_errors.value() - errors
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        lines = f.read().splitlines()
+    valid = all(line and json.loads(line) for line in lines)
+    return check(lines and valid and not errors,
+                 f"after switching from the store to a file, {len(lines)} lines written, "
+                 f"{'all' if valid else 'not all'} valid JSON, {errors} write errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sensors', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=5.0, help='measured run time per worker count')
+    parser.add_argument('--shards', help='comma-separated worker counts (default: 1, 2, 4... up to the cores)')
+    parser.add_argument('--output', choices=('file', 'store'), default='file')
+    args = parser.parse_args()
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    if args.shards:
+        counts = [int(count) for count in args.shards.split(',')]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cores:
+            counts.append(cores)
+
+    fake_ipc.install(latency=0.0, record=False)
+    logging.disable(logging.WARNING)
+    module = fake_ipc.load_component('sensor-simulator')
+
+    print(f"{args.sensors} sensors, '{args.output}' output, {cores} core{'s' if cores != 1 else ''} available")
+    print(f"{'':<28} {'readings/s':>12} {'speed-up':>9} {'writer busy':>12}")
+    ok = True
+    with tempfile.TemporaryDirectory() as work:
+        bench_in_process(module, work, args.sensors, args.seconds, args.output)
+        rates = {}
+        for shards in counts:
+            rate, busy, valid, seen = bench_sharded(module, work, args.sensors, shards, args.seconds, args.output)
+            rates[shards] = rate
+            speedup = rate / rates[counts[0]]
+            label = f"{shards} worker{'s' if shards != 1 else ''}"
+            print(f"{'sharded, ' + label:<28} {rate:>12,.0f} "
+                  f"{speedup:>8.2f}x {busy:>11.0%}")
+            if valid is not None:
+                ok &= check(valid, f"{label}: every reading written once, as valid JSON")
+            ok &= check(seen == args.sensors, f"{label}: all {args.sensors} sensors read ({seen})")
+        if cores >= 2 and {1, 2} <= set(rates):
+            ok &= check(rates[2] > 1.5 * rates[1], "2 workers on 2 free cores write over 1.5x the readings of 1")
+        print()
+        ok &= check_reconfigure(module, work, min(args.sensors, 100))
+        ok &= check_output_switch(module, work, min(args.sensors, 100))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
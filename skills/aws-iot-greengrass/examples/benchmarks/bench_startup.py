@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Startup time of the example components on the shared component runtime.
+
+Each component is started in a fresh subprocess with the fake IPC endpoint
+and GG_STARTUP_PROFILE=true, and is timed from process spawn until it
+reports ready (configuration loaded, IPC connected, subscribed or
+scheduling). Reported per component: median time to ready, time spent
+importing modules after component_runtime, and the slowest import.
+
+--eager loads every deferred (lazy_import) module before the component
+starts, which is what the components did before they used the runtime.
+Install boto3 and watchdog to see the difference for s3-uploader.
+
+Usage:
+    python3 bench_startup.py [--runs 5] [--components hello-world,s3-uploader] [--eager]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+
+COMPONENTS = {
+    'hello-world': ('main.py', 'HelloWorldComponent', {}),
+    'sensor-simulator': ('main.py', 'SensorSimulatorComponent', {'GG_OUTPUT_PATH': '{tmp}/sensor-data.json'}),
+    's3-uploader': ('main.py', 'S3Uploader', {'GG_WATCH_DIR': '{tmp}/uploads'}),
+    'ipc-publisher': ('main.py', 'IPCPublisher', {}),
+    'ipc-subscriber': ('main.py', 'IPCSubscriber', {'GG_OUTPUT_FILE': '{tmp}/ipc-messages.log'}),
+    'iot-core-publisher': ('main.py', 'IoTCorePublisher', {'GG_SPOOL_DIR': '{tmp}/spool'}),
+    'ipc-subscriber/async': ('async_main.py', 'AsyncIPCSubscriber', {'GG_OUTPUT_FILE': '{tmp}/ipc-messages.log'}),
+}
+
+
+def run_child(name, eager):
+    """Start one component and print its startup profile as JSON on stdout"""
+    result_out = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    example, filename, class_name, _ = name.split('/')[0], *COMPONENTS[name]
+
+    fake_ipc.install(latency=0.001, record=False)
+    module = fake_ipc.load_component(example, filename=filename)
+    runtime = sys.modules['component_runtime']
+    startup = runtime.startup
+    if eager:
+        for value in list(vars(module).values()):
+            if isinstance(value, runtime.LazyModule):
+                value.load()
+    component = getattr(module, class_name)()
+
+    def report():
+        if not startup.is_ready.wait(30):
+            print(f"{name} did not report ready", file=sys.stderr)
+            os._exit(1)
+        timer = startup.import_timer
+        slowest = max((record for record in timer.records if record[3] == 0), key=lambda record: record[2],
+                      default=('-', 0, 0, 0))
+        print(json.dumps({
+            'ready': startup.ready_at,
+            'importMs': 1000 * timer.total(),
+            'slowestImport': slowest[0],
+            'slowestImportMs': 1000 * slowest[2],
+            'modules': len(timer.records),
+        }), file=result_out, flush=True)
+        # Components run until signalled; the profile is all we need
+        os._exit(0)
+
+    # The asyncio variants install signal handlers, so the component keeps the main thread
+    threading.Thread(target=report, daemon=True).start()
+    component.run()
+
+
+def run_component(name, tmp, eager):
+    env = dict(os.environ, GG_STARTUP_PROFILE='true')
+    env.update({key: value.format(tmp=tmp) for key, value in COMPONENTS[name][2].items()})
+    spawned = time.perf_counter()
+    output = subprocess.run([sys.executable, __file__, '--child', name] + (['--eager'] if eager else []), env=env,
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    # perf_counter is CLOCK_MONOTONIC on Linux, so parent and child readings are comparable
+    result['readyMs'] = 1000 * (result['ready'] - spawned)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='runs per component (medians are reported)')
+    parser.add_argument('--components', default=','.join(COMPONENTS), help='comma-separated components to start')
+    parser.add_argument('--eager', action='store_true', help='import deferred modules up front')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.eager)
+        return
+
+    print(f"Median of {args.runs} starts, fake IPC endpoint, {'eager' if args.eager else 'deferred'} imports")
+    print(f"{'component':<22} {'ready ms':>9} {'import ms':>10} {'modules':>8}  slowest import")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.components.split(','):
+            runs = [run_component(name, tmp, args.eager) for _ in range(args.runs)]
+            ready = statistics.median(run['readyMs'] for run in runs)
+            imports = statistics.median(run['importMs'] for run in runs)
+            slowest = max(runs, key=lambda run: run['slowestImportMs'])
+            print(f"{name:<22} {ready:>9.0f} {imports:>10.1f} {runs[0]['modules']:>8}  "
+                  f"{slowest['slowestImport']} ({slowest['slowestImportMs']:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Status cache and telemetry batching benchmark for the Python v2 device controller.
+
+Sends bursts of get_status commands for many devices through the fake IPC
+endpoint with a slow simulated status probe, and compares:
+- no cache (every command runs the probe)
+- coalescing only (TTL 0: concurrent commands share one probe)
+- TTL cache
+- TTL cache with telemetry replies batched into one IoT Core publish
+
+Reports total time, mean command latency, probes run, cache hit rate,
+probe time saved and IoT Core publishes.
+
+Usage:
+    python3 bench_status_cache.py [--devices 100] [--commands 10] [--probe-ms 20]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import threading
+import time
+
+import fake_ipc
+
+CONTROLLER = fake_ipc.EXAMPLES_DIR / 'v1-lambda-migration' / 'python' / 'cloud_communication' / 'v2_controller.py'
+
+
+def run_scenario(module, endpoint, args, ttl, batch_size):
+    def slow_probe():
+        time.sleep(args.probe_ms / 1000.0)
+        return 'online'
+
+    sent_at, latencies = {}, []
+    lock, done = threading.Lock(), threading.Event()
+    expected = args.devices * args.commands
+
+    def handler(device_id, data):
+        module.handle_command(device_id, data)
+        with lock:
+            latencies.append(time.perf_counter() - sent_at[data['command_id']])
+            if len(latencies) >= expected:
+                done.set()
+
+    module.get_device_status = slow_probe
+    module.status_cache = module.StatusCache(slow_probe, ttl) if ttl is not None else None
+    module.telemetry_batcher = (module.TelemetryBatcher('telemetry/batch', batch_size, 0.05)
+                                if batch_size > 1 else None)
+    module.dispatcher = module.CommandDispatcher(handler, args.workers, expected, 2 * expected)
+    operation = module.ipc_client.subscribe_to_iot_core(
+        topic_name='commands/+', qos=fake_ipc.QOS.AT_LEAST_ONCE, on_stream_event=module.on_command)[1]
+    publishes_before = endpoint.iot_core_publish_count
+
+    # The controller prints every command; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for sequence in range(args.commands):
+            for device in range(args.devices):
+                command_id = f"{device}-{sequence}"
+                sent_at[command_id] = time.perf_counter()
+                endpoint.inject_iot_core(f"commands/device-{device:04d}", json.dumps(
+                    {'command': 'get_status', 'command_id': command_id}))
+        done.wait(120)
+        elapsed = time.perf_counter() - start
+        if module.telemetry_batcher:
+            module.telemetry_batcher.stop()
+        endpoint.drain()
+        operation.close()
+        module.dispatcher.stop()
+
+    report = module.status_cache.report() if module.status_cache else None
+    return elapsed, latencies, report, endpoint.iot_core_publish_count - publishes_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=100, help='number of devices')
+    parser.add_argument('--commands', type=int, default=10, help='get_status commands per device')
+    parser.add_argument('--workers', type=int, default=8, help='dispatcher worker threads')
+    parser.add_argument('--probe-ms', type=float, default=20.0, help='simulated status probe time')
+    parser.add_argument('--ttl', type=float, default=1.0, help='status cache TTL in seconds')
+    parser.add_argument('--batch-size', type=int, default=20, help='telemetry replies per batch')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC latency')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+    module = fake_ipc.load_module(CONTROLLER, 'v2_controller')
+
+    print(f"{args.devices * args.commands} get_status commands for {args.devices} devices, "
+          f"{args.workers} workers, {args.probe_ms:.0f} ms status probe")
+    print(f"{'variant':<26} {'total s':>8} {'mean ms':>8} {'probes':>7} {'hit rate':>9} "
+          f"{'saved ms':>9} {'publishes':>10}")
+    for name, ttl, batch_size in (
+        ('no cache', None, 1),
+        ('coalescing only (TTL 0)', 0.0, 1),
+        (f'TTL {args.ttl:g} s', args.ttl, 1),
+        (f'TTL {args.ttl:g} s, batch {args.batch_size}', args.ttl, args.batch_size),
+    ):
+        elapsed, latencies, report, publishes = run_scenario(module, endpoint, args, ttl, batch_size)
+        if report:
+            probes, hit_rate, saved = report['probes'], f"{report['hitRate']:.1%}", f"{report['latencySavedMs']:.0f}"
+        else:
+            probes, hit_rate, saved = len(latencies), '-', '-'
+        print(f"{name:<26} {elapsed:>8.2f} {1000 * statistics.mean(latencies):>8.1f} {probes:>7} "
+              f"{hit_rate:>9} {saved:>9} {publishes:>10}")
+
+    endpoint.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+V1 vs V2 migration benchmark for the Python v1-lambda-migration pairs.
+
+Each variant runs in its own subprocess with the fake IPC endpoint as the
+local message bus:
+- local/v1:  v1_processor_lambda.py through compat_runtime (pinned workers)
+- local/v2:  v2_temperature_processor.py, with the V1 rule (above 80 °F) in
+             place of its anomaly detection, so every reading gets a reply
+- cloud/v1:  v1_controller_lambda.py through compat_runtime (pinned workers)
+- cloud/v2:  v2_controller.py
+
+Reported per variant:
+- startup: process spawn until the component has subscribed
+- latency: p50/p99 of message in -> reply out, one message at a time
+- throughput: messages/second with all messages sent at once
+- peak RSS of the process
+
+Usage:
+    python3 bench_v1_vs_v2.py [--messages 2000] [--latency-ms 1] [--runs 3] [--compat-concurrency 1]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import fake_ipc
+from helpers import percentile
+
+MIGRATION_DIR = fake_ipc.EXAMPLES_DIR / 'v1-lambda-migration' / 'python'
+ARN = 'arn:aws:lambda:us-west-2:123456789012:function:{}:1'
+
+VARIANTS = {
+    'local/v1': {
+        'compat': ('v1_processor_lambda.lambda_handler', MIGRATION_DIR / 'local_communication', 'processor', [
+            {'Source': ARN.format('sensor'), 'Subject': 'sensors/temperature', 'Target': ARN.format('processor')},
+            {'Source': ARN.format('processor'), 'Subject': 'lambda/alerts', 'Target': ARN.format('alert_handler')},
+        ]),
+        'reply_topic': 'lambda/alerts',
+    },
+    'local/v2': {
+        'module': MIGRATION_DIR / 'local_communication' / 'v2_temperature_processor.py',
+        'reply_topic': 'component/alerts',
+        # Alerts only on anomalies by default; with the V1 rule every reading gets a reply to time
+        'anomalies': lambda: ThresholdMonitor(80),
+    },
+    'cloud/v1': {
+        'compat': ('v1_controller_lambda.lambda_handler', MIGRATION_DIR / 'cloud_communication', 'controller', [
+            {'Source': 'cloud', 'Subject': 'commands/+', 'Target': ARN.format('controller')},
+            {'Source': ARN.format('controller'), 'Subject': 'telemetry/+', 'Target': 'cloud'},
+        ]),
+    },
+    'cloud/v2': {
+        'module': MIGRATION_DIR / 'cloud_communication' / 'v2_controller.py',
+    },
+}
+
+
+class ReplyTracker:
+    """Match replies to the message that caused them by device/sensor id"""
+
+    def __init__(self):
+        self.sent_at = {}
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def sent(self, key):
+        with self.lock:
+            self.sent_at[key] = time.perf_counter()
+
+    def received(self, key):
+        now = time.perf_counter()
+        with self.condition:
+            self.latencies.append(now - self.sent_at.pop(key))
+            self.condition.notify_all()
+
+    def wait_for(self, count, timeout=60):
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.latencies) >= count, timeout)
+
+
+class ThresholdMonitor:
+    """The V1 processor's fixed rule (temperature above a limit) behind AnomalyMonitor's offer()"""
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def offer(self, sensor_id, sensor_type, value, timestamp=None):
+        return {'state': 'raised', 'check': 'threshold'} if value > self.limit else None
+
+
+def start_variant(name, endpoint, compat_concurrency):
+    """Load and start a variant in this process; returns a stop callable"""
+    variant = VARIANTS[name]
+    if 'compat' in variant:
+        handler, code_dir, function, subscriptions = variant['compat']
+        os.environ.update({
+            'GG_HANDLER': handler,
+            'GG_CODE_DIR': str(code_dir),
+            'GG_FUNCTION_ARN': ARN.format(function),
+            'GG_SUBSCRIPTIONS': json.dumps(subscriptions),
+            'GG_CONCURRENCY': str(compat_concurrency),
+            'GG_MAX_QUEUE_SIZE': '1000000',
+        })
+        module = fake_ipc.load_module(MIGRATION_DIR / 'compat_runtime' / 'lambda_runner.py', 'lambda_runner')
+        runner = module.LambdaRunner()
+        runner.start_workers()
+        runner.subscribe()
+        return runner.stop
+
+    os.environ['MAX_PENDING_COMMANDS'] = '1000000'
+    module = fake_ipc.load_module(variant['module'], name.replace('/', '_'))
+    if 'anomalies' in variant:
+        module.anomalies = variant['anomalies']()
+    threading.Thread(target=module.main, daemon=True).start()
+    while not (endpoint._local_subscriptions or endpoint._iot_core_subscriptions):
+        time.sleep(0.0005)
+    return lambda: None
+
+
+def send(name, endpoint, tracker, i):
+    if name.startswith('local'):
+        key = f"sensor-{i}"
+        tracker.sent(key)
+        endpoint.publish_local('sensors/temperature', fake_ipc.PublishMessage(
+            json_message=fake_ipc.JsonMessage(message={'sensor_id': key, 'temperature': 90})))
+    else:
+        key = f"device-{i}"
+        tracker.sent(key)
+        endpoint.inject_iot_core(f"commands/{key}", json.dumps(
+            {'command': 'get_status', 'device_id': key, 'command_id': key}))
+
+
+def run_child(name, messages, latency, compat_concurrency):
+    """Run one variant and print its measurements as JSON on stdout"""
+    result_out = sys.stdout
+    # The components print every message; keep stdout for the result
+    sys.stdout = open(os.devnull, 'w')
+
+    endpoint = fake_ipc.install(latency=latency, record=False)
+    tracker = ReplyTracker()
+    if name.startswith('local'):
+        endpoint.subscribe_local(VARIANTS[name]['reply_topic'], lambda event: tracker.received(
+            (event.json_message.message if event.json_message else
+             json.loads(event.binary_message.message))['sensor_id']))
+    else:
+        publish_iot_core = endpoint.publish_iot_core
+
+        def record_telemetry(topic, payload, qos=None):
+            publish_iot_core(topic, payload, qos)
+            tracker.received(json.loads(payload)['device_id'])
+        endpoint.publish_iot_core = record_telemetry
+
+    stop = start_variant(name, endpoint, compat_concurrency)
+    ready = time.perf_counter()
+
+    # Latency: one message at a time
+    latency_messages = min(messages, 500)
+    for i in range(latency_messages):
+        send(name, endpoint, tracker, i)
+        tracker.wait_for(i + 1)
+    # A copy: the throughput run below adds to the tracker's list
+    latencies = list(tracker.latencies)
+
+    # Throughput: everything at once
+    start = time.perf_counter()
+    for i in range(latency_messages, latency_messages + messages):
+        send(name, endpoint, tracker, i)
+    completed = tracker.wait_for(latency_messages + messages)
+    elapsed = time.perf_counter() - start
+
+    stop()
+    endpoint.close()
+    result = {
+        'ready': ready,
+        'completed': completed,
+        'p50Ms': 1000 * percentile(latencies, 0.5),
+        'p99Ms': 1000 * percentile(latencies, 0.99),
+        'throughput': messages / elapsed,
+        'peakRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(json.dumps(result), file=result_out, flush=True)
+
+
+def run_variant(name, args):
+    """Spawn a child for the variant; startup is measured from spawn to subscribed"""
+    spawned = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', name, '--messages', str(args.messages),
+         '--latency-ms', str(args.latency_ms), '--compat-concurrency', str(args.compat_concurrency)],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    # perf_counter is CLOCK_MONOTONIC on Linux, so parent and child readings are comparable
+    result['startupMs'] = 1000 * (result['ready'] - spawned)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help='messages in the throughput phase')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated IPC latency')
+    parser.add_argument('--runs', type=int, default=3, help='runs per variant (medians are reported)')
+    parser.add_argument('--compat-concurrency', type=int, default=1,
+                        help='compat_runtime workers for the v1 variants (1 = pinned V1 semantics)')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='comma-separated variants to run')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.messages, args.latency_ms / 1000.0, args.compat_concurrency)
+        return
+
+    print(f"{args.messages} messages, {args.latency_ms} ms simulated IPC latency, median of {args.runs} runs")
+    print(f"{'variant':<10} {'startup ms':>11} {'p50 ms':>8} {'p99 ms':>8} {'msgs/s':>8} {'peak RSS MB':>12}")
+    for name in args.variants.split(','):
+        runs = [run_variant(name, args) for _ in range(args.runs)]
+        if not all(run['completed'] for run in runs):
+            print(f"{name:<10} did not process every message")
+            continue
+        median = {key: statistics.median(run[key] for run in runs)
+                  for key in ('startupMs', 'p50Ms', 'p99Ms', 'throughput', 'peakRssMb')}
+        print(f"{name:<10} {median['startupMs']:>11.0f} {median['p50Ms']:>8.2f} {median['p99Ms']:>8.2f} "
+              f"{median['throughput']:>8.0f} {median['peakRssMb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
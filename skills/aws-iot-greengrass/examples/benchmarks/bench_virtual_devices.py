@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Virtual devices: how many devices one publisher process can drive over one
+IPC connection, and whether the multiplexed scheduler keeps every device on
+its schedule.
+
+- Devices per process: IPCPublisher in pipelined mode with a per-device topic
+  (local/devices/{deviceId}/data), each device publishing every --interval
+  seconds, for increasing device counts. Reports achieved against target
+  rate, lateness, missed ticks, CPU and the memory each device adds, and
+  checks that every device published on its own topic.
+- Rate limit and fairness: more devices than maxRate allows. The total rate
+  must hold at maxRate and every device must get about the same share.
+- Per-device schedules: two groups with different intervals, each keeping
+  its own rate.
+- IoTCorePublisher: columnar batches per device on dt/{deviceId}/telemetry,
+  with the IoT Core link down for a second. Spooled payloads must reach
+  their device's topic, and every device's sequence numbers must arrive
+  complete and in order.
+
+Usage:
+    python3 bench_virtual_devices.py [--devices 1000,5000,20000,50000] [--interval 5] [--seconds 10]
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import fake_ipc
+from helpers import check, create
+
+
+def run_for(publisher, seconds, task):
+    """Run the publisher's scheduler on a thread for a while; returns the scheduler stats and CPU seconds"""
+    thread = threading.Thread(target=publisher.scheduler.run, args=(task,))
+    cpu = time.process_time()
+    thread.start()
+    time.sleep(seconds)
+    stats = publisher.scheduler.stats()
+    publisher.scheduler.stop()
+    thread.join()
+    return stats, time.process_time() - cpu
+
+
+def topic_counts(endpoint, prefix):
+    counts = collections.Counter()
+    for topic, message in endpoint.published:
+        if topic.startswith(prefix):
+            device_id = json.loads(message.binary_message.message)['deviceId']
+            counts[device_id] += topic == f"{prefix}{device_id}/data"
+    return counts
+
+
+def bench_devices_per_process(module, endpoint, sizes, interval, seconds):
+    # After fake_ipc.install(), so that component_runtime finds the fake IPC SDK
+    from component_runtime.metrics import rss_bytes
+    baseline = rss_bytes()
+    print(f"IPCPublisher, pipelined, 64 in flight, 2 ms IPC latency; each device every {interval:g} s for {seconds:g} s")
+    print(f"{'devices':>8} {'target/s':>9} {'achieved/s':>11} {'mean late ms':>13} {'max late ms':>12} "
+          f"{'missed':>7} {'CPU':>6} {'KiB/device':>11}")
+    ok = True
+    for size in sizes:
+        endpoint.published.clear()
+        # Python allocations for the devices, their topics and the schedule (RSS reuses memory freed earlier)
+        tracemalloc.start()
+        publisher = create(module.IPCPublisher, GG_TOPIC='local/devices/{deviceId}/data', GG_PUBLISH_MODE='pipelined',
+                           GG_MAX_IN_FLIGHT='64', GG_INTERVAL=str(interval),
+                           GG_DEVICES=json.dumps([{'count': size, 'idFormat': 'meter-{index:06d}'}]))
+        added = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        # A little over the run time, so that the device with the last phase makes its last tick
+        stats, cpu = run_for(publisher, seconds + 0.2, publisher.publish_reading)
+        publisher.flush()
+        endpoint.drain()
+        counts = topic_counts(endpoint, 'local/devices/')
+        print(f"{size:>8} {stats['targetRate']:>9.0f} {stats['achievedRate']:>11.0f} {stats['meanJitterMs']:>13.2f} "
+              f"{stats['maxJitterMs']:>12.1f} {stats['missedTicks']:>7} {cpu / (seconds + 0.2):>6.0%} "
+              f"{added / size / 1024:>11.2f}")
+        expected = int(seconds / interval)
+        ok &= check(len(counts) == size and min(counts.values()) >= expected,
+                    f"{size} devices: each published at least {expected} times on its own topic")
+        del publisher
+    print(f"One process per device instead: about {baseline / 2**20:.0f} MiB each (this process before any "
+          f"publisher), {sizes[-1] * baseline / 2**30:.0f} GiB for {sizes[-1]} devices")
+    return ok
+
+
+def check_rate_limit(module, endpoint, seconds):
+    endpoint.published.clear()
+    publisher = create(module.IPCPublisher, GG_TOPIC='local/limited/{deviceId}/data', GG_PUBLISH_MODE='pipelined',
+                       GG_MAX_IN_FLIGHT='64', GG_INTERVAL='0.5', GG_MAX_RATE='1000',
+                       GG_DEVICES=json.dumps([{'count': 2000, 'idFormat': 'tag-{index:04d}'}]))
+    stats, _ = run_for(publisher, seconds, publisher.publish_reading)
+    publisher.flush()
+    endpoint.drain()
+    counts = list(topic_counts(endpoint, 'local/limited/').values())
+    print(f"2000 devices asking for {stats['targetRate']:.0f}/s with maxRate 1000: {stats['achievedRate']:.0f}/s, "
+          f"publishes per device {min(counts)}..{max(counts)}, {stats['throttledTicks']} ticks throttled")
+    ok = check(abs(stats['achievedRate'] - 1000) <= 50, f"total rate held at maxRate ({stats['achievedRate']:.0f}/s)")
+    ok &= check(len(counts) == 2000 and max(counts) - min(counts) <= 1,
+                "every device gets the same share of the limited rate (within one publish)")
+    return ok
+
+
+def check_schedules(module, endpoint, seconds):
+    endpoint.published.clear()
+    groups = [{'count': 100, 'idFormat': 'fast-{index:03d}', 'interval': 0.1},
+              {'count': 1000, 'idFormat': 'slow-{index:04d}', 'interval': 2}]
+    publisher = create(module.IPCPublisher, GG_TOPIC='local/mixed/{deviceId}/data', GG_PUBLISH_MODE='pipelined',
+                       GG_MAX_IN_FLIGHT='64', GG_INTERVAL='1', GG_DEVICES=json.dumps(groups))
+    run_for(publisher, seconds, publisher.publish_reading)
+    publisher.flush()
+    endpoint.drain()
+    counts = topic_counts(endpoint, 'local/mixed/')
+    fast = [count for device_id, count in counts.items() if device_id.startswith('fast-')]
+    slow = [count for device_id, count in counts.items() if device_id.startswith('slow-')]
+    ok = check(len(fast) == 100 and all(abs(count - seconds / 0.1) <= 2 for count in fast),
+               f"100 devices every 0.1 s: {min(fast)}..{max(fast)} publishes in {seconds:g} s")
+    ok &= check(len(slow) == 1000 and all(abs(count - seconds / 2) <= 1 for count in slow),
+                f"1000 devices every 2 s: {min(slow)}..{max(slow)} publishes in {seconds:g} s")
+    return ok
+
+
+def check_iot_core(module, encoding, endpoint, spool_directory, seconds):
+    endpoint.iot_core_published.clear()
+    publisher = create(module.IoTCorePublisher, GG_TOPIC='dt/{deviceId}/telemetry', GG_INTERVAL='0.5',
+                       GG_PAYLOAD_LAYOUT='columnar', GG_BATCH_SIZE='4', GG_SPOOL_DIR=spool_directory,
+                       GG_DRAIN_RATE='5000', GG_DRAIN_BATCH_SIZE='200', GG_RECONNECT_INTERVAL='0.2',
+                       GG_DEVICES=json.dumps([{'count': 1000, 'idFormat': 'plc-{index:04d}'}]))
+    publisher.start_drain_thread()
+
+    def outage():
+        time.sleep(seconds / 3)
+        endpoint.set_link_up(False)
+        time.sleep(1.0)
+        endpoint.set_link_up(True)
+
+    threading.Thread(target=outage).start()
+    stats, _ = run_for(publisher, seconds, publisher.publish_device_reading)
+    time.sleep(1.0)
+    publisher.stop()
+    endpoint.drain()
+
+    sequences = collections.defaultdict(list)
+    misrouted = 0
+    for topic, payload in endpoint.iot_core_published:
+        readings = encoding.decode_payload(payload, 'json')
+        misrouted += any(topic != f"dt/{reading['deviceId']}/telemetry" for reading in readings)
+        for reading in readings:
+            sequences[reading['deviceId']].append(reading['sequenceNumber'])
+    complete = all(numbers == list(range(1, len(numbers) + 1)) for numbers in sequences.values())
+    print(f"IoTCorePublisher, 1000 devices every 0.5 s, columnar batches of 4: {publisher.spooled.value()} payloads "
+          f"spooled during a 1 s outage, {len(endpoint.iot_core_published)} payloads published")
+    ok = check(publisher.spooled.value() > 0 and misrouted == 0,
+               "every payload, spooled ones included, reached its device's topic")
+    ok &= check(len(sequences) == 1000 and complete,
+                "every device's readings arrived complete and in order")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', default='1000,5000,20000,50000', help='comma-separated device counts')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between a device\'s readings')
+    parser.add_argument('--seconds', type=float, default=10.0, help='run time per device count')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.devices.split(',')]
+
+    # Before the components are imported, so that they find the fake IPC SDK
+    endpoint = fake_ipc.install(latency=0.002, record=True)
+    logging.disable(logging.ERROR)
+    os.environ['GG_SPOOL_DIR'] = ''
+    ipc_publisher = fake_ipc.load_component('ipc-publisher')
+    iot_publisher = fake_ipc.load_component('iot-core-publisher')
+    encoding = sys.modules['encoding']
+
+    ok = bench_devices_per_process(ipc_publisher, endpoint, sizes, args.interval, args.seconds)
+    print()
+    ok &= check_rate_limit(ipc_publisher, endpoint, 6.0)
+    ok &= check_schedules(ipc_publisher, endpoint, 6.0)
+    print()
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= check_iot_core(iot_publisher, encoding, endpoint, tmp, 6.0)
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Command dispatcher check for the Python v2 device controller.
+
+Sends commands for many devices on commands/<device_id> through the fake IPC
+endpoint, redelivering every command once as a QoS 1 broker would. One device
+is slow to process. Verifies that each command runs exactly once, that each
+device's commands run in order, and that the slow device does not hold up the
+others. The same load is repeated with a single worker, which serializes
+commands the way the inline subscription callback did, for comparison.
+
+It also fills a dispatcher's pending limit while its worker is busy and
+checks that further commands are rejected at once: dispatch() runs on the
+SDK's stream callback thread, which must not wait for a free slot.
+
+Usage:
+    python3 check_command_dispatcher.py [--devices 200] [--commands 5] [--slow-ms 200]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import threading
+import time
+
+import fake_ipc
+from helpers import check, percentile
+
+CONTROLLER = fake_ipc.EXAMPLES_DIR / 'v1-lambda-migration' / 'python' / 'cloud_communication' / 'v2_controller.py'
+SLOW_DEVICE = 'device-slow'
+
+
+class CommandRecorder:
+    """Wraps handle_command to record execution order and completion latency"""
+
+    def __init__(self, handle_command, slow_seconds):
+        self.handle_command = handle_command
+        self.slow_seconds = slow_seconds
+        self.sent_at = {}
+        self.latencies = {}
+        self.order = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.expected = 0
+
+    def __call__(self, device_id, data):
+        if device_id == SLOW_DEVICE:
+            time.sleep(self.slow_seconds)
+        self.handle_command(device_id, data)
+        with self.lock:
+            command_id = data['command_id']
+            self.latencies[command_id] = time.perf_counter() - self.sent_at[command_id]
+            self.order.setdefault(device_id, []).append(data['sequence'])
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+
+def send_commands(endpoint, recorder, devices, commands):
+    """Inject every command twice, the second time as a redelivery"""
+    recorder.expected = len(devices) * commands
+    for sequence in range(commands):
+        for device_id in devices:
+            command_id = f"{device_id}-{sequence}"
+            payload = json.dumps({'command': 'get_status', 'command_id': command_id, 'sequence': sequence})
+            recorder.sent_at[command_id] = time.perf_counter()
+            endpoint.inject_iot_core(f"commands/{device_id}", payload)
+            endpoint.inject_iot_core(f"commands/{device_id}", payload)
+
+
+def run_scenario(module, endpoint, devices, args, workers):
+    recorder = CommandRecorder(module.handle_command, args.slow_ms / 1000.0)
+    published_before = len(endpoint.iot_core_published)
+
+    module.dispatcher = module.CommandDispatcher(recorder, workers, 100000, 100000)
+    operation = module.ipc_client.subscribe_to_iot_core(
+        topic_name='commands/+', qos=fake_ipc.QOS.AT_LEAST_ONCE, on_stream_event=module.on_command)[1]
+
+    # The controller prints every command; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        send_commands(endpoint, recorder, devices, args.commands)
+        recorder.done.wait(120)
+        elapsed = time.perf_counter() - start
+        endpoint.drain()
+        operation.close()
+
+    published = endpoint.iot_core_published[published_before:]
+    fast = [latency for command_id, latency in recorder.latencies.items() if not command_id.startswith(SLOW_DEVICE)]
+    module.dispatcher.stop()
+    return recorder, published, fast, elapsed
+
+
+def check_saturated(module, pending=10, commands=100):
+    """Dispatch past the pending limit while the only worker is busy; returns whether it stayed non-blocking"""
+    release = threading.Event()
+    dispatcher = module.CommandDispatcher(lambda device_id, data: release.wait(10), 1, pending, 100000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        accepted = sum(dispatcher.dispatch(f"device-{i % 5}", {'command_id': f"saturate-{i}"}) for i in range(commands))
+        elapsed = time.perf_counter() - start
+    release.set()
+    dispatcher.stop()
+    ok = check(accepted == pending and dispatcher.stats['rejected'] == commands - pending,
+               f"pending limit {pending}: {accepted} commands accepted, {dispatcher.stats['rejected']} rejected")
+    ok &= check(elapsed < 0.1, f"{commands} commands dispatched in {1000 * elapsed:.1f} ms with the worker busy")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=200, help='number of devices')
+    parser.add_argument('--commands', type=int, default=5, help='commands per device')
+    parser.add_argument('--workers', type=int, default=8, help='dispatcher worker threads')
+    parser.add_argument('--slow-ms', type=float, default=200.0, help='processing time of the slow device')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated IPC latency')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0)
+    module = fake_ipc.load_module(CONTROLLER, 'v2_controller')
+    devices = [SLOW_DEVICE] + [f"device-{i:04d}" for i in range(args.devices - 1)]
+    total = len(devices) * args.commands
+
+    print(f"{total} commands for {len(devices)} devices, each delivered twice; "
+          f"{SLOW_DEVICE} takes {args.slow_ms:.0f} ms per command")
+
+    recorder, published, fast, elapsed = run_scenario(module, endpoint, devices, args, args.workers)
+    stats = module.dispatcher.stats
+    ok = True
+    ok &= check(len(published) == total, f"{len(published)} telemetry messages for {total} unique commands")
+    ok &= check(stats['duplicates'] == total, f"{stats['duplicates']} redeliveries dropped")
+    ok &= check(all(order == sorted(order) and len(order) == args.commands for order in recorder.order.values()),
+                "every device's commands ran once, in order")
+    ok &= check(percentile(fast, 0.99) < args.slow_ms / 1000.0,
+                f"other devices' p99 latency {1000 * percentile(fast, 0.99):.1f} ms stays below "
+                f"the slow device's {args.slow_ms:.0f} ms")
+
+    ok &= check_saturated(module)
+
+    _, _, serial_fast, serial_elapsed = run_scenario(module, endpoint, devices, args, 1)
+
+    print()
+    print(f"{'variant':<28} {'total s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, latencies, seconds in (
+        ('serialized, 1 worker', serial_fast, serial_elapsed),
+        (f'dispatcher, {args.workers} workers', fast, elapsed),
+    ):
+        print(f"{name:<28} {seconds:>8.2f} {1000 * percentile(latencies, 0.5):>8.1f} "
+              f"{1000 * percentile(latencies, 0.99):>8.1f}")
+    print("(latencies exclude the slow device)")
+
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
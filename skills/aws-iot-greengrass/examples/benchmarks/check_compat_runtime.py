@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Check for the V1 Lambda compatibility runtime.
+
+Runs the unmodified V1 Lambdas from v1-lambda-migration/python through
+compat_runtime/lambda_runner.py against the fake IPC endpoint:
+- v1_processor_lambda: local sensor messages in, local alerts out
+- v1_controller_lambda: IoT Core commands in, IoT Core telemetry out
+
+Verifies that every message is routed according to the V1 subscriptions,
+that a single worker preserves message order, and reports invocations per
+second for different worker pool sizes.
+
+Usage:
+    python3 check_compat_runtime.py [--messages 1000] [--latency-ms 2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import fake_ipc
+from helpers import check, wait_for
+
+MIGRATION_DIR = fake_ipc.EXAMPLES_DIR / 'v1-lambda-migration' / 'python'
+RUNNER = MIGRATION_DIR / 'compat_runtime' / 'lambda_runner.py'
+ARN = 'arn:aws:lambda:us-west-2:123456789012:function:{}:1'
+
+PROCESSOR_SUBSCRIPTIONS = [
+    {'Source': ARN.format('sensor'), 'Subject': 'sensors/temperature', 'Target': ARN.format('processor')},
+    {'Source': ARN.format('processor'), 'Subject': 'lambda/alerts', 'Target': ARN.format('alert_handler')},
+]
+CONTROLLER_SUBSCRIPTIONS = [
+    {'Source': 'cloud', 'Subject': 'commands/+', 'Target': ARN.format('controller')},
+    {'Source': ARN.format('controller'), 'Subject': 'telemetry/+', 'Target': 'cloud'},
+]
+
+
+def start_runner(module, handler, code_dir, function, subscriptions, concurrency):
+    os.environ.update({
+        'GG_HANDLER': handler,
+        'GG_CODE_DIR': str(code_dir),
+        'GG_FUNCTION_ARN': ARN.format(function),
+        'GG_SUBSCRIPTIONS': json.dumps(subscriptions),
+        'GG_CONCURRENCY': str(concurrency),
+        'GG_MAX_QUEUE_SIZE': '100000',
+    })
+    runner = module.LambdaRunner()
+    runner.start_workers()
+    runner.subscribe()
+    return runner
+
+
+def run_processor(module, endpoint, count, concurrency):
+    runner = start_runner(module, 'v1_processor_lambda.lambda_handler', MIGRATION_DIR / 'local_communication',
+                          'processor', PROCESSOR_SUBSCRIPTIONS, concurrency)
+    endpoint.published.clear()
+    start = time.perf_counter()
+    for i in range(count):
+        reading = {'sensor_id': f"sensor-{i}", 'temperature': 90 if i % 2 == 0 else 70}
+        endpoint.publish_local('sensors/temperature', fake_ipc.PublishMessage(
+            binary_message=fake_ipc.BinaryMessage(message=json.dumps(reading).encode('utf-8'))))
+    wait_for(lambda: runner.stats['invoked'] + runner.stats['errors'] >= count, timeout=60)
+    elapsed = time.perf_counter() - start
+    runner.stop()
+    endpoint.drain()
+    alerts = [json.loads(message.binary_message.message)
+              for topic, message in endpoint.published if topic == 'lambda/alerts']
+    return runner, alerts, elapsed
+
+
+def run_controller(module, endpoint, count, concurrency):
+    runner = start_runner(module, 'v1_controller_lambda.lambda_handler', MIGRATION_DIR / 'cloud_communication',
+                          'controller', CONTROLLER_SUBSCRIPTIONS, concurrency)
+    endpoint.iot_core_published.clear()
+    start = time.perf_counter()
+    for i in range(count):
+        device_id = f"device-{i % 50}"
+        endpoint.inject_iot_core(f"commands/{device_id}",
+                                 json.dumps({'command': 'get_status', 'device_id': device_id}))
+    wait_for(lambda: runner.stats['invoked'] + runner.stats['errors'] >= count, timeout=60)
+    elapsed = time.perf_counter() - start
+    runner.stop()
+    endpoint.drain()
+    return runner, endpoint.iot_core_published[:], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000, help='messages per scenario')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC latency')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0)
+    module = fake_ipc.load_module(RUNNER, 'lambda_runner')
+    logging.disable(logging.WARNING)
+
+    # The V1 Lambdas print every message; keep the report readable
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        runner, alerts, _ = run_processor(module, endpoint, args.messages, 1)
+        controller, telemetry, _ = run_controller(module, endpoint, args.messages, 1)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    ok = True
+    ok &= check(runner.stats['invoked'] == args.messages and runner.stats['errors'] == 0,
+                f"processor invoked {runner.stats['invoked']} times without errors")
+    ok &= check(len(alerts) == args.messages // 2 + args.messages % 2,
+                f"{len(alerts)} HIGH_TEMPERATURE alerts published locally on lambda/alerts")
+    ok &= check([alert['sensor_id'] for alert in alerts] == [f"sensor-{i}" for i in range(0, args.messages, 2)],
+                "alerts published in message order with one worker")
+    ok &= check(len(telemetry) == args.messages and all(topic.startswith('telemetry/device-') for topic, _ in telemetry),
+                f"{len(telemetry)} telemetry messages published to IoT Core")
+    ok &= check(all(json.loads(payload)['device_id'] == topic.split('/')[1] for topic, payload in telemetry),
+                "telemetry routed to telemetry/<device_id>")
+
+    print()
+    print(f"{args.latency_ms} ms simulated IPC latency, {args.messages} messages")
+    print(f"{'Lambda':<24} {'workers':>8} {'invocations/s':>14}")
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    results = []
+    try:
+        for concurrency in (1, 4, 16):
+            for name, scenario in (('v1_processor_lambda', run_processor), ('v1_controller_lambda', run_controller)):
+                _, _, elapsed = scenario(module, endpoint, args.messages, concurrency)
+                results.append((name, concurrency, args.messages / elapsed))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    for name, concurrency, rate in sorted(results):
+        print(f"{name:<24} {concurrency:>8} {rate:>14.0f}")
+
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Check for references/migration/export_ggv1.py against stubbed AWS responses.
+
+Stub Greengrass and Lambda clients return canned responses after a simulated
+API latency, and a local HTTP server stands in for the presigned code URLs.
+Several groups share some functions. Verifies:
+- every group gets group.json, functions.json, subscriptions.json and its code
+- shared code is downloaded once per run
+- a re-run downloads nothing; changing one function downloads only that one
+- the parallel export is faster than a single worker
+
+Usage:
+    python3 check_export_ggv1.py [--groups 20] [--functions 5] [--api-latency-ms 50]
+"""
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import http.server
+import importlib.util
+import io
+import json
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from helpers import check
+
+EXPORTER = Path(__file__).resolve().parents[2] / 'references' / 'migration' / 'export_ggv1.py'
+SHARED_FUNCTIONS = 2
+
+
+def load_exporter():
+    spec = importlib.util.spec_from_file_location('export_ggv1', EXPORTER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_zip(name, revision):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('lambda_function.py', f"# {name} revision {revision}\ndef lambda_handler(event, context):\n    pass\n")
+        archive.writestr('lib/helper.py', 'VALUE = 1\n' * 2000)
+    return buffer.getvalue()
+
+
+class CodeServer:
+    """Serves Lambda zips at http://127.0.0.1:<port>/<name>, counting requests"""
+
+    def __init__(self, latency):
+        self.zips = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                time.sleep(latency)
+                body = server.zips[self.path.lstrip('/')]
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{name}"
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class StubAWS:
+    """Stub greengrass and lambda clients returning canned V1 responses"""
+
+    def __init__(self, groups, functions, server, latency):
+        self.latency = latency
+        self.server = server
+        self.groups = {}
+        self.revisions = {}
+        for g in range(groups):
+            # The first functions are shared by every group, the rest are per group
+            names = [f"shared_{i}" for i in range(SHARED_FUNCTIONS)] + \
+                    [f"group{g}_fn{i}" for i in range(functions - SHARED_FUNCTIONS)]
+            self.groups[f"group-{g:04d}"] = names
+            for name in names:
+                self.set_code(name, 1)
+
+    def set_code(self, name, revision):
+        self.revisions[name] = revision
+        self.server.zips[name] = make_zip(name, revision)
+
+    def call(self):
+        time.sleep(self.latency)
+
+    def get_group(self, GroupId):
+        self.call()
+        return {'Id': GroupId, 'LatestVersion': 'v1', 'ResponseMetadata': {}}
+
+    def get_group_version(self, GroupId, GroupVersionId):
+        self.call()
+        return {'Id': GroupId, 'Version': GroupVersionId, 'Definition': {
+            'FunctionDefinitionVersionArn':
+                f"arn:aws:greengrass:us-west-2:123456789012:/greengrass/definition/functions/fn-{GroupId}/versions/1",
+            'SubscriptionDefinitionVersionArn':
+                f"arn:aws:greengrass:us-west-2:123456789012:/greengrass/definition/subscriptions/sub-{GroupId}/versions/1",
+        }}
+
+    def get_function_definition_version(self, FunctionDefinitionId, FunctionDefinitionVersionId):
+        self.call()
+        group_id = FunctionDefinitionId[len('fn-'):]
+        functions = [{'FunctionArn': f"arn:aws:lambda:us-west-2:123456789012:function:{name}:1", 'Id': name}
+                     for name in self.groups[group_id]]
+        functions.append({'FunctionArn': 'arn:aws:lambda:::function:GGIPDetector:1', 'Id': 'ip-detector'})
+        return {'Definition': {'Functions': functions}}
+
+    def get_subscription_definition_version(self, SubscriptionDefinitionId, SubscriptionDefinitionVersionId):
+        self.call()
+        return {'Definition': {'Subscriptions': [
+            {'Id': '1', 'Source': 'cloud', 'Subject': 'commands/+', 'Target': 'arn:aws:lambda:...'}]}}
+
+    def get_function(self, FunctionName):
+        self.call()
+        name = FunctionName.split(':')[-2]
+        digest = hashlib.sha256(self.server.zips[name]).digest()
+        return {'Configuration': {'FunctionName': name, 'CodeSha256': base64.b64encode(digest).decode('ascii')},
+                'Code': {'Location': self.server.url(name)}}
+
+
+def run_export(exporter, aws, output_dir, workers):
+    requests_before = aws.server.requests
+    start = time.perf_counter()
+    # The exporter prints one line per group
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, stats = exporter.export_groups(list(aws.groups), aws, aws, output_dir, workers=workers)
+    return results, stats, aws.server.requests - requests_before, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=20, help='number of V1 groups')
+    parser.add_argument('--functions', type=int, default=5, help='Lambda functions per group')
+    parser.add_argument('--workers', type=int, default=16, help='exporter pool size')
+    parser.add_argument('--api-latency-ms', type=float, default=50.0, help='simulated AWS API latency')
+    args = parser.parse_args()
+
+    exporter = load_exporter()
+    server = CodeServer(args.api_latency_ms / 1000.0)
+    aws = StubAWS(args.groups, args.functions, server, args.api_latency_ms / 1000.0)
+    unique_functions = SHARED_FUNCTIONS + args.groups * (args.functions - SHARED_FUNCTIONS)
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / 'parallel'
+        results, stats, downloads, parallel_seconds = run_export(exporter, aws, output, args.workers)
+        ok &= check(all(results[g] == args.functions for g in aws.groups),
+                    f"{len(results)} groups exported with {args.functions} functions each (managed functions skipped)")
+        ok &= check(all((output / g / f).is_file() for g in aws.groups
+                        for f in ('group.json', 'functions.json', 'subscriptions.json')),
+                    "group.json, functions.json and subscriptions.json written per group")
+        handler = output / 'group-0000' / 'lambda-code' / 'shared_0' / 'lambda_function.py'
+        ok &= check(handler.is_file() and 'revision 1' in handler.read_text(), "Lambda code extracted per function")
+        ok &= check(downloads == unique_functions and stats['downloaded'] == unique_functions,
+                    f"{downloads} downloads for {unique_functions} unique functions "
+                    f"({args.groups * args.functions} function exports)")
+        ok &= check('ResponseMetadata' not in json.loads((output / 'group-0000' / 'group.json').read_text()),
+                    "responses written without ResponseMetadata")
+
+        _, _, downloads, rerun_seconds = run_export(exporter, aws, output, args.workers)
+        ok &= check(downloads == 0, f"re-run downloaded {downloads} zips")
+
+        aws.set_code('group3_fn2', 2)
+        _, _, downloads, _ = run_export(exporter, aws, output, args.workers)
+        changed = output / 'group-0003' / 'lambda-code' / 'group3_fn2' / 'lambda_function.py'
+        ok &= check(downloads == 1 and 'revision 2' in changed.read_text(),
+                    f"changing one function downloaded {downloads} zip and updated its code")
+
+        _, _, _, serial_seconds = run_export(exporter, aws, Path(tmp) / 'serial', 1)
+        ok &= check(parallel_seconds < serial_seconds,
+                    f"{args.workers} workers {parallel_seconds:.2f}s vs 1 worker {serial_seconds:.2f}s")
+
+    print()
+    print(f"{args.groups} groups, {args.functions} functions each, {args.api_latency_ms:.0f} ms per API call/download")
+    print(f"{'run':<28} {'seconds':>8}")
+    print(f"{'1 worker (like the .sh)':<28} {serial_seconds:>8.2f}")
+    print(f"{f'{args.workers} workers':<28} {parallel_seconds:>8.2f}")
+    print(f"{f'{args.workers} workers, re-run':<28} {rerun_seconds:>8.2f}")
+
+    server.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Report-by-exception check for IoTCorePublisher's edge filters.
+
+Runs the deadband (absolute and percent) and swinging door filters over a
+simulated dataset, one reading per second for --hours per signal:
+
+- temperature: daily cycle, slow random-walk drift, 0.05 noise, 0.01 resolution
+- humidity: slow ramp with step changes (a door opening) and 0.2 noise
+- pressure: almost constant, with readings of "warning" quality now and then
+- vibration: mostly noise, which no filter should compress much
+
+For each combination it reports the compression ratio and the largest
+reconstruction error: the last value sent for deadband, linear interpolation
+between the readings sent for swinging door. Checks that the error stays
+within the configured tolerance, that no gap between readings sent exceeds
+maxSilence (plus one interval), and that every reading of non-good quality
+is sent.
+
+Then it feeds the temperature signal through a running IoTCorePublisher
+(columnar JSON batches) against the fake IPC endpoint, changes the filter
+half-way through, and checks the payloads that reach IoT Core.
+
+Usage:
+    python3 check_filtering.py [--hours 6] [--seed 7]
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+import fake_ipc
+from helpers import check
+
+START = datetime(2026, 10, 19, tzinfo=timezone.utc)
+MAX_SILENCE = 300
+
+FILTERS = {
+    'deadband 0.1': {'method': 'deadband', 'deadband': 0.1, 'maxSilence': MAX_SILENCE},
+    'deadband 0.5%': {'method': 'deadband', 'deadbandPercent': 0.5, 'maxSilence': MAX_SILENCE},
+    'swingingDoor 0.1': {'method': 'swingingDoor', 'deviation': 0.1, 'maxSilence': MAX_SILENCE},
+    'swingingDoor 0.25': {'method': 'swingingDoor', 'deviation': 0.25, 'maxSilence': MAX_SILENCE},
+}
+
+
+def simulate(kind, seconds, rng):
+    """(epoch seconds, value, quality) once a second"""
+    points = []
+    drift = 0.0
+    level = 45.0
+    for i in range(seconds):
+        quality = 'good'
+        if kind == 'temperature':
+            drift += rng.gauss(0, 0.002)
+            value = 22.0 + 3.0 * math.sin(2 * math.pi * i / 86400) + drift + rng.gauss(0, 0.05)
+        elif kind == 'humidity':
+            if rng.random() < 0.0005:
+                level += rng.choice((-1, 1)) * rng.uniform(3, 8)
+            value = level + i / 3600 + rng.gauss(0, 0.2)
+        elif kind == 'pressure':
+            value = 1013.25 + 0.5 * math.sin(2 * math.pi * i / 43200) + rng.gauss(0, 0.02)
+            if rng.random() < 0.001:
+                quality = 'warning'
+        else:
+            value = 5.0 + rng.gauss(0, 1.0)
+        points.append((START.timestamp() + i, round(value, 2), quality))
+    return points
+
+
+def readings(kind, points):
+    """The points as the publisher's reading objects"""
+    return [{'deviceId': 'sensor-001', 'sensorType': kind, 'value': value, 'unit': 'units',
+             'timestamp': (START + timedelta(seconds=t - START.timestamp())).isoformat(),
+             'sequenceNumber': i + 1, 'quality': quality}
+            for i, (t, value, quality) in enumerate(points)]
+
+
+def reconstruct(points, sent, linear):
+    """The values a consumer sees at each point's time from the (time, value) pairs sent
+
+    Deadband consumers hold the last value; swinging door consumers
+    interpolate linearly between the readings sent.
+    """
+    times = [t for t, _ in sent]
+    values = []
+    for t, _, _ in points:
+        index = bisect.bisect_right(times, t) - 1
+        t0, v0 = sent[index]
+        if not linear or t0 == t or index + 1 == len(sent):
+            values.append(v0)
+        else:
+            t1, v1 = sent[index + 1]
+            values.append(v0 + (v1 - v0) * (t - t0) / (t1 - t0))
+    return values
+
+
+def evaluate(filtering, settings, kind, points):
+    """Compression and reconstruction error of one filter over one signal"""
+    edge_filter = filtering.create_filter(settings)
+    sent = []
+    for reading in readings(kind, points):
+        sent.extend(edge_filter.offer(reading))
+    sent.extend(edge_filter.flush())
+    by_sequence = {reading['sequenceNumber']: reading for reading in sent}
+    kept = [(points[reading['sequenceNumber'] - 1][0], reading['value']) for reading in sent]
+
+    linear = settings['method'] == 'swingingDoor'
+    worst = 0.0  # error relative to its bound
+    max_error = squares = 0.0
+    for (_, value, _), seen in zip(points, reconstruct(points, kept, linear)):
+        error = abs(seen - value)
+        if settings['method'] == 'deadband' and 'deadbandPercent' in settings:
+            bound = settings['deadbandPercent'] * abs(seen) / 100
+        else:
+            bound = settings.get('deadband', settings.get('deviation'))
+        worst = max(worst, error - bound)
+        max_error = max(max_error, error)
+        squares += error * error
+
+    times = [t for t, _ in kept]
+    return {
+        'sent': len(sent),
+        'ratio': len(points) / len(sent),
+        'maxError': max_error,
+        'rmsError': math.sqrt(squares / len(points)),
+        'withinBound': worst <= 1e-9,
+        'ordered': times == sorted(times) and len(by_sequence) == len(sent),
+        'maxGap': max(b - a for a, b in zip(times, times[1:])),
+        'exceptionsSent': all(i + 1 in by_sequence for i, point in enumerate(points) if point[2] != 'good'),
+        # Swinging door holds the newest reading back until flush()
+        'flushed': not linear or sent[-1]['sequenceNumber'] == len(points),
+    }
+
+
+def check_dataset(filtering, hours, seed):
+    rng = random.Random(seed)
+    seconds = int(hours * 3600)
+    print(f"{seconds} readings per signal, 1 per second; maxSilence {MAX_SILENCE} s")
+    print(f"{'signal':<12} {'filter':<18} {'sent':>6} {'ratio':>7} {'max err':>8} {'rms err':>8} {'max gap s':>10}")
+    ok = True
+    for kind in ('temperature', 'humidity', 'pressure', 'vibration'):
+        points = simulate(kind, seconds, rng)
+        for name, settings in FILTERS.items():
+            result = evaluate(filtering, settings, kind, points)
+            print(f"{kind:<12} {name:<18} {result['sent']:>6} {result['ratio']:>6.1f}x {result['maxError']:>8.3f} "
+                  f"{result['rmsError']:>8.3f} {result['maxGap']:>10.0f}")
+            failures = [label for label, passed in [
+                ('error exceeds the tolerance', result['withinBound']),
+                ('readings out of order or repeated', result['ordered']),
+                (f"gap above {MAX_SILENCE + 1} s", result['maxGap'] <= MAX_SILENCE + 1),
+                ('non-good reading suppressed', result['exceptionsSent']),
+                ('held reading not flushed', result['flushed']),
+            ] if not passed]
+            if failures:
+                ok &= check(False, f"{kind} {name}: {', '.join(failures)}")
+    return check(ok, "reconstruction error within tolerance, heartbeats and exceptions sent, for every signal")
+
+
+def check_publisher(module, encoding, endpoint, seed):
+    """The filter inside a running publisher, changed half-way through"""
+    deviation = FILTERS['swingingDoor 0.1']['deviation']
+    os.environ.update({
+        'GG_SPOOL_DIR': '', 'GG_PAYLOAD_LAYOUT': 'columnar', 'GG_BATCH_SIZE': '20',
+        'GG_FILTERS': json.dumps({'temperature': FILTERS['swingingDoor 0.1']}),
+    })
+    points = simulate('temperature', 3600, random.Random(seed))
+    dataset = iter(readings('temperature', points))
+    publisher = module.IoTCorePublisher()
+    publisher.generate_sensor_data = lambda: next(dataset)
+    for i in range(len(points)):
+        if i == len(points) // 2:
+            # Readings from here on are all sent; the one held back by swinging door goes first
+            publisher.apply_configuration({'filters': {}})
+        publisher.publish_reading()
+    publisher.stop()
+    endpoint.drain()
+
+    received = []
+    for _, payload in endpoint.iot_core_published:
+        received.extend(encoding.decode_payload(payload, 'json'))
+    sequence = [reading['sequenceNumber'] for reading in received]
+    kept = [(points[number - 1][0], reading['value']) for number, reading in zip(sequence, received)]
+    error = max(abs(seen - value) for (_, value, _), seen in zip(points, reconstruct(points, kept, True)))
+    half = len(points) // 2
+
+    ok = check(sequence == sorted(set(sequence)) and sequence[-1] == len(points),
+               f"{len(received)} of {len(points)} readings reached IoT Core in order, the last one included")
+    ok &= check(publisher.reported.value() == len(received),
+                f"reported counter matches ({publisher.reported.value()})")
+    ok &= check(sequence[-half:] == list(range(half + 1, len(points) + 1)),
+                "after the filter was removed every reading was sent")
+    ok &= check(error <= deviation + 1e-9, f"reconstruction error {error:.3f} within {deviation} across the change")
+    ok &= check(publisher.compression_ratio() == round(len(points) / len(received), 2),
+                f"compressionRatio gauge {publisher.compression_ratio():g}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=6.0, help='hours of simulated readings per signal')
+    parser.add_argument('--seed', type=int, default=7, help='random seed for the dataset')
+    args = parser.parse_args()
+
+    # Before the publisher is imported, so that it finds the fake IPC SDK
+    endpoint = fake_ipc.install(latency=0.0, record=True)
+    logging.disable(logging.WARNING)
+    module = fake_ipc.load_component('iot-core-publisher')
+    # The publisher's own modules, imported alongside it
+    filtering, encoding = sys.modules['filtering'], sys.modules['encoding']
+
+    ok = check_dataset(filtering, args.hours, args.seed)
+    ok &= check_publisher(module, encoding, endpoint, args.seed)
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Memory budget check: peak RSS of each example component under a fixed
+synthetic load, with and without the component runtime's low-memory mode
+(GG_LOW_MEMORY=true).
+
+Each component runs in a fresh subprocess against the fake IPC endpoint
+while a driver thread in the same process applies the load for --seconds:
+
+- sensor-simulator: 200 sensors, each reading every 0.1 s, to a file
+- ipc-publisher: a reading every 2 ms, pipelined, in batches of 50
+- iot-core-publisher: a reading every 2 ms in columnar batches of 500, with
+  IoT Core down for the first half so readings are spooled and drained
+- ipc-subscriber (threaded and async): 2000 messages per second on
+  local/sensor/data, written to the output file
+- s3-uploader: 40 files of 2 MiB dropped into the watch directory and
+  uploaded to a local S3 stand-in (needs boto3)
+- hello-world: no load, the baseline cost of the runtime
+
+Peak RSS is the process's high-water mark (VmHWM), so it includes the
+driver and the fake endpoint, which are the same in both modes. The check
+fails if a component exceeds its low-memory budget, or if the low-memory
+S3 client's SigV4 signature differs from botocore's for the same request
+(when botocore is installed).
+
+Usage:
+    python3 check_memory.py [--seconds 6] [--components sensor-simulator,s3-uploader] [--mode low]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import check
+
+SENSORS = [{'id': f"sensor-{i:03d}", 'type': 'temperature', 'interval': 0.1, 'baseValue': 22.0, 'variance': 3.0,
+            'unit': 'C'} for i in range(200)]
+
+# example, filename, class, environment, low-memory peak RSS budget (MiB)
+COMPONENTS = {
+    'hello-world': ('main.py', 'HelloWorldComponent', {'GG_INTERVAL': '1'}, 22),
+    'sensor-simulator': ('main.py', 'SensorSimulatorComponent', {
+        'GG_SENSOR_CONFIG': json.dumps({'sensors': SENSORS, 'outputMode': 'file',
+                                        'outputPath': '{tmp}/sensor-data.json'})}, 22),
+    'ipc-publisher': ('main.py', 'IPCPublisher', {
+        'GG_INTERVAL': '0.002', 'GG_PUBLISH_MODE': 'pipelined', 'GG_BATCH_SIZE': '50'}, 22),
+    'iot-core-publisher': ('main.py', 'IoTCorePublisher', {
+        'GG_INTERVAL': '0.002', 'GG_PAYLOAD_LAYOUT': 'columnar', 'GG_BATCH_SIZE': '500',
+        'GG_SPOOL_DIR': '{tmp}/spool', 'GG_DRAIN_RATE': '200', 'GG_RECONNECT_INTERVAL': '0.5'}, 22),
+    'ipc-subscriber': ('main.py', 'IPCSubscriber', {'GG_OUTPUT_FILE': '{tmp}/ipc-messages.log'}, 22),
+    'ipc-subscriber/async': ('async_main.py', 'AsyncIPCSubscriber', {'GG_OUTPUT_FILE': '{tmp}/ipc-messages.log'}, 27),
+    's3-uploader': ('main.py', 'S3Uploader', {
+        'GG_WATCH_DIR': '{tmp}/uploads', 'GG_UPLOAD_INTERVAL': '1', 'GG_DELETE_AFTER': 'true',
+        'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_DEFAULT_REGION': 'us-east-1'}, 32),
+}
+
+COMMON = {'GG_METRICS_INTERVAL': '0', 'GG_STATS_INTERVAL': '3600', 'GG_LOG_SAMPLE_RATE': '1'}
+
+
+def memory_status():
+    """VmHWM (peak RSS), VmRSS and VmPeak (peak virtual size) in bytes, from /proc/self/status"""
+    status = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmHWM', 'VmRSS', 'VmPeak'):
+                status[key] = int(value.split()[0]) * 1024
+    return status
+
+
+def start_s3():
+    """A local endpoint that accepts PutObject and discards the body; returns its URL"""
+    # Imported here: http.server alone adds several MiB to every other component's measurement
+    import http.server
+
+    class S3Handler(http.server.BaseHTTPRequestHandler):
+        # HTTP/1.1 answers botocore's "Expect: 100-continue" instead of leaving it to time out
+        protocol_version = 'HTTP/1.1'
+
+        def do_PUT(self):
+            remaining = int(self.headers.get('Content-Length', 0))
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 65536)))
+            self.send_response(200)
+            self.send_header('ETag', '"0"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), S3Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def drive(name, endpoint, seconds, tmp):
+    """Apply the component's load for seconds"""
+    deadline = time.monotonic() + seconds
+    if name.startswith('ipc-subscriber'):
+        message = fake_ipc.PublishMessage(binary_message=fake_ipc.BinaryMessage(message=json.dumps({
+            'messageType': 'sensor-reading', 'deviceId': 'ipc-sensor-001', 'sequenceNumber': 1,
+            'data': {'temperature': 24.5, 'humidity': 51.2, 'pressure': 1001.3}}).encode()))
+        while time.monotonic() < deadline:
+            for _ in range(20):
+                endpoint.publish_local('local/sensor/data', message)
+            time.sleep(0.01)
+    elif name == 'iot-core-publisher':
+        endpoint.set_link_up(False)
+        time.sleep(seconds / 2)
+        endpoint.set_link_up(True)
+        time.sleep(max(0.0, deadline - time.monotonic()))
+    elif name == 's3-uploader':
+        data = os.urandom(2 << 20)
+        for i in range(40):
+            with open(os.path.join(tmp, 'uploads', f"capture-{i:03d}.bin"), 'wb') as f:
+                f.write(data)
+            time.sleep(seconds / 50)
+        time.sleep(max(0.0, deadline - time.monotonic()))
+    else:
+        time.sleep(seconds)
+
+
+def run_child(name, seconds, tmp):
+    """Run one component under load and print its memory use as JSON on stdout"""
+    result_out = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    example, filename, class_name = name.split('/')[0], *COMPONENTS[name][:2]
+    if name == 's3-uploader':
+        os.environ['AWS_ENDPOINT_URL_S3'] = start_s3()
+
+    endpoint = fake_ipc.install(latency=0.001, record=False)
+    module = fake_ipc.load_component(example, filename=filename)
+    component = getattr(module, class_name)()
+    started = memory_status()
+
+    def report():
+        runtime = sys.modules['component_runtime']
+        runtime.startup.is_ready.wait(30)
+        time.sleep(0.2)
+        drive(name, endpoint, seconds, tmp)
+        print(json.dumps({**memory_status(), 'startRss': started['VmRSS'], 'threads': threading.active_count(),
+                          'processed': {key: counter.value() for key, counter in runtime.metrics.counters.items()}}),
+              file=result_out, flush=True)
+        # Components run until signalled; the measurement is all we need
+        os._exit(0)
+
+    threading.Thread(target=report, daemon=True).start()
+    component.run()
+
+
+def run_component(name, low_memory, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, **COMMON, GG_LOW_MEMORY='true' if low_memory else 'false')
+        env.update({key: value.replace('{tmp}', tmp) for key, value in COMPONENTS[name][2].items()})
+        output = subprocess.run([sys.executable, __file__, '--child', name, '--tmp', tmp, '--seconds', str(seconds)],
+                                env=env, capture_output=True, text=True, timeout=seconds + 60,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if output.returncode or not output.stdout.strip():
+            print(output.stderr[-2000:])
+            raise RuntimeError(f"{name} failed")
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def check_signature():
+    """The low-memory S3 client signs a PutObject exactly as botocore does"""
+    # Imported here, like http.server: mock and botocore would inflate the components' measurements
+    import datetime
+    import urllib.parse
+    from unittest import mock
+
+    from botocore.auth import S3SigV4Auth
+    from botocore.awsrequest import AWSRequest
+    from botocore.config import Config
+    from botocore.credentials import Credentials
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 's3-uploader', 'src'))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'component-runtime', 'src'))
+    from s3_stream import StreamingS3Client
+
+    client = StreamingS3Client(region='eu-west-1')
+    credentials = {'access_key': 'AKIDEXAMPLE', 'secret_key': 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+                   'token': 'session-token', 'expires': None}
+    ok = True
+    for key in ('device-uploads/capture-001.bin', 'device uploads/2026-10-19T03:05:44+00:00 (1).jpg'):
+        scheme, host, port, path = client.address('my-greengrass-uploads', key)
+        metadata = {'device-id': 'gg-core-01', 'upload-timestamp': '2026-10-19T03:05:44'}
+        ours = client.signed_headers(host, path, 1234, metadata, credentials, '20261019T030544Z')
+
+        request = AWSRequest(method='PUT', url=f"{scheme}://{host}{urllib.parse.quote(path, safe='/~')}",
+                             headers={name: value for name, value in ours.items()
+                                      if name not in ('Authorization', 'x-amz-date', 'x-amz-security-token')})
+        request.context['client_config'] = Config(s3={'payload_signing_enabled': False})
+        with mock.patch('botocore.auth.get_current_datetime',
+                        return_value=datetime.datetime(2026, 10, 19, 3, 5, 44)):
+            S3SigV4Auth(Credentials('AKIDEXAMPLE', credentials['secret_key'], 'session-token'),
+                        's3', 'eu-west-1').add_auth(request)
+        ok &= check(ours['Authorization'] == request.headers['Authorization'],
+                    f"low-memory S3 signature matches botocore for {key!r}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=6.0, help='seconds of load per component')
+    parser.add_argument('--components', default=','.join(COMPONENTS), help='comma-separated components to run')
+    parser.add_argument('--mode', choices=('both', 'low', 'default'), default='both',
+                        help='run with low-memory mode, without it, or both')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--tmp', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.seconds, args.tmp)
+        return
+
+    names = args.components.split(',')
+    if 's3-uploader' in names and importlib.util.find_spec('boto3') is None:
+        print("boto3 not installed - skipping s3-uploader")
+        names.remove('s3-uploader')
+    modes = {'both': (False, True), 'low': (True,), 'default': (False,)}[args.mode]
+
+    ok = True
+    if importlib.util.find_spec('botocore') is not None:
+        ok &= check_signature()
+
+    mib = 1 << 20
+    print(f"{args.seconds:g} s of load per component; MiB")
+    print(f"{'component':<22} {'mode':<8} {'start':>6} {'peak':>6} {'end':>6} {'VmPeak':>7} {'threads':>8} {'budget':>7}")
+    for name in names:
+        budget = COMPONENTS[name][3]
+        for low_memory in modes:
+            result = run_component(name, low_memory, args.seconds)
+            mode = 'low' if low_memory else 'default'
+            print(f"{name:<22} {mode:<8} {result['startRss'] / mib:>6.1f} {result['VmHWM'] / mib:>6.1f} "
+                  f"{result['VmRSS'] / mib:>6.1f} {result['VmPeak'] / mib:>7.0f} {result['threads']:>8} "
+                  f"{budget if low_memory else '':>7}  {json.dumps(result['processed'])}")
+            if low_memory:
+                ok &= check(result['VmHWM'] <= budget * mib,
+                            f"{name} peak RSS {result['VmHWM'] / mib:.1f} MiB within {budget} MiB")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Runtime metrics check: the metrics registry's hot-path cost and accuracy,
+and the snapshots a running component publishes.
+
+- Recording cost: Counter.inc() and Histogram.record() against a counter
+  behind a lock and a plain attribute increment, on one and on several
+  threads, with the totals checked for lost updates.
+- Histogram accuracy: percentiles against the exact values.
+- Snapshots: an IPCPublisher runs against the fake IPC endpoint with a short
+  metricsInterval; the snapshots published to local/metrics/IPCPublisher and
+  written to the metrics file must agree with what was published.
+
+Usage:
+    python3 check_metrics.py [--operations 200000] [--threads 4] [--latency-ms 2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import check
+
+
+class LockedCounter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class PlainCounter:
+    """Not thread-safe: the baseline cost of an increment"""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+def time_threads(target, threads):
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+
+def check_recording_cost(operations, threads):
+    from component_runtime.metrics import Counter, Histogram
+    print(f"Recording cost, {operations} operations per thread (ns per operation)")
+    print(f"  {'metric':<26} {'1 thread':>9} {f'{threads} threads':>11}")
+    ok = True
+    for name, make, record, total in [
+        ('plain attribute +=', PlainCounter, lambda m: m.inc(), lambda m: m.value),
+        ('counter behind a lock', LockedCounter, lambda m: m.inc(), lambda m: m.value),
+        ('Counter.inc()', lambda: Counter('c'), lambda m: m.inc(), lambda m: m.value()),
+        ('Histogram.record()', lambda: Histogram('h'), lambda m: m.record(0.0025), lambda m: m.totals()[1]),
+    ]:
+        costs = []
+        for count in (1, threads):
+            metric = make()
+
+            def run():
+                for _ in range(operations):
+                    record(metric)
+
+            elapsed = time_threads(run, count)
+            costs.append(1e9 * elapsed / (operations * count))
+            if make is not PlainCounter and count > 1:
+                ok &= check(total(metric) == operations * count,
+                            f"{name} lost no updates across {count} threads ({total(metric)})")
+        print(f"  {name:<26} {costs[0]:>9.0f} {costs[1]:>11.0f}")
+    return ok
+
+
+def check_histogram_accuracy(samples=100000):
+    from component_runtime.metrics import Histogram, summarize
+    histogram = Histogram('latency')
+    values = [random.lognormvariate(-6, 1) for _ in range(samples)]
+    for value in values:
+        histogram.record(value)
+    summary = summarize(*histogram.totals())
+    values.sort()
+    ok = True
+    for percentile in (50, 90, 99):
+        exact = 1000 * values[int(percentile / 100 * samples) - 1]
+        error = abs(summary[f"p{percentile}"] - exact) / exact
+        ok &= check(error < 0.04, f"p{percentile} {summary[f'p{percentile}']:.3f} ms within 4% of {exact:.3f} ms")
+    return ok & check(abs(summary['max'] - 1000 * values[-1]) < 0.001, "max is exact (to the microsecond)")
+
+
+def check_snapshots(endpoint, latency, path):
+    snapshots = []
+    endpoint.subscribe_local('local/metrics/#', lambda event: snapshots.append(
+        (event.binary_message.context.topic, json.loads(event.binary_message.message))))
+    os.environ.update({'GG_INTERVAL': '0.01', 'GG_PUBLISH_MODE': 'pipelined', 'GG_METRICS_INTERVAL': '0.25',
+                       'GG_METRICS_TOPIC': 'local/metrics', 'GG_METRICS_FILE': path})
+
+    module = fake_ipc.load_component('ipc-publisher')
+    publisher = module.IPCPublisher()
+    thread = threading.Thread(target=publisher.run, daemon=True)
+    thread.start()
+    time.sleep(1.4)
+    publisher.scheduler.stop()
+    thread.join(timeout=10)
+    publisher.in_flight.wait_idle(5.0)
+    endpoint.close()
+
+    ok = check(len(snapshots) >= 4, f"{len(snapshots)} snapshots published in 1.4 s at a 0.25 s interval")
+    topics = {topic for topic, _ in snapshots}
+    ok &= check(topics == {'local/metrics/IPCPublisher'}, f"published to {sorted(topics)}")
+    last = snapshots[-1][1]
+    published = last['counters']['published']['total']
+    sequence = next(publisher.sequence) - 1
+    ok &= check(publisher.published.value() == sequence, f"the counter saw every publish ({sequence})")
+    # The final snapshot is taken at shutdown, while the last pipelined publishes can still be in flight
+    ok &= check(sequence - publisher.config['maxInFlight'] <= published <= sequence,
+                f"final snapshot counts {published} publishes")
+    windows = sum(snapshot['histograms']['publishLatency']['count'] for _, snapshot in snapshots)
+    ok &= check(windows == published, f"histogram windows add up to the total ({windows})")
+    p50 = snapshots[1][1]['histograms']['publishLatency'].get('p50', 0)
+    ok &= check(latency * 1000 <= p50 < latency * 1000 + 5,
+                f"publish latency p50 {p50} ms against {latency * 1000:g} ms")
+    gauges = last['gauges']
+    ok &= check(gauges['rssBytes'] > 0 and gauges['threads'] > 0 and 'inFlight' in gauges,
+                f"process gauges: {gauges['rssBytes'] // 1024} KiB RSS, {gauges['cpuPercent']}% CPU, "
+                f"{gauges['threads']} threads")
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    ok &= check(len(lines) == len(snapshots), f"{len(lines)} snapshots appended to the metrics file")
+    size = len(json.dumps(last, separators=(',', ':')))
+    print(f"  snapshot: {size} bytes, e.g. counters {json.dumps(last['counters'])}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operations', type=int, default=200000, help='recordings per thread')
+    parser.add_argument('--threads', type=int, default=4, help='threads recording at once')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC round-trip latency')
+    args = parser.parse_args()
+
+    # Before component_runtime is imported, so that it finds the fake IPC SDK
+    endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+    logging.disable(logging.ERROR)
+    ok = check_recording_cost(args.operations, args.threads)
+    ok &= check_histogram_accuracy()
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= check_snapshots(endpoint, args.latency_ms / 1000.0, os.path.join(tmp, 'metrics.jsonl'))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Profiling hooks check: profiles of a running IPCPublisher, requested by
+signal and over local IPC, and what the hooks cost.
+
+- Disabled (no GG_PROFILE_DIR, the default): a child process runs the
+  publisher and reports that no signal handler was installed and that
+  cProfile and tracemalloc were never imported.
+- Installed: the publisher runs on the main thread against the fake IPC
+  endpoint while a driver thread sends SIGUSR1 (stacks) and SIGUSR2
+  (sample), and publishes {"action": "cprofile"} and {"action": "memory"}
+  requests to local/profile/IPCPublisher. Every result file must exist,
+  load with the standard tools and be announced on
+  local/profile/IPCPublisher/result.
+
+The process CPU use is reported for the publisher with the hooks disabled,
+installed but idle, and while each profile runs.
+
+Usage:
+    python3 check_profiling.py [--duration 1.5] [--latency-ms 2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import pstats
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import check
+
+ENVIRONMENT = {'GG_INTERVAL': '0.005', 'GG_PUBLISH_MODE': 'pipelined', 'GG_METRICS_INTERVAL': '0',
+               'GG_PROFILE_TOPIC': 'local/profile'}
+
+
+def cpu_percent(window):
+    """Process CPU use over the next window seconds"""
+    cpu, started = time.process_time(), time.monotonic()
+    time.sleep(window)
+    return 100 * (time.process_time() - cpu) / (time.monotonic() - started)
+
+
+def run_publisher(driver):
+    """Run an IPCPublisher on the main thread until driver(publisher) returns"""
+    module = fake_ipc.load_component('ipc-publisher')
+    publisher = module.IPCPublisher()
+    result = {}
+
+    def drive():
+        time.sleep(0.3)
+        try:
+            result.update(driver(publisher))
+        finally:
+            publisher.scheduler.stop()
+
+    thread = threading.Thread(target=drive, name='driver', daemon=True)
+    thread.start()
+    publisher.run()
+    thread.join(timeout=30)
+    return result
+
+
+def child_disabled(window):
+    """Child process: the publisher without a profile directory"""
+    fake_ipc.install(latency=0.002, record=False)
+    logging.disable(logging.ERROR)
+
+    def driver(publisher):
+        return {'cpu': cpu_percent(window), 'usr1': signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL,
+                'usr2': signal.getsignal(signal.SIGUSR2) == signal.SIG_DFL}
+
+    result = run_publisher(driver)
+    result['modules'] = [name for name in ('cProfile', 'tracemalloc') if name in sys.modules]
+    result['threads'] = [thread.name for thread in threading.enumerate()]
+    print(json.dumps(result))
+
+
+def check_disabled(window):
+    environment = {**os.environ, **ENVIRONMENT}
+    environment.pop('GG_PROFILE_DIR', None)
+    output = subprocess.run([sys.executable, __file__, '--child-disabled', '--window', str(window)],
+                            env=environment, capture_output=True, text=True, timeout=60)
+    if output.returncode:
+        print(output.stderr)
+        return check(False, "publisher ran with the hooks disabled"), None
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    ok = check(result['usr1'] and result['usr2'], "disabled: SIGUSR1 and SIGUSR2 keep their default handlers")
+    ok &= check(not result['modules'], f"disabled: profiling modules imported: {result['modules'] or 'none'}")
+    ok &= check('profiler' not in result['threads'], "disabled: no profiler thread")
+    return ok, result['cpu']
+
+
+def wait_for_file(results, action, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for result in results:
+            if result['action'] == action:
+                return result['file']
+        time.sleep(0.05)
+    return None
+
+
+def check_installed(endpoint, directory, duration, window):
+    results = []
+    endpoint.subscribe_local('local/profile/+/result', lambda event: results.append(
+        json.loads(event.binary_message.message)))
+
+    def request(body):
+        endpoint.publish_local('local/profile/IPCPublisher', fake_ipc.PublishMessage(
+            binary_message=fake_ipc.BinaryMessage(message=json.dumps(body).encode())))
+
+    def driver(publisher):
+        cpu = {'installed, idle': cpu_percent(window)}
+        os.kill(os.getpid(), signal.SIGUSR1)
+        files = {'stacks': wait_for_file(results, 'stacks', 5)}
+        for action, trigger in [('sample', lambda: os.kill(os.getpid(), signal.SIGUSR2)),
+                                ('cprofile', lambda: request({'action': 'cprofile', 'duration': duration})),
+                                ('memory', lambda: request({'action': 'memory', 'duration': duration}))]:
+            trigger()
+            time.sleep(0.1)
+            cpu[f"during {action}"] = cpu_percent(min(window, duration - 0.2))
+            files[action] = wait_for_file(results, action, duration + 10)
+        sequence = next(publisher.sequence)
+        time.sleep(0.2)
+        return {'cpu': cpu, 'files': files, 'progress': next(publisher.sequence) - sequence}
+
+    result = run_publisher(driver)
+    files = result['files']
+    ok = check(signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL, "uninstall restored the SIGUSR1 handler")
+    ok &= check(result['progress'] > 1, f"publisher kept publishing after the profiles ({result['progress'] - 1})")
+
+    path = files['stacks']
+    ok &= check(bool(path) and 'Thread MainThread' in open(path).read(),
+                f"SIGUSR1 wrote every thread's stack to {os.path.basename(path or '-')}")
+
+    path = files['sample']
+    lines = open(path).read().splitlines() if path else []
+    valid = all(line.rsplit(' ', 1)[1].isdigit() and ';' in line for line in lines)
+    samples = sum(int(line.rsplit(' ', 1)[1]) for line in lines) if valid else 0
+    ok &= check(bool(lines) and valid and any(line.startswith('MainThread;') for line in lines),
+                f"SIGUSR2 sampled all threads: {len(lines)} collapsed stacks, {samples} samples")
+
+    path = files['cprofile']
+    try:
+        stats = pstats.Stats(path)
+        functions = {name for _, _, name in stats.stats}
+        ok &= check('publish_reading' in functions,
+                    f"cprofile over IPC: {len(stats.stats)} functions, publish_reading among them")
+    except Exception as e:
+        ok &= check(False, f"cprofile over IPC wrote a pstats file ({e})")
+
+    path = files['memory']
+    text = open(path).read() if path else ''
+    ok &= check('Largest allocations by line' in text and os.path.exists(path[:-len('txt')] + 'tracemalloc'),
+                f"memory over IPC: {os.path.basename(path or '-')} and its tracemalloc snapshot")
+    return ok, result['cpu']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=1.5, help='seconds each profile runs')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated IPC round-trip latency')
+    parser.add_argument('--window', type=float, default=1.0, help='seconds CPU use is measured over')
+    parser.add_argument('--child-disabled', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_disabled:
+        child_disabled(args.window)
+        return
+
+    ok, disabled_cpu = check_disabled(args.window)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({**ENVIRONMENT, 'GG_PROFILE_DIR': tmp, 'GG_PROFILE_DURATION': str(args.duration)})
+        # Before component_runtime is imported, so that it finds the fake IPC SDK
+        endpoint = fake_ipc.install(latency=args.latency_ms / 1000.0, record=False)
+        logging.disable(logging.ERROR)
+        installed_ok, cpu = check_installed(endpoint, tmp, args.duration, args.window)
+        ok &= installed_ok
+        endpoint.close()
+
+    print(f"Process CPU, publisher at {1 / float(ENVIRONMENT['GG_INTERVAL']):g} readings/s")
+    if disabled_cpu is not None:
+        print(f"  {'hooks disabled':<18} {disabled_cpu:>6.1f}%")
+    for name, percent in cpu.items():
+        print(f"  {name:<18} {percent:>6.1f}%")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
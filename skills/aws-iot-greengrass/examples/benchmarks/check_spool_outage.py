@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Store-and-forward check for IoTCorePublisher.
+
+Publishes at a high rate against the fake IPC endpoint, takes the IoT Core
+link down for a while, brings it back and verifies that every reading reaches
+IoT Core exactly once and in order. Also checks spool eviction and checkpoint
+recovery after a restart.
+
+Usage:
+    python3 check_spool_outage.py [--outage 1.0] [--interval 0.005]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import check
+
+
+def check_outage(module, endpoint, spool_dir, interval, outage):
+    os.environ.update({
+        'GG_INTERVAL': str(interval),
+        'GG_SPOOL_DIR': spool_dir,
+        'GG_DRAIN_RATE': '2000',
+        'GG_DRAIN_BATCH_SIZE': '100',
+        'GG_RECONNECT_INTERVAL': '0.1',
+    })
+    publisher = module.IoTCorePublisher()
+    publisher.start_drain_thread()
+    scheduler_thread = threading.Thread(target=publisher.scheduler.run, args=(publisher.publish_reading,))
+    scheduler_thread.start()
+
+    time.sleep(0.5)
+    endpoint.set_link_up(False)
+    time.sleep(outage)
+    spooled = publisher.spool.pending_bytes()
+    endpoint.set_link_up(True)
+    time.sleep(0.5)
+    publisher.scheduler.stop()
+    scheduler_thread.join()
+
+    deadline = time.monotonic() + 10
+    while publisher.spool.has_pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    publisher.stop()
+
+    sequence = [json.loads(payload)['sequenceNumber'] for _, payload in endpoint.iot_core_published]
+    generated = next(publisher.sequence) - 1
+    ok = check(spooled > 0, f"readings were spooled during the outage ({spooled} bytes)")
+    ok &= check(not publisher.spool.has_pending(), "spool drained after the link came back")
+    ok &= check(sequence == list(range(1, generated + 1)),
+                f"all {generated} readings delivered once and in order ({len(sequence)} received)")
+    return ok
+
+
+def check_eviction_and_restart(module_spool, spool_dir):
+    spool = module_spool.DiskSpool(spool_dir, max_bytes=4096, segment_bytes=1024)
+    for i in range(500):
+        spool.append(json.dumps({"n": i}).encode('utf-8'))
+    batch = spool.read_batch(10)
+    first = json.loads(batch[0][0])['n']
+    ok = check(spool.total_bytes() <= 4096, f"spool stays under byte cap ({spool.total_bytes()} bytes)")
+    ok &= check(spool.evicted_records > 0 and first == spool.evicted_records,
+                f"oldest records evicted first ({spool.evicted_records} evicted, next is #{first})")
+
+    spool.commit(batch[4][1])
+    spool.close()
+    reopened = module_spool.DiskSpool(spool_dir, max_bytes=4096, segment_bytes=1024)
+    resumed = json.loads(reopened.read_batch(1)[0][0])['n']
+    ok &= check(resumed == first + 5, f"restart resumes after the checkpoint (#{resumed})")
+    reopened.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--outage', type=float, default=1.0, help='seconds the IoT Core link is down')
+    parser.add_argument('--interval', type=float, default=0.005, help='publish interval in seconds')
+    args = parser.parse_args()
+
+    endpoint = fake_ipc.install(latency=0.0005)
+    module = fake_ipc.load_component('iot-core-publisher')
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = check_outage(module, endpoint, os.path.join(tmp, 'outage'), args.interval, args.outage)
+        ok &= check_eviction_and_restart(sys.modules['spool'], os.path.join(tmp, 'eviction'))
+
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
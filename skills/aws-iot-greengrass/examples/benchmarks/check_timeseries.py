@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Time-series store check for the sensor simulator (outputMode "store").
+
+- Correctness: rollups and downsampled buckets match min/max/mean/count
+  computed directly from the readings, ring wrap-around keeps the newest
+  readings, and a reopened store (also with a new capacity) keeps its
+  history.
+- Query cost: for histories of 10^4 to 10^6 readings at one per second,
+  times a 100-reading range query and a 24-bucket hourly downsample of the
+  most recent day, against scanning the JSON lines file the simulator
+  writes in outputMode "file". The store's times should not grow with the
+  history.
+- Over IPC: a running SensorSimulatorComponent answers a query published
+  to local/sensor/query.
+
+Usage:
+    python3 check_timeseries.py [--sizes 10000,100000,1000000]
+"""
+
+import _thread
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import fake_ipc
+from helpers import check
+
+START = 1_760_000_000.0
+
+
+def timed(function, repeat=20):
+    """Median seconds per call"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return sorted(times)[len(times) // 2]
+
+
+def expected_buckets(readings, step, start, end):
+    buckets = {}
+    for t, value in readings:
+        if start <= t < end:
+            buckets.setdefault(t - t % step, []).append(value)
+    return [(bucket, min(values), max(values), sum(values) / len(values), len(values))
+            for bucket, values in sorted(buckets.items())]
+
+
+def same_buckets(points, expected):
+    return len(points) == len(expected) and all(
+        point['time'] == t and point['min'] == low and point['max'] == high
+        and abs(point['mean'] - mean) < 1e-9 and point['count'] == count
+        for point, (t, low, high, mean, count) in zip(points, expected))
+
+
+def check_correctness(timeseries, directory):
+    rng = random.Random(3)
+    store = timeseries.TimeSeriesStore(directory, raw_points=5000, minute_points=4000, hour_points=100)
+    readings = []
+    t = START
+    for _ in range(20000):
+        t += rng.choice((1, 2, 5, 30))
+        value = round(20 + rng.gauss(0, 2), 2)
+        readings.append((t, value))
+        store.append('temp-001', t, value, 'good' if value < 24 else 'warning')
+
+    ok = check([point['time'] for point in store.query('temp-001')] == [t for t, _ in readings[-5000:]],
+               "raw ring keeps the newest 5000 of 20000 readings, in order")
+    end = readings[-1][0] + 1
+    for resolution, seconds in (('1m', 60), ('1h', 3600)):
+        start = readings[0][0] - readings[0][0] % seconds
+        ok &= check(same_buckets(store.query('temp-001', start, end, resolution),
+                                 expected_buckets(readings, seconds, start, end)),
+                    f"{resolution} rollups match the readings")
+    for step in (60, 300, 3600, 7200, 45):
+        start = readings[-4000][0] - readings[-4000][0] % step
+        ok &= check(same_buckets(store.downsample('temp-001', start, end, step),
+                                 expected_buckets(readings, step, start, end)),
+                    f"downsample to {step} s buckets matches the readings")
+    middle = readings[-2500][0]
+    ok &= check([point['time'] for point in store.query('temp-001', middle, limit=10)] ==
+                [t for t, _ in readings[-2500:-2490]], "range query with limit starts at the range start")
+    store.append('temp-001', readings[-1][0] - 100, 1.0)
+    ok &= check(store.query('temp-001')[-1]['time'] == readings[-1][0],
+                "a reading older than the newest is stored at the newest time")
+    store.close()
+
+    reopened = timeseries.TimeSeriesStore(directory, raw_points=1000, minute_points=4000, hour_points=100)
+    points = reopened.query('temp-001')
+    ok &= check(len(points) == 1000 and points[-1]['value'] == 1.0 and reopened.sensors() == ['temp-001'],
+                "reopened with a smaller raw ring: newest 1000 readings kept")
+    reopened.close()
+    return ok
+
+
+def check_query_cost(timeseries, directory, sizes):
+    print(f"{'history':>9} {'range ms':>9} {'downsample ms':>14} {'JSONL scan ms':>14} {'store MiB':>10} {'JSONL MiB':>10}")
+    results = []
+    for size in sizes:
+        path = os.path.join(directory, f"history-{size}")
+        store = timeseries.TimeSeriesStore(path, raw_points=size, minute_points=size // 60 + 1,
+                                           hour_points=size // 3600 + 1)
+        jsonl = os.path.join(directory, f"history-{size}.json")
+        with open(jsonl, 'w') as f:
+            for i in range(size):
+                t = START + i
+                value = round(22 + 3 * random.random(), 2)
+                store.append('temp-001', t, value)
+                f.write(json.dumps({'sensorId': 'temp-001', 'sensorType': 'temperature', 'value': value,
+                                    'unit': 'C', 'timestamp': datetime.fromtimestamp(t, timezone.utc).isoformat(),
+                                    'quality': 'good'}) + '\n')
+        newest = START + size
+        range_start = newest - 500
+
+        def scan():
+            kept = []
+            with open(jsonl) as f:
+                for line in f:
+                    reading = json.loads(line)
+                    if datetime.fromisoformat(reading['timestamp']).timestamp() >= range_start:
+                        kept.append(reading)
+                        if len(kept) == 100:
+                            break
+            return kept
+
+        range_ms = 1000 * timed(lambda: store.query('temp-001', range_start, limit=100))
+        downsample_ms = 1000 * timed(lambda: store.downsample('temp-001', newest - 86400, newest, 3600))
+        scan_ms = 1000 * timed(scan, repeat=1)
+        store_bytes = sum(os.path.getsize(os.path.join(path, 'temp-001', name))
+                          for name in os.listdir(os.path.join(path, 'temp-001')))
+        print(f"{size:>9} {range_ms:>9.3f} {downsample_ms:>14.3f} {scan_ms:>14.1f} {store_bytes / 2**20:>10.1f} "
+              f"{os.path.getsize(jsonl) / 2**20:>10.1f}")
+        results.append((range_ms, downsample_ms))
+        store.close()
+    smallest, largest = results[0], results[-1]
+    return check(largest[0] < 5 * smallest[0] + 0.05 and largest[1] < 5 * smallest[1] + 0.05,
+                 f"query time does not grow with the history ({sizes[0]} -> {sizes[-1]} readings)")
+
+
+def check_ipc(endpoint, directory):
+    os.environ.update({'GG_METRICS_INTERVAL': '0', 'GG_SENSOR_CONFIG': json.dumps({
+        'sensors': [{'id': 'temp-001', 'type': 'temperature', 'interval': 0.01, 'baseValue': 22.0, 'variance': 3.0}],
+        'outputMode': 'store', 'storeDirectory': directory})})
+    module = fake_ipc.load_component('sensor-simulator')
+    component = module.SensorSimulatorComponent()
+    replies = []
+    endpoint.subscribe_local('local/sensor/query/result', lambda event: replies.append(
+        json.loads(event.binary_message.message)))
+
+    def drive():
+        time.sleep(1.0)
+        for request in ({'requestId': 'list'}, {'requestId': 'raw', 'sensorId': 'temp-001', 'limit': 10},
+                        {'requestId': 'minute', 'sensorId': 'temp-001', 'step': 60}):
+            endpoint.publish_local('local/sensor/query', fake_ipc.PublishMessage(
+                binary_message=fake_ipc.BinaryMessage(message=json.dumps(request).encode())))
+        deadline = time.monotonic() + 5
+        while len(replies) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Stop the component's main loop the way Ctrl-C does
+        _thread.interrupt_main()
+
+    threading.Thread(target=drive, daemon=True).start()
+    try:
+        component.run()
+    except KeyboardInterrupt:
+        pass
+    by_id = {reply.get('requestId'): reply for reply in replies}
+    ok = check(by_id.get('list', {}).get('sensors') == ['temp-001'], "IPC query lists the stored sensors")
+    raw = by_id.get('raw', {})
+    ok &= check(len(raw.get('points', [])) == 10 and 'next' in raw,
+                f"IPC range query returns 10 readings and the next page ({raw.get('error', 'ok')})")
+    minute = by_id.get('minute', {}).get('points', [])
+    ok &= check(bool(minute) and sum(point['count'] for point in minute) >= 50,
+                f"IPC downsample returns {sum(point['count'] for point in minute)} readings in {len(minute)} buckets")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated history sizes')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    # Before the simulator is imported, so that it finds the fake IPC SDK
+    endpoint = fake_ipc.install(latency=0.001, record=False)
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sensor-simulator', 'src'))
+    import timeseries
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = check_correctness(timeseries, os.path.join(tmp, 'correctness'))
+        ok &= check_query_cost(timeseries, tmp, sizes)
+        ok &= check_ipc(endpoint, os.path.join(tmp, 'component'))
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
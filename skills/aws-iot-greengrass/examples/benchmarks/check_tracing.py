@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+End-to-end tracing check: trace contexts through a pipeline of example
+components on the fake IPC endpoint, and the collector's summary.
+
+- Pipeline: IPCPublisher (starts the traces) -> IPCSubscriber (forwardTopic)
+  -> IoTCorePublisher (inputTopic) -> IoT Core. Every reading must be
+  recorded once with all six hops in order, transit hops must include the
+  simulated IPC latency, and no trace context may reach IoT Core.
+- Batches: IPCPublisher with batchSize 5 -> IPCSubscriber, where the traces
+  end.
+- Async: readings with trace contexts published to AsyncIoTCorePublisher's
+  inputTopic.
+- Untraced: with a trace rate of 0 messages carry no trace context and are
+  forwarded unchanged.
+- The migration example v2_temperature_processor passes a trace on with its
+  alert, raised for an anomalous reading after a steady stretch.
+- Cost: stamping a message without a trace, and the whole life of one trace.
+
+Then it prints the collector's summary of the trace file.
+
+Usage:
+    python3 check_tracing.py [--messages 500] [--latency-ms 1]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_ipc
+from helpers import check, create, wait_for
+
+PIPELINE_HOPS = [
+    'IPCPublisher.generate', 'IPCPublisher.publish', 'IPCSubscriber.receive', 'IPCSubscriber.forward',
+    'IoTCorePublisher.receive', 'IoTCorePublisher.publish',
+]
+BATCH_HOPS = ['IPCPublisher.generate', 'IPCPublisher.publish', 'IPCSubscriber.receive', 'IPCSubscriber.processed']
+
+
+def read_records(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def publish(endpoint, topic, message):
+    endpoint.publish_local(topic, fake_ipc.PublishMessage(
+        binary_message=fake_ipc.BinaryMessage(message=json.dumps(message).encode('utf-8'))))
+
+
+def check_pipeline(modules, endpoint, tracing, path, count, latency):
+    publisher_module, subscriber_module, iot_module = modules
+    publisher = create(publisher_module.IPCPublisher, GG_TOPIC='local/sensor/data', GG_INTERVAL='0.01')
+    subscriber = create(subscriber_module.IPCSubscriber, GG_TOPICS='local/sensor/data', GG_OUTPUT_FILE='',
+                        GG_FORWARD_TOPIC='local/sensor/processed')
+    iot = create(iot_module.IoTCorePublisher, GG_TOPIC='sensor/data', GG_SPOOL_DIR='',
+                 GG_INPUT_TOPIC='local/sensor/processed')
+    subscriber.subscribe_to_topics()
+    iot.subscribe_input(iot.queue_input).result(timeout=5)
+    consumer = threading.Thread(target=iot.consume_input)
+    consumer.start()
+
+    for _ in range(count):
+        publisher.publish_reading()
+        time.sleep(0.002)
+    wait_for(lambda: len(endpoint.iot_core_published) >= count, timeout=10)
+    iot.stop()
+    consumer.join()
+    for operation in subscriber.subscriptions.values():
+        operation.close()
+
+    records = read_records(path)
+    ok = check(len(records) == count and len({record['id'] for record in records}) == count,
+               f"{len(records)} of {count} readings traced once each")
+    ok &= check(all([name for name, _ in record['hops']] == PIPELINE_HOPS for record in records),
+                "every trace has the six pipeline hops in order")
+    ok &= check(all(all(a[1] <= b[1] for a, b in zip(record['hops'], record['hops'][1:])) for record in records),
+                "hop timestamps never decrease")
+    transit = [record['hops'][2][1] - record['hops'][1][1] for record in records]
+    ok &= check(min(transit) >= latency * 1e6 * 0.9,
+                f"publish -> receive includes the {latency * 1000:g} ms IPC latency (min {min(transit) / 1000:.3f} ms)")
+    payloads = [json.loads(payload) for _, payload in endpoint.iot_core_published]
+    ok &= check(len(payloads) == count and not any('trace' in payload for payload in payloads),
+                f"{len(payloads)} readings reached IoT Core without trace contexts")
+    return ok
+
+
+def check_batches(modules, endpoint, tracing, path, count):
+    publisher_module, subscriber_module, _ = modules
+    publisher = create(publisher_module.IPCPublisher, GG_TOPIC='local/batch/data', GG_INTERVAL='0.01',
+                       GG_BATCH_SIZE='5')
+    subscriber = create(subscriber_module.IPCSubscriber, GG_TOPICS='local/batch/data', GG_OUTPUT_FILE='')
+    subscriber.subscribe_to_topics()
+    for _ in range(count):
+        publisher.publish_reading()
+    publisher.flush()
+    wait_for(lambda: len(read_records(path)) >= count, timeout=10)
+    for operation in subscriber.subscriptions.values():
+        operation.close()
+
+    records = read_records(path)
+    return check(len(records) == count and all([name for name, _ in record['hops']] == BATCH_HOPS
+                                                for record in records),
+                 f"{len(records)} of {count} batched readings traced, ending in IPCSubscriber.processed")
+
+
+def check_async(async_module, endpoint, tracing, path, count):
+    publisher = create(async_module.AsyncIoTCorePublisher, GG_TOPIC='sensor/async', GG_SPOOL_DIR='',
+                       GG_INPUT_TOPIC='local/async/readings', GG_PAYLOAD_LAYOUT='columnar', GG_BATCH_SIZE='10')
+    published = len(endpoint.iot_core_published)
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(publisher.run_async())
+        while publisher.input_operation is None:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        for i in range(count):
+            reading = {'sensorId': 'temp-001', 'sensorType': 'temperature', 'value': 20.0 + i % 7, 'unit': 'C',
+                       'timestamp': f"2026-10-19T00:00:{i % 60:02d}+00:00", 'quality': 'good'}
+            tracing.start(reading, 'SensorSimulator', 'read')
+            publish(endpoint, 'local/async/readings', reading)
+        while len(endpoint.iot_core_published) - published < count // 10:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(run(), 10.0))
+
+    records = read_records(path)
+    names = ['SensorSimulator.read', 'AsyncIoTCorePublisher.receive', 'AsyncIoTCorePublisher.publish']
+    return check(len(records) == count and all([name for name, _ in record['hops']] == names for record in records),
+                 f"{len(records)} of {count} readings traced through AsyncIoTCorePublisher in columnar batches")
+
+
+def check_untraced(modules, endpoint, tracing):
+    publisher_module, subscriber_module, _ = modules
+    tracing.install(rate=0, path='')
+    publisher = create(publisher_module.IPCPublisher, GG_TOPIC='local/plain/data', GG_INTERVAL='0.01')
+    subscriber = create(subscriber_module.IPCSubscriber, GG_TOPICS='local/plain/data', GG_OUTPUT_FILE='',
+                        GG_FORWARD_TOPIC='local/plain/processed')
+    subscriber.subscribe_to_topics()
+    for _ in range(20):
+        publisher.publish_reading()
+    endpoint.drain()
+    for operation in subscriber.subscriptions.values():
+        operation.close()
+    sent = [m.binary_message.message for topic, m in endpoint.published if topic == 'local/plain/data']
+    forwarded = [m.binary_message.message for topic, m in endpoint.published if topic == 'local/plain/processed']
+    return check(len(sent) == 20 and sent == forwarded and not any(b'"trace"' in message for message in sent),
+                 "with trace rate 0 messages carry no trace and are forwarded byte for byte")
+
+
+def check_processor(endpoint, tracing):
+    module = fake_ipc.load_module(fake_ipc.EXAMPLES_DIR / 'v1-lambda-migration' / 'python' / 'local_communication' /
+                                  'v2_temperature_processor.py', 'v2_temperature_processor')
+    alerts = []
+    endpoint.subscribe_local('component/alerts', lambda event: alerts.append(event.json_message.message))
+    tracing.install(rate=1, path='')
+    # A steady sensor first, as the processor alerts on readings unusual for the sensor
+    noise = random.Random(1)
+    started = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for second in range(100):
+            message = {'sensor_id': 'sensor-1', 'temperature': round(noise.gauss(72, 0.3), 1),
+                       'timestamp': started + second}
+            module.on_sensor_data(
+                fake_ipc.SubscriptionResponseMessage(json_message=fake_ipc.JsonMessage(message=message)))
+    message = {'sensor_id': 'sensor-1', 'temperature': 85, 'timestamp': started + 100}
+    tracing.start(message, 'SensorPublisher', 'publish')
+    module.on_sensor_data(fake_ipc.SubscriptionResponseMessage(json_message=fake_ipc.JsonMessage(message=message)))
+    endpoint.drain()
+    hops = [name for name, _ in alerts[0]['trace']['hops']] if alerts and 'trace' in alerts[0] else []
+    return check(len(alerts) == 1 and hops == ['SensorPublisher.publish', 'TemperatureProcessor.receive',
+                                               'TemperatureProcessor.publish'],
+                 "v2_temperature_processor passes the trace on with its alert")
+
+
+def check_cost(tracing, directory):
+    untraced = {'value': 1.0}
+    rounds = 200000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        tracing.stamp(untraced, 'IPCSubscriber', 'receive')
+    stamp_ns = (time.perf_counter() - started) / rounds * 1e9
+
+    tracing.install(rate=1, path=os.path.join(directory, 'cost.jsonl'))
+    rounds = 20000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        message = {'value': 1.0}
+        tracing.start(message, 'IPCPublisher', 'generate')
+        tracing.stamp(message, 'IPCPublisher', 'publish')
+        tracing.stamp(message, 'IPCSubscriber', 'receive')
+        tracing.end(message.pop('trace'), 'IPCSubscriber', 'processed')
+    trace_us = (time.perf_counter() - started) / rounds * 1e6
+    tracing.close()
+    print(f"  stamp on an untraced message: {stamp_ns:.0f} ns; one traced message, 4 hops and recorded: "
+          f"{trace_us:.1f} us")
+    return check(stamp_ns < 1000, "stamping an untraced message costs under 1 us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500, help='readings sent through the pipeline')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated IPC round-trip latency')
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    # Before the components are imported, so that they find the fake IPC SDK
+    endpoint = fake_ipc.install(latency=latency, record=True)
+    logging.disable(logging.WARNING)
+    modules = (fake_ipc.load_component('ipc-publisher'), fake_ipc.load_component('ipc-subscriber'),
+               fake_ipc.load_component('iot-core-publisher'))
+    async_module = fake_ipc.load_component('iot-core-publisher', filename='async_main.py')
+    from component_runtime import tracing
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"{name}.jsonl") for name in ('pipeline', 'batches', 'async')]
+        tracing.install(rate=1, path=paths[0])
+        ok = check_pipeline(modules, endpoint, tracing, paths[0], args.messages, latency)
+        tracing.install(rate=1, path=paths[1])
+        ok &= check_batches(modules, endpoint, tracing, paths[1], 100)
+        tracing.install(rate=1, path=paths[2])
+        ok &= check_async(async_module, endpoint, tracing, paths[2], 100)
+        ok &= check_untraced(modules, endpoint, tracing)
+        ok &= check_processor(endpoint, tracing)
+        ok &= check_cost(tracing, tmp)
+
+        collector = subprocess.run(
+            [sys.executable, '-m', 'component_runtime.trace_collector', paths[0]], capture_output=True, text=True,
+            env={**os.environ, 'PYTHONPATH': str(fake_ipc.RUNTIME_DIR)})
+        print()
+        print(collector.stdout.rstrip() or collector.stderr.rstrip())
+        print()
+        ok &= check(collector.returncode == 0 and f"{args.messages} traces" in collector.stdout,
+                    "trace_collector summarizes the pipeline traces")
+    endpoint.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
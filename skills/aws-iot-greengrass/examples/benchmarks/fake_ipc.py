@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for the Greengrass IPC endpoint.
+
+install() registers fake awsiot.greengrasscoreipc modules (V1 connect() client,
+GreengrassCoreIPCClientV2 and the model classes the examples use) so the example
+components can be imported and driven without a running nucleus. Responses and
+stream events are delivered on a single background thread, like the SDK's event
+loop, after a configurable round-trip latency. As in the SDK, the V2 client runs
+stream callbacks on an executor unless it is created with executor=None.
+"""
+
+import heapq
+import importlib.util
+import itertools
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+# The components import the shared component_runtime package
+RUNTIME_DIR = EXAMPLES_DIR / 'component-runtime' / 'src'
+if str(RUNTIME_DIR) not in sys.path:
+    sys.path.insert(0, str(RUNTIME_DIR))
+
+
+class LinkDownError(Exception):
+    """Raised for IoT Core publishes while the simulated cloud link is down"""
+
+
+class InvalidArgumentsError(Exception):
+    """Raised for requests the nucleus would reject, such as a qos that is not a QOS value"""
+
+
+def topic_matches(topic_filter, topic):
+    """Match an MQTT-style topic filter (+, # and * wildcards) against a topic"""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part not in ('+', '*') and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+# ---------------------------------------------------------------------------
+# Model classes (subset of awsiot.greengrasscoreipc.model)
+# ---------------------------------------------------------------------------
+
+class _Model:
+    _fields = ()
+
+    def __init__(self, **kwargs):
+        for field in self._fields:
+            setattr(self, field, kwargs.pop(field, None))
+        if kwargs:
+            raise TypeError(f"{type(self).__name__} got unexpected fields: {sorted(kwargs)}")
+
+    def __repr__(self):
+        values = ', '.join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({values})"
+
+
+def _model(name, *fields):
+    return type(name, (_Model,), {'_fields': fields})
+
+
+MessageContext = _model('MessageContext', 'topic')
+BinaryMessage = _model('BinaryMessage', 'message', 'context')
+JsonMessage = _model('JsonMessage', 'message', 'context')
+PublishMessage = _model('PublishMessage', 'json_message', 'binary_message')
+PublishToTopicRequest = _model('PublishToTopicRequest', 'topic', 'publish_message')
+PublishToTopicResponse = _model('PublishToTopicResponse')
+SubscribeToTopicRequest = _model('SubscribeToTopicRequest', 'topic', 'receive_mode')
+SubscribeToTopicResponse = _model('SubscribeToTopicResponse', 'topic_name')
+SubscriptionResponseMessage = _model('SubscriptionResponseMessage', 'json_message', 'binary_message')
+MQTTMessage = _model('MQTTMessage', 'topic_name', 'payload')
+IoTCoreMessage = _model('IoTCoreMessage', 'message')
+PublishToIoTCoreRequest = _model('PublishToIoTCoreRequest', 'topic_name', 'qos', 'payload')
+PublishToIoTCoreResponse = _model('PublishToIoTCoreResponse')
+SubscribeToIoTCoreRequest = _model('SubscribeToIoTCoreRequest', 'topic_name', 'qos')
+SubscribeToIoTCoreResponse = _model('SubscribeToIoTCoreResponse')
+GetConfigurationRequest = _model('GetConfigurationRequest', 'component_name', 'key_path')
+GetConfigurationResponse = _model('GetConfigurationResponse', 'component_name', 'value')
+SubscribeToConfigurationUpdateRequest = _model(
+    'SubscribeToConfigurationUpdateRequest', 'component_name', 'key_path')
+SubscribeToConfigurationUpdateResponse = _model('SubscribeToConfigurationUpdateResponse')
+ConfigurationUpdateEvent = _model('ConfigurationUpdateEvent', 'component_name', 'key_path')
+ConfigurationUpdateEvents = _model('ConfigurationUpdateEvents', 'configuration_update_event')
+
+
+class QOS:
+    AT_MOST_ONCE = 'AT_MOST_ONCE'
+    AT_LEAST_ONCE = 'AT_LEAST_ONCE'
+
+
+def _check_qos(qos):
+    if qos not in (QOS.AT_MOST_ONCE, QOS.AT_LEAST_ONCE):
+        raise InvalidArgumentsError(f"qos must be QOS.AT_MOST_ONCE or QOS.AT_LEAST_ONCE, got {qos!r}")
+
+
+class StreamResponseHandler:
+    def on_stream_event(self, event):
+        pass
+
+    def on_stream_error(self, error):
+        return True
+
+    def on_stream_closed(self):
+        pass
+
+
+class SubscribeToTopicStreamHandler(StreamResponseHandler):
+    pass
+
+
+class SubscribeToIoTCoreStreamHandler(StreamResponseHandler):
+    pass
+
+
+class SubscribeToConfigurationUpdateStreamHandler(StreamResponseHandler):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Endpoint
+# ---------------------------------------------------------------------------
+
+class FakeEndpoint:
+    """Simulated nucleus: local pub/sub bus, IoT Core link and configuration store"""
+
+    def __init__(self, latency=0.0, record=True):
+        self.latency = latency
+        self.record = record
+        self.link_up = True
+        self.published = []
+        self.iot_core_published = []
+        self.publish_count = 0
+        self.iot_core_publish_count = 0
+        self.configuration = {}
+        self._local_subscriptions = []
+        self._iot_core_subscriptions = []
+        self._config_subscriptions = []
+        self._lock = threading.Lock()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._event_loop, name='fake-ipc', daemon=True)
+        self._thread.start()
+
+    # -- event loop ---------------------------------------------------------
+
+    def call_later(self, delay, callback, *args):
+        """Run callback on the endpoint thread after delay seconds"""
+        due = time.monotonic() + delay
+        with self._wakeup:
+            heapq.heappush(self._queue, (due, next(self._sequence), callback, args))
+            self._wakeup.notify()
+
+    def _event_loop(self):
+        while True:
+            with self._wakeup:
+                while self._running and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._wakeup.wait(timeout)
+                if not self._running:
+                    return
+                _, _, callback, args = heapq.heappop(self._queue)
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"fake-ipc callback failed: {e}", file=sys.stderr)
+
+    def complete(self, future, result=None, error=None):
+        """Resolve a future after the configured round-trip latency"""
+        if error is not None:
+            self.call_later(self.latency, future.set_exception, error)
+        else:
+            self.call_later(self.latency, future.set_result, result)
+        return future
+
+    def drain(self, timeout=5.0):
+        """Block until every scheduled response and event has been delivered"""
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        while time.monotonic() < deadline:
+            with self._wakeup:
+                pending = [item[0] for item in self._queue]
+            if not pending:
+                # One extra round trip so callbacks already popped finish too
+                done.clear()
+                self.call_later(0, done.set)
+                done.wait(max(0.0, deadline - time.monotonic()))
+                with self._wakeup:
+                    if not self._queue:
+                        return True
+            else:
+                time.sleep(min(0.001, max(0.0, max(pending) - time.monotonic())))
+        return False
+
+    def close(self):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        self._thread.join(timeout=1)
+
+    # -- local pub/sub ------------------------------------------------------
+
+    def publish_local(self, topic, publish_message):
+        with self._lock:
+            self.publish_count += 1
+            if self.record:
+                self.published.append((topic, publish_message))
+            subscribers = [s for s in self._local_subscriptions if topic_matches(s[0], topic)]
+        for _, deliver in subscribers:
+            event = SubscriptionResponseMessage()
+            if publish_message.json_message is not None:
+                event.json_message = JsonMessage(
+                    message=publish_message.json_message.message,
+                    context=MessageContext(topic=topic))
+            else:
+                event.binary_message = BinaryMessage(
+                    message=publish_message.binary_message.message,
+                    context=MessageContext(topic=topic))
+            self.call_later(self.latency, deliver, event)
+
+    def subscribe_local(self, topic_filter, deliver):
+        entry = (topic_filter, deliver)
+        with self._lock:
+            self._local_subscriptions.append(entry)
+        return lambda: self._unsubscribe(self._local_subscriptions, entry)
+
+    # -- IoT Core -----------------------------------------------------------
+
+    def set_link_up(self, up):
+        """Simulate the cloud connection going down or coming back"""
+        self.link_up = up
+
+    def publish_iot_core(self, topic, payload, qos=None):
+        if not self.link_up:
+            raise LinkDownError(f"IoT Core link is down, cannot publish to {topic}")
+        with self._lock:
+            self.iot_core_publish_count += 1
+            if self.record:
+                self.iot_core_published.append((topic, bytes(payload)))
+
+    def inject_iot_core(self, topic, payload):
+        """Deliver a cloud-to-device message to matching IoT Core subscribers"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        with self._lock:
+            subscribers = [s for s in self._iot_core_subscriptions if topic_matches(s[0], topic)]
+        for _, deliver in subscribers:
+            event = IoTCoreMessage(message=MQTTMessage(topic_name=topic, payload=payload))
+            self.call_later(self.latency, deliver, event)
+
+    def subscribe_iot_core(self, topic_filter, deliver):
+        entry = (topic_filter, deliver)
+        with self._lock:
+            self._iot_core_subscriptions.append(entry)
+        return lambda: self._unsubscribe(self._iot_core_subscriptions, entry)
+
+    # -- configuration ------------------------------------------------------
+
+    def get_configuration(self, key_path=None):
+        value = self.configuration
+        for key in key_path or []:
+            value = value[key]
+        return value
+
+    def update_configuration(self, key_path, value):
+        """Change a configuration value and notify configuration subscribers"""
+        target = self.configuration
+        for key in key_path[:-1]:
+            target = target.setdefault(key, {})
+        target[key_path[-1]] = value
+        with self._lock:
+            subscribers = list(self._config_subscriptions)
+        for deliver in subscribers:
+            event = ConfigurationUpdateEvents(
+                configuration_update_event=ConfigurationUpdateEvent(key_path=list(key_path)))
+            self.call_later(self.latency, deliver, event)
+
+    def subscribe_configuration(self, deliver):
+        with self._lock:
+            self._config_subscriptions.append(deliver)
+        return lambda: self._unsubscribe(self._config_subscriptions, deliver)
+
+    def _unsubscribe(self, subscriptions, entry):
+        with self._lock:
+            if entry in subscriptions:
+                subscriptions.remove(entry)
+
+
+# ---------------------------------------------------------------------------
+# V1 client: awsiot.greengrasscoreipc.connect()
+# ---------------------------------------------------------------------------
+
+class _Operation:
+    def __init__(self, endpoint, stream_handler=None):
+        self.endpoint = endpoint
+        self.stream_handler = stream_handler
+        self._response = Future()
+        self._unsubscribe = None
+
+    def activate(self, request):
+        try:
+            self._response_value = self._handle(request)
+        except Exception as e:
+            self.endpoint.complete(self._response, error=e)
+        else:
+            self.endpoint.complete(self._response, result=self._response_value)
+        sent = Future()
+        sent.set_result(None)
+        return sent
+
+    def get_response(self):
+        return self._response
+
+    def close(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+            if self.stream_handler:
+                self.endpoint.call_later(0, self.stream_handler.on_stream_closed)
+        closed = Future()
+        closed.set_result(None)
+        return closed
+
+    def _deliver(self, event):
+        try:
+            self.stream_handler.on_stream_event(event)
+        except Exception as e:
+            # As in the SDK, True closes the stream
+            if self.stream_handler.on_stream_error(e):
+                self.close()
+
+    def _handle(self, request):
+        raise NotImplementedError
+
+
+class _PublishToTopicOperation(_Operation):
+    def _handle(self, request):
+        self.endpoint.publish_local(request.topic, request.publish_message)
+        return PublishToTopicResponse()
+
+
+class _SubscribeToTopicOperation(_Operation):
+    def _handle(self, request):
+        self._unsubscribe = self.endpoint.subscribe_local(request.topic, self._deliver)
+        return SubscribeToTopicResponse(topic_name=request.topic)
+
+
+class _PublishToIoTCoreOperation(_Operation):
+    def _handle(self, request):
+        _check_qos(request.qos)
+        self.endpoint.publish_iot_core(request.topic_name, request.payload, request.qos)
+        return PublishToIoTCoreResponse()
+
+
+class _SubscribeToIoTCoreOperation(_Operation):
+    def _handle(self, request):
+        _check_qos(request.qos)
+        self._unsubscribe = self.endpoint.subscribe_iot_core(request.topic_name, self._deliver)
+        return SubscribeToIoTCoreResponse()
+
+
+class _GetConfigurationOperation(_Operation):
+    def _handle(self, request):
+        value = self.endpoint.get_configuration(request.key_path)
+        return GetConfigurationResponse(component_name=request.component_name, value=value)
+
+
+class _SubscribeToConfigurationUpdateOperation(_Operation):
+    def _handle(self, request):
+        self._unsubscribe = self.endpoint.subscribe_configuration(self._deliver)
+        return SubscribeToConfigurationUpdateResponse()
+
+
+class FakeIPCClient:
+    """Mirror of the V1 GreengrassCoreIPCClient operation factory methods"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.closed = False
+
+    def new_publish_to_topic(self):
+        return _PublishToTopicOperation(self.endpoint)
+
+    def new_subscribe_to_topic(self, stream_handler):
+        return _SubscribeToTopicOperation(self.endpoint, stream_handler)
+
+    def new_publish_to_iot_core(self):
+        return _PublishToIoTCoreOperation(self.endpoint)
+
+    def new_subscribe_to_iot_core(self, stream_handler):
+        return _SubscribeToIoTCoreOperation(self.endpoint, stream_handler)
+
+    def new_get_configuration(self):
+        return _GetConfigurationOperation(self.endpoint)
+
+    def new_subscribe_to_configuration_update(self, stream_handler):
+        return _SubscribeToConfigurationUpdateOperation(self.endpoint, stream_handler)
+
+    def close(self):
+        self.closed = True
+
+
+# ---------------------------------------------------------------------------
+# V2 client: GreengrassCoreIPCClientV2
+# ---------------------------------------------------------------------------
+
+class _CallbackHandler(StreamResponseHandler):
+    def __init__(self, executor, on_stream_event, on_stream_error=None, on_stream_closed=None):
+        self._executor = executor
+        self._on_event = on_stream_event
+        self._on_error = on_stream_error
+        self._on_closed = on_stream_closed
+
+    def on_stream_event(self, event):
+        if self._executor is None:
+            self._on_event(event)
+        else:
+            self._executor.submit(self._on_event, event)
+
+    def on_stream_error(self, error):
+        return self._on_error(error) if self._on_error else True
+
+    def on_stream_closed(self):
+        if self._on_closed:
+            self._on_closed()
+
+
+class FakeIPCClientV2:
+    """Mirror of GreengrassCoreIPCClientV2 built on the same endpoint"""
+
+    def __init__(self, endpoint, executor=True):
+        self.endpoint = endpoint
+        self._client = FakeIPCClient(endpoint)
+        # Same contract as the SDK: True creates a thread pool, None runs callbacks on the event thread
+        self._executor = ThreadPoolExecutor() if executor is True else executor
+
+    def _run(self, operation, request):
+        operation.activate(request)
+        return operation.get_response()
+
+    def publish_to_topic_async(self, *, topic, publish_message):
+        request = PublishToTopicRequest(topic=topic, publish_message=publish_message)
+        return self._run(self._client.new_publish_to_topic(), request)
+
+    def publish_to_topic(self, *, topic, publish_message):
+        return self.publish_to_topic_async(topic=topic, publish_message=publish_message).result()
+
+    def publish_to_iot_core_async(self, *, topic_name, qos, payload):
+        request = PublishToIoTCoreRequest(topic_name=topic_name, qos=qos, payload=payload)
+        return self._run(self._client.new_publish_to_iot_core(), request)
+
+    def publish_to_iot_core(self, *, topic_name, qos, payload):
+        return self.publish_to_iot_core_async(topic_name=topic_name, qos=qos, payload=payload).result()
+
+    def subscribe_to_topic(self, *, topic, on_stream_event, on_stream_error=None,
+                           on_stream_closed=None, receive_mode=None):
+        handler = _CallbackHandler(self._executor, on_stream_event, on_stream_error, on_stream_closed)
+        operation = self._client.new_subscribe_to_topic(handler)
+        response = self._run(operation, SubscribeToTopicRequest(topic=topic)).result()
+        return response, operation
+
+    def subscribe_to_iot_core(self, *, topic_name, qos, on_stream_event, on_stream_error=None,
+                              on_stream_closed=None):
+        handler = _CallbackHandler(self._executor, on_stream_event, on_stream_error, on_stream_closed)
+        operation = self._client.new_subscribe_to_iot_core(handler)
+        response = self._run(operation, SubscribeToIoTCoreRequest(topic_name=topic_name, qos=qos)).result()
+        return response, operation
+
+    def get_configuration(self, *, component_name=None, key_path=None):
+        request = GetConfigurationRequest(component_name=component_name, key_path=key_path or [])
+        return self._run(self._client.new_get_configuration(), request).result()
+
+    def subscribe_to_configuration_update(self, *, on_stream_event, component_name=None,
+                                          key_path=None, on_stream_error=None, on_stream_closed=None):
+        handler = _CallbackHandler(self._executor, on_stream_event, on_stream_error, on_stream_closed)
+        operation = self._client.new_subscribe_to_configuration_update(handler)
+        request = SubscribeToConfigurationUpdateRequest(component_name=component_name, key_path=key_path or [])
+        response = self._run(operation, request).result()
+        return response, operation
+
+    def close(self):
+        self._client.close()
+
+
+# ---------------------------------------------------------------------------
+# Installation helpers
+# ---------------------------------------------------------------------------
+
+_MODEL_NAMES = [
+    'MessageContext', 'BinaryMessage', 'JsonMessage', 'PublishMessage', 'PublishToTopicRequest',
+    'PublishToTopicResponse', 'SubscribeToTopicRequest', 'SubscribeToTopicResponse',
+    'SubscriptionResponseMessage', 'MQTTMessage', 'IoTCoreMessage', 'PublishToIoTCoreRequest',
+    'PublishToIoTCoreResponse', 'SubscribeToIoTCoreRequest', 'SubscribeToIoTCoreResponse',
+    'GetConfigurationRequest', 'GetConfigurationResponse', 'SubscribeToConfigurationUpdateRequest',
+    'SubscribeToConfigurationUpdateResponse', 'ConfigurationUpdateEvent', 'ConfigurationUpdateEvents',
+    'QOS', 'InvalidArgumentsError',
+]
+
+
+def install(endpoint=None, latency=0.0, record=True):
+    """Register the fake awsiot modules in sys.modules and return the endpoint"""
+    endpoint = endpoint or FakeEndpoint(latency=latency, record=record)
+
+    awsiot = types.ModuleType('awsiot')
+    ipc = types.ModuleType('awsiot.greengrasscoreipc')
+    model = types.ModuleType('awsiot.greengrasscoreipc.model')
+    clientv2 = types.ModuleType('awsiot.greengrasscoreipc.clientv2')
+    client = types.ModuleType('awsiot.greengrasscoreipc.client')
+
+    for name in _MODEL_NAMES:
+        setattr(model, name, globals()[name])
+    ipc.connect = lambda **kwargs: FakeIPCClient(endpoint)
+    ipc.model = model
+    ipc.clientv2 = clientv2
+    ipc.client = client
+    for handler in (SubscribeToTopicStreamHandler, SubscribeToIoTCoreStreamHandler,
+                    SubscribeToConfigurationUpdateStreamHandler):
+        setattr(ipc, handler.__name__, handler)
+        setattr(client, handler.__name__, handler)
+    client.GreengrassCoreIPCClient = FakeIPCClient
+    clientv2.GreengrassCoreIPCClientV2 = lambda executor=True, **kwargs: FakeIPCClientV2(endpoint, executor)
+    awsiot.greengrasscoreipc = ipc
+
+    sys.modules.update({
+        'awsiot': awsiot,
+        'awsiot.greengrasscoreipc': ipc,
+        'awsiot.greengrasscoreipc.model': model,
+        'awsiot.greengrasscoreipc.clientv2': clientv2,
+        'awsiot.greengrasscoreipc.client': client,
+    })
+    return endpoint
+
+
+def load_module(path, module_name):
+    """Import a source file under a unique module name (every example has a main.py)"""
+    path = Path(path)
+    src_dir = str(path.parent)
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_component(example, module_name=None, filename='main.py'):
+    """Import examples/<example>/src/<filename> after the fake modules are installed
+
+    Modules such as async_main.py do `from main import ...`; while they load,
+    `main` is pointed at this example's main.py so examples don't collide.
+    """
+    prefix = example.replace('-', '_')
+    module_name = module_name or f"{prefix}_{Path(filename).stem}"
+    if filename == 'main.py':
+        return load_module(EXAMPLES_DIR / example / 'src' / filename, module_name)
+
+    main_module = sys.modules.get(f"{prefix}_main") or load_component(example)
+    previous = sys.modules.get('main')
+    sys.modules['main'] = main_module
+    try:
+        return load_module(EXAMPLES_DIR / example / 'src' / filename, module_name)
+    finally:
+        if previous is None:
+            del sys.modules['main']
+        else:
+            sys.modules['main'] = previous
@@ -0,0 +1,66 @@
+"""
+Helpers shared by the check and bench scripts.
+
+check() prints a PASS/FAIL line, wait_for() polls a condition, percentile()
+and Recorder summarize what a component sent, and create() builds a component
+from GG_* variables. Memory is measured with component_runtime.metrics.rss_bytes,
+the same function the components report through their metrics.
+"""
+
+import os
+import threading
+import time
+
+
+def check(condition, message):
+    print(f"{'PASS' if condition else 'FAIL'}: {message}")
+    return condition
+
+
+def wait_for(condition, timeout=5.0, interval=0.001):
+    """Poll condition until it is true or timeout seconds pass; returns whether it became true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def create(cls, **variables):
+    """A component configured from GG_* variables (each component reads them once, when created)"""
+    os.environ.update(variables)
+    try:
+        return cls()
+    finally:
+        for name in variables:
+            del os.environ[name]
+
+
+class Recorder:
+    """Arrival time, topic and payload of every message a component sends"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = []
+
+    def add(self, topic, payload):
+        with self.lock:
+            self.messages.append((time.monotonic(), topic, payload))
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.messages)
+
+    def max_gap(self, start, end, topic=None):
+        times = [at for at, message_topic, _ in self.snapshot()
+                 if start <= at <= end and topic in (None, message_topic)]
+        return max((b - a for a, b in zip(times, times[1:])), default=0.0)
+
+    def first_after(self, at, topic):
+        return next((t for t, message_topic, _ in self.snapshot() if t >= at and message_topic == topic), None)
@@ -0,0 +1,61 @@
+"""
+Shared runtime for the example Greengrass components.
+
+Import this first in a component's main module: with GG_STARTUP_PROFILE=true
+the import timer must be installed before the heavy imports it measures.
+
+Only the startup profile, the memory settings and the metrics, profiling and
+tracing instances are loaded with the package. Every other name is imported
+from its submodule the first time it is used, so a component pays only for
+the parts of the runtime it imports.
+"""
+
+import importlib
+import os
+
+from .config import env_bool
+from .memory import configure_memory
+from .metrics import MetricsRegistry
+from .profiling import ProfilingHooks
+from .startup import StartupProfile
+from .tracing import Tracer
+
+# Exported name -> the submodule that defines it
+_EXPORTS = {
+    'AnomalyDetector': 'anomaly', 'AnomalyMonitor': 'anomaly', 'validate_anomaly_settings': 'anomaly',
+    'env_config': 'config', 'env_list': 'config',
+    'DeviceScheduler': 'devices', 'RateLimiter': 'devices', 'VirtualDevice': 'devices', 'create_devices': 'devices',
+    'render_topic': 'devices', 'set_topics': 'devices', 'topic_fields': 'devices',
+    'ImportTimer': 'imports', 'LazyModule': 'imports', 'is_installed': 'imports', 'lazy_import': 'imports',
+    'IPC_AVAILABLE': 'ipc', 'close_ipc_clients': 'ipc', 'ipc_client': 'ipc', 'ipc_client_v2': 'ipc',
+    'ConfigWatcher': 'live_config',
+    'LOG_FORMAT': 'logs', 'configure_logging': 'logs', 'flush_logging': 'logs', 'lazy': 'logs', 'sampled': 'logs',
+    'set_level': 'logs', 'setup_logging': 'logs',
+    'LOW_MEMORY': 'memory',
+    'FixedRateScheduler': 'scheduling', 'run_until_signalled': 'scheduling',
+}
+
+configure_memory()
+startup = StartupProfile(enabled=env_bool(os.environ.get('GG_STARTUP_PROFILE', 'false')))
+# Created with the package: each has the name of its submodule, which a later import would bind over a lazy instance
+metrics = MetricsRegistry()
+profiling = ProfilingHooks()
+tracing = Tracer()
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getattr(importlib.import_module(f'{__name__}.{module_name}'), name)
+    return value
+
+
+__all__ = [
+    'AnomalyDetector', 'AnomalyMonitor', 'ConfigWatcher', 'DeviceScheduler', 'FixedRateScheduler', 'IPC_AVAILABLE',
+    'ImportTimer', 'LOG_FORMAT', 'LOW_MEMORY', 'LazyModule', 'MetricsRegistry', 'ProfilingHooks', 'RateLimiter',
+    'StartupProfile', 'Tracer', 'VirtualDevice', 'close_ipc_clients', 'configure_logging', 'configure_memory',
+    'create_devices', 'env_bool', 'env_config', 'env_list', 'flush_logging', 'ipc_client', 'ipc_client_v2',
+    'is_installed', 'lazy', 'lazy_import', 'metrics', 'profiling', 'render_topic', 'run_until_signalled', 'sampled',
+    'set_level', 'set_topics', 'setup_logging', 'startup', 'topic_fields', 'tracing', 'validate_anomaly_settings',
+]
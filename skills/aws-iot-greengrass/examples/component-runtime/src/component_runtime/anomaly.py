@@ -0,0 +1,330 @@
+"""
+Streaming anomaly detection per sensor, instead of fixed alert thresholds.
+
+Each sensor keeps a few running statistics, updated in constant time and
+memory per reading, and three checks score every reading:
+
+- spike: how far the reading is from the sensor's current level (a fast
+  EWMA), in units of the median absolute deviation (MAD) of those
+  residuals. Median and MAD are tracked by stochastic approximation: each
+  reading moves them one small step towards it, so there is no window of
+  past readings to keep and an outlier barely moves them.
+- shift: the fast EWMA against a slow EWMA baseline, as a z-score of their
+  difference less its own running average (the steady lag of the baseline
+  behind steady drift). Catches level shifts and ramps that stay inside any
+  fixed threshold, while drift slower than the baseline window becomes the
+  new baseline. Starts once the baseline has seen a whole window of
+  readings.
+- rate: the rate of change against the sensor's usual rate of change, as a
+  robust z-score in the same way as spike.
+
+A sensor raises an alert when a check's score reaches its threshold. The
+alert is cleared only after clearCount readings in a row below clearRatio
+times the thresholds, and no sooner than holdOff seconds after the last
+reading above that; readings in between are suppressed instead of raising
+more alerts. Nothing is raised during the first warmup readings, while the
+statistics settle. Only these transitions are reported.
+"""
+
+import math
+import time
+from datetime import datetime, timezone
+
+CHECKS = ('spike', 'shift', 'rate')
+DEFAULTS = {
+    'spikeThreshold': 6.0,
+    'shiftThreshold': 4.0,
+    'rateThreshold': 8.0,
+    'clearRatio': 0.5,
+    'clearCount': 5,
+    'holdOff': 60.0,
+    'warmup': 60,
+    'baselineWindow': 240,
+    'fastWindow': 10,
+    'minDeviation': 0.01,
+}
+# MAD to standard deviation for normally distributed readings
+MAD_SCALE = 1.4826
+# Step of the median and MAD estimates, as a fraction of the MAD, once warmed up
+QUANTILE_RATE = 0.05
+# The spread of the fast average around the baseline is averaged over this many baseline windows
+SPREAD_WINDOWS = 4
+# Scores use at least this fraction of the MAD's baseline-window average, so that a quiet stretch
+# (a sensor resting at a limit) does not make its ordinary noise afterwards look like spikes
+MAD_FLOOR = 0.7
+
+
+class AnomalySettings:
+    """Validated detector settings for one sensor type"""
+
+    __slots__ = ('thresholds', 'clear_ratio', 'clear_count', 'hold_off', 'warmup', 'baseline_window', 'slow_alpha',
+                 'fast_alpha', 'spread_limit', 'min_deviation', 'source')
+
+    def __init__(self, settings=None):
+        settings = {} if settings is None else settings
+        if not isinstance(settings, dict):
+            raise ValueError(f"Anomaly settings must be an object, got {settings!r}")
+        unknown = set(settings).difference(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown anomaly settings: {', '.join(sorted(unknown))}")
+        values = {**DEFAULTS, **settings}
+        for key, value in values.items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"{key} must be a non-negative number, got {value!r}")
+        if not 0 < values['clearRatio'] <= 1:
+            raise ValueError(f"clearRatio must be above 0 and at most 1, got {values['clearRatio']}")
+        if values['fastWindow'] < 1 or values['baselineWindow'] <= values['fastWindow']:
+            raise ValueError("fastWindow must be at least 1 and baselineWindow larger than fastWindow")
+        if not any(values[key] for key in ('spikeThreshold', 'shiftThreshold', 'rateThreshold')):
+            raise ValueError("At least one of spikeThreshold, shiftThreshold and rateThreshold must be above 0")
+        if values['minDeviation'] <= 0:
+            raise ValueError(f"minDeviation must be positive, got {values['minDeviation']}")
+        # A threshold of 0 turns its check off
+        self.thresholds = (values['spikeThreshold'], values['shiftThreshold'], values['rateThreshold'])
+        self.clear_ratio = float(values['clearRatio'])
+        self.clear_count = int(values['clearCount'])
+        self.hold_off = float(values['holdOff'])
+        self.warmup = int(values['warmup'])
+        self.baseline_window = int(values['baselineWindow'])
+        # EWMA weights for windows of N readings
+        self.slow_alpha = 2.0 / (values['baselineWindow'] + 1)
+        self.fast_alpha = 2.0 / (values['fastWindow'] + 1)
+        self.spread_limit = (values['shiftThreshold'] or DEFAULTS['shiftThreshold']) * self.clear_ratio
+        self.min_deviation = float(values['minDeviation'])
+        self.source = settings
+
+
+def validate_anomaly_settings(settings):
+    """Raise ValueError unless settings maps sensor types to valid detector settings"""
+    if not isinstance(settings, dict):
+        raise ValueError(f"Anomaly detection settings must map sensor types to settings, got {settings!r}")
+    for sensor_type, type_settings in settings.items():
+        try:
+            AnomalySettings(type_settings)
+        except ValueError as e:
+            raise ValueError(f"anomalyDetection.{sensor_type}: {e}") from None
+
+
+def reading_time(timestamp):
+    """Epoch seconds of a reading timestamp (epoch seconds or milliseconds, or ISO 8601); now if missing"""
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return timestamp / 1000 if timestamp > 1e11 else float(timestamp)
+    if isinstance(timestamp, str):
+        try:
+            moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            return time.time()
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+    return time.time()
+
+
+class RobustScore:
+    """Streaming median and MAD of a series, and how far a value is from the median in MAD units"""
+
+    __slots__ = ('median', 'mad', 'typical')
+
+    def __init__(self, value, min_deviation):
+        self.median = value
+        self.mad = min_deviation
+        # Average of the MAD over the baseline window
+        self.typical = min_deviation
+
+    def scale(self, min_deviation):
+        return max(max(self.mad, MAD_FLOOR * self.typical) * MAD_SCALE, min_deviation)
+
+    def score(self, value, min_deviation):
+        return abs(value - self.median) / self.scale(min_deviation)
+
+    def update(self, value, rate, min_deviation, slow_rate):
+        """Move both estimates one step towards value
+
+        rate is the step as a fraction of the MAD, slow_rate the EWMA weight of the MAD's average.
+        """
+        self.typical += slow_rate * (self.mad - self.typical)
+        step = rate * max(self.mad, min_deviation)
+        if value > self.median:
+            self.median += step
+        elif value < self.median:
+            self.median -= step
+        if abs(value - self.median) > self.mad:
+            self.mad += step
+        else:
+            self.mad = max(self.mad - step, 0.0)
+
+
+class AnomalyDetector:
+    """Running statistics and alert state of one sensor"""
+
+    __slots__ = ('settings', 'count', 'last_value', 'last_time', 'residual', 'rate', 'fast', 'slow', 'lag', 'spread',
+                 'active', 'check', 'below', 'last_high', 'raised_at', 'peak', 'suppressed')
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.count = 0
+        self.last_value = None
+        self.last_time = None
+        self.residual = None
+        self.rate = None
+        self.fast = self.slow = 0.0
+        # EWMAs of the difference between the fast and slow averages, and of its square
+        self.lag = 0.0
+        self.spread = 0.0
+        self.active = False
+        # The check that raised the current alert
+        self.check = None
+        self.below = 0
+        self.last_high = 0.0
+        self.raised_at = 0.0
+        self.peak = 0.0
+        # Readings above a threshold while the alert was already raised
+        self.suppressed = 0
+
+    def scores(self, value, t):
+        """Score the reading with each check, then update the statistics; returns (spike, shift, rate)"""
+        s = self.settings
+        self.count += 1
+        if self.residual is None:
+            self.residual = RobustScore(0.0, s.min_deviation)
+            self.fast = self.slow = value
+            self.last_value, self.last_time = value, t
+            return 0.0, 0.0, 0.0
+        # Fast steps while the estimates settle, like an average of the readings so far
+        quantile_rate = max(QUANTILE_RATE, 1.0 / self.count)
+        slow_rate = max(s.slow_alpha, 1.0 / self.count)
+
+        # Residual against the sensor's current level, so that noise that wanders (a random walk) scores
+        # by its short-term changes rather than by how far it has wandered
+        residual = value - self.fast
+        spike = self.residual.score(residual, s.min_deviation)
+        # Outliers enter the averages clipped to the spike threshold
+        limit = (s.thresholds[0] or DEFAULTS['spikeThreshold']) * self.residual.scale(s.min_deviation)
+        clipped = self.fast + min(max(residual, self.residual.median - limit), self.residual.median + limit)
+        self.residual.update(residual, quantile_rate, s.min_deviation, slow_rate)
+
+        self.fast += s.fast_alpha * (clipped - self.fast)
+        self.slow += slow_rate * (clipped - self.slow)
+        # The baseline lags behind steady drift by a steady amount, so the difference is taken against its
+        # own average
+        difference = self.fast - self.slow - self.lag
+        deviation = max(math.sqrt(self.spread), s.min_deviation)
+        # Not before the baseline has seen a whole window
+        shift = abs(difference) / deviation if self.count > s.baseline_window else 0.0
+        # Over a longer window, and with differences clipped to where an alert would hold, so that lag and
+        # spread do not follow a ramp as quickly as the ramp grows
+        if self.count > s.baseline_window:
+            limit = s.spread_limit * deviation
+            difference = min(max(difference, -limit), limit)
+        spread_rate = max(s.slow_alpha / SPREAD_WINDOWS, 1.0 / self.count)
+        self.lag += spread_rate * difference
+        self.spread += spread_rate * (difference * difference - self.spread)
+
+        rate = 0.0
+        if t > self.last_time:
+            change = (value - self.last_value) / (t - self.last_time)
+            if self.rate is None:
+                self.rate = RobustScore(change, s.min_deviation)
+            else:
+                rate = self.rate.score(change, s.min_deviation)
+                self.rate.update(change, quantile_rate, s.min_deviation, slow_rate)
+        self.last_value, self.last_time = value, t
+        return spike, shift, rate
+
+    def update(self, value, t):
+        """Take one reading at t (epoch seconds); returns 'raised', 'cleared' or None"""
+        scores = self.scores(value, t)
+        s = self.settings
+        if self.count <= s.warmup:
+            return None
+        # The highest score relative to its threshold decides
+        level, check = max((score / threshold, name)
+                           for name, score, threshold in zip(CHECKS, scores, s.thresholds) if threshold)
+        if not self.active:
+            if level >= 1:
+                self.active, self.check, self.below = True, check, 0
+                self.raised_at = self.last_high = t
+                self.peak = level
+                return 'raised'
+            return None
+        self.peak = max(self.peak, level)
+        if level >= 1:
+            self.suppressed += 1
+        if level >= s.clear_ratio:
+            self.below = 0
+            self.last_high = t
+            return None
+        self.below += 1
+        if self.below >= s.clear_count and t - self.last_high >= s.hold_off:
+            self.active = False
+            return 'cleared'
+        return None
+
+
+class AnomalyMonitor:
+    """Anomaly detectors per sensor, created on a sensor's first reading
+
+    settings maps sensor types to detector settings ({} for the defaults);
+    readings of other types are not checked. At most max_sensors sensors are
+    tracked; readings of further sensors are not checked.
+    """
+
+    def __init__(self, settings, max_sensors=10000):
+        self.max_sensors = max_sensors
+        self.detectors = {}
+        self.settings = {}
+        self.raised = 0
+        self.configure(settings)
+
+    def configure(self, settings):
+        """Apply new settings; sensors of types whose settings changed start over"""
+        validate_anomaly_settings(settings)
+        current = self.settings
+        self.settings = {sensor_type: current[sensor_type]
+                         if sensor_type in current and current[sensor_type].source == type_settings
+                         else AnomalySettings(type_settings)
+                         for sensor_type, type_settings in settings.items()}
+        for key in [key for key, detector in self.detectors.items()
+                    if self.settings.get(key[1]) is not detector.settings]:
+            del self.detectors[key]
+
+    def offer(self, sensor_id, sensor_type, value, timestamp=None):
+        """Check one reading; returns an alert message on a state transition, otherwise None"""
+        settings = self.settings.get(sensor_type)
+        if settings is None or not isinstance(value, (int, float)) or isinstance(value, bool) \
+                or not math.isfinite(value):
+            return None
+        key = (sensor_id, sensor_type)
+        detector = self.detectors.get(key)
+        if detector is None:
+            if len(self.detectors) >= self.max_sensors:
+                return None
+            detector = self.detectors[key] = AnomalyDetector(settings)
+        t = reading_time(timestamp)
+        state = detector.update(float(value), t)
+        if state is None:
+            return None
+        alert = {
+            'messageType': 'anomaly-alert',
+            'sensorId': sensor_id,
+            'sensorType': sensor_type,
+            'state': state,
+            'check': detector.check,
+            'value': value,
+            'level': round(detector.fast, 6),
+            'baseline': round(detector.slow, 6),
+            'timestamp': datetime.fromtimestamp(t, timezone.utc).isoformat(),
+        }
+        if state == 'raised':
+            self.raised += 1
+            alert['score'] = round(detector.peak, 3)
+        else:
+            alert['peakScore'] = round(detector.peak, 3)
+            alert['duration'] = round(t - detector.raised_at, 3)
+            alert['suppressed'] = detector.suppressed
+            detector.suppressed = 0
+        return alert
+
+    def active(self):
+        """Sensors with a raised alert"""
+        return sum(1 for detector in self.detectors.values() if detector.active)
@@ -0,0 +1,287 @@
+"""
+Prebuilt dependency bundles: a component's pinned requirements.txt installed
+on the build host into a ZIP artifact, so that devices unpack it instead of
+running pip in the install lifecycle:
+
+    python3 -m component_runtime.bundle ../s3-uploader [-o dist] [--platform manylinux2014_aarch64 --python-version 3.9]
+
+The default kind, site-packages, is the packages installed with
+pip install --target. It is relocatable, so the recipe puts
+{artifacts:decompressedPath}/<component>-deps/site-packages on PYTHONPATH and
+needs no install step. A wheelhouse holds the wheels and requirements.txt
+instead, for an offline pip install --no-index on the device.
+
+Only wheels are used, so nothing is compiled against the build host's
+libraries, and every distribution pip resolves must be pinned with == in
+requirements.txt, transitive ones included. Built bundles are cached under
+a hash of the requirements, the kind and the target platform, so unchanged
+dependencies are not downloaded and installed again, and the ZIP is
+byte-for-byte the same for the same content.
+"""
+
+import argparse
+import base64
+import compileall
+import hashlib
+import json
+import os
+import py_compile
+import re
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import time
+import zipfile
+
+KINDS = ('site-packages', 'wheelhouse')
+# Part of the cache key: bump when the bundle layout changes
+BUNDLE_FORMAT = 1
+# Fixed ZIP entry times, so the same content always gives the same artifact digest
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+PINNED = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*===?\s*([^\s;]+)\s*(;.*)?$')
+
+
+def default_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'greengrass-bundles')
+
+
+def normalize(name):
+    """A distribution name as pip compares them (PEP 503)"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def read_requirements(path):
+    """The requirement lines of a requirements file, without comments; raises ValueError for unpinned ones
+
+    Lines must be name==version, optionally with extras, an environment
+    marker and --hash options.
+    """
+    requirements = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            requirement = without_hashes(line)
+            if requirement.startswith('-'):
+                raise ValueError(f"{path}:{number}: pip options other than --hash are not supported: {line}")
+            if not PINNED.match(requirement):
+                raise ValueError(f"{path}:{number}: {requirement!r} is not pinned; use name==version")
+            requirements.append(line)
+    if not requirements:
+        raise ValueError(f"{path} lists no requirements")
+    return requirements
+
+
+def without_hashes(line):
+    return ' '.join(word for word in line.split() if not word.startswith('--hash='))
+
+
+def pinned_names(requirements):
+    return {normalize(PINNED.match(without_hashes(line)).group(1)) for line in requirements}
+
+
+def target(platforms=(), python_version=None):
+    """The platform and Python version a bundle is built for; the build host's unless given"""
+    host_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    return {
+        'platforms': sorted(platforms) or [sysconfig.get_platform()],
+        'pythonVersion': python_version or host_version,
+        'implementation': sys.implementation.name,
+    }
+
+
+def bundle_key(requirements, kind, build_target):
+    """Content hash of everything that decides a bundle's contents"""
+    content = json.dumps({'format': BUNDLE_FORMAT, 'kind': kind, 'requirements': sorted(requirements),
+                          'target': build_target}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def pip_command(kind, destination, requirements_file, platforms, python_version):
+    if kind == 'wheelhouse':
+        command = [sys.executable, '-m', 'pip', 'download', '--dest', destination]
+    else:
+        # Bytecode is compiled afterwards, reproducibly (see compile_bytecode)
+        command = [sys.executable, '-m', 'pip', 'install', '--target', destination, '--no-compile',
+                   '--no-warn-script-location']
+    command += ['--only-binary=:all:', '--disable-pip-version-check', '--requirement', requirements_file]
+    for platform in platforms:
+        command += ['--platform', platform]
+    if python_version:
+        command += ['--python-version', python_version]
+    return command
+
+
+def compile_bytecode(directory, python_version):
+    """Precompile the packages when the devices run this Python version
+
+    Artifacts are read-only to components, so without bytecode in the bundle
+    every start would compile the packages again. The .pyc files are checked
+    by hash, not by source timestamp, so they stay valid however the ZIP's
+    times are unpacked and are the same on every build.
+    """
+    if python_version and python_version != f"{sys.version_info.major}.{sys.version_info.minor}":
+        return False
+    # ddir keeps the temporary build path out of the .pyc files; imports set the real path
+    return compileall.compile_dir(directory, ddir='site-packages', quiet=2, workers=0,
+                                  invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+
+
+def distributions(directory, kind):
+    """{normalized name: version} of the distributions in a built bundle directory"""
+    found = {}
+    for name in os.listdir(directory):
+        if kind == 'wheelhouse' and name.endswith('.whl'):
+            distribution, version = name.split('-')[:2]
+        elif kind == 'site-packages' and name.endswith('.dist-info'):
+            distribution, version = name[:-len('.dist-info')].rsplit('-', 1)
+        else:
+            continue
+        found[normalize(distribution)] = version
+    return found
+
+
+def write_zip(source, path):
+    """ZIP a directory with sorted entries and fixed times, written atomically"""
+    partial = path + '.partial'
+    with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for root, directories, files in os.walk(source):
+            directories.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                entry = zipfile.ZipInfo(os.path.relpath(full, source).replace(os.sep, '/'), ZIP_DATE)
+                entry.compress_type = zipfile.ZIP_DEFLATED
+                entry.external_attr = (os.stat(full).st_mode & 0o777 | 0o100000) << 16
+                with open(full, 'rb') as f:
+                    archive.writestr(entry, f.read())
+    os.replace(partial, path)
+
+
+def file_digest(path):
+    """SHA-256 of a file, base64-encoded as recipes expect in an artifact's Digest"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return base64.b64encode(digest.digest()).decode('ascii')
+
+
+def build(component_dir, output_dir, kind='site-packages', platforms=(), python_version=None, cache_dir=None):
+    """Build (or take from the cache) the dependency bundle of one component
+
+    Returns a summary dict; raises ValueError for unpinned requirements and
+    RuntimeError when pip fails.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Bundle kind must be one of {', '.join(KINDS)}, got {kind!r}")
+    component_dir = os.path.abspath(component_dir)
+    name = os.path.basename(component_dir.rstrip(os.sep))
+    requirements_file = os.path.join(component_dir, 'requirements.txt')
+    requirements = read_requirements(requirements_file)
+    build_target = target(platforms, python_version)
+    key = bundle_key(requirements, kind, build_target)
+    artifact = os.path.join(output_dir, f"{name}-deps.zip")
+    os.makedirs(output_dir, exist_ok=True)
+
+    cached = os.path.join(cache_dir, f"{name}-{kind}-{key[:16]}.zip") if cache_dir else None
+    started = time.monotonic()
+    if cached and os.path.exists(cached):
+        shutil.copyfile(cached, artifact)
+        with zipfile.ZipFile(artifact) as archive:
+            manifest = json.loads(archive.read('bundle.json'))
+        return {**summary(name, artifact, manifest), 'cached': True, 'seconds': time.monotonic() - started}
+
+    with tempfile.TemporaryDirectory(prefix=f"{name}-deps-") as work:
+        root = os.path.join(work, 'bundle')
+        destination = os.path.join(root, 'wheels' if kind == 'wheelhouse' else 'site-packages')
+        os.makedirs(destination)
+        with open(os.path.join(root, 'requirements.txt'), 'w') as f:
+            f.write('\n'.join(requirements) + '\n')
+        command = pip_command(kind, destination, os.path.join(root, 'requirements.txt'), platforms, python_version)
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if result.returncode:
+            raise RuntimeError(f"pip failed for {name}:\n{result.stdout.strip()}")
+        # Console scripts carry the build host's interpreter path; the components do not use them
+        shutil.rmtree(os.path.join(destination, 'bin'), ignore_errors=True)
+        if kind == 'site-packages':
+            compile_bytecode(destination, python_version)
+
+        found = distributions(destination, kind)
+        unpinned = sorted(set(found) - pinned_names(requirements))
+        if unpinned:
+            raise ValueError(f"{requirements_file} does not pin {', '.join(f'{n}=={found[n]}' for n in unpinned)}, "
+                             f"which pip resolved as dependencies; add them so the bundle is reproducible")
+        manifest = {'component': name, 'kind': kind, 'key': key, 'target': build_target,
+                    'distributions': dict(sorted(found.items()))}
+        with open(os.path.join(root, 'bundle.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        write_zip(root, artifact)
+
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        shutil.copyfile(artifact, cached + '.partial')
+        os.replace(cached + '.partial', cached)
+    return {**summary(name, artifact, manifest), 'cached': False, 'seconds': time.monotonic() - started}
+
+
+def summary(name, artifact, manifest):
+    return {'component': name, 'path': artifact, 'kind': manifest['kind'], 'key': manifest['key'],
+            'distributions': manifest['distributions'], 'bytes': os.path.getsize(artifact),
+            'digest': file_digest(artifact)}
+
+
+def recipe_artifact(result, version):
+    """The Artifacts entry for a bundle, with the digest the nucleus verifies after download"""
+    return {'Uri': f"s3://YOUR_BUCKET/{result['component']}/{version}/{os.path.basename(result['path'])}",
+            'Digest': result['digest'], 'Algorithm': 'SHA-256', 'Unarchive': 'ZIP'}
+
+
+def component_version(component_dir):
+    try:
+        with open(os.path.join(component_dir, 'recipe.json')) as f:
+            return json.load(f).get('ComponentVersion', '1.0.0')
+    except (OSError, ValueError):
+        return '1.0.0'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m component_runtime.bundle',
+                                     description='Build offline dependency bundles from components\' requirements.txt')
+    parser.add_argument('components', nargs='+', help='component directories with a requirements.txt')
+    parser.add_argument('-o', '--output', default='dist', help='directory the <component>-deps.zip files go to')
+    parser.add_argument('--kind', choices=KINDS, default='site-packages',
+                        help='installed packages to put on PYTHONPATH, or wheels for pip install --no-index')
+    parser.add_argument('--platform', action='append', default=[],
+                        help='wheel platform tag of the devices, e.g. manylinux2014_aarch64 (repeatable; '
+                             'default: this host)')
+    parser.add_argument('--python-version', help='Python version of the devices, e.g. 3.9 (default: this Python)')
+    parser.add_argument('--cache-dir', default=default_cache_dir(), help='where built bundles are kept')
+    parser.add_argument('--no-cache', action='store_true', help='always build, and do not store the result')
+    parser.add_argument('--json', action='store_true', help='print the results and recipe artifacts as JSON')
+    args = parser.parse_args(argv)
+
+    results = []
+    for component_dir in args.components:
+        try:
+            result = build(component_dir, args.output, args.kind, args.platform, args.python_version,
+                           None if args.no_cache else args.cache_dir)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"{component_dir}: {e}", file=sys.stderr)
+            return 1
+        result['artifact'] = recipe_artifact(result, component_version(component_dir))
+        results.append(result)
+        if not args.json:
+            print(f"{result['component']}: {result['path']}, {len(result['distributions'])} distributions, "
+                  f"{result['bytes'] / 2**20:.1f} MiB, "
+                  f"{'from the cache' if result['cached'] else 'built'} in {result['seconds']:.1f} s")
+            print(f"  artifact: {json.dumps(result['artifact'])}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Component configuration from defaults and GG_* environment variables.
+"""
+
+import copy
+import json
+import os
+
+
+def env_bool(value):
+    return value.lower() == 'true'
+
+
+def env_list(value):
+    """A JSON list, or a comma-separated string"""
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def env_config(defaults, variables):
+    """Return a copy of defaults with values overridden from the environment
+
+    variables maps a configuration key to (environment variable, parse), where
+    parse turns the variable's string into the value, e.g. int, float, str,
+    env_bool, env_list or json.loads. Unset variables keep the default.
+    """
+    config = copy.deepcopy(defaults)
+    for key, (variable, parse) in variables.items():
+        value = os.environ.get(variable)
+        if value is not None:
+            config[key] = parse(value)
+    return config
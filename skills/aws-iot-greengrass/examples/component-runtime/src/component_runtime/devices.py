@@ -0,0 +1,312 @@
+"""
+Virtual devices: one component process publishing for many device ids.
+
+The "devices" configuration is a list of groups. Each group is one device
+({"deviceId": "gateway-1"}) or a numbered range of them ({"count": 5000,
+"idFormat": "meter-{index:05d}", "start": 1}), with an optional "interval"
+for its devices; devices without one follow the component's interval.
+
+DeviceScheduler runs every device on its own fixed-rate schedule from one
+thread, on a heap of deadlines, and can hold the total rate to maxRate
+publishes per second. It has the same tick interface as FixedRateScheduler,
+so the publishers' loops drive either one.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import string
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fields a topic template may use
+TOPIC_FIELDS = ('deviceId',)
+DEFAULT_ID_FORMAT = '{deviceId}-{index:05d}'
+
+
+def topic_fields(template):
+    """The fields a topic template uses; raises ValueError for any other field or a malformed template"""
+    try:
+        fields = {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+    except ValueError as e:
+        raise ValueError(f"Invalid topic template {template!r}: {e}") from None
+    unknown = fields.difference(TOPIC_FIELDS)
+    if unknown:
+        raise ValueError(f"Unsupported field in topic {template!r}: {', '.join(sorted(unknown))} "
+                         f"(expected {', '.join('{' + field + '}' for field in TOPIC_FIELDS)})")
+    return fields
+
+
+def render_topic(template, device_id):
+    """The topic for one device; templates without fields are returned as they are"""
+    return template.format(deviceId=device_id) if '{' in template else template
+
+
+class VirtualDevice:
+    """One device id with its own schedule and sequence numbers"""
+
+    __slots__ = ('device_id', 'interval', 'topic', 'sequence', 'deadline')
+
+    def __init__(self, device_id, interval=None):
+        self.device_id = device_id
+        # None follows the component's interval
+        self.interval = interval
+        self.topic = None
+        self.sequence = 0
+        self.deadline = 0.0
+
+    def next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+
+def create_devices(groups, device_id):
+    """VirtualDevice objects for the configured groups; raises ValueError for invalid groups
+
+    device_id is the component's deviceId, which group id formats can use.
+    """
+    if not isinstance(groups, list):
+        raise ValueError(f"devices must be a list of device groups, got {type(groups).__name__}")
+    devices = []
+    for group in groups:
+        if not isinstance(group, dict):
+            raise ValueError(f"Invalid device group {json.dumps(group)}: expected an object")
+        interval = group.get('interval')
+        if interval is not None and (not isinstance(interval, (int, float)) or interval < 0.001):
+            raise ValueError(f"Device interval must be at least 0.001 seconds, got {interval!r}")
+        if 'count' not in group:
+            if not group.get('deviceId'):
+                raise ValueError(f"Invalid device group {json.dumps(group)}: needs deviceId or count")
+            devices.append(VirtualDevice(str(group['deviceId']), interval))
+            continue
+        count, start = group['count'], group.get('start', 1)
+        if not isinstance(count, int) or count < 1 or not isinstance(start, int):
+            raise ValueError(f"Invalid device group {json.dumps(group)}: count must be a positive integer")
+        id_format = group.get('idFormat', DEFAULT_ID_FORMAT)
+        try:
+            devices.extend(VirtualDevice(id_format.format(index=index, deviceId=device_id), interval)
+                           for index in range(start, start + count))
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Invalid idFormat {id_format!r}: {e}") from None
+    ids = set()
+    for device in devices:
+        if device.device_id in ids:
+            raise ValueError(f"Duplicate virtual device id: {device.device_id}")
+        ids.add(device.device_id)
+    return devices
+
+
+def set_topics(devices, template):
+    """Render each device's topic from the template"""
+    topic_fields(template)
+    for device in devices:
+        device.topic = render_topic(template, device.device_id)
+
+
+class RateLimiter:
+    """Token bucket: at most rate events per second, with bursts of up to burst events
+
+    A rate of 0 does not limit.
+    """
+
+    def __init__(self, rate=0.0, burst=None):
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        if rate < 0:
+            raise ValueError(f"Rate must not be negative, got {rate}")
+        self.rate = float(rate)
+        # 10 ms worth of events by default, so high rates do not need a sleep per event
+        self.burst = float(burst if burst is not None else max(1.0, self.rate / 100))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def delay(self, now=None):
+        """Seconds until an event is allowed"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+
+class DeviceScheduler:
+    """Fixed-rate schedules for many virtual devices, run from one thread
+
+    Devices are served earliest deadline first. Their first deadlines are
+    spread evenly over their interval, so devices with the same interval do
+    not all publish at once. Deadlines advance from the schedule, not from
+    when a publish finished. A device more than one interval behind, because
+    publishing or max_rate cannot keep up, skips the ticks it missed: every
+    device then falls behind by the same share instead of some of them
+    starving, and the backlog does not burst out when the load drops.
+
+    A new interval keeps the phase of devices that follow it: each next
+    deadline moves by the change, applied by the run loop the next time it
+    wakes. The wait for a deadline ends early when the interval or max_rate
+    changes or the scheduler is stopped.
+    """
+
+    def __init__(self, devices, interval, max_rate=0.0, stats_interval=60.0):
+        if interval < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {interval}")
+        if not devices:
+            raise ValueError("DeviceScheduler needs at least one device")
+        self.devices = devices
+        self.interval = float(interval)
+        self.stats_interval = float(stats_interval)
+        self.limiter = RateLimiter(max_rate)
+        self.running = False
+        self.heap = []
+        # Breaks ties between equal deadlines in the order devices were queued
+        self.order = itertools.count()
+        self.current = None
+        self.limited = False
+        # Seconds to move the deadlines of devices without their own interval by, set from other threads
+        self.shift_lock = threading.Lock()
+        self.shift = 0.0
+        # Set to end the run loop's wait: a setting changed or the scheduler stopped
+        self._wake = threading.Event()
+        self.reset_stats()
+
+    def device_interval(self, device):
+        return device.interval or self.interval
+
+    def target_rate(self):
+        """Publishes per second all devices' schedules ask for, before max_rate"""
+        return sum(1.0 / self.device_interval(device) for device in self.devices)
+
+    def reset_stats(self):
+        """Start a new rate and jitter measurement window"""
+        self.window_start = time.monotonic()
+        self.ticks = 0
+        self.missed = 0
+        self.throttled = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+
+    def stats(self):
+        """Achieved rate and jitter (lateness against the deadline) for the current window"""
+        elapsed = max(time.monotonic() - self.window_start, 1e-9)
+        return {
+            "devices": len(self.devices),
+            "targetRate": round(self.target_rate(), 3),
+            "maxRate": self.limiter.rate,
+            "achievedRate": round(self.ticks / elapsed, 3),
+            "meanJitterMs": round(1000 * self.jitter_total / self.ticks, 3) if self.ticks else 0.0,
+            "maxJitterMs": round(1000 * self.jitter_max, 3),
+            "missedTicks": self.missed,
+            "throttledTicks": self.throttled
+        }
+
+    def set_interval(self, interval):
+        """Change the interval of devices without their own, keeping the time of their last tick as the phase"""
+        if interval < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {interval}")
+        with self.shift_lock:
+            self.shift += float(interval) - self.interval
+            self.interval = float(interval)
+        self.reset_stats()
+        self._wake.set()
+
+    def set_max_rate(self, max_rate):
+        self.limiter.set_rate(max_rate)
+        self.reset_stats()
+        self._wake.set()
+
+    def apply_shift(self):
+        """Move the queued deadlines of devices that follow the interval by the pending change"""
+        with self.shift_lock:
+            shift, self.shift = self.shift, 0.0
+        if not shift:
+            return
+        for index, (_, order, device) in enumerate(self.heap):
+            if not device.interval:
+                device.deadline += shift
+                self.heap[index] = (device.deadline, order, device)
+        heapq.heapify(self.heap)
+
+    def start(self):
+        """Begin scheduling, with each device's first tick spread over its interval"""
+        self.running = True
+        self._wake.clear()
+        with self.shift_lock:
+            self.shift = 0.0
+        self.reset_stats()
+        now = time.monotonic()
+        count = len(self.devices)
+        self.heap = []
+        for index, device in enumerate(self.devices):
+            device.deadline = now + self.device_interval(device) * index / count
+            self.heap.append((device.deadline, next(self.order), device))
+        heapq.heapify(self.heap)
+
+    def delay(self):
+        """Seconds until the next tick is due and allowed by the rate limit"""
+        self.apply_shift()
+        now = time.monotonic()
+        due = self.heap[0][0] - now
+        if due > 0:
+            return due
+        wait = self.limiter.delay(now)
+        self.limited = self.limited or wait > 0
+        return wait
+
+    def begin_tick(self):
+        """Take the device whose tick is due, recording how late it started"""
+        deadline, _, device = heapq.heappop(self.heap)
+        self.limiter.take()
+        if self.limited:
+            self.throttled += 1
+            self.limited = False
+        lateness = max(0.0, time.monotonic() - deadline)
+        self.ticks += 1
+        self.jitter_total += lateness
+        self.jitter_max = max(self.jitter_max, lateness)
+        self.current = device
+        return device
+
+    def end_tick(self):
+        """Queue the device's next deadline and report stats when the window closes"""
+        # Devices still queued move with a change made during the tick; this one's next deadline uses the new interval
+        self.apply_shift()
+        device, self.current = self.current, None
+        interval = self.device_interval(device)
+        device.deadline += interval
+        now = time.monotonic()
+        if now - device.deadline > interval:
+            # Skip ticks we are too late for instead of bursting to catch up
+            skipped = int((now - device.deadline) // interval)
+            self.missed += skipped
+            device.deadline += skipped * interval
+        heapq.heappush(self.heap, (device.deadline, next(self.order), device))
+
+        if now - self.window_start >= self.stats_interval:
+            logger.info(f"Publish rate: {json.dumps(self.stats())}")
+            self.reset_stats()
+
+    def run(self, task):
+        """Call task(device) for each device's ticks until stop() is called"""
+        self.start()
+        while self.running:
+            delay = self.delay()
+            if delay > 0:
+                # Check again after waking: a setting may have changed, or the rate limit held the device back
+                if self._wake.wait(delay):
+                    self._wake.clear()
+                continue
+            task(self.begin_tick())
+            self.end_tick()
+
+    def stop(self):
+        """Stop the run loop after the current tick, or at once if it is waiting for one"""
+        self.running = False
+        self._wake.set()
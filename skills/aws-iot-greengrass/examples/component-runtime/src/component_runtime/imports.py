@@ -0,0 +1,150 @@
+"""
+Deferred imports and import-time measurement.
+"""
+
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        """Import the module now and return it"""
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self.__dict__['_module'] = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self.load(), attribute, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def is_installed(name):
+    """Whether the top-level package of `name` can be imported, without importing it"""
+    top_level = name.partition('.')[0]
+    if top_level in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(top_level) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_import(name):
+    """Return a LazyModule for `name`, or None when its package is not installed
+
+    Only the top-level package is located up front; the module itself, and
+    everything it imports, is loaded the first time one of its attributes is
+    used. Use the None result the way the examples use *_AVAILABLE flags.
+    """
+    if not is_installed(name):
+        return None
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+class _TimedLoader:
+    """Wraps a module loader to time exec_module"""
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.exec_module(self._loader, module)
+
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+
+
+class ImportTimer:
+    """sys.meta_path hook that records self and cumulative import time per module, like -X importtime"""
+
+    def __init__(self):
+        self.records = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self.local, 'finding', False):
+            return None
+        self.local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self.local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def exec_module(self, loader, module):
+        # Each frame accumulates the time spent in the imports it triggers
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.records.append((module.__name__, elapsed - children, elapsed, len(stack)))
+
+    def total(self):
+        """Seconds spent importing, counting nested imports once"""
+        with self.lock:
+            return sum(cumulative for _, _, cumulative, depth in self.records if depth == 0)
+
+    def report(self, top=15):
+        """The slowest imports in `python -X importtime` layout (microseconds)"""
+        with self.lock:
+            records = sorted(self.records, key=lambda record: record[2], reverse=True)[:top]
+        lines = ["import time: self [us] | cumulative | imported package"]
+        for name, own, cumulative, depth in records:
+            lines.append(f"import time: {1e6 * own:>9.0f} | {1e6 * cumulative:>10.0f} | {'  ' * depth}{name}")
+        return '\n'.join(lines)
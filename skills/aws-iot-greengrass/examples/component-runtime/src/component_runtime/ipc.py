@@ -0,0 +1,50 @@
+"""
+One Greengrass IPC connection per process, opened on first use.
+"""
+
+import threading
+
+from .imports import lazy_import
+
+greengrasscoreipc = lazy_import('awsiot.greengrasscoreipc')
+IPC_AVAILABLE = greengrasscoreipc is not None
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _shared(kind, connect):
+    with _lock:
+        client = _clients.get(kind)
+        if client is None:
+            # Not cached on failure, so a later call retries the connection
+            client = _clients[kind] = connect()
+        return client
+
+
+def ipc_client():
+    """The process-wide V1 (`connect()`) IPC client; raises if the connection fails"""
+    if not IPC_AVAILABLE:
+        raise RuntimeError("awsiot.greengrasscoreipc is not installed")
+    return _shared('v1', lambda: greengrasscoreipc.connect())
+
+
+def ipc_client_v2(executor=True):
+    """The process-wide GreengrassCoreIPCClientV2
+
+    executor is passed to the client the first time it is created; see the
+    SDK for how stream callbacks are scheduled.
+    """
+    if not IPC_AVAILABLE:
+        raise RuntimeError("awsiot.greengrasscoreipc is not installed")
+    clientv2 = lazy_import('awsiot.greengrasscoreipc.clientv2')
+    return _shared('v2', lambda: clientv2.GreengrassCoreIPCClientV2(executor=executor))
+
+
+def close_ipc_clients():
+    """Close the shared clients; the next ipc_client() call reconnects"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,197 @@
+"""
+Live configuration: read the component's configuration from the nucleus and
+apply deployment changes in place instead of restarting the component.
+"""
+
+import copy
+import inspect
+import logging
+import threading
+import time
+
+from .imports import lazy_import
+from .ipc import IPC_AVAILABLE, ipc_client
+
+logger = logging.getLogger(__name__)
+
+asyncio = lazy_import('asyncio')
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+ipc_client_module = lazy_import('awsiot.greengrasscoreipc.client')
+
+
+def coerce(value, parse):
+    """Convert a configuration value from IPC to the type the component expects
+
+    Values that arrive as strings are parsed like the matching GG_* variable;
+    numbers are converted so that e.g. an interval of 15 is still a float.
+    """
+    if isinstance(value, str):
+        return parse(value)
+    if parse is str:
+        return str(value)
+    if parse in (int, float) and not isinstance(value, bool):
+        return parse(value)
+    return value
+
+
+class ConfigWatcher:
+    """Apply GetConfiguration and SubscribeToConfigurationUpdate values to a component
+
+    config is the component's configuration dict and variables maps keys to
+    (environment variable, parse) as for env_config; only those keys are read
+    from the nucleus, and only parse is used. apply receives a dict of the
+    changed keys and their new values and must update config in place; it
+    runs on the watcher's thread, or on the event loop given to run_on().
+    validate receives a configuration and raises to reject it: load() passes
+    the error on for the startup configuration, and a rejected update is
+    logged and not applied. Keys in restart_keys are read by load() but later
+    changes to them are logged as needing a restart.
+    """
+
+    def __init__(self, config, variables, apply, validate=None, restart_keys=(), timeout=10.0):
+        self.config = config
+        self.variables = variables
+        self.apply = apply
+        self.validate = validate
+        self.restart_keys = set(restart_keys)
+        self.timeout = timeout
+        self.client = None
+        self.operation = None
+        self.loop = None
+        self.updates = 0
+        self.last_pause = None
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Overlay the deployed configuration onto config and validate it, before the component uses it
+
+        Connects the shared IPC client. Without IPC the environment
+        configuration is kept and watch() does nothing. Returns whether the
+        deployed configuration was read.
+        """
+        loaded = False
+        if IPC_AVAILABLE:
+            try:
+                self.client = ipc_client()
+                self.config.update(self.changes(self.fetch()))
+                loaded = True
+            except Exception as e:
+                logger.error(f"Deployed configuration unavailable, using environment configuration: {e}")
+                self.client = None
+        if self.validate:
+            self.validate(self.config)
+        return loaded
+
+    def watch(self):
+        """Subscribe to configuration updates and apply them as they arrive"""
+        if self.client is None:
+            return False
+        try:
+            self.subscribe()
+        except Exception as e:
+            logger.error(f"Failed to subscribe to configuration updates: {e}")
+            return False
+        self._thread = threading.Thread(target=self._watch, name='config-watcher', daemon=True)
+        self._thread.start()
+        return True
+
+    def subscribe(self):
+        # Events only signal the watcher thread: blocking IPC calls must not run on the SDK's thread
+        watcher = self
+
+        class UpdateHandler(ipc_client_module.SubscribeToConfigurationUpdateStreamHandler):
+            def on_stream_event(self, event):
+                watcher._changed.set()
+
+            def on_stream_error(self, error):
+                logger.error(f"Configuration update stream error: {error}")
+                return False  # Keep the stream open
+
+        request = ipc_model.SubscribeToConfigurationUpdateRequest()
+        request.key_path = []
+        self.operation = self.client.new_subscribe_to_configuration_update(UpdateHandler())
+        self.operation.activate(request)
+        self.operation.get_response().result(timeout=self.timeout)
+
+    def fetch(self):
+        """The component's configuration as deployed"""
+        request = ipc_model.GetConfigurationRequest()
+        request.key_path = []
+        operation = self.client.new_get_configuration()
+        operation.activate(request)
+        return operation.get_response().result(timeout=self.timeout).value or {}
+
+    def changes(self, deployed):
+        """Keys whose deployed value differs from the current configuration"""
+        changes = {}
+        for key, (_, parse) in self.variables.items():
+            if key not in deployed:
+                continue
+            value = coerce(copy.deepcopy(deployed[key]), parse)
+            if value != self.config.get(key):
+                changes[key] = value
+        return changes
+
+    def refresh(self):
+        """Fetch the configuration and apply what changed; returns the applied keys"""
+        changes = self.changes(self.fetch())
+        for key in self.restart_keys.intersection(changes):
+            logger.warning(f"{key} changed to {changes[key]!r}; restart the component to apply it")
+            del changes[key]
+        if not changes:
+            return {}
+        if self.validate:
+            try:
+                self.validate({**self.config, **changes})
+            except Exception as e:
+                logger.error(f"Rejected configuration update {sorted(changes)}: {e}")
+                return {}
+
+        started = time.perf_counter()
+        self._apply(changes)
+        self.last_pause = time.perf_counter() - started
+        self.updates += 1
+        logger.info(f"Reconfigured {', '.join(sorted(changes))} in {1000 * self.last_pause:.1f} ms")
+        return changes
+
+    def run_on(self, loop):
+        """Apply updates on an asyncio event loop (None applies them on the watcher thread)"""
+        self.loop = loop
+
+    def _apply(self, changes):
+        loop = self.loop
+        if loop is None:
+            self.apply(changes)
+            return
+
+        async def apply_on_loop():
+            result = self.apply(changes)
+            if inspect.isawaitable(result):
+                await result
+
+        asyncio.run_coroutine_threadsafe(apply_on_loop(), loop).result(timeout=self.timeout)
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            self._changed.wait()
+            if self._stopped.is_set():
+                return
+            # A deployment sends one event per changed key; one fetch covers all that arrived so far
+            self._changed.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to apply configuration update: {e}")
+
+    def stop(self):
+        """Stop watching; the configuration keeps its current values"""
+        self._stopped.set()
+        self._changed.set()
+        if self.operation is not None:
+            try:
+                self.operation.close()
+            except Exception:
+                pass
+            self.operation = None
@@ -0,0 +1,244 @@
+"""
+Logging setup shared by the example components.
+
+Records are handed to a background writer thread through a queue
+(QueueHandler/QueueListener), so a component never waits for its log
+stream, and messages are formatted on that thread. Hot-path messages pass
+their arguments %-style (wrapping expensive ones in lazy()) and can be
+rate-limited per message type with extra=sampled(key), which is checked
+before the record is built. GG_LOG_FORMAT=json writes JSON lines instead
+of text.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from .memory import LOW_MEMORY, LOW_MEMORY_LOG_QUEUE_SIZE
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Records waiting for the writer; beyond this they are dropped and counted
+QUEUE_SIZE = 10000
+# Sample keys (e.g. one per topic) tracked before idle ones are forgotten
+MAX_SAMPLE_KEYS = 1024
+
+_lock = threading.Lock()
+_handler = None
+_output = None
+_listener = None
+_sampler = None
+
+
+def sampled(key):
+    """extra= for a hot-path record: at most the sample rate per second are written for key
+
+    The next record written for the key reports how many were suppressed.
+    """
+    return {'sample_key': key}
+
+
+class lazy:
+    """Log argument that is only computed if the record is written, e.g. lazy(json.dumps, reading)"""
+
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
+
+
+class Sampler:
+    """Token bucket per sample key: up to rate records per second, bursts of up to rate"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        # key -> [tokens, last refill, suppressed since the last written record]
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def admit(self, key):
+        """None if the record is suppressed, else how many were suppressed before it"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= MAX_SAMPLE_KEYS:
+                    self.forget_idle(now)
+                bucket = self.buckets[key] = [self.rate, now, 0]
+            tokens = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return None
+            bucket[0] = tokens - 1
+            suppressed, bucket[2] = bucket[2], 0
+        return suppressed
+
+    def forget_idle(self, now):
+        """Drop buckets that have refilled and owe no suppressed count; a new bucket would be the same"""
+        for key in [key for key, (tokens, last, suppressed) in self.buckets.items()
+                    if not suppressed and tokens + (now - last) * self.rate >= self.rate]:
+            del self.buckets[key]
+
+
+class SampledLogger(logging.Logger):
+    """Logger that drops suppressed extra=sampled(key) records before building them
+
+    Creating the LogRecord is most of a logging call's cost, so sampling
+    happens here rather than in a handler filter.
+    """
+
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, stacklevel=1):
+        sampler = _sampler
+        if sampler is not None and extra is not None and 'sample_key' in extra:
+            suppressed = sampler.admit(extra['sample_key'])
+            if suppressed is None:
+                return
+            if suppressed:
+                extra = {**extra, 'suppressed': suppressed}
+        # One more frame (this one) between the caller and logging
+        super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info,
+                     stacklevel=stacklevel + 1)
+
+
+class TextFormatter(logging.Formatter):
+    """LOG_FORMAT text, noting how many sampled records were suppressed"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f"{text} [{suppressed} similar suppressed]" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record (JSON lines)"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'sample_key', None):
+            entry['sampleKey'] = record.sample_key
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted so the writer thread does the formatting"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The queue never leaves the process, so the record and its arguments
+        # can be passed as they are; QueueHandler would format them here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(log_format='text', sample_rate=10.0, stream=None, background=True, queue_size=QUEUE_SIZE):
+    """Replace the root handler; returns the handler records are passed to
+
+    log_format is 'text' or 'json'. sample_rate limits records logged with
+    extra=sampled(key) per key and second (0 writes them all). background=False
+    writes on the calling thread instead of through the queue, which holds up
+    to queue_size records.
+    """
+    global _handler, _output, _listener, _sampler
+    with _lock:
+        _stop_writer()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        _output = logging.StreamHandler(stream)
+        _output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter(LOG_FORMAT))
+        if background:
+            _handler = BackgroundQueueHandler(queue.Queue(queue_size))
+            _listener = logging.handlers.QueueListener(_handler.queue, _output)
+            _listener.start()
+        else:
+            _handler = _output
+        _sampler = Sampler(sample_rate) if sample_rate > 0 else None
+        root.addHandler(_handler)
+        root.setLevel(logging.INFO)
+        return _handler
+
+
+def flush_logging():
+    """Write every queued record and stop the writer thread (also runs at exit)
+
+    Records logged afterwards are written on the calling thread.
+    """
+    global _handler
+    with _lock:
+        if _listener is None:
+            return
+        _stop_writer()
+        root = logging.getLogger()
+        root.removeHandler(_handler)
+        root.addHandler(_output)
+        _handler = _output
+
+
+def _stop_writer():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _handler.dropped:
+        _output.handle(logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f"Log queue was full, {_handler.dropped} records dropped"}))
+
+
+# Loggers created from here on can drop sampled records early
+logging.setLoggerClass(SampledLogger)
+atexit.register(flush_logging)
+
+
+def setup_logging(name, level=None):
+    """Configure the root handler once and return the component's logger
+
+    Components must call this before logging anything: a module-level
+    logging.warning() would otherwise install a default handler first and
+    make this configuration a no-op. GG_LOG_FORMAT and GG_LOG_SAMPLE_RATE
+    select the output format and sample rate; low-memory mode queues fewer
+    records.
+    """
+    if not logging.getLogger().handlers:
+        configure_logging(log_format=os.environ.get('GG_LOG_FORMAT', 'text').lower(),
+                          sample_rate=float(os.environ.get('GG_LOG_SAMPLE_RATE', '10')),
+                          queue_size=LOW_MEMORY_LOG_QUEUE_SIZE if LOW_MEMORY else QUEUE_SIZE)
+    logger = logging.getLogger(name)
+    if level:
+        set_level(logger, level)
+    return logger
+
+
+def set_level(logger, level):
+    """Set a level given by name (DEBUG, INFO, WARN, ERROR)"""
+    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
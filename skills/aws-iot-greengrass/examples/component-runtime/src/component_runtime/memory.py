@@ -0,0 +1,25 @@
+"""
+Low-memory mode for constrained devices, such as Greengrass Lite hosts.
+
+GG_LOW_MEMORY=true trades some throughput for a smaller, bounded footprint.
+Here it shrinks the stack reserved for each new thread and the log queue;
+the components check LOW_MEMORY to switch to their lean variants.
+"""
+
+import os
+import threading
+
+from .config import env_bool
+
+LOW_MEMORY = env_bool(os.environ.get('GG_LOW_MEMORY', 'false'))
+# Stack reserved per thread in low-memory mode, instead of the default (8 MiB on most Linux systems)
+THREAD_STACK_SIZE = 512 * 1024
+# Log records that may wait for the writer thread in low-memory mode
+LOW_MEMORY_LOG_QUEUE_SIZE = 1000
+
+
+def configure_memory(low_memory=LOW_MEMORY):
+    """Apply the process-wide low-memory settings; threads started earlier keep their stacks"""
+    if low_memory:
+        threading.stack_size(THREAD_STACK_SIZE)
+    return low_memory
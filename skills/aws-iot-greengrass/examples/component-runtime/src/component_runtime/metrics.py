@@ -0,0 +1,317 @@
+"""
+Runtime metrics: counters, gauges and histograms, with a reporter thread
+that publishes a compact snapshot to a local IPC topic and/or a file.
+
+Recording takes no lock: every thread updates its own cell, and the
+reporter sums the cells when it takes a snapshot. A snapshot can therefore
+miss an update that is in progress; the next one includes it.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from .imports import lazy_import
+from .ipc import IPC_AVAILABLE, ipc_client
+
+logger = logging.getLogger(__name__)
+
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+
+# Histogram buckets: SUB_COUNT/2 per power of two, so a bucket's middle is within ~3% of its values
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+# Metrics files are rolled over to <path>.1 beyond this size
+MAX_FILE_BYTES = 1 << 20
+
+
+class _Sharded:
+    """Per-thread cells, registered once per thread"""
+
+    def __init__(self, name):
+        self.name = name
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def _new_cell(self, cell):
+        self._local.cell = cell
+        with self._lock:
+            self._cells.append(cell)
+        return cell
+
+    def cells(self):
+        with self._lock:
+            return list(self._cells)
+
+
+class Counter(_Sharded):
+    """Monotonic count, e.g. messages published"""
+
+    def inc(self, amount=1):
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            self._new_cell([amount])
+
+    def value(self):
+        return sum(cell[0] for cell in self.cells())
+
+
+class Gauge:
+    """Current value: set() from the component, or a function read at snapshot time"""
+
+    def __init__(self, name, function=None):
+        self.name = name
+        self.function = function
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        if self.function is None:
+            return self._value
+        try:
+            return self.function()
+        except Exception:
+            return None
+
+
+def bucket_index(value):
+    """HDR-style bucket of a non-negative integer: exact below SUB_COUNT, then SUB_COUNT/2 per power of two"""
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return shift * HALF_COUNT + (value >> shift)
+
+
+def bucket_bounds(index):
+    """Lowest and highest value counted in a bucket"""
+    if index < SUB_COUNT:
+        return index, index
+    shift = index // HALF_COUNT - 1
+    lowest = (index - shift * HALF_COUNT) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+class Histogram(_Sharded):
+    """Distribution of durations, recorded in seconds and reported in milliseconds
+
+    Values are kept in microsecond buckets with ~3% resolution, so memory
+    stays bounded however many values are recorded.
+    """
+
+    def record(self, seconds):
+        micros = int(seconds * 1e6) if seconds > 0 else 0
+        index = bucket_index(micros)
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell([{}, 0, 0, 0])
+        counts = cell[0]
+        counts[index] = counts.get(index, 0) + 1
+        cell[1] += 1
+        cell[2] += micros
+        if micros > cell[3]:
+            cell[3] = micros
+
+    def totals(self):
+        """(bucket counts, count, sum, max) over all threads since the start"""
+        counts, count, total, maximum = {}, 0, 0, 0
+        for cell in self.cells():
+            for index, n in cell[0].copy().items():
+                counts[index] = counts.get(index, 0) + n
+            count += cell[1]
+            total += cell[2]
+            maximum = max(maximum, cell[3])
+        return counts, count, total, maximum
+
+
+def summarize(counts, count, total, maximum, percentiles=(50, 90, 99)):
+    """count, mean, percentiles and max in milliseconds"""
+    summary = {'count': count}
+    if not count:
+        return summary
+    summary['mean'] = round(total / count / 1000, 3)
+    ordered = sorted(counts.items())
+    for percentile in percentiles:
+        rank = percentile / 100 * count
+        seen = 0
+        for index, n in ordered:
+            seen += n
+            if seen >= rank:
+                # The middle of the bucket is within 1/SUB_COUNT of any value in it
+                lowest, highest = bucket_bounds(index)
+                summary[f"p{percentile}"] = round(min((lowest + highest) / 2, maximum) / 1000, 3)
+                break
+    summary['max'] = round(maximum / 1000, 3)
+    return summary
+
+
+def rss_bytes():
+    """Resident set size (Linux), else the peak RSS"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Highest resident set size so far (ru_maxrss is in KiB on Linux)"""
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MetricsRegistry:
+    """Named metrics for one component and the reporter that publishes them
+
+    counter(), gauge() and histogram() return the existing metric for a
+    name, so they can be called wherever a metric is needed. Snapshots
+    include the process's RSS (current and peak), CPU use and thread count.
+    """
+
+    def __init__(self):
+        self.component = None
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.interval = 0.0
+        self.topic = None
+        self.path = None
+        self._lock = threading.Lock()
+        self._previous = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _get(self, metrics, name, kind):
+        with self._lock:
+            metric = metrics.get(name)
+            if metric is None:
+                metric = metrics[name] = kind(name)
+            return metric
+
+    def counter(self, name):
+        return self._get(self.counters, name, Counter)
+
+    def gauge(self, name, function=None):
+        gauge = self._get(self.gauges, name, Gauge)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name):
+        return self._get(self.histograms, name, Histogram)
+
+    def snapshot(self):
+        """Counters with their rate, gauges, and histograms since the previous snapshot"""
+        now = time.monotonic()
+        cpu = sum(os.times()[:2])
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = dict(self.histograms)
+        previous = self._previous or {'at': now, 'cpu': cpu, 'counters': {}, 'histograms': {}}
+        elapsed = now - previous['at']
+
+        snapshot = {
+            'component': self.component,
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'interval': round(elapsed, 3),
+            'counters': {},
+            'gauges': {
+                'rssBytes': rss_bytes(),
+                'peakRssBytes': peak_rss_bytes(),
+                'cpuPercent': round(100 * (cpu - previous['cpu']) / elapsed, 1) if elapsed > 0 else 0.0,
+                'threads': threading.active_count(),
+            },
+            'histograms': {},
+        }
+        totals = {}
+        for name, counter in counters.items():
+            value = totals[name] = counter.value()
+            rate = (value - previous['counters'].get(name, 0)) / elapsed if elapsed > 0 else 0.0
+            snapshot['counters'][name] = {'total': value, 'rate': round(rate, 3)}
+        for name, gauge in gauges.items():
+            snapshot['gauges'][name] = gauge.value()
+        histogram_totals = {}
+        for name, histogram in histograms.items():
+            counts, count, total, maximum = histogram_totals[name] = histogram.totals()
+            # Report the window since the previous snapshot
+            last_counts, last_count, last_total, _ = previous['histograms'].get(name, ({}, 0, 0, 0))
+            window = {index: n - last_counts.get(index, 0) for index, n in counts.items()
+                      if n > last_counts.get(index, 0)}
+            window_max = max((bucket_bounds(index)[1] for index in window), default=0)
+            snapshot['histograms'][name] = summarize(window, count - last_count, total - last_total,
+                                                     min(window_max, maximum))
+
+        self._previous = {'at': now, 'cpu': cpu, 'counters': totals, 'histograms': histogram_totals}
+        return snapshot
+
+    def start(self, component, interval=None, topic=None, path=None):
+        """Publish a snapshot every interval seconds to topic/<component> and/or append it to path
+
+        Unset arguments come from GG_METRICS_INTERVAL (0 disables the
+        reporter), GG_METRICS_TOPIC and GG_METRICS_FILE. The topic is only
+        used when IPC is available.
+        """
+        self.component = component
+        self.interval = float(interval if interval is not None else os.environ.get('GG_METRICS_INTERVAL', '0') or 0)
+        topic = topic if topic is not None else os.environ.get('GG_METRICS_TOPIC', '')
+        self.topic = f"{topic.rstrip('/')}/{component}" if topic and IPC_AVAILABLE else None
+        self.path = path if path is not None else os.environ.get('GG_METRICS_FILE') or None
+        self._previous = None
+        self.snapshot()
+        if self.interval <= 0 or not (self.topic or self.path) or self._thread is not None:
+            return False
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._report, name='metrics-reporter', daemon=True)
+        self._thread.start()
+        logger.info(f"Publishing metrics every {self.interval:g} s to "
+                    f"{' and '.join(filter(None, (self.topic, self.path)))}")
+        return True
+
+    def stop(self):
+        """Stop the reporter after publishing a final snapshot"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._stopped.set()
+        thread.join(timeout=5.0)
+        self.publish(self.snapshot())
+
+    def publish(self, snapshot):
+        payload = json.dumps(snapshot, separators=(',', ':'))
+        if self.topic:
+            try:
+                request = ipc_model.PublishToTopicRequest()
+                request.topic = self.topic
+                request.publish_message = ipc_model.PublishMessage()
+                request.publish_message.binary_message = ipc_model.BinaryMessage()
+                request.publish_message.binary_message.message = payload.encode('utf-8')
+                operation = ipc_client().new_publish_to_topic()
+                operation.activate(request)
+                operation.get_response().result(timeout=5.0)
+            except Exception as e:
+                logger.error(f"Failed to publish metrics to {self.topic}: {e}")
+        if self.path:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > MAX_FILE_BYTES:
+                    os.replace(self.path, self.path + '.1')
+                with open(self.path, 'a') as f:
+                    f.write(payload + '\n')
+            except OSError as e:
+                logger.error(f"Failed to write metrics to {self.path}: {e}")
+
+    def _report(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.publish(self.snapshot())
+            except Exception as e:
+                logger.error(f"Failed to report metrics: {e}")
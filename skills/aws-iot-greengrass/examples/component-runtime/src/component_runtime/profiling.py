@@ -0,0 +1,295 @@
+"""
+On-demand profiling of a running component, triggered by a signal or an
+IPC message, with results written to a directory for offline analysis.
+
+Nothing is installed unless a profile directory is configured: no signal
+handlers, no subscription, no threads, and cProfile and tracemalloc are not
+imported. Once installed, the hooks cost nothing until a profile is
+requested.
+"""
+
+import collections
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+from .imports import lazy_import
+from .ipc import IPC_AVAILABLE, ipc_client
+
+logger = logging.getLogger(__name__)
+
+cProfile = lazy_import('cProfile')
+tracemalloc = lazy_import('tracemalloc')
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+ipc_client_module = lazy_import('awsiot.greengrasscoreipc.client')
+
+ACTIONS = ('stacks', 'sample', 'cprofile', 'memory')
+# Longest profile a request may ask for
+MAX_DURATION = 600.0
+
+
+def format_stacks():
+    """Every thread's current stack, as text"""
+    frames = sys._current_frames()
+    lines = []
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        if frame is None:
+            continue
+        lines.append(f"Thread {thread.name} (ident {thread.ident}{', daemon' if thread.daemon else ''}):")
+        lines.extend(line.rstrip('\n') for line in traceback.format_stack(frame))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def sample_stacks(duration, interval, stop=None):
+    """Sample every other thread's stack for duration seconds; returns collapsed stacks and the sample count
+
+    Keys are 'thread;outermost;...;innermost' frames, as used by flame graph
+    tools. Sampling is by wall clock, so waiting threads show where they wait.
+    """
+    own = threading.get_ident()
+    counts = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline and not (stop and stop.is_set()):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+
+class ProfilingHooks:
+    """Signal and IPC triggers for profiles of the running component
+
+    SIGUSR1 writes every thread's stack, SIGUSR2 samples all threads for the
+    configured duration. A JSON message such as {"action": "cprofile",
+    "duration": 10} on <topic>/<component> runs any of ACTIONS; the result
+    file is published to <topic>/<component>/result. One profile runs at a
+    time.
+    """
+
+    def __init__(self):
+        self.component = None
+        self.directory = None
+        self.topic = None
+        self.duration = 30.0
+        self.sample_interval = 0.005
+        self.installed = False
+        self.operation = None
+        self._signals = False
+        self._previous_handlers = {}
+        self._main_calls = collections.deque()
+        self._lock = threading.Lock()
+        self._active = None
+        self._stopped = threading.Event()
+
+    def install(self, component, directory=None, topic=None, duration=None):
+        """Install the hooks if a profile directory is configured; returns whether they were installed
+
+        Unset arguments come from GG_PROFILE_DIR (empty disables profiling),
+        GG_PROFILE_TOPIC and GG_PROFILE_DURATION. Signals are only handled
+        when this is called on the main thread; cprofile needs them, because
+        it profiles the main thread.
+        """
+        directory = directory if directory is not None else os.environ.get('GG_PROFILE_DIR', '')
+        if not directory or self.installed:
+            return False
+        self.component = component
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.duration = float(duration if duration is not None else os.environ.get('GG_PROFILE_DURATION') or 30)
+        topic = topic if topic is not None else os.environ.get('GG_PROFILE_TOPIC', '')
+        self.installed = True
+        self._stopped.clear()
+
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGUSR1, signal.SIGUSR2):
+                self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+            self._signals = True
+        if topic and IPC_AVAILABLE:
+            self.topic = f"{topic.rstrip('/')}/{component}"
+            try:
+                self.subscribe()
+            except Exception as e:
+                logger.error(f"Failed to subscribe to profile requests on {self.topic}: {e}")
+                self.topic = None
+        triggers = ['SIGUSR1/SIGUSR2'] if self._signals else []
+        triggers += [self.topic] if self.topic else []
+        logger.info(f"Profiling hooks installed ({', '.join(triggers) or 'no triggers'}), writing to {directory}")
+        return True
+
+    def subscribe(self):
+        hooks = self
+
+        class RequestHandler(ipc_client_module.SubscribeToTopicStreamHandler):
+            def on_stream_event(self, event):
+                try:
+                    if event.binary_message is not None:
+                        body = json.loads(event.binary_message.message or b'{}')
+                    else:
+                        body = event.json_message.message or {}
+                    hooks.request(body.get('action', 'sample'), body.get('duration'))
+                except Exception as e:
+                    logger.error(f"Invalid profile request: {e}")
+
+            def on_stream_error(self, error):
+                logger.error(f"Profile request stream error: {error}")
+                return False  # Keep the stream open
+
+        request = ipc_model.SubscribeToTopicRequest()
+        request.topic = self.topic
+        self.operation = ipc_client().new_subscribe_to_topic(RequestHandler())
+        self.operation.activate(request)
+        self.operation.get_response().result(timeout=10.0)
+
+    def uninstall(self):
+        """Stop a running profile, close the subscription and restore the previous signal handlers"""
+        if not self.installed:
+            return
+        self.installed = False
+        self._stopped.set()
+        if self._signals and threading.current_thread() is threading.main_thread():
+            self._signals = False
+            for signum, handler in self._previous_handlers.items():
+                signal.signal(signum, handler)
+        if self.operation is not None:
+            try:
+                self.operation.close()
+            except Exception:
+                pass
+            self.operation = None
+
+    def request(self, action, duration=None):
+        """Start a profile in the background; returns False if it cannot start now"""
+        if action not in ACTIONS:
+            logger.error(f"Unknown profile action {action!r}; expected one of {', '.join(ACTIONS)}")
+            return False
+        if action == 'cprofile' and not self._signals:
+            logger.error("cprofile needs the hooks installed on the main thread")
+            return False
+        duration = min(float(duration or self.duration), MAX_DURATION)
+        with self._lock:
+            if self._active:
+                logger.warning(f"Ignoring {action} request: {self._active} profile still running")
+                return False
+            self._active = action
+        logger.info(f"Profiling: {action}" + ('' if action == 'stacks' else f" for {duration:g} s"))
+        threading.Thread(target=self._run, args=(action, duration), name='profiler', daemon=True).start()
+        return True
+
+    def _run(self, action, duration):
+        try:
+            path = getattr(self, f"_{action}")(duration)
+            if path:
+                logger.info(f"Profile written to {path}")
+                self._publish_result(action, path)
+        except Exception as e:
+            logger.error(f"{action} profile failed: {e}")
+        finally:
+            with self._lock:
+                self._active = None
+
+    def _path(self, action, suffix):
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        return os.path.join(self.directory, f"{self.component}-{action}-{stamp}.{suffix}")
+
+    def _stacks(self, duration):
+        path = self._path('stacks', 'txt')
+        with open(path, 'w') as f:
+            f.write(format_stacks())
+        return path
+
+    def _sample(self, duration):
+        counts, samples = sample_stacks(duration, self.sample_interval, self._stopped)
+        path = self._path('sample', 'collapsed')
+        with open(path, 'w') as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"{samples} samples of {len(counts)} distinct stacks")
+        return path
+
+    def _cprofile(self, duration):
+        profiler = cProfile.Profile()
+        # cProfile only sees the thread that enables it, so it is switched on and off on the main thread
+        self._call_on_main(profiler.enable)
+        self._stopped.wait(duration)
+        disabled = threading.Event()
+        self._call_on_main(lambda: (profiler.disable(), disabled.set()))
+        if not disabled.wait(10.0):
+            raise RuntimeError("main thread did not stop the profiler")
+        path = self._path('cprofile', 'pstats')
+        profiler.dump_stats(path)
+        return path
+
+    def _memory(self, duration):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            self._stopped.wait(duration)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+        before, after = before.filter_traces(ignore), after.filter_traces(ignore)
+        path = self._path('memory', 'txt')
+        with open(path, 'w') as f:
+            f.write(f"Traced {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB over {duration:g} s\n\n")
+            f.write("Largest allocations by line:\n")
+            f.writelines(f"{stat}\n" for stat in after.statistics('lineno')[:25])
+            f.write(f"\nGrowth over {duration:g} s by line:\n")
+            f.writelines(f"{stat}\n" for stat in after.compare_to(before, 'lineno')[:25])
+        after.dump(path[:-len('txt')] + 'tracemalloc')
+        return path
+
+    def _publish_result(self, action, path):
+        if not self.topic:
+            return
+        try:
+            request = ipc_model.PublishToTopicRequest()
+            request.topic = f"{self.topic}/result"
+            request.publish_message = ipc_model.PublishMessage()
+            request.publish_message.binary_message = ipc_model.BinaryMessage()
+            request.publish_message.binary_message.message = json.dumps({'action': action, 'file': path}).encode()
+            operation = ipc_client().new_publish_to_topic()
+            operation.activate(request)
+            operation.get_response().result(timeout=5.0)
+        except Exception as e:
+            logger.error(f"Failed to publish profile result: {e}")
+
+    def _call_on_main(self, function):
+        """Run function on the main thread, through the SIGUSR2 handler"""
+        if not self._signals:
+            # Uninstalled while profiling: SIGUSR2 no longer reaches _on_signal
+            function()
+            return
+        self._main_calls.append(function)
+        os.kill(os.getpid(), signal.SIGUSR2)
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGUSR2 and self._main_calls:
+            while self._main_calls:
+                self._main_calls.popleft()()
+            return
+        self.request('stacks' if signum == signal.SIGUSR1 else 'sample')
@@ -0,0 +1,134 @@
+"""
+Scheduling for the components' main loops.
+
+FixedRateScheduler runs a task on monotonic deadlines that advance from the
+schedule rather than from when the task finished, so publish latency does not
+accumulate as drift, and logs the achieved rate and jitter once per stats
+window. The wait for the next deadline ends early when the interval changes
+or the scheduler is stopped.
+
+run_until_signalled runs the asyncio entry points' main coroutine until
+SIGTERM or SIGINT cancels it.
+"""
+
+import json
+import logging
+import signal
+import threading
+import time
+
+from .imports import lazy_import
+
+logger = logging.getLogger(__name__)
+
+asyncio = lazy_import('asyncio')
+
+
+class FixedRateScheduler:
+    """Run a task on fixed monotonic deadlines so publish latency doesn't accumulate as drift"""
+
+    def __init__(self, interval, stats_interval=60.0):
+        if interval < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {interval}")
+        self.interval = float(interval)
+        self.stats_interval = float(stats_interval)
+        self.running = False
+        self.deadline = time.monotonic()
+        # Set to end the run loop's wait: the deadline moved or the scheduler stopped
+        self._wake = threading.Event()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start a new rate and jitter measurement window"""
+        self.window_start = time.monotonic()
+        self.ticks = 0
+        self.missed = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+
+    def stats(self):
+        """Achieved rate and jitter (lateness against the deadline) for the current window"""
+        elapsed = max(time.monotonic() - self.window_start, 1e-9)
+        return {
+            "targetRate": round(1.0 / self.interval, 3),
+            "achievedRate": round(self.ticks / elapsed, 3),
+            "meanJitterMs": round(1000 * self.jitter_total / self.ticks, 3) if self.ticks else 0.0,
+            "maxJitterMs": round(1000 * self.jitter_max, 3),
+            "missedTicks": self.missed
+        }
+
+    def set_interval(self, interval):
+        """Change the interval, keeping the time of the last tick as the phase"""
+        if interval < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {interval}")
+        self.deadline += float(interval) - self.interval
+        self.interval = float(interval)
+        self.reset_stats()
+        self._wake.set()
+
+    def start(self):
+        """Begin scheduling with the first tick due immediately"""
+        self.running = True
+        self._wake.clear()
+        self.reset_stats()
+        self.deadline = time.monotonic()
+
+    def delay(self):
+        """Seconds until the next tick is due"""
+        return self.deadline - time.monotonic()
+
+    def begin_tick(self):
+        """Record how late this tick started"""
+        lateness = max(0.0, time.monotonic() - self.deadline)
+        self.ticks += 1
+        self.jitter_total += lateness
+        self.jitter_max = max(self.jitter_max, lateness)
+
+    def end_tick(self):
+        """Advance to the next deadline and report stats when the window closes"""
+        # Deadlines advance from the schedule, not from when the task finished
+        self.deadline += self.interval
+        now = time.monotonic()
+        if now - self.deadline > self.interval:
+            # Skip ticks we are too late for instead of bursting to catch up
+            skipped = int((now - self.deadline) // self.interval)
+            self.missed += skipped
+            self.deadline += skipped * self.interval
+
+        if now - self.window_start >= self.stats_interval:
+            logger.info(f"Publish rate: {json.dumps(self.stats())}")
+            self.reset_stats()
+
+    def run(self, task):
+        """Call task once per interval until stop() is called"""
+        self.start()
+        while self.running:
+            delay = self.delay()
+            if delay > 0:
+                # Check again after waking: the deadline may have moved
+                if self._wake.wait(delay):
+                    self._wake.clear()
+                continue
+            self.begin_tick()
+            task()
+            self.end_tick()
+
+    def stop(self):
+        """Stop the run loop after the current tick, or at once if it is waiting for one"""
+        self.running = False
+        self._wake.set()
+
+
+async def run_until_signalled(coro):
+    """Run coro until it finishes or SIGTERM/SIGINT cancels it"""
+    task = asyncio.ensure_future(coro)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
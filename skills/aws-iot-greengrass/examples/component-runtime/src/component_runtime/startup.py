@@ -0,0 +1,70 @@
+"""
+Startup-time profile: process start to ready, split into phases.
+"""
+
+import os
+import threading
+import time
+
+from .imports import ImportTimer
+
+
+def process_age():
+    """Seconds since this process started (Linux), or None when unknown"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may contain spaces; starttime is field 22
+            fields = f.read().rpartition(')')[2].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """Phase timings from process start until the component reports ready"""
+
+    def __init__(self, enabled=False):
+        now = time.perf_counter()
+        self.enabled = enabled
+        age = process_age()
+        self.started = now - age if age is not None else now
+        self.marks = [('interpreter', now)] if age is not None else []
+        self.last = now
+        self.ready_at = None
+        self.is_ready = threading.Event()
+        self.import_timer = ImportTimer().install() if enabled else None
+
+    def mark(self, phase):
+        """End the current phase and name it"""
+        now = time.perf_counter()
+        self.marks.append((phase, now))
+        self.last = now
+
+    def elapsed(self):
+        return (self.ready_at or time.perf_counter()) - self.started
+
+    def ready(self, logger):
+        """Mark the component ready and log the startup time, with the full profile when enabled"""
+        if self.is_ready.is_set():
+            return
+        self.mark('ready')
+        self.ready_at = self.last
+        self.is_ready.set()
+        logger.info(f"Ready in {1000 * self.elapsed():.0f} ms")
+        if self.enabled:
+            self.import_timer.uninstall()
+            logger.info(f"Startup profile:\n{self.report()}")
+
+    def report(self, top=15):
+        lines = [f"{'phase':<24} {'ms':>9}"]
+        previous = self.started
+        for phase, at in self.marks:
+            lines.append(f"{phase:<24} {1000 * (at - previous):>9.1f}")
+            previous = at
+        lines.append(f"{'total':<24} {1000 * (previous - self.started):>9.1f}")
+        if self.import_timer is not None:
+            lines.append(f"{1000 * self.import_timer.total():.1f} ms importing; slowest imports:")
+            lines.append(self.import_timer.report(top))
+        return '\n'.join(lines)
@@ -0,0 +1,90 @@
+"""
+Per-hop and end-to-end latency percentiles from the trace files that
+components write with tracing (see tracing.py):
+
+    python3 -m component_runtime.trace_collector /tmp/traces.jsonl [--json]
+"""
+
+import argparse
+import json
+import math
+import sys
+
+PERCENTILES = (50, 90, 99)
+
+
+def read_traces(paths):
+    """Trace records from JSON lines files; lines that are not traces are skipped"""
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(trace, dict) and len(trace.get('hops') or ()) >= 2:
+                    yield trace
+
+
+def percentiles(values):
+    """count, p50, p90, p99 and max (nearest rank) of durations in microseconds, in milliseconds"""
+    values = sorted(values)
+    summary = {'count': len(values)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(values[max(0, math.ceil(len(values) * p / 100) - 1)] / 1000, 3)
+    summary['max'] = round(values[-1] / 1000, 3)
+    return summary
+
+
+def collect(traces):
+    """Latency percentiles per hop (from one stamp to the next) and end to end
+
+    Hops are named "<from> -> <to>" and listed in the order they first
+    appear. Traces are grouped by the path they took, since end-to-end
+    latency only compares like with like.
+    """
+    hops = {}
+    paths = {}
+    for trace in traces:
+        stamps = trace['hops']
+        for (first, started), (second, ended) in zip(stamps, stamps[1:]):
+            hops.setdefault(f"{first} -> {second}", []).append(ended - started)
+        components = [name.split('.')[0] for name, _ in stamps]
+        path = ' -> '.join(c for i, c in enumerate(components) if i == 0 or c != components[i - 1])
+        paths.setdefault(path, []).append(stamps[-1][1] - stamps[0][1])
+    return {
+        'traces': sum(len(durations) for durations in paths.values()),
+        'hops': {name: percentiles(durations) for name, durations in hops.items()},
+        'endToEnd': {path: percentiles(durations) for path, durations in paths.items()},
+    }
+
+
+def format_summary(summary):
+    """The collect() summary as text tables"""
+    columns = ('count', *(f"p{p}" for p in PERCENTILES), 'max')
+    lines = [f"{summary['traces']} traces; milliseconds"]
+    for title, rows in (('hop', summary['hops']), ('end to end', summary['endToEnd'])):
+        width = max([len(title), *map(len, rows)])
+        lines.append('')
+        lines.append(f"{title:<{width}}  " + ' '.join(f"{column:>9}" for column in columns))
+        for name, row in rows.items():
+            lines.append(f"{name:<{width}}  " + ' '.join(f"{row[column]:>9}" for column in columns))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m component_runtime.trace_collector',
+                                     description='Per-hop and end-to-end latency percentiles from trace files')
+    parser.add_argument('paths', nargs='+', help='trace files (JSON lines), e.g. /tmp/traces.jsonl')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+    summary = collect(read_traces(args.paths))
+    if not summary['traces']:
+        print("No traces found", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Trace context for following a message across IPC hops.
+
+The component that starts a trace adds a "trace" object to a message: a
+64-bit trace id and a list of hops, each a name ("<component>.<event>")
+and a timestamp. Components that receive the message append their own hops
+and pass the object on with what they publish; the one where the message
+ends writes it to its trace file as one JSON line:
+
+    {"id": "9f1c2e0b7a4d3658", "hops": [["IPCPublisher.generate", 81234567890],
+     ["IPCPublisher.publish", 81234567913], ["IPCSubscriber.receive", 81234568402], ...]}
+
+Timestamps are microseconds on the monotonic clock, which every process on
+a host shares, so hops stamped by different components can be subtracted
+and are not moved by wall clock steps. Traces therefore only span one host.
+
+Nothing is traced unless the component that starts traces has a trace rate
+above 0; a message without a trace costs one dict lookup per hop.
+trace_collector.py summarizes the trace files.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TRACE_KEY = 'trace'
+# Trace files are rolled over to <path>.1 beyond this size
+MAX_FILE_BYTES = 10 << 20
+# Records written between checks of the file size
+CHECK_EVERY = 1000
+
+
+def now():
+    """The current hop timestamp: microseconds on the monotonic clock"""
+    return time.monotonic_ns() // 1000
+
+
+class Tracer:
+    """Starts trace contexts, stamps hops on them and records the traces that end here"""
+
+    now = staticmethod(now)
+
+    def __init__(self):
+        self.rate = 0.0
+        self.path = None
+        self.started = 0
+        self.recorded = 0
+        self._fd = None
+        self._since_check = 0
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def install(self, rate=None, path=None):
+        """Configure tracing; returns whether this component starts traces
+
+        Unset arguments come from GG_TRACE_RATE (the fraction of messages
+        that start a trace, 0 by default) and GG_TRACE_FILE (where traces
+        that end in this component are appended; empty records nothing).
+        """
+        self.rate = float(rate if rate is not None else os.environ.get('GG_TRACE_RATE') or 0)
+        if not 0 <= self.rate <= 1:
+            raise ValueError(f"Trace rate must be between 0 and 1, got {self.rate}")
+        path = path if path is not None else os.environ.get('GG_TRACE_FILE', '')
+        self.close()
+        self.path = path or None
+        if self.rate:
+            logger.info(f"Tracing {self.rate:.0%} of messages"
+                        f"{f', recording to {self.path}' if self.path else ''}")
+        return self.rate > 0
+
+    def start(self, message, component, event):
+        """Add a new trace context to message, for the configured fraction of messages
+
+        Returns the trace, or None when this message is not traced.
+        """
+        if not self.rate or (self.rate < 1 and self._random.random() >= self.rate):
+            return None
+        self.started += 1
+        trace = message[TRACE_KEY] = {'id': f"{self._random.getrandbits(64):016x}",
+                                      'hops': [[f"{component}.{event}", now()]]}
+        return trace
+
+    def stamp(self, message, component, event, at=None):
+        """Append a hop to the message's trace, if it has one; returns the trace or None
+
+        at is the hop's timestamp from now(), for events that happened
+        before the message was decoded (such as its arrival).
+        """
+        trace = message.get(TRACE_KEY) if isinstance(message, dict) else None
+        if trace is not None:
+            self.hop(trace, component, event, at)
+        return trace
+
+    def hop(self, trace, component, event, at=None):
+        """Append a hop to a trace"""
+        trace['hops'].append([f"{component}.{event}", now() if at is None else at])
+
+    def end(self, trace, component, event, at=None):
+        """Append the last hop to a trace, and record it if a trace file is configured"""
+        if trace is None:
+            return
+        self.hop(trace, component, event, at)
+        if self.path:
+            self.record(trace)
+
+    def record(self, trace):
+        line = (json.dumps(trace, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            try:
+                if self._fd is None:
+                    self._open()
+                # One write per line with O_APPEND, so components sharing the file do not interleave
+                os.write(self._fd, line)
+                self.recorded += 1
+                self._since_check += 1
+                if self._since_check >= CHECK_EVERY:
+                    self._roll_over()
+            except OSError as e:
+                logger.error(f"Failed to record trace to {self.path}: {e}")
+                self._close_file()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._since_check = 0
+
+    def _roll_over(self):
+        """Start a new file when this one is too large, or another component rolled it over"""
+        self._since_check = 0
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self._fd)
+        if current is None or current.st_ino != opened.st_ino:
+            self._close_file()
+        elif opened.st_size > MAX_FILE_BYTES:
+            os.replace(self.path, self.path + '.1')
+            self._close_file()
+
+    def _close_file(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def close(self):
+        with self._lock:
+            self._close_file()
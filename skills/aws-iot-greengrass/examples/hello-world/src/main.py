@@ -1,72 +1,75 @@
 #!/usr/bin/env python3
 
 import json
-import logging
-import os
 import sys
-import time
-from pathlib import Path
+import threading
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger('HelloWorld')
+from component_runtime import ConfigWatcher, close_ipc_clients, env_config, set_level, setup_logging, startup
+
+logger = setup_logging('HelloWorld')
 
 class HelloWorldComponent:
     def __init__(self):
+        self.config_changed = threading.Event()
         self.config = self.load_configuration()
         self.setup_logging()
         
     def load_configuration(self):
-        """Load component configuration from Greengrass"""
+        """Load component configuration"""
+        defaults = {
+            "message": "Hello from Greengrass!",
+            "interval": 10,
+            "logLevel": "INFO"
+        }
+        variables = {
+            "message": ('GG_MESSAGE', str),
+            "interval": ('GG_INTERVAL', int),
+            "logLevel": ('GG_LOG_LEVEL', str)
+        }
         try:
-            # Default configuration
-            config = {
-                "message": "Hello from Greengrass!",
-                "interval": 10,
-                "logLevel": "INFO"
-            }
-            
-            # Try to load from Greengrass configuration
-            config_path = os.environ.get('AWS_GG_NUCLEUS_DOMAIN_SOCKET_FILEPATH_FOR_COMPONENT')
-            if config_path:
-                # In a real deployment, this would use the Greengrass IPC client
-                # For now, we'll use environment variables or default config
-                config["message"] = os.environ.get('GG_MESSAGE', config["message"])
-                config["interval"] = int(os.environ.get('GG_INTERVAL', config["interval"]))
-                config["logLevel"] = os.environ.get('GG_LOG_LEVEL', config["logLevel"])
-            
-            return config
+            config = env_config(defaults, variables)
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
-            return {
-                "message": "Hello from Greengrass!",
-                "interval": 10,
-                "logLevel": "INFO"
-            }
+            config = dict(defaults)
+        
+        # Deployed configuration replaces the environment values and is kept up to date
+        self.config_watcher = ConfigWatcher(config, variables, self.apply_configuration)
+        self.config_watcher.load()
+        startup.mark('configuration')
+        return config
     
     def setup_logging(self):
         """Configure logging based on component configuration"""
-        log_level = getattr(logging, self.config.get('logLevel', 'INFO').upper())
-        logger.setLevel(log_level)
+        set_level(logger, self.config.get('logLevel', 'INFO'))
+    
+    def apply_configuration(self, changes):
+        """Apply a configuration update without restarting"""
+        self.config.update(changes)
+        self.setup_logging()
+        # Start the new interval now rather than after the current sleep
+        self.config_changed.set()
         
     def run(self):
         """Main component loop"""
         logger.info("HelloWorld component starting...")
         logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+        self.config_watcher.watch()
+        startup.ready(logger)
         
         try:
             while True:
                 logger.info(self.config['message'])
-                time.sleep(self.config['interval'])
+                if self.config_changed.wait(self.config['interval']):
+                    self.config_changed.clear()
                 
         except KeyboardInterrupt:
             logger.info("HelloWorld component stopping...")
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
             sys.exit(1)
+        finally:
+            self.config_watcher.stop()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     component = HelloWorldComponent()
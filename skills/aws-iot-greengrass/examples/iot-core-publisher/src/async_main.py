@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import sys
+import time
+
+from component_runtime import (
+    close_ipc_clients, metrics, profiling, run_until_signalled, sampled, startup, topic_fields, tracing
+)
+from main import ENCODER_KEYS, FILTER_KEYS, INPUT_BACKLOG, IoTCorePublisher, logger
+
+
+class AsyncIoTCorePublisher(IoTCorePublisher):
+    """IoTCorePublisher driven by a single asyncio event loop
+
+    Publishes await the SDK response futures instead of blocking a thread, and
+    the spool drain runs as a task on the same loop. maxInFlight bounds the
+    number of outstanding publishes; values above 1 trade strict ordering for
+    throughput. Configuration updates are applied on the loop between ticks.
+    Readings from inputTopic are queued onto the loop in place of the ticks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tasks = set()
+        self.in_flight_limit = None
+        self.input_readings = None
+
+    def apply_configuration(self, changes):
+        """Apply a configuration update; runs on the event loop once it is running"""
+        if self.in_flight_limit is not None:
+            # Sent from here, so that the flushes in IoTCorePublisher.apply_configuration find nothing to block on
+            new_topic = changes.get('topic', self.config['topic'])
+            switching = (bool(self.devices) or bool(topic_fields(new_topic))) != self.multiplexed
+            if switching or FILTER_KEYS.intersection(changes):
+                for payload, traces, topic in self.filter_flushes():
+                    self.submit(payload, traces, topic)
+            if switching or ENCODER_KEYS.intersection(changes):
+                for payload, traces, topic in self.encoder_flushes():
+                    self.submit(payload, traces, topic)
+        super().apply_configuration(changes)
+        if 'maxInFlight' in changes and self.in_flight_limit is not None:
+            # Publishes holding the old semaphore release it as they finish
+            self.in_flight_limit = asyncio.Semaphore(self.config['maxInFlight'])
+
+    async def publish_payload_async(self, payload, topic=None):
+        """Publish an encoded payload to IoT Core, raising if the publish fails"""
+        started = time.perf_counter()
+        try:
+            operation = self.ipc_client.new_publish_to_iot_core()
+            operation.activate(self.build_publish_request(payload, topic))
+            await asyncio.wait_for(asyncio.wrap_future(operation.get_response()), timeout=10.0)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.publish_failed.inc()
+            raise
+        self.publish_latency.record(time.perf_counter() - started)
+        self.published.inc()
+
+    async def forward_async(self, payload, traces=(), topic=None):
+        """Publish a payload, or spool it while IoT Core is unreachable"""
+        topic = topic or self.default_topic()
+        if not self.ipc_client:
+            logger.log(self.publish_log_level, "[SIMULATION] Would publish to topic '%s': %s", topic,
+                       self.describe_payload(payload), extra=sampled('publish'))
+            self.end_traces(traces, 'publish')
+            return
+
+        async with self.in_flight_limit:
+            # While a backlog exists new payloads queue behind it to keep delivery in order
+            if not self.spool or (self.link_up and not self.spool.has_pending()):
+                try:
+                    await self.publish_payload_async(payload, topic)
+                    self.end_traces(traces, 'publish')
+                    logger.log(self.publish_log_level, "Published to IoT Core topic '%s': %s", topic,
+                               self.describe_payload(payload), extra=sampled('publish'))
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Failed to publish message: {e}")
+                    if not self.spool:
+                        return
+                    self.set_link_state(False, e)
+            self.spool.append(payload)
+            self.spooled.inc()
+            self.end_traces(traces, 'spool')
+
+    def submit(self, payload, traces=(), topic=None):
+        """Start forwarding a payload without waiting for the result"""
+        task = asyncio.get_running_loop().create_task(self.forward_async(payload, traces, topic))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def drain_spool_async(self):
+        """Forward spooled readings in rate-limited batches once IoT Core is reachable"""
+        batch_size = self.config['drainBatchSize']
+        batch_period = batch_size / self.config['drainRate']
+
+        while True:
+            batch = self.spool.read_batch(batch_size)
+            if not batch:
+                await asyncio.sleep(min(batch_period, self.config['reconnectInterval']))
+                continue
+
+            started = time.monotonic()
+            sent_position = None
+            failed = False
+            for payload, position in batch:
+                try:
+                    await self.publish_payload_async(payload, self.spooled_topic(payload))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.set_link_state(False, e)
+                    failed = True
+                    break
+                sent_position = position
+
+            if sent_position is not None:
+                self.spool.commit(sent_position)
+                self.set_link_state(True)
+
+            if failed:
+                await asyncio.sleep(self.config['reconnectInterval'])
+            else:
+                await asyncio.sleep(max(0.0, started + batch_period - time.monotonic()))
+
+    def enqueue_input(self, readings):
+        """Runs on the event loop; drops readings when the queue is full"""
+        for reading in readings:
+            try:
+                self.input_readings.put_nowait(reading)
+            except asyncio.QueueFull:
+                logger.warning("Input reading dropped: %d readings waiting", INPUT_BACKLOG,
+                               extra=sampled('input-backlog'))
+
+    def offer(self, reading):
+        """Submit what the edge filter lets through of one reading"""
+        self.readings.inc()
+        stream = self.stream_for(reading['deviceId'])
+        for payload, traces in self.encode_readings(stream.edge_filter.offer(reading), stream):
+            self.submit(payload, traces, self.stream_topic(stream))
+
+    async def publish_input(self):
+        """Publish readings from inputTopic as they arrive, until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.input_readings = asyncio.Queue(INPUT_BACKLOG)
+        subscribed = self.subscribe_input(lambda readings: loop.call_soon_threadsafe(self.enqueue_input, readings))
+        await asyncio.wait_for(asyncio.wrap_future(subscribed), timeout=10.0)
+        while True:
+            self.offer(await self.input_readings.get())
+            if len(self.tasks) >= self.config['maxInFlight']:
+                await asyncio.wait(set(self.tasks), return_when=asyncio.FIRST_COMPLETED)
+
+    async def run_async(self):
+        """Publish on the fixed-rate schedule, or readings from inputTopic, until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.in_flight_limit = asyncio.Semaphore(self.config['maxInFlight'])
+        self.config_watcher.run_on(loop)
+        drain = loop.create_task(self.drain_spool_async()) if self.spool and self.ipc_client else None
+        scheduler = self.scheduler
+        try:
+            if self.config['inputTopic'] and self.ipc_client:
+                await self.publish_input()
+            scheduler.start()
+            while scheduler.running:
+                delay = scheduler.delay()
+                if delay > 0:
+                    # Check again after waking: the rate limit may hold the next device back
+                    await asyncio.sleep(delay)
+                    continue
+                # A virtual device when devices are configured, otherwise None
+                device = scheduler.begin_tick()
+                self.offer(self.generate_sensor_data(device))
+                scheduler.end_tick()
+                if len(self.tasks) >= self.config['maxInFlight']:
+                    await asyncio.wait(set(self.tasks), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.config_watcher.stop()
+            self.close_input()
+            scheduler.stop()
+            for payload, traces, topic in self.filter_flushes():
+                self.submit(payload, traces, topic)
+            for payload, traces, topic in self.encoder_flushes():
+                self.submit(payload, traces, topic)
+            if self.tasks:
+                await asyncio.wait(set(self.tasks), timeout=10.0)
+            if drain:
+                drain.cancel()
+                await asyncio.gather(drain, return_exceptions=True)
+            if self.spool:
+                self.spool.close()
+            self.log_compression()
+
+    def run(self):
+        """Main component loop"""
+        logger.info("Async IoT Core Publisher component starting...")
+        logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+        self.config_watcher.watch()
+        tracing.install()
+        metrics.gauge('inFlight', lambda: len(self.tasks))
+        metrics.start('AsyncIoTCorePublisher')
+        profiling.install('AsyncIoTCorePublisher')
+        startup.ready(logger)
+
+        try:
+            asyncio.run(run_until_signalled(self.run_async()))
+            logger.info("Async IoT Core Publisher component stopping...")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            sys.exit(1)
+        finally:
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            close_ipc_clients()
+
+
+if __name__ == "__main__":
+    publisher = AsyncIoTCorePublisher()
+    publisher.run()
@@ -0,0 +1,208 @@
+import json
+import logging
+from array import array
+from datetime import datetime, timezone
+
+from component_runtime import lazy_import
+
+# Loaded only when a binary encoding is configured
+cbor2 = lazy_import('cbor2')
+CBOR_AVAILABLE = cbor2 is not None
+
+msgpack = lazy_import('msgpack')
+MSGPACK_AVAILABLE = msgpack is not None
+
+logger = logging.getLogger('IoTCorePublisher.Encoding')
+
+ENCODINGS = ('json', 'cbor', 'msgpack')
+LAYOUTS = ('record', 'columnar')
+
+# Fields shared by every reading from one publisher; columnar batches send them once
+HEADER_FIELDS = ('deviceId', 'sensorType', 'unit')
+
+
+def serialize(obj, encoding):
+    """Serialize a JSON-compatible object with the given encoding"""
+    if encoding == 'cbor':
+        return cbor2.dumps(obj)
+    if encoding == 'msgpack':
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def deserialize(payload, encoding):
+    """Inverse of serialize()"""
+    if encoding == 'cbor':
+        return cbor2.loads(payload)
+    if encoding == 'msgpack':
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+
+def to_epoch_ms(timestamp):
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def from_epoch_ms(epoch_ms):
+    return datetime.fromtimestamp(epoch_ms / 1000, timezone.utc).isoformat()
+
+
+class ColumnBuffer:
+    """Readings waiting for a columnar batch, stored as the batch's columns
+
+    A buffered reading dict costs several hundred bytes; here a reading takes
+    three 8-byte array slots, plus its quality when that is not "good".
+    """
+
+    __slots__ = ('header', 'values', 'timestamps', 'sequence', 'quality')
+
+    def __init__(self):
+        self.header = None
+        self.values = array('d')
+        self.timestamps = array('q')
+        # None once a reading without a sequence number is added
+        self.sequence = array('q')
+        self.quality = {}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, reading):
+        if self.header is None:
+            self.header = {field: reading[field] for field in HEADER_FIELDS if field in reading}
+        index = len(self.timestamps)
+        value = reading['value']
+        if type(value) is not float and isinstance(self.values, array):
+            # Keep ints and other values exactly as given
+            self.values = self.values.tolist()
+        self.values.append(value)
+        self.timestamps.append(to_epoch_ms(reading['timestamp']))
+        sequence = reading.get('sequenceNumber')
+        if sequence is None or self.sequence is None:
+            self.sequence = None
+        else:
+            self.sequence.append(sequence)
+        if reading.get('quality', 'good') != 'good':
+            self.quality[str(index)] = reading['quality']
+
+
+class PayloadEncoder:
+    """Turn readings into IoT Core payloads in the configured encoding and layout
+
+    The record layout publishes one object per reading. The columnar layout
+    buffers batch_size readings and publishes them as one payload: the shared
+    header fields appear once, and values, timestamps (epoch milliseconds,
+    optionally delta-encoded) and sequence numbers are stored as parallel arrays.
+    """
+
+    def __init__(self, encoding='json', layout='record', batch_size=1, delta_timestamps=True):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding: {encoding} (expected one of {', '.join(ENCODINGS)})")
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unsupported payloadLayout: {layout} (expected one of {', '.join(LAYOUTS)})")
+        if encoding == 'cbor' and not CBOR_AVAILABLE:
+            raise ValueError("encoding 'cbor' requires the cbor2 package (pip3 install cbor2)")
+        if encoding == 'msgpack' and not MSGPACK_AVAILABLE:
+            raise ValueError("encoding 'msgpack' requires the msgpack package (pip3 install msgpack)")
+        self.encoding = encoding
+        self.layout = layout
+        self.batch_size = max(1, batch_size) if layout == 'columnar' else 1
+        self.delta_timestamps = delta_timestamps
+        self.pending = ColumnBuffer()
+
+    def encode(self, reading):
+        """Add a reading; returns a payload when one is ready, otherwise None"""
+        if self.layout == 'record':
+            if self.encoding == 'json':
+                # Unchanged verbose format for existing consumers
+                return json.dumps(reading).encode('utf-8')
+            return serialize(reading, self.encoding)
+
+        self.pending.append(reading)
+        if len(self.pending) < self.batch_size:
+            return None
+        return self.flush()
+
+    def flush(self):
+        """Encode any buffered readings now, or return None if there are none"""
+        if not self.pending:
+            return None
+        columns, self.pending = self.pending, ColumnBuffer()
+        return serialize(self.build_columnar(columns), self.encoding)
+
+    def build_columnar(self, columns):
+        """Build a columnar batch object from buffered readings that share the header fields"""
+        timestamps = columns.timestamps.tolist()
+        batch = dict(columns.header)
+        batch['count'] = len(columns)
+        if self.delta_timestamps:
+            # Each entry is milliseconds since the previous reading; the first is absolute
+            batch['timestampDeltas'] = [timestamps[0]] + [b - a for a, b in zip(timestamps, timestamps[1:])]
+        else:
+            batch['timestamps'] = timestamps
+        batch['values'] = columns.values.tolist() if isinstance(columns.values, array) else columns.values
+
+        if columns.sequence is not None:
+            sequence = columns.sequence
+            if all(b - a == 1 for a, b in zip(sequence, sequence[1:])):
+                batch['firstSequenceNumber'] = sequence[0]
+            else:
+                batch['sequenceNumbers'] = sequence.tolist()
+
+        # Quality is almost always "good", so only the exceptions are sent
+        if columns.quality:
+            batch['quality'] = columns.quality
+        return batch
+
+
+def payload_device_id(payload, encoding='json'):
+    """The deviceId a payload carries, or None
+
+    Tries the given encoding first, then the other installed ones: a payload
+    spooled before an encoding change is still in the old encoding.
+    """
+    available = {'json': True, 'cbor': CBOR_AVAILABLE, 'msgpack': MSGPACK_AVAILABLE}
+    for candidate in dict.fromkeys((encoding, *ENCODINGS)):
+        if not available.get(candidate):
+            continue
+        try:
+            obj = deserialize(payload, candidate)
+        except Exception:
+            continue
+        if isinstance(obj, dict) and isinstance(obj.get('deviceId'), str):
+            return obj['deviceId']
+    return None
+
+
+def decode_payload(payload, encoding='json'):
+    """Decode a payload produced by PayloadEncoder back into a list of reading dicts"""
+    obj = deserialize(payload, encoding)
+    if 'values' not in obj:
+        return [obj]
+
+    if 'timestampDeltas' in obj:
+        timestamps = []
+        current = 0
+        for delta in obj['timestampDeltas']:
+            current += delta
+            timestamps.append(current)
+    else:
+        timestamps = obj['timestamps']
+
+    count = obj['count']
+    if 'firstSequenceNumber' in obj:
+        sequence = list(range(obj['firstSequenceNumber'], obj['firstSequenceNumber'] + count))
+    else:
+        sequence = obj.get('sequenceNumbers', [None] * count)
+    quality = obj.get('quality', {})
+
+    readings = []
+    for i in range(count):
+        reading = {field: obj[field] for field in HEADER_FIELDS if field in obj}
+        reading['value'] = obj['values'][i]
+        reading['timestamp'] = from_epoch_ms(timestamps[i])
+        if sequence[i] is not None:
+            reading['sequenceNumber'] = sequence[i]
+        reading['quality'] = quality.get(str(i), 'good')
+        readings.append(reading)
+    return readings
@@ -0,0 +1,205 @@
+"""
+Report-by-exception filtering: readings that do not change meaningfully are
+not published.
+
+Filters are configured per sensorType. A deadband filter sends a reading
+when it moves more than the deadband from the last one sent; consumers hold
+the last value. A swinging door filter sends the readings where the signal
+bends; consumers interpolate linearly between them. Both guarantee that the
+reconstructed signal is never further than the configured tolerance from
+any reading.
+"""
+
+import math
+
+from encoding import to_epoch_ms
+
+METHODS = ('none', 'deadband', 'swingingDoor')
+SETTINGS = {
+    'none': {'method', 'maxSilence'},
+    'deadband': {'method', 'deadband', 'deadbandPercent', 'maxSilence'},
+    'swingingDoor': {'method', 'deviation', 'maxSilence'},
+}
+
+
+class EdgeFilter:
+    """Publish every reading; the base of the report-by-exception filters
+
+    Subclasses choose in select() which readings go out. Readings whose
+    quality is not "good" are always sent, and with max_silence a reading is
+    sent at least that often (a heartbeat), so consumers can tell a steady
+    value from a silent sensor.
+    """
+
+    method = 'none'
+
+    def __init__(self, max_silence=0.0):
+        self.max_silence = float(max_silence)
+        # Reading time (epoch seconds) of the last reading sent
+        self.last_sent = None
+        self.offered = 0
+        self.sent = 0
+
+    def offer(self, reading):
+        """The readings to publish, oldest first, now that this one has arrived"""
+        self.offered += 1
+        t = to_epoch_ms(reading['timestamp']) / 1000
+        force = (self.last_sent is None or reading.get('quality', 'good') != 'good'
+                 or (self.max_silence and t - self.last_sent >= self.max_silence))
+        return self.sending(self.select(reading, t, force))
+
+    def flush(self):
+        """Readings held back to decide later, to send before the filter is replaced"""
+        return self.sending(self.release())
+
+    def select(self, reading, t, force):
+        return [(t, reading)]
+
+    def release(self):
+        return []
+
+    def sending(self, selected):
+        if not selected:
+            return []
+        self.sent += len(selected)
+        self.last_sent = selected[-1][0]
+        return [reading for _, reading in selected]
+
+    def compression_ratio(self):
+        """Readings offered per reading sent"""
+        return self.offered / self.sent if self.sent else 0.0
+
+
+class DeadbandFilter(EdgeFilter):
+    """Send a reading when it differs from the last one sent by more than the deadband
+
+    The deadband is absolute, or a percentage of the last value sent.
+    """
+
+    method = 'deadband'
+
+    def __init__(self, deadband, percent=False, max_silence=0.0):
+        super().__init__(max_silence)
+        self.deadband = float(deadband)
+        self.percent = percent
+        self.last_value = None
+
+    def select(self, reading, t, force):
+        value = reading['value']
+        if not force and self.last_value is not None:
+            threshold = self.deadband * abs(self.last_value) / 100 if self.percent else self.deadband
+            if abs(value - self.last_value) <= threshold:
+                return []
+        self.last_value = value
+        return [(t, reading)]
+
+
+class SwingingDoorFilter(EdgeFilter):
+    """Swinging door trending: send the readings where a straight line stops fitting
+
+    From the last reading sent (the anchor), the line to the newest reading
+    must pass within deviation of every reading skipped since. The slopes
+    that allow this narrow as readings arrive (the doors swing shut); when
+    the newest reading falls outside them, the previous reading is sent and
+    becomes the anchor. A reading is therefore sent one reading late, and
+    the one still held back is sent by flush().
+    """
+
+    method = 'swingingDoor'
+
+    def __init__(self, deviation, max_silence=0.0):
+        super().__init__(max_silence)
+        self.deviation = float(deviation)
+        self.anchor = None
+        self.held = None
+        self.reset_doors()
+
+    def reset_doors(self):
+        # Slopes from the anchor that keep every skipped reading within deviation
+        self.lower_slope = -math.inf
+        self.upper_slope = math.inf
+
+    def narrow_doors(self, t, value):
+        anchor_t, anchor_value = self.anchor
+        # Readings in the same millisecond as the anchor count as 1 ms later
+        elapsed = max(t - anchor_t, 0.001)
+        self.lower_slope = max(self.lower_slope, (value - anchor_value - self.deviation) / elapsed)
+        self.upper_slope = min(self.upper_slope, (value - anchor_value + self.deviation) / elapsed)
+
+    def select(self, reading, t, force):
+        value = reading['value']
+        selected = []
+        if self.anchor is None:
+            force = True
+        elif self.held is not None:
+            anchor_t, anchor_value = self.anchor
+            slope = (value - anchor_value) / max(t - anchor_t, 0.001)
+            if not self.lower_slope <= slope <= self.upper_slope:
+                # The held reading ends the segment and starts the next one
+                held_t, held = self.held
+                selected.append(self.held)
+                self.anchor = (held_t, held['value'])
+                self.reset_doors()
+        if force:
+            selected.append((t, reading))
+            self.anchor = (t, value)
+            self.held = None
+            self.reset_doors()
+        else:
+            self.held = (t, reading)
+            self.narrow_doors(t, value)
+        return selected
+
+    def release(self):
+        if self.held is None:
+            return []
+        held_t, held = self.held
+        self.anchor = (held_t, held['value'])
+        self.held = None
+        self.reset_doors()
+        return [(held_t, held)]
+
+
+def create_filter(settings=None):
+    """An EdgeFilter for one sensor type's settings (None publishes every reading)
+
+    Raises ValueError for settings that cannot be used.
+    """
+    settings = settings or {}
+    if not isinstance(settings, dict):
+        raise ValueError(f"Filter settings must be an object, got {settings!r}")
+    method = settings.get('method', 'none')
+    if method not in METHODS:
+        raise ValueError(f"Unsupported filter method: {method} (expected one of {', '.join(METHODS)})")
+    unknown = set(settings) - SETTINGS[method]
+    if unknown:
+        raise ValueError(f"Unknown {method} filter settings: {', '.join(sorted(unknown))}")
+    max_silence = float(settings.get('maxSilence', 0))
+    if max_silence < 0:
+        raise ValueError(f"maxSilence must not be negative, got {max_silence}")
+
+    if method == 'deadband':
+        if ('deadband' in settings) == ('deadbandPercent' in settings):
+            raise ValueError("A deadband filter needs exactly one of deadband and deadbandPercent")
+        percent = 'deadbandPercent' in settings
+        deadband = float(settings['deadbandPercent' if percent else 'deadband'])
+        if deadband < 0:
+            raise ValueError(f"Deadband must not be negative, got {deadband}")
+        return DeadbandFilter(deadband, percent=percent, max_silence=max_silence)
+    if method == 'swingingDoor':
+        deviation = float(settings.get('deviation', 0))
+        if deviation <= 0:
+            raise ValueError(f"A swingingDoor filter needs a positive deviation, got {deviation}")
+        return SwingingDoorFilter(deviation, max_silence=max_silence)
+    return EdgeFilter(max_silence)
+
+
+def validate_filters(filters):
+    """Raise ValueError unless filters maps sensor types to usable settings"""
+    if not isinstance(filters, dict):
+        raise ValueError(f"filters must map sensor types to filter settings, got {filters!r}")
+    for sensor_type, settings in filters.items():
+        try:
+            create_filter(settings)
+        except ValueError as e:
+            raise ValueError(f"filters.{sensor_type}: {e}") from None
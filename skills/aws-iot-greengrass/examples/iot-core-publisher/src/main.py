@@ -1,70 +1,271 @@
 #!/usr/bin/env python3
 
+import itertools
 import json
 import logging
-import os
+import queue
 import random
 import sys
+import threading
 import time
 from datetime import datetime, timezone
 
-try:
-    import awsiot.greengrasscoreipc
-    from awsiot.greengrasscoreipc.model import (
-        IoTCoreMessage,
-        PublishToIoTCoreRequest,
-        QOS
-    )
-    GREENGRASS_IPC_AVAILABLE = True
-except ImportError:
-    GREENGRASS_IPC_AVAILABLE = False
-    logging.warning("Greengrass IPC not available - running in simulation mode")
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from component_runtime import (
+    ConfigWatcher, DeviceScheduler, FixedRateScheduler, close_ipc_clients, create_devices, env_bool, env_config,
+    ipc_client, lazy, lazy_import, metrics, profiling, render_topic, sampled, set_topics, setup_logging, startup,
+    topic_fields, tracing
 )
-logger = logging.getLogger('IoTCorePublisher')
+from encoding import PayloadEncoder, payload_device_id
+from filtering import create_filter, validate_filters
+from spool import DiskSpool
+
+logger = setup_logging('IoTCorePublisher')
+
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+ipc_client_module = lazy_import('awsiot.greengrasscoreipc.client')
+GREENGRASS_IPC_AVAILABLE = ipc_model is not None
+if not GREENGRASS_IPC_AVAILABLE:
+    logger.warning("Greengrass IPC not available - running in simulation mode")
+
+# Settings that need a new PayloadEncoder when they change
+ENCODER_KEYS = {'encoding', 'payloadLayout', 'batchSize', 'deltaTimestamps'}
+# Settings that need a new edge filter when they change
+FILTER_KEYS = {'filters', 'sensorType'}
+# Readings from inputTopic waiting to be published; more are dropped
+INPUT_BACKLOG = 10000
+
+
+def describe_payload(payload, encoding):
+    """Render a payload for log messages"""
+    if encoding == 'json':
+        return payload.decode('utf-8')
+    return f"<{len(payload)} bytes {encoding}>"
+
+
+def input_reading(message, config):
+    """The reading to publish for a message from inputTopic, or None if it has no value for sensorType
+
+    Takes readings in this component's format or the sensor simulator's
+    ({"sensorId", "sensorType", "value"}), and IPC publisher messages, whose
+    "data" holds a value per sensor type. A trace context is kept.
+    """
+    if 'value' in message:
+        if message.get('sensorType', config['sensorType']) != config['sensorType']:
+            return None
+        value = message['value']
+    else:
+        value = (message.get('data') or {}).get(config['sensorType'])
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+
+    reading = {
+        "deviceId": message.get('deviceId') or message.get('sensorId') or config['deviceId'],
+        "sensorType": config['sensorType'],
+        "value": value,
+        "unit": message.get('unit') or ("°C" if config['sensorType'] == "temperature" else "units"),
+        "timestamp": message.get('timestamp') or datetime.now(timezone.utc).isoformat()
+    }
+    if message.get('sequenceNumber') is not None:
+        reading['sequenceNumber'] = message['sequenceNumber']
+    reading['quality'] = message.get('quality', 'good')
+    if 'trace' in message:
+        reading['trace'] = message['trace']
+    return reading
+
+class DeviceStream:
+    """The edge filter and encoder state of one device's readings, when the publisher serves many devices"""
+    
+    __slots__ = ('topic', 'edge_filter', 'encoder', 'encoder_traces')
+    
+    def __init__(self, topic, edge_filter, encoder):
+        self.topic = topic
+        self.edge_filter = edge_filter
+        self.encoder = encoder
+        self.encoder_traces = []
 
 class IoTCorePublisher:
     def __init__(self):
         self.config = self.load_configuration()
         self.ipc_client = None
+        self.sequence = itertools.count(1)
+        # Per-message logs would dominate at sub-second intervals; the scheduler reports rate instead
+        self.publish_log_level = logging.INFO if self.config['interval'] >= 1 else logging.DEBUG
+        # Virtual devices share this process and its IPC connection, each on its own schedule
+        self.devices = create_devices(self.config['devices'], self.config['deviceId'])
+        set_topics(self.devices, self.config['topic'])
+        if self.devices:
+            self.scheduler = DeviceScheduler(self.devices, self.config['interval'], self.config['maxRate'],
+                                             self.config['statsInterval'])
+            logger.info(f"Publishing for {len(self.devices)} virtual devices")
+        else:
+            self.scheduler = FixedRateScheduler(self.config['interval'], self.config['statsInterval'])
+        # With virtual devices or a per-device topic, each deviceId gets its own filter, batches and topic
+        self.multiplexed = bool(self.devices) or bool(topic_fields(self.config['topic']))
+        self.streams = {}
+        self.link_up = True
+        self.stop_event = threading.Event()
+        self.drain_thread = None
+        self.spool = None
+        # Held for each scheduler tick and while a configuration update is applied
+        self.config_lock = threading.Lock()
+        self.encoder = self.create_encoder(self.config)
+        self.edge_filter = self.create_filter(self.config)
+        # Traces of the readings in the encoder's pending batch
+        self.encoder_traces = []
+        self.input_queue = queue.Queue(INPUT_BACKLOG)
+        self.input_operation = None
+        # Hop names in trace contexts
+        self.trace_name = type(self).__name__
+        self.readings = metrics.counter('readings')
+        self.reported = metrics.counter('reported')
+        self.published = metrics.counter('published')
+        self.publish_failed = metrics.counter('publishFailed')
+        self.spooled = metrics.counter('spooled')
+        self.publish_latency = metrics.histogram('publishLatency')
+        metrics.gauge('linkUp', lambda: self.link_up)
+        metrics.gauge('spoolPendingBytes', self.spool_pending_bytes)
+        metrics.gauge('compressionRatio', self.compression_ratio)
+        if self.multiplexed:
+            metrics.gauge('devices', lambda: len(self.streams))
         self.setup_ipc_client()
+        self.setup_spool()
         
     def load_configuration(self):
         """Load component configuration"""
         try:
-            config = {
+            variables = {
+                "topic": ('GG_TOPIC', str),
+                "interval": ('GG_INTERVAL', float),
+                "deviceId": ('GG_DEVICE_ID', str),
+                "sensorType": ('GG_SENSOR_TYPE', str),
+                "minValue": ('GG_MIN_VALUE', float),
+                "maxValue": ('GG_MAX_VALUE', float),
+                "qos": ('GG_QOS', int),
+                "statsInterval": ('GG_STATS_INTERVAL', float),
+                "spoolDirectory": ('GG_SPOOL_DIR', str),
+                "spoolMaxBytes": ('GG_SPOOL_MAX_BYTES', int),
+                "drainBatchSize": ('GG_DRAIN_BATCH_SIZE', int),
+                "drainRate": ('GG_DRAIN_RATE', float),
+                "reconnectInterval": ('GG_RECONNECT_INTERVAL', float),
+                "encoding": ('GG_ENCODING', str),
+                "payloadLayout": ('GG_PAYLOAD_LAYOUT', str),
+                "batchSize": ('GG_BATCH_SIZE', int),
+                "deltaTimestamps": ('GG_DELTA_TIMESTAMPS', env_bool),
+                "maxInFlight": ('GG_MAX_IN_FLIGHT', int),
+                "filters": ('GG_FILTERS', json.loads),
+                "inputTopic": ('GG_INPUT_TOPIC', str),
+                "devices": ('GG_DEVICES', json.loads),
+                "maxRate": ('GG_MAX_RATE', float)
+            }
+            config = env_config({
                 "topic": "sensor/data",
                 "interval": 30,
                 "deviceId": "sensor-001",
                 "sensorType": "temperature",
                 "minValue": 20.0,
                 "maxValue": 30.0,
-                "qos": 1
-            }
+                "qos": 1,
+                "statsInterval": 60,
+                "spoolDirectory": "/tmp/iot-core-publisher-spool",
+                "spoolMaxBytes": 10485760,
+                "drainBatchSize": 50,
+                "drainRate": 20.0,
+                "reconnectInterval": 5,
+                "encoding": "json",
+                "payloadLayout": "record",
+                "batchSize": 1,
+                "deltaTimestamps": True,
+                "maxInFlight": 1,
+                "filters": {},
+                "inputTopic": "",
+                "devices": [],
+                "maxRate": 0
+            }, variables)
             
-            # Load from environment variables (for testing)
-            config["topic"] = os.environ.get('GG_TOPIC', config["topic"])
-            config["interval"] = int(os.environ.get('GG_INTERVAL', config["interval"]))
-            config["deviceId"] = os.environ.get('GG_DEVICE_ID', config["deviceId"])
-            config["sensorType"] = os.environ.get('GG_SENSOR_TYPE', config["sensorType"])
-            config["minValue"] = float(os.environ.get('GG_MIN_VALUE', config["minValue"]))
-            config["maxValue"] = float(os.environ.get('GG_MAX_VALUE', config["maxValue"]))
-            config["qos"] = int(os.environ.get('GG_QOS', config["qos"]))
+            # Deployed configuration replaces the environment values and is kept up to date;
+            # the spool stays where it was opened, the input subscription where it was made
+            # and the virtual devices as they were created until the component restarts
+            self.config_watcher = ConfigWatcher(config, variables, self.apply_configuration,
+                                                validate=self.validate_configuration,
+                                                restart_keys=('spoolDirectory', 'inputTopic', 'devices'))
+            self.config_watcher.load()
             
+            startup.mark('configuration')
             return config
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             raise
     
+    def validate_configuration(self, config):
+        """Raise ValueError for settings the publisher cannot run with"""
+        if config['interval'] < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {config['interval']}")
+        if config['drainBatchSize'] < 1 or config['drainRate'] <= 0 or config['maxInFlight'] < 1:
+            raise ValueError("drainBatchSize and maxInFlight must be at least 1 and drainRate positive")
+        if config['maxRate'] < 0:
+            raise ValueError(f"maxRate must not be negative, got {config['maxRate']}")
+        self.create_encoder(config)
+        validate_filters(config['filters'])
+        create_devices(config['devices'], config['deviceId'])
+        topic_fields(config['topic'])
+    
+    def create_encoder(self, config):
+        """A PayloadEncoder for the configured encoding and layout"""
+        return PayloadEncoder(
+            encoding=config['encoding'],
+            layout=config['payloadLayout'],
+            batch_size=config['batchSize'],
+            delta_timestamps=config['deltaTimestamps']
+        )
+    
+    def create_filter(self, config):
+        """The edge filter configured for the sensor type (publishes every reading if there is none)"""
+        return create_filter(config['filters'].get(config['sensorType']))
+    
+    def apply_configuration(self, changes):
+        """Apply a configuration update between scheduler ticks without restarting"""
+        with self.config_lock:
+            config = {**self.config, **changes}
+            multiplexed = bool(self.devices) or bool(topic_fields(config['topic']))
+            if multiplexed != self.multiplexed:
+                # Between one stream and a stream per device: everything held is sent to the old topics
+                self.flush_filter()
+                self.flush_encoder()
+                self.multiplexed = multiplexed
+                self.streams = {}
+            if FILTER_KEYS.intersection(changes):
+                # A reading the old filter held back is sent before the filter is replaced
+                self.flush_filter()
+                for stream in self.all_streams():
+                    stream.edge_filter = self.create_filter(config)
+                self.edge_filter = self.create_filter(config)
+            if ENCODER_KEYS.intersection(changes):
+                # Readings batched under the old settings are sent in the old encoding
+                self.flush_encoder()
+                for stream in self.all_streams():
+                    stream.encoder = self.create_encoder(config)
+                self.encoder = self.create_encoder(config)
+            self.config.update(changes)
+            if 'topic' in changes:
+                set_topics(self.devices, self.config['topic'])
+                for device_id, stream in self.streams.items():
+                    stream.topic = render_topic(self.config['topic'], device_id)
+            if 'maxRate' in changes and self.devices:
+                self.scheduler.set_max_rate(self.config['maxRate'])
+            if 'interval' in changes:
+                self.scheduler.set_interval(self.config['interval'])
+                self.publish_log_level = logging.INFO if self.config['interval'] >= 1 else logging.DEBUG
+            if 'statsInterval' in changes:
+                self.scheduler.stats_interval = float(self.config['statsInterval'])
+            if 'spoolMaxBytes' in changes and self.spool:
+                self.spool.max_bytes = self.config['spoolMaxBytes']
+    
     def setup_ipc_client(self):
         """Initialize Greengrass IPC client"""
         if GREENGRASS_IPC_AVAILABLE:
             try:
-                self.ipc_client = awsiot.greengrasscoreipc.connect()
+                self.ipc_client = ipc_client()
+                startup.mark('ipc connect')
                 logger.info("Connected to Greengrass IPC")
             except Exception as e:
                 logger.error(f"Failed to connect to Greengrass IPC: {e}")
@@ -72,60 +273,386 @@ class IoTCorePublisher:
         else:
             logger.info("Running in simulation mode - messages will be logged only")
     
-    def generate_sensor_data(self):
-        """Generate simulated sensor data"""
+    def setup_spool(self):
+        """Open the store-and-forward spool (an empty spoolDirectory disables spooling)"""
+        if not self.config['spoolDirectory']:
+            logger.info("Spooling disabled - publish failures will stop the component")
+            return
+        try:
+            self.spool = DiskSpool(self.config['spoolDirectory'], max_bytes=self.config['spoolMaxBytes'])
+            logger.info(f"Spooling offline readings to {self.config['spoolDirectory']}")
+        except Exception as e:
+            logger.error(f"Failed to open spool: {e}")
+            raise
+    
+    def generate_sensor_data(self, device=None):
+        """Generate simulated sensor data, as the component's device or a virtual one"""
         value = random.uniform(self.config['minValue'], self.config['maxValue'])
         
         data = {
-            "deviceId": self.config['deviceId'],
+            "deviceId": device.device_id if device else self.config['deviceId'],
             "sensorType": self.config['sensorType'],
             "value": round(value, 2),
             "unit": "°C" if self.config['sensorType'] == "temperature" else "units",
             "timestamp": datetime.now(timezone.utc).isoformat(),
+            "sequenceNumber": device.next_sequence() if device else next(self.sequence),
             "quality": "good"
         }
+        tracing.start(data, self.trace_name, 'generate')
         
         return data
     
-    def publish_to_iot_core(self, message_data):
-        """Publish message to IoT Core"""
+    def default_topic(self):
+        """The topic of the component's own device"""
+        return render_topic(self.config['topic'], self.config['deviceId'])
+    
+    def spooled_topic(self, payload):
+        """The topic for a spooled payload: a per-device topic is rendered from the deviceId it carries"""
+        if '{' not in self.config['topic']:
+            return self.config['topic']
+        device_id = payload_device_id(payload, self.encoder.encoding)
+        return render_topic(self.config['topic'], device_id) if device_id else self.default_topic()
+    
+    def build_publish_request(self, payload, topic=None):
+        """Build a PublishToIoTCore request for an encoded payload, to the component's topic unless one is given"""
+        qos_map = {0: ipc_model.QOS.AT_MOST_ONCE, 1: ipc_model.QOS.AT_LEAST_ONCE}
+        qos = qos_map.get(self.config['qos'], ipc_model.QOS.AT_LEAST_ONCE)
+        
+        request = ipc_model.PublishToIoTCoreRequest()
+        request.topic_name = topic or self.default_topic()
+        request.payload = payload
+        request.qos = qos
+        return request
+    
+    def publish_payload(self, payload, topic=None):
+        """Publish an encoded payload to IoT Core, raising if the publish fails"""
+        started = time.perf_counter()
+        try:
+            operation = self.ipc_client.new_publish_to_iot_core()
+            operation.activate(self.build_publish_request(payload, topic))
+            future = operation.get_response()
+            future.result(timeout=10.0)
+        except Exception:
+            self.publish_failed.inc()
+            raise
+        self.publish_latency.record(time.perf_counter() - started)
+        self.published.inc()
+    
+    def describe_payload(self, payload):
+        """A log argument rendering the payload, only if the record is written"""
+        return lazy(describe_payload, payload, self.encoder.encoding)
+    
+    def publish_to_iot_core(self, payload, topic=None):
+        """Publish an encoded payload to IoT Core"""
+        topic = topic or self.default_topic()
         try:
-            message_json = json.dumps(message_data)
-            
             if self.ipc_client:
                 # Real Greengrass deployment
-                qos_map = {0: QOS.AT_MOST_ONCE, 1: QOS.AT_LEAST_ONCE}
-                qos = qos_map.get(self.config['qos'], QOS.AT_LEAST_ONCE)
-                
-                request = PublishToIoTCoreRequest()
-                request.topic_name = self.config['topic']
-                request.payload = message_json.encode('utf-8')
-                request.qos = qos
+                self.publish_payload(payload, topic)
                 
-                operation = self.ipc_client.new_publish_to_iot_core()
-                operation.activate(request)
-                future = operation.get_response()
-                future.result(timeout=10.0)
-                
-                logger.info(f"Published to IoT Core topic '{self.config['topic']}': {message_json}")
+                logger.log(self.publish_log_level, "Published to IoT Core topic '%s': %s", topic,
+                           self.describe_payload(payload), extra=sampled('publish'))
             else:
                 # Simulation mode
-                logger.info(f"[SIMULATION] Would publish to topic '{self.config['topic']}': {message_json}")
+                logger.log(self.publish_log_level, "[SIMULATION] Would publish to topic '%s': %s", topic,
+                           self.describe_payload(payload), extra=sampled('publish'))
                 
         except Exception as e:
             logger.error(f"Failed to publish message: {e}")
             raise
     
+    def stream_for(self, device_id):
+        """The filter and encoder state for a device's readings: the publisher's own unless it is multiplexed"""
+        if not self.multiplexed:
+            return self
+        stream = self.streams.get(device_id)
+        if stream is None:
+            stream = self.streams[device_id] = DeviceStream(render_topic(self.config['topic'], device_id),
+                                                            self.create_filter(self.config),
+                                                            self.create_encoder(self.config))
+        return stream
+    
+    def all_streams(self):
+        return list(self.streams.values()) if self.multiplexed else [self]
+    
+    def stream_topic(self, stream):
+        """The topic a stream publishes to (None for the component's own topic)"""
+        return None if stream is self else stream.topic
+    
+    def encode_readings(self, readings, stream=None):
+        """(payload, traces) for each payload that is ready once the readings that passed the edge filter are encoded
+
+        Trace contexts are not published: each is taken off its reading and
+        goes with the payload that carries the reading.
+        """
+        stream = stream or self
+        payloads = []
+        for reading in readings:
+            self.reported.inc()
+            trace = reading.pop('trace', None)
+            if trace is not None:
+                stream.encoder_traces.append(trace)
+            payload = stream.encoder.encode(reading)
+            if payload is not None:
+                payloads.append((payload, self.take_encoder_traces(stream)))
+        return payloads
+    
+    def flush_encoded(self, stream=None):
+        """(payload, traces) for the readings the encoder is batching, or None if there are none"""
+        stream = stream or self
+        payload = stream.encoder.flush()
+        return None if payload is None else (payload, self.take_encoder_traces(stream))
+    
+    def take_encoder_traces(self, stream=None):
+        stream = stream or self
+        traces, stream.encoder_traces = stream.encoder_traces, []
+        return traces
+    
+    def filter_flushes(self):
+        """(payload, traces, topic) for what every edge filter is holding back"""
+        for stream in self.all_streams():
+            for payload, traces in self.encode_readings(stream.edge_filter.flush(), stream):
+                yield payload, traces, self.stream_topic(stream)
+    
+    def encoder_flushes(self):
+        """(payload, traces, topic) for every partially filled batch"""
+        for stream in self.all_streams():
+            encoded = self.flush_encoded(stream)
+            if encoded is not None:
+                yield (*encoded, self.stream_topic(stream))
+    
+    def end_traces(self, traces, event):
+        for trace in traces:
+            tracing.end(trace, self.trace_name, event)
+    
+    def compression_ratio(self):
+        """Readings generated per reading published since the component started"""
+        reported = self.reported.value()
+        return round(self.readings.value() / reported, 2) if reported else 0.0
+    
+    def publish_reading(self, reading=None, device=None):
+        """Publish what the edge filter lets through of a reading from inputTopic, or of a simulated one
+        
+        Without inputTopic this is one scheduler tick, for a virtual device if one is given.
+        """
+        with self.config_lock:
+            self.readings.inc()
+            if reading is None:
+                reading = self.generate_sensor_data(device) if device else self.generate_sensor_data()
+            stream = self.stream_for(reading['deviceId'])
+            for payload, traces in self.encode_readings(stream.edge_filter.offer(reading), stream):
+                self.forward(payload, traces, self.stream_topic(stream))
+    
+    def publish_device_reading(self, device):
+        """One virtual device's scheduler tick"""
+        self.publish_reading(device=device)
+    
+    def flush_filter(self):
+        """Publish the readings the edge filters are holding back"""
+        for payload, traces, topic in self.filter_flushes():
+            self.forward(payload, traces, topic)
+    
+    def flush_encoder(self):
+        """Forward partially filled batches"""
+        for payload, traces, topic in self.encoder_flushes():
+            self.forward(payload, traces, topic)
+    
+    def forward(self, payload, traces=(), topic=None):
+        """Publish a payload, or spool it while IoT Core is unreachable
+        
+        The traces of its readings end when it is published or spooled.
+        A spooled payload is later sent to the topic of the deviceId it carries.
+        """
+        if not self.spool:
+            self.publish_to_iot_core(payload, topic)
+            self.end_traces(traces, 'publish')
+            return
+        
+        # While a backlog exists new payloads queue behind it to keep delivery in order
+        if self.link_up and not self.spool.has_pending():
+            try:
+                self.publish_to_iot_core(payload, topic)
+                self.end_traces(traces, 'publish')
+                return
+            except Exception as e:
+                self.set_link_state(False, e)
+        
+        self.spool.append(payload)
+        self.spooled.inc()
+        self.end_traces(traces, 'spool')
+    
+    def decode_input(self, event, received):
+        """The readings in a message from inputTopic (one, or one per message of a batch)"""
+        if event.binary_message is not None:
+            data = json.loads(event.binary_message.message)
+        else:
+            data = event.json_message.message
+        messages = data.get('messages') if isinstance(data, dict) else None
+        readings = []
+        for message in messages if isinstance(messages, list) else [data]:
+            if not isinstance(message, dict):
+                continue
+            tracing.stamp(message, self.trace_name, 'receive', at=received)
+            reading = input_reading(message, self.config)
+            if reading is not None:
+                readings.append(reading)
+        return readings
+    
+    def subscribe_input(self, deliver):
+        """Subscribe to inputTopic and return the response future
+
+        deliver(readings) is called for each message, on the IPC thread.
+        """
+        topic = self.config['inputTopic']
+        publisher = self
+        
+        class InputHandler(ipc_client_module.SubscribeToTopicStreamHandler):
+            def on_stream_event(self, event):
+                received = tracing.now()
+                try:
+                    readings = publisher.decode_input(event, received)
+                except ValueError as e:
+                    logger.warning("Ignored message on %s: %s", topic, e, extra=sampled('input-invalid'))
+                    return
+                if readings:
+                    deliver(readings)
+            
+            def on_stream_error(self, error):
+                logger.error(f"Input stream error: {error}")
+                return False  # Keep the stream open
+        
+        request = ipc_model.SubscribeToTopicRequest()
+        request.topic = topic
+        self.input_operation = self.ipc_client.new_subscribe_to_topic(InputHandler())
+        self.input_operation.activate(request)
+        logger.info(f"Publishing readings from {topic}")
+        return self.input_operation.get_response()
+    
+    def queue_input(self, readings):
+        """Queue readings for the main thread; blocking here would stall the IPC connection"""
+        for reading in readings:
+            try:
+                self.input_queue.put_nowait(reading)
+            except queue.Full:
+                logger.warning("Input reading dropped: %d readings waiting", INPUT_BACKLOG,
+                               extra=sampled('input-backlog'))
+    
+    def consume_input(self):
+        """Publish readings from inputTopic as they arrive, until stop() is called"""
+        while not self.stop_event.is_set():
+            try:
+                reading = self.input_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.publish_reading(reading)
+    
+    def spool_pending_bytes(self):
+        """Spooled bytes not yet forwarded (0 without a spool)"""
+        if not self.spool:
+            return 0
+        with self.spool.lock:
+            return self.spool.pending_bytes()
+    
+    def set_link_state(self, up, error=None):
+        """Track whether IoT Core publishes are currently succeeding"""
+        if up == self.link_up:
+            return
+        self.link_up = up
+        if up:
+            logger.info("IoT Core link restored - draining spooled readings")
+        else:
+            logger.warning(f"IoT Core link down ({error}) - spooling readings to disk")
+    
+    def drain_spool(self):
+        """Forward spooled readings in rate-limited batches once IoT Core is reachable"""
+        batch_size = self.config['drainBatchSize']
+        batch_period = batch_size / self.config['drainRate']
+        
+        while not self.stop_event.is_set():
+            batch = self.spool.read_batch(batch_size)
+            if not batch:
+                self.stop_event.wait(min(batch_period, self.config['reconnectInterval']))
+                continue
+            
+            # While offline, the first record of each attempt doubles as the reconnect probe
+            started = time.monotonic()
+            sent_position = None
+            failed = False
+            for payload, position in batch:
+                try:
+                    self.publish_payload(payload, self.spooled_topic(payload))
+                except Exception as e:
+                    self.set_link_state(False, e)
+                    failed = True
+                    break
+                sent_position = position
+            
+            if sent_position is not None:
+                self.spool.commit(sent_position)
+                self.set_link_state(True)
+            
+            if failed:
+                self.stop_event.wait(self.config['reconnectInterval'])
+            else:
+                self.stop_event.wait(max(0.0, started + batch_period - time.monotonic()))
+    
+    def start_drain_thread(self):
+        """Start forwarding spooled readings in the background"""
+        if not self.spool or not self.ipc_client:
+            return
+        self.drain_thread = threading.Thread(target=self.drain_spool, name='spool-drain', daemon=True)
+        self.drain_thread.start()
+    
+    def stop(self):
+        """Stop publishing and the spool drain thread"""
+        self.scheduler.stop()
+        self.config_watcher.stop()
+        self.close_input()
+        try:
+            self.flush_filter()
+            self.flush_encoder()
+        except Exception as e:
+            logger.error(f"Dropped partial batch on shutdown: {e}")
+        self.log_compression()
+        self.stop_event.set()
+        if self.drain_thread:
+            self.drain_thread.join(timeout=15)
+        if self.spool:
+            self.spool.close()
+    
+    def close_input(self):
+        if self.input_operation is not None:
+            try:
+                self.input_operation.close()
+            except Exception:
+                pass
+            self.input_operation = None
+    
+    def log_compression(self):
+        """Report how many readings the edge filter suppressed"""
+        readings, reported = self.readings.value(), self.reported.value()
+        if readings and reported < readings:
+            logger.info(f"Edge filter published {reported} of {readings} readings "
+                        f"(compression ratio {self.compression_ratio():g})")
+    
     def run(self):
         """Main component loop"""
         logger.info("IoT Core Publisher component starting...")
         logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
         
         try:
-            while True:
-                sensor_data = self.generate_sensor_data()
-                self.publish_to_iot_core(sensor_data)
-                time.sleep(self.config['interval'])
+            self.start_drain_thread()
+            self.config_watcher.watch()
+            tracing.install()
+            metrics.start('IoTCorePublisher')
+            profiling.install('IoTCorePublisher')
+            if self.config['inputTopic'] and self.ipc_client:
+                self.subscribe_input(self.queue_input).result(timeout=10.0)
+                startup.ready(logger)
+                self.consume_input()
+            else:
+                startup.ready(logger)
+                self.scheduler.run(self.publish_device_reading if self.devices else self.publish_reading)
                 
         except KeyboardInterrupt:
             logger.info("IoT Core Publisher component stopping...")
@@ -133,8 +660,11 @@ class IoTCorePublisher:
             logger.error(f"Unexpected error: {e}")
             sys.exit(1)
         finally:
-            if self.ipc_client:
-                self.ipc_client.close()
+            self.stop()
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     publisher = IoTCorePublisher()
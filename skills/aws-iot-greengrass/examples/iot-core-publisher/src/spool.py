@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import struct
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('IoTCorePublisher.Spool')
+
+RECORD_HEADER = struct.Struct('>I')
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+class DiskSpool:
+    """Store-and-forward buffer: a segmented append-only log with a checkpointed read offset
+
+    Payloads are appended as length-prefixed records to the newest segment file.
+    Readers take records from the checkpoint position; commit() persists the new
+    position so records already forwarded are not sent again after a restart.
+    When the spool grows past max_bytes, whole segments are evicted oldest first.
+    """
+
+    def __init__(self, directory, max_bytes=10485760, segment_bytes=1048576, fsync=False):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.evicted_records = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.segments = sorted(
+            int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        )
+        if not self.segments:
+            self.segments = [0]
+            self.segment_path(0).touch()
+        self.repair_tail()
+        self.segment_sizes = {seg: self.segment_path(seg).stat().st_size for seg in self.segments}
+        self.read_position = self.load_checkpoint()
+        self.writer = open(self.segment_path(self.segments[-1]), 'ab')
+
+        if self.pending_bytes():
+            logger.info(f"Spool opened with {self.pending_bytes()} bytes pending in {len(self.segments)} segment(s)")
+
+    def segment_path(self, segment):
+        return self.directory / f"{SEGMENT_PREFIX}{segment:012d}{SEGMENT_SUFFIX}"
+
+    def repair_tail(self):
+        """Truncate a partially written record left by a crash mid-append"""
+        path = self.segment_path(self.segments[-1])
+        valid = 0
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                (length,) = RECORD_HEADER.unpack(header)
+                if len(f.read(length)) < length:
+                    break
+                valid = f.tell()
+        if valid < path.stat().st_size:
+            logger.warning(f"Truncating incomplete record at end of {path.name}")
+            os.truncate(path, valid)
+
+    def load_checkpoint(self):
+        """Read the persisted read position, clamped to the segments that still exist"""
+        try:
+            with open(self.directory / CHECKPOINT_FILE) as f:
+                checkpoint = json.load(f)
+            position = (checkpoint['segment'], checkpoint['offset'])
+        except FileNotFoundError:
+            position = (self.segments[0], 0)
+        except (ValueError, KeyError) as e:
+            logger.error(f"Ignoring corrupt spool checkpoint: {e}")
+            position = (self.segments[0], 0)
+
+        if position[0] < self.segments[0]:
+            position = (self.segments[0], 0)
+        return position
+
+    def save_checkpoint(self):
+        """Atomically persist the read position"""
+        tmp_path = self.directory / f"{CHECKPOINT_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"segment": self.read_position[0], "offset": self.read_position[1]}, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / CHECKPOINT_FILE)
+
+    def total_bytes(self):
+        return sum(self.segment_sizes.values())
+
+    def pending_bytes(self):
+        """Bytes appended but not yet committed as forwarded"""
+        segment, offset = self.read_position
+        return sum(size for seg, size in self.segment_sizes.items() if seg >= segment) - offset
+
+    def has_pending(self):
+        with self.lock:
+            return self.pending_bytes() > 0
+
+    def append(self, payload):
+        """Append one payload (bytes) to the spool"""
+        record = RECORD_HEADER.pack(len(payload)) + payload
+        with self.lock:
+            active = self.segments[-1]
+            if self.segment_sizes[active] and self.segment_sizes[active] + len(record) > self.segment_bytes:
+                self.roll_segment()
+                active = self.segments[-1]
+            self.writer.write(record)
+            self.writer.flush()
+            if self.fsync:
+                os.fsync(self.writer.fileno())
+            self.segment_sizes[active] += len(record)
+            self.enforce_cap()
+
+    def roll_segment(self):
+        """Start a new active segment"""
+        self.writer.close()
+        segment = self.segments[-1] + 1
+        self.segments.append(segment)
+        self.segment_sizes[segment] = 0
+        self.writer = open(self.segment_path(segment), 'ab')
+
+    def enforce_cap(self):
+        """Evict the oldest segments until the spool fits in max_bytes"""
+        while self.total_bytes() > self.max_bytes:
+            if len(self.segments) == 1:
+                self.roll_segment()
+            oldest = self.segments.pop(0)
+            self.evicted_records += self.count_records(oldest, self.read_position[1] if oldest == self.read_position[0] else 0)
+            del self.segment_sizes[oldest]
+            self.segment_path(oldest).unlink()
+            if self.read_position[0] <= oldest:
+                self.read_position = (self.segments[0], 0)
+                self.save_checkpoint()
+            logger.warning(f"Spool over {self.max_bytes} bytes, evicted oldest segment {oldest} "
+                           f"({self.evicted_records} records evicted so far)")
+
+    def count_records(self, segment, start_offset=0):
+        count = 0
+        with open(self.segment_path(segment), 'rb') as f:
+            f.seek(start_offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return count
+                f.seek(RECORD_HEADER.unpack(header)[0], os.SEEK_CUR)
+                count += 1
+
+    def read_batch(self, max_records):
+        """Return up to max_records pending [(payload, position_after_record)], oldest first"""
+        batch = []
+        with self.lock:
+            segment, offset = self.read_position
+            for seg in self.segments:
+                if seg < segment:
+                    continue
+                with open(self.segment_path(seg), 'rb') as f:
+                    f.seek(offset if seg == segment else 0)
+                    while len(batch) < max_records:
+                        header = f.read(RECORD_HEADER.size)
+                        if len(header) < RECORD_HEADER.size:
+                            break
+                        (length,) = RECORD_HEADER.unpack(header)
+                        payload = f.read(length)
+                        if len(payload) < length:
+                            break
+                        batch.append((payload, (seg, f.tell())))
+                if len(batch) >= max_records:
+                    break
+        return batch
+
+    def commit(self, position):
+        """Mark everything up to position as forwarded and drop fully consumed segments"""
+        with self.lock:
+            if position[0] < self.segments[0] or position <= self.read_position:
+                # Position was evicted while the batch was in flight, or is stale
+                return
+            self.read_position = position
+            while len(self.segments) > 1 and self.segments[0] < position[0]:
+                oldest = self.segments.pop(0)
+                del self.segment_sizes[oldest]
+                self.segment_path(oldest).unlink()
+            self.save_checkpoint()
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
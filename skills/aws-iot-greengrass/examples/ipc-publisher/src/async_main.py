@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import sys
+import time
+
+from component_runtime import close_ipc_clients, metrics, profiling, run_until_signalled, sampled, startup, tracing
+from main import IPCPublisher, logger
+
+
+class AsyncIPCPublisher(IPCPublisher):
+    """IPCPublisher driven by a single asyncio event loop
+
+    Each publish awaits the SDK response future (wrapped with asyncio.wrap_future)
+    instead of blocking a thread on future.result(), so many publishes can be in
+    flight on one loop. maxInFlight bounds the number of outstanding publishes.
+    Configuration updates are applied on the loop between ticks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tasks = set()
+        self.in_flight_limit = None
+
+    def apply_configuration(self, changes):
+        """Apply a configuration update; runs on the event loop once it is running"""
+        if self.pending_batch and ('batchSize' in changes or 'publishMode' in changes):
+            message_data = self.build_batch_message(self.pending_batch)
+            self.pending_batch = []
+            self.submit(message_data)
+        super().apply_configuration(changes)
+        if 'maxInFlight' in changes and self.in_flight_limit is not None:
+            # Publishes holding the old semaphore release it as they finish
+            self.in_flight_limit = asyncio.Semaphore(self.config['maxInFlight'])
+
+    async def publish_async(self, message_data, topic=None):
+        """Publish message via Greengrass IPC and await the response"""
+        topic = topic or self.default_topic()
+        self.stamp_publish(message_data)
+        message_json = json.dumps(message_data)
+
+        if not self.ipc_client:
+            logger.log(self.publish_log_level, "[SIMULATION] Would publish to IPC topic '%s': %s", topic,
+                       message_json, extra=sampled('publish'))
+            return
+
+        async with self.in_flight_limit:
+            try:
+                started = time.perf_counter()
+                operation = self.ipc_client.new_publish_to_topic()
+                operation.activate(self.build_publish_request(message_json, topic))
+                await asyncio.wrap_future(operation.get_response())
+                self.publish_latency.record(time.perf_counter() - started)
+                self.published.inc()
+                logger.log(self.publish_log_level, "Published to IPC topic '%s': %s", topic, message_json,
+                           extra=sampled('publish'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.publish_failed.inc()
+                logger.error(f"Failed to publish IPC message: {e}")
+
+    def submit(self, message_data, topic=None):
+        """Batch a message and start publishing it without waiting for the result"""
+        message_data = self.add_to_batch(message_data)
+        if message_data is None:
+            return None
+        task = asyncio.get_running_loop().create_task(self.publish_async(message_data, topic))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def flush_async(self, timeout=10.0):
+        """Publish any partial batch and wait for in-flight publishes"""
+        if self.pending_batch:
+            message_data = self.build_batch_message(self.pending_batch)
+            self.pending_batch = []
+            self.submit(message_data)
+        if self.tasks:
+            done, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+            if pending:
+                logger.warning(f"Cancelling {len(pending)} IPC publishes still in flight at shutdown")
+                for task in pending:
+                    task.cancel()
+
+    async def run_async(self):
+        """Publish on the fixed-rate schedule, or each virtual device's, until cancelled"""
+        self.in_flight_limit = asyncio.Semaphore(self.config['maxInFlight'])
+        self.config_watcher.run_on(asyncio.get_running_loop())
+        scheduler = self.scheduler
+        scheduler.start()
+        try:
+            while scheduler.running:
+                delay = scheduler.delay()
+                if delay > 0:
+                    # Check again after waking: the rate limit may hold the next device back
+                    await asyncio.sleep(delay)
+                    continue
+                # A virtual device when devices are configured, otherwise None
+                device = scheduler.begin_tick()
+                self.readings.inc()
+                self.submit(self.generate_message_data(device), device.topic if device else None)
+                scheduler.end_tick()
+                if len(self.tasks) >= self.config['maxInFlight']:
+                    # Let completions run before queueing more work than can be in flight
+                    await asyncio.wait(set(self.tasks), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.config_watcher.run_on(None)
+            scheduler.stop()
+            await self.flush_async()
+
+    def run(self):
+        """Main component loop"""
+        logger.info("Async IPC Publisher component starting...")
+        logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+        self.config_watcher.watch()
+        tracing.install()
+        metrics.gauge('inFlight', lambda: len(self.tasks))
+        metrics.start('AsyncIPCPublisher')
+        profiling.install('AsyncIPCPublisher')
+        startup.ready(logger)
+
+        try:
+            asyncio.run(run_until_signalled(self.run_async()))
+            logger.info("Async IPC Publisher component stopping...")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            sys.exit(1)
+        finally:
+            self.config_watcher.stop()
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            close_ipc_clients()
+
+
+if __name__ == "__main__":
+    publisher = AsyncIPCPublisher()
+    publisher.run()
@@ -1,64 +1,169 @@
 #!/usr/bin/env python3
 
+import itertools
 import json
 import logging
-import os
 import random
 import sys
+import threading
 import time
 from datetime import datetime, timezone
 
-try:
-    import awsiot.greengrasscoreipc
-    from awsiot.greengrasscoreipc.model import (
-        PublishToTopicRequest,
-        PublishMessage,
-        BinaryMessage
-    )
-    GREENGRASS_IPC_AVAILABLE = True
-except ImportError:
-    GREENGRASS_IPC_AVAILABLE = False
-    logging.warning("Greengrass IPC not available - running in simulation mode")
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from component_runtime import (
+    ConfigWatcher, DeviceScheduler, FixedRateScheduler, close_ipc_clients, create_devices, env_config, ipc_client,
+    lazy_import, metrics, profiling, render_topic, sampled, set_topics, setup_logging, startup, topic_fields, tracing
 )
-logger = logging.getLogger('IPCPublisher')
+
+logger = setup_logging('IPCPublisher')
+
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+GREENGRASS_IPC_AVAILABLE = ipc_model is not None
+if not GREENGRASS_IPC_AVAILABLE:
+    logger.warning("Greengrass IPC not available - running in simulation mode")
+
+class InFlightWindow:
+    """Counting semaphore for outstanding publishes whose size can change while in use"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.in_flight < self.limit, timeout):
+                return False
+            self.in_flight += 1
+            return True
+    
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+    
+    def resize(self, limit):
+        """Change the limit; publishes over a smaller limit finish normally"""
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+    
+    def wait_idle(self, timeout=None):
+        """Wait until no publish is outstanding"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.in_flight == 0, timeout)
 
 class IPCPublisher:
     def __init__(self):
         self.config = self.load_configuration()
         self.ipc_client = None
+        self.pending_batch = []
+        self.in_flight = InFlightWindow(self.config['maxInFlight'])
+        # Held for each scheduler tick and while a configuration update is applied
+        self.config_lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        # Per-message logs would dominate at sub-second intervals; the scheduler reports rate instead
+        self.publish_log_level = logging.INFO if self.config['interval'] >= 1 else logging.DEBUG
+        # Virtual devices share this process and its IPC connection, each on its own schedule
+        self.devices = create_devices(self.config['devices'], self.config['deviceId'])
+        set_topics(self.devices, self.config['topic'])
+        if self.devices:
+            self.scheduler = DeviceScheduler(self.devices, self.config['interval'], self.config['maxRate'],
+                                             self.config['statsInterval'])
+            logger.info(f"Publishing for {len(self.devices)} virtual devices")
+        else:
+            self.scheduler = FixedRateScheduler(self.config['interval'], self.config['statsInterval'])
+        self.readings = metrics.counter('readings')
+        self.published = metrics.counter('published')
+        self.publish_failed = metrics.counter('publishFailed')
+        self.publish_latency = metrics.histogram('publishLatency')
+        # Hop names in trace contexts
+        self.trace_name = type(self).__name__
+        metrics.gauge('inFlight', lambda: self.in_flight.in_flight)
+        metrics.gauge('batchPending', lambda: len(self.pending_batch))
+        if self.devices:
+            metrics.gauge('devices', lambda: len(self.devices))
         self.setup_ipc_client()
         
     def load_configuration(self):
         """Load component configuration"""
         try:
-            config = {
+            variables = {
+                "topic": ('GG_TOPIC', str),
+                "interval": ('GG_INTERVAL', float),
+                "messageType": ('GG_MESSAGE_TYPE', str),
+                "deviceId": ('GG_DEVICE_ID', str),
+                "publishMode": ('GG_PUBLISH_MODE', str),
+                "maxInFlight": ('GG_MAX_IN_FLIGHT', int),
+                "batchSize": ('GG_BATCH_SIZE', int),
+                "statsInterval": ('GG_STATS_INTERVAL', float),
+                "devices": ('GG_DEVICES', json.loads),
+                "maxRate": ('GG_MAX_RATE', float)
+            }
+            config = env_config({
                 "topic": "local/sensor/data",
                 "interval": 15,
                 "messageType": "sensor-reading",
-                "deviceId": "ipc-sensor-001"
-            }
+                "deviceId": "ipc-sensor-001",
+                "publishMode": "sync",
+                "maxInFlight": 16,
+                "batchSize": 1,
+                "statsInterval": 60,
+                "devices": [],
+                "maxRate": 0
+            }, variables)
             
-            # Load from environment variables
-            config["topic"] = os.environ.get('GG_TOPIC', config["topic"])
-            config["interval"] = int(os.environ.get('GG_INTERVAL', config["interval"]))
-            config["messageType"] = os.environ.get('GG_MESSAGE_TYPE', config["messageType"])
-            config["deviceId"] = os.environ.get('GG_DEVICE_ID', config["deviceId"])
+            # Deployed configuration replaces the environment values and is kept up to date;
+            # the virtual devices are created once, at startup
+            self.config_watcher = ConfigWatcher(config, variables, self.apply_configuration,
+                                                validate=self.validate_configuration, restart_keys=('devices',))
+            self.config_watcher.load()
             
+            startup.mark('configuration')
             return config
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             raise    
+    
+    @staticmethod
+    def validate_configuration(config):
+        """Raise ValueError for settings the publisher cannot run with"""
+        if config["publishMode"] not in ("sync", "pipelined"):
+            raise ValueError(f"Unsupported publishMode: {config['publishMode']}")
+        if config["maxInFlight"] < 1 or config["batchSize"] < 1:
+            raise ValueError("maxInFlight and batchSize must be at least 1")
+        if config["interval"] < 0.001:
+            raise ValueError(f"Interval must be at least 0.001 seconds, got {config['interval']}")
+        if config["maxRate"] < 0:
+            raise ValueError(f"maxRate must not be negative, got {config['maxRate']}")
+        per_device_topic = bool(topic_fields(config["topic"]))
+        if create_devices(config["devices"], config["deviceId"]) and per_device_topic and config["batchSize"] > 1:
+            raise ValueError("batchSize must be 1 when the topic is per device: a batch holds readings of many devices")
+    
+    def apply_configuration(self, changes):
+        """Apply a configuration update between scheduler ticks without restarting"""
+        with self.config_lock:
+            if 'batchSize' in changes or 'publishMode' in changes:
+                # Readings batched under the old settings are sent with them
+                self.flush_batch()
+            self.config.update(changes)
+            if 'interval' in changes:
+                self.scheduler.set_interval(self.config['interval'])
+                self.publish_log_level = logging.INFO if self.config['interval'] >= 1 else logging.DEBUG
+            if 'statsInterval' in changes:
+                self.scheduler.stats_interval = float(self.config['statsInterval'])
+            if 'maxInFlight' in changes:
+                self.in_flight.resize(self.config['maxInFlight'])
+            if 'topic' in changes:
+                set_topics(self.devices, self.config['topic'])
+            if 'maxRate' in changes and self.devices:
+                self.scheduler.set_max_rate(self.config['maxRate'])
 
     def setup_ipc_client(self):
         """Initialize Greengrass IPC client"""
         if GREENGRASS_IPC_AVAILABLE:
             try:
-                self.ipc_client = awsiot.greengrasscoreipc.connect()
+                self.ipc_client = ipc_client()
+                startup.mark('ipc connect')
                 logger.info("Connected to Greengrass IPC")
             except Exception as e:
                 logger.error(f"Failed to connect to Greengrass IPC: {e}")
@@ -66,13 +171,13 @@ class IPCPublisher:
         else:
             logger.info("Running in simulation mode - messages will be logged only")
     
-    def generate_message_data(self):
-        """Generate message data for IPC publishing"""
+    def generate_message_data(self, device=None):
+        """Generate message data for IPC publishing, as the component's device or a virtual one"""
         data = {
             "messageType": self.config['messageType'],
-            "deviceId": self.config['deviceId'],
+            "deviceId": device.device_id if device else self.config['deviceId'],
             "timestamp": datetime.now(timezone.utc).isoformat(),
-            "sequenceNumber": int(time.time()),
+            "sequenceNumber": device.next_sequence() if device else next(self.sequence),
             "data": {
                 "temperature": round(random.uniform(18.0, 32.0), 2),
                 "humidity": round(random.uniform(30.0, 80.0), 2),
@@ -80,56 +185,185 @@ class IPCPublisher:
             },
             "status": "active"
         }
+        tracing.start(data, self.trace_name, 'generate')
         
         return data
     
-    def publish_to_ipc(self, message_data):
-        """Publish message via Greengrass IPC"""
+    def build_batch_message(self, messages):
+        """Combine several readings into one payload"""
+        return {
+            "messageType": f"{self.config['messageType']}-batch",
+            "deviceId": self.config['deviceId'],
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "count": len(messages),
+            "messages": messages
+        }
+    
+    def stamp_publish(self, message_data):
+        """Stamp the publish hop on the message's trace, or on each batched message's"""
+        for message in message_data.get('messages', (message_data,)):
+            tracing.stamp(message, self.trace_name, 'publish')
+    
+    def default_topic(self):
+        """The topic of the component's own device (a virtual device publishes to device.topic)"""
+        return render_topic(self.config['topic'], self.config['deviceId'])
+    
+    def build_publish_request(self, message_json, topic):
+        """Build a PublishToTopic request for a JSON payload"""
+        request = ipc_model.PublishToTopicRequest()
+        request.topic = topic
+        publish_message = ipc_model.PublishMessage()
+        publish_message.binary_message = ipc_model.BinaryMessage()
+        publish_message.binary_message.message = message_json.encode('utf-8')
+        request.publish_message = publish_message
+        return request
+    
+    def add_to_batch(self, message_data):
+        """Return the message to publish now, or None while a batch is still filling"""
+        if self.config['batchSize'] <= 1:
+            return message_data
+        self.pending_batch.append(message_data)
+        if len(self.pending_batch) < self.config['batchSize']:
+            return None
+        message_data = self.build_batch_message(self.pending_batch)
+        self.pending_batch = []
+        return message_data
+    
+    def publish(self, message_data, topic=None):
+        """Batch and publish a message using the configured publish mode"""
+        message_data = self.add_to_batch(message_data)
+        if message_data is None:
+            return
+        
+        if self.config['publishMode'] == 'pipelined':
+            self.publish_to_ipc_pipelined(message_data, topic)
+        else:
+            self.publish_to_ipc(message_data, topic)
+    
+    def publish_to_ipc(self, message_data, topic=None):
+        """Publish message via Greengrass IPC, to the component's topic unless one is given"""
+        topic = topic or self.default_topic()
         try:
+            self.stamp_publish(message_data)
             message_json = json.dumps(message_data)
             
             if self.ipc_client:
                 # Real Greengrass IPC publishing
-                request = PublishToTopicRequest()
-                request.topic = self.config['topic']
-                publish_message = PublishMessage()
-                publish_message.binary_message = BinaryMessage()
-                publish_message.binary_message.message = message_json.encode('utf-8')
-                request.publish_message = publish_message
+                request = self.build_publish_request(message_json, topic)
                 
+                started = time.perf_counter()
                 operation = self.ipc_client.new_publish_to_topic()
                 operation.activate(request)
                 future = operation.get_response()
                 future.result(timeout=10.0)
+                self.publish_latency.record(time.perf_counter() - started)
+                self.published.inc()
                 
-                logger.info(f"Published to IPC topic '{self.config['topic']}': {message_json}")
+                logger.log(self.publish_log_level, "Published to IPC topic '%s': %s", topic, message_json,
+                           extra=sampled('publish'))
             else:
                 # Simulation mode
-                logger.info(f"[SIMULATION] Would publish to IPC topic '{self.config['topic']}': {message_json}")
+                logger.log(self.publish_log_level, "[SIMULATION] Would publish to IPC topic '%s': %s", topic,
+                           message_json, extra=sampled('publish'))
                 
         except Exception as e:
+            self.publish_failed.inc()
+            logger.error(f"Failed to publish IPC message: {e}")
+            raise
+    
+    def publish_to_ipc_pipelined(self, message_data, topic=None):
+        """Publish message via Greengrass IPC without waiting for the response"""
+        topic = topic or self.default_topic()
+        self.stamp_publish(message_data)
+        message_json = json.dumps(message_data)
+        
+        if not self.ipc_client:
+            logger.log(self.publish_log_level, "[SIMULATION] Would publish to IPC topic '%s': %s", topic,
+                       message_json, extra=sampled('publish'))
+            return
+        
+        request = self.build_publish_request(message_json, topic)
+        
+        # Blocks only when maxInFlight publishes are already awaiting a response
+        self.in_flight.acquire()
+        started = time.perf_counter()
+        try:
+            operation = self.ipc_client.new_publish_to_topic()
+            operation.activate(request)
+            future = operation.get_response()
+        except Exception as e:
+            self.in_flight.release()
+            self.publish_failed.inc()
             logger.error(f"Failed to publish IPC message: {e}")
             raise
+        
+        future.add_done_callback(lambda future: self.on_publish_complete(future, started, topic))
+    
+    def on_publish_complete(self, future, started=None, topic=None):
+        """Completion callback for pipelined publishes"""
+        self.in_flight.release()
+        error = future.exception()
+        if error:
+            self.publish_failed.inc()
+        else:
+            self.published.inc()
+            if started is not None:
+                self.publish_latency.record(time.perf_counter() - started)
+        
+        if error:
+            logger.error("Failed to publish IPC message: %s", error, extra=sampled('publish-failed'))
+        else:
+            logger.debug("Published to IPC topic '%s'", topic or self.default_topic(), extra=sampled('publish-complete'))
+    
+    def flush_batch(self):
+        """Publish any partial batch"""
+        if self.pending_batch:
+            message_data = self.build_batch_message(self.pending_batch)
+            self.pending_batch = []
+            if self.config['publishMode'] == 'pipelined':
+                self.publish_to_ipc_pipelined(message_data)
+            else:
+                self.publish_to_ipc(message_data)
+    
+    def flush(self, timeout=10.0):
+        """Publish any partial batch and wait for in-flight publishes to complete"""
+        self.flush_batch()
+        if not self.in_flight.wait_idle(timeout):
+            logger.warning("Timed out waiting for in-flight IPC publishes")
+            return False
+        return True
+    
+    def publish_reading(self, device=None):
+        """Generate and publish one reading (one scheduler tick), for a virtual device if one is given"""
+        with self.config_lock:
+            self.readings.inc()
+            self.publish(self.generate_message_data(device), device.topic if device else None)
     
     def run(self):
         """Main component loop"""
         logger.info("IPC Publisher component starting...")
         logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+        self.config_watcher.watch()
+        tracing.install()
+        metrics.start('IPCPublisher')
+        profiling.install('IPCPublisher')
+        startup.ready(logger)
         
         try:
-            while True:
-                message_data = self.generate_message_data()
-                self.publish_to_ipc(message_data)
-                time.sleep(self.config['interval'])
+            self.scheduler.run(self.publish_reading)
                 
         except KeyboardInterrupt:
             logger.info("IPC Publisher component stopping...")
+            self.flush()
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
             sys.exit(1)
         finally:
-            if self.ipc_client:
-                self.ipc_client.close()
+            self.config_watcher.stop()
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     publisher = IPCPublisher()
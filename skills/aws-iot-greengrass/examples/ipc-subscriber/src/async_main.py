@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import sys
+
+from component_runtime import close_ipc_clients, metrics, profiling, run_until_signalled, sampled, startup, tracing
+from main import (
+    IPCSubscriber,
+    SubscribeToTopicStreamHandler,
+    decode_event,
+    ipc_model,
+    logger
+)
+
+
+class QueueingHandler(SubscribeToTopicStreamHandler):
+    """Hand stream events from the SDK thread to the asyncio event loop"""
+
+    def __init__(self, subscriber, loop):
+        super().__init__()
+        self.subscriber = subscriber
+        self.loop = loop
+
+    def on_stream_event(self, event) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.subscriber.enqueue, *decode_event(event), tracing.now())
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    def on_stream_error(self, error: Exception) -> bool:
+        logger.error(f"Stream error: {error}")
+        return False  # Keep the stream open
+
+    def on_stream_closed(self) -> None:
+        logger.info("Message stream closed")
+
+
+class AsyncIPCSubscriber(IPCSubscriber):
+    """IPCSubscriber driven by a single asyncio event loop
+
+    Subscriptions are activated concurrently and their stream events are queued
+    onto the loop, where a consumer task runs process_message. Configuration
+    updates are applied on the loop. Shutdown cancels the consumer and closes
+    every subscription operation.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.queue = None
+        self.dropped = 0
+        self.dropped_counter = metrics.counter('dropped')
+        metrics.gauge('queueDepth', lambda: self.queue.qsize() if self.queue is not None else 0)
+
+    def enqueue(self, topic, message, received=None):
+        """Runs on the event loop; drops messages when the queue is full"""
+        try:
+            self.queue.put_nowait((topic, message, received))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.dropped_counter.inc()
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Message queue full, dropped {self.dropped} messages so far")
+
+    async def subscribe_async(self, topic, loop):
+        """Subscribe to one IPC topic and await the response"""
+        try:
+            request = ipc_model.SubscribeToTopicRequest()
+            request.topic = topic
+            operation = self.ipc_client.new_subscribe_to_topic(QueueingHandler(self, loop))
+            operation.activate(request)
+            await asyncio.wrap_future(operation.get_response())
+            self.subscriptions[topic] = operation
+            logger.info(f"Subscribed to IPC topic: {topic}")
+        except Exception as e:
+            logger.error(f"Failed to subscribe to topic {topic}: {e}")
+
+    def apply_configuration(self, changes):
+        """Apply a configuration update; runs on the event loop once it is running"""
+        if 'topics' in changes and self.queue is not None:
+            return self.apply_configuration_async(changes)
+        super().apply_configuration(changes)
+
+    async def apply_configuration_async(self, changes):
+        """Resubscribe without blocking the loop, then apply the other changes"""
+        topics = changes['topics']
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(self.subscribe_async(topic, loop) for topic in topics if topic not in self.subscriptions))
+        removed = [self.subscriptions.pop(topic) for topic in list(self.subscriptions) if topic not in topics]
+        await asyncio.gather(*(asyncio.wrap_future(operation.close()) for operation in removed), return_exceptions=True)
+        self.config['topics'] = topics
+        super().apply_configuration({key: value for key, value in changes.items() if key != 'topics'})
+
+    async def consume(self):
+        """Process queued messages in arrival order"""
+        while True:
+            topic, message, received = await self.queue.get()
+            logger.info("Received message on topic '%s': %s", topic, message, extra=sampled(f"received:{topic}"))
+            self.process_message(topic, message, received)
+
+    async def close_subscriptions(self):
+        """Close every subscription operation"""
+        closing = [asyncio.wrap_future(operation.close()) for operation in self.subscriptions.values()]
+        await asyncio.gather(*closing, return_exceptions=True)
+        self.subscriptions = {}
+
+    async def run_async(self):
+        """Subscribe to all topics and process messages until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.config['queueSize'])
+        consumer = loop.create_task(self.consume())
+        try:
+            await asyncio.gather(*(self.subscribe_async(topic, loop) for topic in self.config['topics']))
+            self.config_watcher.run_on(loop)
+            self.config_watcher.watch()
+            tracing.install()
+            metrics.start('AsyncIPCSubscriber')
+            profiling.install('AsyncIPCSubscriber')
+            startup.ready(logger)
+            logger.info("Listening for IPC messages...")
+            await consumer
+        finally:
+            self.config_watcher.stop()
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            consumer.cancel()
+            await self.close_subscriptions()
+
+    def run(self):
+        """Main component loop"""
+        logger.info("Async IPC Subscriber component starting...")
+        logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+
+        if not self.ipc_client:
+            logger.warning("No IPC client available - cannot subscribe")
+            return
+
+        try:
+            asyncio.run(run_until_signalled(self.run_async()))
+            logger.info("Async IPC Subscriber component stopping...")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            sys.exit(1)
+        finally:
+            close_ipc_clients()
+
+
+if __name__ == "__main__":
+    subscriber = AsyncIPCSubscriber()
+    subscriber.run()
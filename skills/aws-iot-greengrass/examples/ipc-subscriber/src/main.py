@@ -1,52 +1,70 @@
 #!/usr/bin/env python3
 
 import json
-import logging
-import os
 import sys
 import time
 from datetime import datetime
 from pathlib import Path
 
-try:
-    import awsiot.greengrasscoreipc
-    from awsiot.greengrasscoreipc.model import (
-        SubscribeToTopicRequest,
-        SubscriptionResponseMessage
-    )
-    GREENGRASS_IPC_AVAILABLE = True
-except ImportError:
-    GREENGRASS_IPC_AVAILABLE = False
-    logging.warning("Greengrass IPC not available - running in simulation mode")
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from component_runtime import (
+    AnomalyMonitor, ConfigWatcher, close_ipc_clients, env_config, env_list, ipc_client, lazy_import, metrics,
+    profiling, sampled, setup_logging, startup, tracing, validate_anomaly_settings
 )
-logger = logging.getLogger('IPCSubscriber')
 
-class MessageHandler(awsiot.greengrasscoreipc.SubscribeToTopicStreamHandler):
+logger = setup_logging('IPCSubscriber')
+
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+GREENGRASS_IPC_AVAILABLE = ipc_model is not None
+if GREENGRASS_IPC_AVAILABLE:
+    # MessageHandler subclasses the SDK's handler, so the client module is needed
+    # at import; connecting loads it right after anyway
+    from awsiot.greengrasscoreipc.client import SubscribeToTopicStreamHandler
+else:
+    SubscribeToTopicStreamHandler = object
+    logger.warning("Greengrass IPC not available - running in simulation mode")
+
+def decode_event(event):
+    """Return (topic, message text) for a SubscriptionResponseMessage"""
+    if event.binary_message is not None:
+        context = event.binary_message.context
+        message = str(event.binary_message.message, 'utf-8')
+    else:
+        context = event.json_message.context
+        message = json.dumps(event.json_message.message)
+    topic = context.topic if context is not None else 'unknown'
+    return topic, message
+
+def sensor_values(message_data):
+    """(deviceId, sensor type, value, timestamp) for each value in a sensor reading or batch of readings"""
+    messages = message_data.get('messages')
+    for item in messages if isinstance(messages, list) else (message_data,):
+        data = item.get('data') if isinstance(item, dict) else None
+        if isinstance(data, dict):
+            device_id = item.get('deviceId', 'unknown')
+            for sensor_type, value in data.items():
+                yield device_id, sensor_type, value, item.get('timestamp')
+
+class MessageHandler(SubscribeToTopicStreamHandler):
     """Handle incoming IPC messages"""
     
     def __init__(self, subscriber):
         super().__init__()
         self.subscriber = subscriber
     
-    def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
+    def on_stream_event(self, event) -> None:
         try:
-            message = str(event.binary_message.message, 'utf-8')
-            topic = event.topic_name if hasattr(event, 'topic_name') else 'unknown'
+            received = tracing.now()
+            topic, message = decode_event(event)
             
-            logger.info(f"Received message on topic '{topic}': {message}")
-            self.subscriber.process_message(topic, message)
+            logger.info("Received message on topic '%s': %s", topic, message, extra=sampled(f"received:{topic}"))
+            self.subscriber.process_message(topic, message, received)
             
         except Exception as e:
             logger.error(f"Error processing message: {e}")
     
     def on_stream_error(self, error: Exception) -> bool:
         logger.error(f"Stream error: {error}")
-        return True  # Return True to keep the stream alive
+        return False  # Keep the stream open
     
     def on_stream_closed(self) -> None:
         logger.info("Message stream closed")
@@ -55,37 +73,70 @@ class IPCSubscriber:
     def __init__(self):
         self.config = self.load_configuration()
         self.ipc_client = None
-        self.subscriptions = []
+        # Topic -> subscription operation
+        self.subscriptions = {}
+        self.received = metrics.counter('received')
+        self.processing_errors = metrics.counter('processingErrors')
+        self.processing_time = metrics.histogram('processingTime')
+        self.forwarded = metrics.counter('forwarded')
+        self.alerts = metrics.counter('alerts')
+        self.anomalies = AnomalyMonitor(self.config['anomalyDetection'])
+        # Hop names in trace contexts
+        self.trace_name = type(self).__name__
+        metrics.gauge('subscriptions', lambda: len(self.subscriptions))
+        metrics.gauge('activeAlerts', self.anomalies.active)
         self.setup_ipc_client()
         self.setup_output_file()
         
     def load_configuration(self):
         """Load component configuration"""
         try:
-            config = {
+            variables = {
+                "topics": ('GG_TOPICS', env_list),
+                "processingMode": ('GG_PROCESSING_MODE', str),
+                "outputFile": ('GG_OUTPUT_FILE', str),
+                "queueSize": ('GG_QUEUE_SIZE', int),
+                "forwardTopic": ('GG_FORWARD_TOPIC', str),
+                "anomalyDetection": ('GG_ANOMALY_DETECTION', json.loads),
+                "alertTopic": ('GG_ALERT_TOPIC', str)
+            }
+            config = env_config({
                 "topics": ["local/sensor/data", "local/alerts/*"],
                 "processingMode": "log",
-                "outputFile": "/tmp/ipc-messages.log"
-            }
-            
-            # Load from environment variables
-            topics_env = os.environ.get('GG_TOPICS')
-            if topics_env:
-                config["topics"] = topics_env.split(',')
+                "outputFile": "/tmp/ipc-messages.log",
+                "queueSize": 1000,
+                "forwardTopic": "",
+                "anomalyDetection": {"temperature": {}},
+                "alertTopic": "component/alerts"
+            }, variables)
             
-            config["processingMode"] = os.environ.get('GG_PROCESSING_MODE', config["processingMode"])
-            config["outputFile"] = os.environ.get('GG_OUTPUT_FILE', config["outputFile"])
+            # Deployed configuration replaces the environment values and is kept up to date
+            self.config_watcher = ConfigWatcher(config, variables, self.apply_configuration,
+                                                validate=self.validate_configuration,
+                                                restart_keys=('queueSize',))
+            self.config_watcher.load()
             
+            startup.mark('configuration')
             return config
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             raise    
-  
-  def setup_ipc_client(self):
+    
+    @staticmethod
+    def validate_configuration(config):
+        """Raise ValueError for settings the subscriber cannot run with"""
+        if config['forwardTopic'] and config['forwardTopic'] in config['topics']:
+            raise ValueError(f"forwardTopic {config['forwardTopic']} is also subscribed to; messages would loop")
+        if config['alertTopic'] and config['alertTopic'] in config['topics']:
+            raise ValueError(f"alertTopic {config['alertTopic']} is also subscribed to; alerts would loop")
+        validate_anomaly_settings(config['anomalyDetection'])
+    
+    def setup_ipc_client(self):
         """Initialize Greengrass IPC client"""
         if GREENGRASS_IPC_AVAILABLE:
             try:
-                self.ipc_client = awsiot.greengrasscoreipc.connect()
+                self.ipc_client = ipc_client()
+                startup.mark('ipc connect')
                 logger.info("Connected to Greengrass IPC")
             except Exception as e:
                 logger.error(f"Failed to connect to Greengrass IPC: {e}")
@@ -103,18 +154,48 @@ class IPCSubscriber:
             except Exception as e:
                 logger.error(f"Failed to setup output file: {e}")
     
-    def process_message(self, topic, message):
-        """Process received IPC message"""
+    def apply_configuration(self, changes):
+        """Apply a configuration update without restarting"""
+        if 'topics' in changes and self.ipc_client:
+            self.update_subscriptions(changes['topics'])
+        if 'anomalyDetection' in changes:
+            self.anomalies.configure(changes['anomalyDetection'])
+        self.config.update(changes)
+        if 'processingMode' in changes or 'outputFile' in changes:
+            self.setup_output_file()
+    
+    def update_subscriptions(self, topics):
+        """Subscribe to added topics before closing removed ones, so kept topics see no gap"""
+        for topic in topics:
+            if topic not in self.subscriptions:
+                self.subscribe_topic(topic)
+        for topic in [topic for topic in self.subscriptions if topic not in topics]:
+            try:
+                self.subscriptions.pop(topic).close()
+                logger.info(f"Unsubscribed from IPC topic: {topic}")
+            except Exception as e:
+                logger.error(f"Failed to unsubscribe from topic {topic}: {e}")
+    
+    def process_message(self, topic, message, received=None):
+        """Process received IPC message
+        
+        received is when the message arrived, as tracing.now(); traced
+        messages are stamped with it.
+        """
+        started = time.perf_counter()
+        self.received.inc()
         try:
             # Parse message if it's JSON
             try:
                 message_data = json.loads(message)
-                formatted_message = json.dumps(message_data, indent=2)
             except json.JSONDecodeError:
-                formatted_message = message
+                message_data = None
+            
+            traces = self.stamp_received(message_data, received)
             
             # Log to file if configured
             if self.config['processingMode'] == 'log' and self.config['outputFile']:
+                formatted_message = message if message_data is None else json.dumps(message_data, indent=2)
                 with open(self.config['outputFile'], 'a') as f:
                     timestamp = datetime.now().isoformat()
                     f.write(f"[{timestamp}] Topic: {topic}\n")
@@ -124,17 +205,89 @@ class IPCSubscriber:
             # Additional processing based on message type
             if isinstance(message_data, dict):
                 msg_type = message_data.get('messageType', 'unknown')
-                logger.info(f"Processing {msg_type} message from topic {topic}")
+                logger.info("Processing %s message from topic %s", msg_type, topic, extra=sampled(f"processing:{msg_type}"))
                 
-                # Example: Alert on high temperature
-                if msg_type == 'sensor-reading':
-                    data = message_data.get('data', {})
-                    temp = data.get('temperature', 0)
-                    if temp > 30:
-                        logger.warning(f"High temperature alert: {temp}°C")
+                if msg_type.startswith('sensor-reading'):
+                    self.check_readings(message_data)
+            
+            if self.config['forwardTopic']:
+                for trace in traces:
+                    tracing.hop(trace, self.trace_name, 'forward')
+                self.forward(message if message_data is None or not traces else json.dumps(message_data))
+            else:
+                for trace in traces:
+                    tracing.end(trace, self.trace_name, 'processed')
                         
         except Exception as e:
+            self.processing_errors.inc()
             logger.error(f"Error processing message: {e}")
+        self.processing_time.record(time.perf_counter() - started)
+    
+    def stamp_received(self, message_data, received):
+        """Stamp the receive hop on the message's trace, or on each batched message's; returns the traces"""
+        if not isinstance(message_data, dict):
+            return []
+        messages = message_data.get('messages')
+        traces = []
+        for item in messages if isinstance(messages, list) else (message_data,):
+            trace = tracing.stamp(item, self.trace_name, 'receive', at=received)
+            if trace is not None:
+                traces.append(trace)
+        return traces
+    
+    def check_readings(self, message_data):
+        """Run each reading through its sensor's anomaly detector and publish alert state changes
+        
+        Alerts go out only when a sensor's alert is raised or cleared, not
+        for every reading while it lasts (see component_runtime.anomaly).
+        """
+        for device_id, sensor_type, value, timestamp in sensor_values(message_data):
+            alert = self.anomalies.offer(device_id, sensor_type, value, timestamp)
+            if alert is None:
+                continue
+            logger.warning(f"Anomaly alert {alert['state']} for {device_id} {sensor_type}: {value} "
+                           f"({alert['check']})")
+            if self.config['alertTopic']:
+                self.publish(self.config['alertTopic'], json.dumps(alert), self.on_alert_complete)
+    
+    def forward(self, message):
+        """Republish a processed message to forwardTopic without waiting for the response"""
+        self.publish(self.config['forwardTopic'], message, self.on_forward_complete)
+    
+    def publish(self, topic, message, on_complete):
+        """Publish to a local topic; on_complete gets the response future
+        
+        This runs on the thread that delivers stream events, which must not
+        block on an IPC response.
+        """
+        if not self.ipc_client:
+            return
+        request = ipc_model.PublishToTopicRequest()
+        request.topic = topic
+        request.publish_message = ipc_model.PublishMessage()
+        request.publish_message.binary_message = ipc_model.BinaryMessage()
+        request.publish_message.binary_message.message = message.encode('utf-8')
+        operation = self.ipc_client.new_publish_to_topic()
+        operation.activate(request)
+        operation.get_response().add_done_callback(on_complete)
+    
+    def on_forward_complete(self, future):
+        error = future.exception()
+        if error:
+            self.processing_errors.inc()
+            logger.error("Failed to forward message to %s: %s", self.config['forwardTopic'], error,
+                         extra=sampled('forward-failed'))
+        else:
+            self.forwarded.inc()
+    
+    def on_alert_complete(self, future):
+        error = future.exception()
+        if error:
+            self.processing_errors.inc()
+            logger.error("Failed to publish alert to %s: %s", self.config['alertTopic'], error,
+                         extra=sampled('alert-failed'))
+        else:
+            self.alerts.inc()
     
     def subscribe_to_topics(self):
         """Subscribe to configured IPC topics"""
@@ -143,20 +296,24 @@ class IPCSubscriber:
             return
         
         for topic in self.config['topics']:
-            try:
-                request = SubscribeToTopicRequest()
-                request.topic = topic
-                
-                handler = MessageHandler(self)
-                operation = self.ipc_client.new_subscribe_to_topic(handler)
-                future = operation.activate(request)
-                future.result(timeout=10.0)
-                
-                self.subscriptions.append(operation)
-                logger.info(f"Subscribed to IPC topic: {topic}")
-                
-            except Exception as e:
-                logger.error(f"Failed to subscribe to topic {topic}: {e}")
+            self.subscribe_topic(topic)
+    
+    def subscribe_topic(self, topic):
+        """Subscribe to one IPC topic"""
+        try:
+            request = ipc_model.SubscribeToTopicRequest()
+            request.topic = topic
+            
+            handler = MessageHandler(self)
+            operation = self.ipc_client.new_subscribe_to_topic(handler)
+            future = operation.activate(request)
+            future.result(timeout=10.0)
+            
+            self.subscriptions[topic] = operation
+            logger.info(f"Subscribed to IPC topic: {topic}")
+            
+        except Exception as e:
+            logger.error(f"Failed to subscribe to topic {topic}: {e}")
     
     def run(self):
         """Main component loop"""
@@ -166,6 +323,11 @@ class IPCSubscriber:
         try:
             if GREENGRASS_IPC_AVAILABLE and self.ipc_client:
                 self.subscribe_to_topics()
+                self.config_watcher.watch()
+                tracing.install()
+                metrics.start('IPCSubscriber')
+                profiling.install('IPCSubscriber')
+                startup.ready(logger)
                 
                 # Keep the component running
                 logger.info("Listening for IPC messages...")
@@ -174,6 +336,7 @@ class IPCSubscriber:
             else:
                 # Simulation mode
                 logger.info("Running in simulation mode - no actual subscriptions")
+                startup.ready(logger)
                 while True:
                     logger.info("Would be listening for IPC messages...")
                     time.sleep(30)
@@ -185,13 +348,16 @@ class IPCSubscriber:
             sys.exit(1)
         finally:
             # Clean up subscriptions
-            for subscription in self.subscriptions:
+            self.config_watcher.stop()
+            profiling.uninstall()
+            metrics.stop()
+            tracing.close()
+            for subscription in self.subscriptions.values():
                 try:
                     subscription.close()
                 except:
                     pass
-            if self.ipc_client:
-                self.ipc_client.close()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     subscriber = IPCSubscriber()
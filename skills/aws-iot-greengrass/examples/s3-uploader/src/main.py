@@ -1,42 +1,49 @@
 #!/usr/bin/env python3
 
 import json
-import logging
 import os
 import sys
+import threading
 import time
 import fnmatch
 from datetime import datetime
 from pathlib import Path
 
-try:
-    import boto3
-    from botocore.exceptions import ClientError, NoCredentialsError
-    BOTO3_AVAILABLE = True
-except ImportError:
-    BOTO3_AVAILABLE = False
-    logging.warning("boto3 not available - running in simulation mode")
+from component_runtime import (
+    LOW_MEMORY, ConfigWatcher, close_ipc_clients, env_bool, env_config, lazy_import, metrics, profiling,
+    setup_logging, startup
+)
 
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
-    WATCHDOG_AVAILABLE = True
-except ImportError:
-    WATCHDOG_AVAILABLE = False
-    logging.warning("watchdog not available - using polling mode")
+from s3_stream import S3Error, StreamingS3Client
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger('S3Uploader')
+logger = setup_logging('S3Uploader')
+
+# boto3 takes hundreds of milliseconds to import; it is loaded on the first upload.
+# Low-memory mode uploads with StreamingS3Client instead and never imports it.
+boto3 = lazy_import('boto3')
+botocore_exceptions = lazy_import('botocore.exceptions')
+BOTO3_AVAILABLE = boto3 is not None
+if not BOTO3_AVAILABLE and not LOW_MEMORY:
+    logger.warning("boto3 not available - running in simulation mode")
+
+watchdog_observers = lazy_import('watchdog.observers')
+WATCHDOG_AVAILABLE = watchdog_observers is not None
+if not WATCHDOG_AVAILABLE:
+    logger.warning("watchdog not available - using polling mode")
 
-class FileUploadHandler(FileSystemEventHandler):
-    """Handle file system events for immediate uploads"""
+class FileUploadHandler:
+    """Handle file system events for immediate uploads
+    
+    watchdog only calls dispatch(), so this needs no FileSystemEventHandler
+    base class and watchdog is not imported unless the observer is started.
+    """
     
     def __init__(self, uploader):
         self.uploader = uploader
+    
+    def dispatch(self, event):
+        if event.event_type == 'created':
+            self.on_created(event)
         
     def on_created(self, event):
         if not event.is_directory:
@@ -49,13 +56,29 @@ class S3Uploader:
     def __init__(self):
         self.config = self.load_configuration()
         self.s3_client = None
-        self.setup_s3_client()
+        self.s3_client_initialized = False
+        self.s3_client_lock = threading.Lock()
+        self.observer = None
+        self.config_changed = threading.Event()
+        self.uploaded = metrics.counter('uploaded')
+        self.uploaded_bytes = metrics.counter('uploadedBytes')
+        self.upload_failed = metrics.counter('uploadFailed')
+        self.upload_time = metrics.histogram('uploadTime')
         self.setup_watch_directory()
         
     def load_configuration(self):
         """Load component configuration"""
         try:
-            config = {
+            variables = {
+                "watchDirectory": ('GG_WATCH_DIR', str),
+                "s3Bucket": ('GG_S3_BUCKET', str),
+                "s3Prefix": ('GG_S3_PREFIX', str),
+                "uploadInterval": ('GG_UPLOAD_INTERVAL', int),
+                "deleteAfterUpload": ('GG_DELETE_AFTER', env_bool),
+                "filePattern": ('GG_FILE_PATTERN', str),
+                "maxFileSize": ('GG_MAX_FILE_SIZE', int)
+            }
+            config = env_config({
                 "watchDirectory": "/tmp/uploads",
                 "s3Bucket": "my-greengrass-uploads", 
                 "s3Prefix": "device-uploads/",
@@ -63,38 +86,55 @@ class S3Uploader:
                 "deleteAfterUpload": False,
                 "filePattern": "*",
                 "maxFileSize": 10485760  # 10MB
-            }
-            
-            # Load from environment variables
-            config["watchDirectory"] = os.environ.get('GG_WATCH_DIR', config["watchDirectory"])
-            config["s3Bucket"] = os.environ.get('GG_S3_BUCKET', config["s3Bucket"])
-            config["s3Prefix"] = os.environ.get('GG_S3_PREFIX', config["s3Prefix"])
-            config["uploadInterval"] = int(os.environ.get('GG_UPLOAD_INTERVAL', config["uploadInterval"]))
-            config["deleteAfterUpload"] = os.environ.get('GG_DELETE_AFTER', 'false').lower() == 'true'
-            config["filePattern"] = os.environ.get('GG_FILE_PATTERN', config["filePattern"])
-            config["maxFileSize"] = int(os.environ.get('GG_MAX_FILE_SIZE', config["maxFileSize"]))
+            }, variables)
             
+            # Deployed configuration replaces the environment values and is kept up to date
+            self.config_watcher = ConfigWatcher(config, variables, self.apply_configuration)
+            self.config_watcher.load()
+            startup.mark('configuration')
             return config
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             raise
     
     def setup_s3_client(self):
-        """Initialize S3 client using Greengrass credentials"""
-        if BOTO3_AVAILABLE:
-            try:
+        """Initialize S3 client using Greengrass credentials on first use"""
+        with self.s3_client_lock:
+            if self.s3_client_initialized:
+                return self.s3_client
+            self.s3_client_initialized = True
+            if LOW_MEMORY:
                 # In Greengrass, credentials are provided via TES
-                self.s3_client = boto3.client('s3')
-                logger.info("S3 client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize S3 client: {e}")
-                self.s3_client = None
-        else:
-            logger.info("Running in simulation mode - uploads will be logged only")
+                self.s3_client = StreamingS3Client()
+                logger.info("S3 client initialized (low-memory mode, streaming PutObject)")
+            elif BOTO3_AVAILABLE:
+                try:
+                    # In Greengrass, credentials are provided via TES
+                    self.s3_client = boto3.client('s3')
+                    logger.info("S3 client initialized")
+                except Exception as e:
+                    logger.error(f"Failed to initialize S3 client: {e}")
+                    self.s3_client = None
+            else:
+                logger.info("Running in simulation mode - uploads will be logged only")
+            return self.s3_client
+    
+    def apply_configuration(self, changes):
+        """Apply a configuration update without restarting"""
+        if 'watchDirectory' in changes:
+            # Raises before anything changes if the new directory can't be created
+            self.setup_watch_directory(changes['watchDirectory'])
+        self.config.update(changes)
+        if 'watchDirectory' in changes and self.observer:
+            self.observer.unschedule_all()
+            self.observer.schedule(FileUploadHandler(self), self.config['watchDirectory'], recursive=False)
+            logger.info(f"Monitoring directory: {self.config['watchDirectory']}")
+        # Rescan now, so a new directory, pattern or interval takes effect immediately
+        self.config_changed.set()
     
-    def setup_watch_directory(self):
+    def setup_watch_directory(self, directory=None):
         """Create watch directory if it doesn't exist"""
-        watch_dir = Path(self.config['watchDirectory'])
+        watch_dir = Path(directory or self.config['watchDirectory'])
         try:
             watch_dir.mkdir(parents=True, exist_ok=True)
             logger.info(f"Watch directory ready: {watch_dir}")
@@ -137,19 +177,27 @@ class S3Uploader:
             path = Path(file_path)
             s3_key = f"{self.config['s3Prefix']}{path.name}"
             
-            if self.s3_client:
+            s3_client = self.setup_s3_client()
+            if s3_client:
                 # Real S3 upload
-                self.s3_client.upload_file(
-                    str(path),
-                    self.config['s3Bucket'],
-                    s3_key,
-                    ExtraArgs={
-                        'Metadata': {
-                            'upload-timestamp': datetime.utcnow().isoformat(),
-                            'source-device': os.environ.get('AWS_IOT_THING_NAME', 'unknown')
-                        }
-                    }
-                )
+                size = path.stat().st_size
+                metadata = {
+                    'upload-timestamp': datetime.utcnow().isoformat(),
+                    'source-device': os.environ.get('AWS_IOT_THING_NAME', 'unknown')
+                }
+                started = time.perf_counter()
+                if LOW_MEMORY:
+                    s3_client.put_object(self.config['s3Bucket'], s3_key, path, metadata)
+                else:
+                    s3_client.upload_file(
+                        str(path),
+                        self.config['s3Bucket'],
+                        s3_key,
+                        ExtraArgs={'Metadata': metadata}
+                    )
+                self.upload_time.record(time.perf_counter() - started)
+                self.uploaded.inc()
+                self.uploaded_bytes.inc(size)
                 logger.info(f"Uploaded {path.name} to s3://{self.config['s3Bucket']}/{s3_key}")
             else:
                 # Simulation mode
@@ -162,11 +210,13 @@ class S3Uploader:
             
             return True
             
-        except ClientError as e:
-            logger.error(f"S3 upload failed for {file_path}: {e}")
-            return False
         except Exception as e:
-            logger.error(f"Unexpected error uploading {file_path}: {e}")
+            self.upload_failed.inc()
+            if isinstance(e, S3Error) or (BOTO3_AVAILABLE and not LOW_MEMORY
+                                          and isinstance(e, botocore_exceptions.ClientError)):
+                logger.error(f"S3 upload failed for {file_path}: {e}")
+            else:
+                logger.error(f"Unexpected error uploading {file_path}: {e}")
             return False
     
     def scan_and_upload_existing(self):
@@ -189,16 +239,17 @@ class S3Uploader:
     def run_with_watchdog(self):
         """Run with file system monitoring"""
         event_handler = FileUploadHandler(self)
-        observer = Observer()
+        observer = watchdog_observers.Observer()
         observer.schedule(event_handler, self.config['watchDirectory'], recursive=False)
         observer.start()
+        self.observer = observer
         
         logger.info(f"Monitoring directory: {self.config['watchDirectory']}")
         
         try:
             # Also periodically scan for files (in case watchdog misses something)
             while True:
-                time.sleep(self.config['uploadInterval'])
+                self.wait_for_next_scan()
                 self.scan_and_upload_existing()
         except KeyboardInterrupt:
             observer.stop()
@@ -211,14 +262,23 @@ class S3Uploader:
         try:
             while True:
                 self.scan_and_upload_existing()
-                time.sleep(self.config['uploadInterval'])
+                self.wait_for_next_scan()
         except KeyboardInterrupt:
             pass
     
+    def wait_for_next_scan(self):
+        """Sleep for uploadInterval, or until the configuration changes"""
+        if self.config_changed.wait(self.config['uploadInterval']):
+            self.config_changed.clear()
+    
     def run(self):
         """Main component loop"""
         logger.info("S3 Uploader component starting...")
         logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+        self.config_watcher.watch()
+        metrics.start('S3Uploader')
+        profiling.install('S3Uploader')
+        startup.ready(logger)
         
         try:
             # Upload any existing files first
@@ -235,6 +295,11 @@ class S3Uploader:
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
             sys.exit(1)
+        finally:
+            self.config_watcher.stop()
+            profiling.uninstall()
+            metrics.stop()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     uploader = S3Uploader()
@@ -0,0 +1,195 @@
+"""
+Minimal S3 PutObject client for low-memory mode.
+
+Requests are signed with Signature Version 4 and sent with http.client; the
+file is streamed from disk in BLOCK_SIZE blocks, so memory use does not grow
+with the file. Credentials come from the environment or, on Greengrass, from
+the Token Exchange Service (AWS_CONTAINER_CREDENTIALS_FULL_URI).
+
+botocore keeps the S3 service model and endpoint rules in memory once a
+client exists, which costs 35 MiB or more of RSS; this client only needs the
+standard library.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+from component_runtime import lazy_import
+
+http_client = lazy_import('http.client')
+
+# Bytes read from the file per socket write
+BLOCK_SIZE = 64 * 1024
+# Refresh Token Exchange Service credentials this long before they expire
+REFRESH_MARGIN = 300
+
+
+class S3Error(Exception):
+    """A PutObject request that S3 rejected or that could not be sent"""
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def sign(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def signing_key(secret_key, date, region, service='s3'):
+    key = sign(f"AWS4{secret_key}".encode('utf-8'), date)
+    for part in (region, service, 'aws4_request'):
+        key = sign(key, part)
+    return key
+
+
+def authorization(method, path, headers, credentials, region, amz_date, payload_hash='UNSIGNED-PAYLOAD'):
+    """The SigV4 Authorization header value for a request with these headers (which must include host)"""
+    names = sorted(name.lower() for name in headers)
+    values = {name.lower(): ' '.join(str(value).split()) for name, value in headers.items()}
+    signed_headers = ';'.join(names)
+    canonical_request = '\n'.join([
+        method,
+        urllib.parse.quote(path, safe='/~'),
+        '',
+        ''.join(f"{name}:{values[name]}\n" for name in names),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+    signature = hmac.new(signing_key(credentials['secret_key'], amz_date[:8], region),
+                         string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return (f"AWS4-HMAC-SHA256 Credential={credentials['access_key']}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}")
+
+
+class StreamingS3Client:
+    """PutObject from a file over one kept-alive connection
+
+    Uploads from several threads are serialized on the connection.
+    """
+
+    def __init__(self, region=None, endpoint_url=None):
+        self.region = region or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or 'us-east-1'
+        # A custom endpoint (e.g. a local S3-compatible store) is addressed path-style
+        self.endpoint_url = endpoint_url or os.environ.get('AWS_ENDPOINT_URL_S3') or os.environ.get('AWS_ENDPOINT_URL')
+        self.credentials = None
+        self.connection = None
+        self.connection_host = None
+        self.lock = threading.Lock()
+
+    def get_credentials(self):
+        """Environment credentials, or Token Exchange Service credentials refreshed before they expire"""
+        credentials = self.credentials
+        if credentials and (credentials['expires'] is None or credentials['expires'] - REFRESH_MARGIN > time.time()):
+            return credentials
+        if os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'):
+            credentials = {
+                'access_key': os.environ['AWS_ACCESS_KEY_ID'],
+                'secret_key': os.environ['AWS_SECRET_ACCESS_KEY'],
+                'token': os.environ.get('AWS_SESSION_TOKEN'),
+                'expires': None,
+            }
+        elif os.environ.get('AWS_CONTAINER_CREDENTIALS_FULL_URI'):
+            credentials = self.fetch_container_credentials(os.environ['AWS_CONTAINER_CREDENTIALS_FULL_URI'])
+        else:
+            raise S3Error("No AWS credentials: deploy with aws.greengrass.TokenExchangeService")
+        self.credentials = credentials
+        return credentials
+
+    def fetch_container_credentials(self, uri):
+        parsed = urllib.parse.urlsplit(uri)
+        connection = http_client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=10)
+        try:
+            headers = {}
+            if os.environ.get('AWS_CONTAINER_AUTHORIZATION_TOKEN'):
+                headers['Authorization'] = os.environ['AWS_CONTAINER_AUTHORIZATION_TOKEN']
+            connection.request('GET', parsed.path or '/', headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise S3Error(f"Token Exchange Service returned {response.status}", status=response.status)
+            document = json.loads(body)
+        finally:
+            connection.close()
+        expiration = document.get('Expiration')
+        return {
+            'access_key': document['AccessKeyId'],
+            'secret_key': document['SecretAccessKey'],
+            'token': document.get('Token'),
+            'expires': datetime.fromisoformat(expiration.replace('Z', '+00:00')).timestamp() if expiration else None,
+        }
+
+    def address(self, bucket, key):
+        """(scheme, host, port, path) for an object"""
+        if self.endpoint_url:
+            parsed = urllib.parse.urlsplit(self.endpoint_url)
+            return parsed.scheme, parsed.hostname, parsed.port, f"{parsed.path.rstrip('/')}/{bucket}/{key}"
+        return 'https', f"{bucket}.s3.{self.region}.amazonaws.com", None, f"/{key}"
+
+    def connect(self, scheme, host, port):
+        if self.connection is not None and self.connection_host == (scheme, host, port):
+            return self.connection
+        self.close()
+        if scheme == 'https':
+            self.connection = http_client.HTTPSConnection(host, port, timeout=60, blocksize=BLOCK_SIZE)
+        else:
+            self.connection = http_client.HTTPConnection(host, port, timeout=60, blocksize=BLOCK_SIZE)
+        self.connection_host = (scheme, host, port)
+        return self.connection
+
+    def signed_headers(self, host, object_path, size, metadata, credentials, amz_date):
+        """Headers for a PutObject of size bytes, including the SigV4 Authorization"""
+        headers = {
+            'host': host,
+            'content-length': str(size),
+            'x-amz-content-sha256': 'UNSIGNED-PAYLOAD',
+            'x-amz-date': amz_date,
+        }
+        if credentials['token']:
+            headers['x-amz-security-token'] = credentials['token']
+        for name, value in (metadata or {}).items():
+            headers[f"x-amz-meta-{name.lower()}"] = value
+        headers['Authorization'] = authorization('PUT', object_path, headers, credentials, self.region, amz_date)
+        return headers
+
+    def put_object(self, bucket, key, path, metadata=None):
+        """Upload the file at path as s3://bucket/key; raises S3Error on failure"""
+        credentials = self.get_credentials()
+        scheme, host, port, object_path = self.address(bucket, key)
+        headers = self.signed_headers(host if port is None else f"{host}:{port}", object_path,
+                                      os.path.getsize(path), metadata, credentials,
+                                      datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+
+        with self.lock, open(path, 'rb') as body:
+            connection = self.connect(scheme, host, port)
+            try:
+                connection.request('PUT', urllib.parse.quote(object_path, safe='/~'), body=body, headers=headers)
+                response = connection.getresponse()
+                text = response.read()
+            except (OSError, http_client.HTTPException) as e:
+                self.close()
+                raise S3Error(f"PutObject failed: {e}") from e
+        if response.status >= 300:
+            match = re.search(rb'<Code>([^<]+)</Code>', text)
+            code = match.group(1).decode() if match else None
+            if code == 'ExpiredToken':
+                self.credentials = None
+            raise S3Error(f"PutObject returned {response.status} {code or response.reason}",
+                          status=response.status, code=code)
+        return response.getheader('ETag')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -1,94 +1,122 @@
 #!/usr/bin/env python3
 
+import heapq
+import itertools
 import json
-import logging
 import math
 import os
-import random
+import queue
 import sys
 import threading
 import time
-from datetime import datetime, timezone
 from pathlib import Path
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from component_runtime import (
+    IPC_AVAILABLE, LOW_MEMORY, ConfigWatcher, close_ipc_clients, env_bool, env_config, ipc_client, lazy,
+    lazy_import, metrics, profiling, sampled, setup_logging, startup
 )
-logger = logging.getLogger('SensorSimulator')
+from sensors import SensorSimulator, parse_time
+from timeseries import RESOLUTIONS, ROLLUPS, TimeSeriesStore
 
-class SensorSimulator:
-    def __init__(self, sensor_config):
-        self.config = sensor_config
-        self.drift_offset = 0.0
-        self.last_value = sensor_config['baseValue']
-        self.start_time = time.time()
-        
-    def generate_reading(self):
-        """Generate a realistic sensor reading with drift and noise"""
-        current_time = time.time()
-        
-        # Base value with optional drift over time
-        base = self.config['baseValue']
-        if self.config.get('enableDrift', True):
-            # Slow drift over time (±10% over 1 hour)
-            drift_rate = 0.1 * self.config['baseValue'] / 3600  # per second
-            time_elapsed = current_time - self.start_time
-            self.drift_offset = math.sin(time_elapsed / 1800) * drift_rate * time_elapsed
-        
-        # Add variance and noise
-        variance = self.config.get('variance', 1.0)
-        if self.config.get('enableNoise', True):
-            # Random walk for realistic sensor behavior
-            change = random.gauss(0, variance * 0.1)
-            self.last_value += change
-            
-            # Keep within reasonable bounds
-            min_val = base - variance
-            max_val = base + variance
-            self.last_value = max(min_val, min(max_val, self.last_value))
-        else:
-            # Simple random value within variance
-            self.last_value = base + random.uniform(-variance, variance)
-        
-        # Apply drift
-        final_value = self.last_value + self.drift_offset
-        
-        # Round based on sensor type
-        if self.config['type'] in ['temperature', 'pressure']:
-            final_value = round(final_value, 2)
-        elif self.config['type'] in ['humidity', 'battery']:
-            final_value = round(final_value, 1)
-        else:
-            final_value = round(final_value, 2)
-        
-        return {
-            'sensorId': self.config['id'],
-            'sensorType': self.config['type'],
-            'value': final_value,
-            'unit': self.config.get('unit', 'units'),
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'quality': self.get_quality_indicator(final_value)
-        }
+logger = setup_logging('SensorSimulator')
+
+ipc_model = lazy_import('awsiot.greengrasscoreipc.model')
+ipc_client_module = lazy_import('awsiot.greengrasscoreipc.client')
+# multiprocessing is only imported for sharded mode
+shards = lazy_import('shards')
+
+# Settings the shard workers are sent again when they change
+SHARD_KEYS = {'sensors', 'enableDrift', 'enableNoise', 'outputMode'}
+# Settings that reopen the output when they change
+OUTPUT_KEYS = {'outputMode', 'outputPath', 'storeDirectory', 'storeRawPoints', 'storeMinutePoints',
+               'storeHourPoints'}
+# Most points in one query reply; the reply says where the next page starts
+QUERY_LIMIT = 1000
+# Queries waiting for the query thread; more are dropped
+QUERY_BACKLOG = 100
+
+
+class SensorLoop:
+    """Run every sensor on one thread, each on its own interval (low-memory mode)
+
+    Instead of a thread (and its stack) per sensor, sensors wait in a heap
+    ordered by when their next reading is due.
+    """
     
-    def get_quality_indicator(self, value):
-        """Determine data quality based on value ranges"""
-        base = self.config['baseValue']
-        variance = self.config.get('variance', 1.0)
-        
-        if abs(value - base) > variance * 0.8:
-            return 'warning'
-        elif abs(value - base) > variance * 1.2:
-            return 'error'
-        else:
-            return 'good'
+    def __init__(self, take_reading):
+        self.take_reading = take_reading
+        self.heap = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+    
+    def schedule(self, simulator, due=None):
+        """Take the sensor's next reading at due (now by default), replacing its earlier deadline"""
+        with self.condition:
+            simulator.next_due = time.monotonic() if due is None else due
+            heapq.heappush(self.heap, (simulator.next_due, next(self.order), simulator))
+            self.condition.notify()
+    
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='sensor-loop', daemon=True)
+        self.thread.start()
+    
+    def stop(self, timeout=5):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+    
+    def next_sensor(self):
+        """Wait for the next due sensor; None once stopped"""
+        with self.condition:
+            while self.running:
+                if self.heap and self.heap[0][0] <= time.monotonic():
+                    due, _, simulator = heapq.heappop(self.heap)
+                    # Skip removed sensors and deadlines replaced by a later schedule()
+                    if simulator.active and due == simulator.next_due:
+                        return simulator
+                    continue
+                self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+            return None
+    
+    def run(self):
+        while True:
+            simulator = self.next_sensor()
+            if simulator is None:
+                return
+            try:
+                self.take_reading(simulator)
+                self.schedule(simulator, time.monotonic() + simulator.config['interval'])
+            except Exception as e:
+                logger.error(f"Error reading sensor {simulator.config['id']}: {e}")
+                self.schedule(simulator, time.monotonic() + 5)  # Brief pause before retry
 
 class SensorSimulatorComponent:
     def __init__(self):
         self.config = self.load_configuration()
-        self.simulators = []
+        # Sensor id -> SensorSimulator
+        self.simulators = {}
+        self.threads = {}
+        # Sharded mode runs the sensors in worker processes instead, and writes their readings on one thread
+        self.pool = shards.ShardPool(self.config['shards'], self.write_batch) if self.config['shards'] else None
+        # Low-memory mode runs all sensors on one thread instead of one thread each
+        self.loop = SensorLoop(self.take_reading) if LOW_MEMORY and not self.pool else None
         self.running = True
+        self.readings = metrics.counter('readings')
+        self.quality_warnings = metrics.counter('qualityWarnings')
+        self.write_errors = metrics.counter('writeErrors')
+        self.write_time = metrics.histogram('writeTime')
+        self.queries = metrics.counter('queries')
+        metrics.gauge('sensors', lambda: len(self.config['sensors']))
+        self.store = None
+        # Held to change the output mode or store, and to write to the store
+        self.output_lock = threading.Lock()
+        self.query_operation = None
+        self.query_queue = queue.Queue(QUERY_BACKLOG)
         self.setup_simulators()
         self.setup_output()
         
@@ -110,107 +138,403 @@ class SensorSimulatorComponent:
                 "outputMode": "file",
                 "outputPath": "/tmp/sensor-data.json",
                 "enableDrift": True,
-                "enableNoise": True
+                "enableNoise": True,
+                "storeDirectory": "/tmp/sensor-store",
+                "storeRawPoints": 65536,
+                "storeMinutePoints": 10080,
+                "storeHourPoints": 8760,
+                "storeQueryTopic": "local/sensor/query",
+                "shards": 0
             }
             
             # Override with environment variables for testing
             if os.environ.get('GG_SENSOR_CONFIG'):
-                config = json.loads(os.environ.get('GG_SENSOR_CONFIG'))
+                config.update(json.loads(os.environ.get('GG_SENSOR_CONFIG')))
             
-            config["outputMode"] = os.environ.get('GG_OUTPUT_MODE', config["outputMode"])
-            config["outputPath"] = os.environ.get('GG_OUTPUT_PATH', config["outputPath"])
+            variables = {
+                "outputMode": ('GG_OUTPUT_MODE', str),
+                "outputPath": ('GG_OUTPUT_PATH', str),
+                "storeDirectory": ('GG_STORE_DIR', str),
+                "storeRawPoints": ('GG_STORE_RAW_POINTS', int),
+                "storeMinutePoints": ('GG_STORE_MINUTE_POINTS', int),
+                "storeHourPoints": ('GG_STORE_HOUR_POINTS', int),
+                "storeQueryTopic": ('GG_STORE_QUERY_TOPIC', str),
+                "shards": ('GG_SHARDS', int)
+            }
+            config = env_config(config, variables)
             
+            # Deployed configuration replaces the environment values and is kept up to date
+            self.config_watcher = ConfigWatcher(config, {
+                **variables,
+                # Only read from the deployed configuration (or GG_SENSOR_CONFIG as a whole)
+                "sensors": (None, json.loads),
+                "enableDrift": (None, env_bool),
+                "enableNoise": (None, env_bool)
+            }, self.apply_configuration, validate=self.validate_configuration,
+                restart_keys=('storeQueryTopic', 'shards'))
+            self.config_watcher.load()
+            startup.mark('configuration')
             return config
         except Exception as e:
             logger.error(f"Failed to load configuration: {e}")
             raise    
 
+    @staticmethod
+    def validate_configuration(config):
+        """Raise ValueError for sensor lists and outputs the simulator cannot run"""
+        if config['outputMode'] == 'store' and not config['storeDirectory']:
+            raise ValueError("outputMode 'store' needs a storeDirectory")
+        if min(config['storeRawPoints'], config['storeMinutePoints'], config['storeHourPoints']) < 1:
+            raise ValueError("storeRawPoints, storeMinutePoints and storeHourPoints must be at least 1")
+        if config['shards'] < 0:
+            raise ValueError(f"shards must be 0 (no worker processes) or more, got {config['shards']}")
+        ids = set()
+        for sensor_config in config['sensors']:
+            missing = [key for key in ('id', 'type', 'interval', 'baseValue') if key not in sensor_config]
+            if missing:
+                raise ValueError(f"Sensor {sensor_config.get('id', '?')} is missing {', '.join(missing)}")
+            if sensor_config['id'] in ids:
+                raise ValueError(f"Duplicate sensor id: {sensor_config['id']}")
+            ids.add(sensor_config['id'])
+    
+    def sensor_settings(self, sensor_config):
+        """A sensor's configuration with the global settings added"""
+        return {
+            **sensor_config,
+            'enableDrift': self.config.get('enableDrift', True),
+            'enableNoise': self.config.get('enableNoise', True)
+        }
+    
     def setup_simulators(self):
         """Initialize sensor simulators"""
+        if self.pool:
+            self.configure_shards()
+            return
         for sensor_config in self.config['sensors']:
-            # Add global settings to each sensor
-            sensor_config['enableDrift'] = self.config.get('enableDrift', True)
-            sensor_config['enableNoise'] = self.config.get('enableNoise', True)
-            
-            simulator = SensorSimulator(sensor_config)
-            self.simulators.append(simulator)
+            simulator = SensorSimulator(self.sensor_settings(sensor_config))
+            self.simulators[sensor_config['id']] = simulator
             logger.info(f"Initialized sensor: {sensor_config['id']} ({sensor_config['type']})")
     
+    def apply_configuration(self, changes):
+        """Apply a configuration update without restarting
+
+        Sensors are matched by id: kept sensors take their new settings in place,
+        removed sensors stop and added sensors start.
+        """
+        if OUTPUT_KEYS.intersection(changes):
+            # Writers read the mode and the store together under the lock
+            with self.output_lock:
+                self.config.update(changes)
+                self.setup_output()
+        else:
+            self.config.update(changes)
+        if self.pool:
+            if SHARD_KEYS.intersection(changes):
+                self.configure_shards()
+            return
+        if not {'sensors', 'enableDrift', 'enableNoise'}.intersection(changes):
+            return
+        
+        sensors = {sensor_config['id']: sensor_config for sensor_config in self.config['sensors']}
+        for sensor_id in [sensor_id for sensor_id in self.simulators if sensor_id not in sensors]:
+            self.simulators.pop(sensor_id).stop()
+            self.threads.pop(sensor_id, None)
+            logger.info(f"Removed sensor: {sensor_id}")
+        for sensor_id, sensor_config in sensors.items():
+            settings = self.sensor_settings(sensor_config)
+            simulator = self.simulators.get(sensor_id)
+            if simulator is None:
+                simulator = self.simulators[sensor_id] = SensorSimulator(settings)
+                self.start_sensor(simulator)
+                logger.info(f"Added sensor: {sensor_id} ({settings['type']})")
+            elif simulator.config != settings:
+                simulator.reconfigure(settings)
+                if self.loop:
+                    self.loop.schedule(simulator)
+                logger.info(f"Reconfigured sensor: {sensor_id}")
+    
+    def configure_shards(self):
+        """Send the shard workers their sensors; the JSON lines are only encoded when the output needs them"""
+        self.pool.configure([self.sensor_settings(sensor_config) for sensor_config in self.config['sensors']],
+                            with_json=self.config['outputMode'] != 'store')
+    
     def setup_output(self):
-        """Setup output file/directory"""
+        """Setup output file/directory, or open the time-series store (under output_lock once running)"""
+        previous, self.store = self.store, None
+        if previous:
+            previous.close()
         if self.config['outputMode'] == 'file':
             output_path = Path(self.config['outputPath'])
             output_path.parent.mkdir(parents=True, exist_ok=True)
             logger.info(f"Output configured: {output_path}")
+        elif self.config['outputMode'] == 'store':
+            self.store = TimeSeriesStore(self.config['storeDirectory'], self.config['storeRawPoints'],
+                                         self.config['storeMinutePoints'], self.config['storeHourPoints'])
+            logger.info(f"Output configured: time-series store in {self.config['storeDirectory']}")
     
     def write_reading(self, reading):
         """Write sensor reading to configured output"""
+        started = time.perf_counter()
         try:
-            if self.config['outputMode'] == 'file':
+            with self.output_lock:
+                mode = self.config['outputMode']
+                if mode == 'store':
+                    self.store.append(reading['sensorId'], parse_time(reading['timestamp']), reading['value'],
+                                      reading['quality'])
+            if mode == 'file':
                 # Append to JSON lines file
                 with open(self.config['outputPath'], 'a') as f:
                     f.write(json.dumps(reading) + '\n')
-            elif self.config['outputMode'] == 'log':
-                # Log the reading
-                logger.info(f"Sensor reading: {json.dumps(reading)}")
-            else:
-                # Default to logging
-                logger.info(f"Sensor reading: {json.dumps(reading)}")
+            elif mode != 'store':
+                # Log the reading ('log' and any other mode)
+                logger.info("Sensor reading: %s", lazy(json.dumps, reading),
+                            extra=sampled(f"reading:{reading['sensorId']}"))
+            self.readings.inc()
                 
         except Exception as e:
+            self.write_errors.inc()
             logger.error(f"Failed to write reading: {e}")
+        self.write_time.record(time.perf_counter() - started)
+    
+    def write_batch(self, data):
+        """Write a batch of readings encoded by the shard workers (sharded mode), on the writer thread"""
+        started = time.perf_counter()
+        count = skipped = 0
+        try:
+            lines = []
+            with self.output_lock:
+                mode = self.config['outputMode']
+                for sensor_id, t, value, quality, line in shards.frames(data):
+                    if mode == 'store':
+                        self.store.append(sensor_id, t, value, quality)
+                    elif not line:
+                        # Encoded for the store before the worker was sent the new output mode
+                        skipped += 1
+                        continue
+                    elif mode == 'file':
+                        lines.append(line)
+                    else:
+                        logger.info("Sensor reading: %s", lazy(str, line[:-1], 'utf-8'),
+                                    extra=sampled(f"reading:{sensor_id}"))
+                    count += 1
+                    if quality in ['warning', 'error']:
+                        self.quality_warnings.inc()
+                        logger.warning("Sensor %s quality: %s (value: %s)", sensor_id, quality, value,
+                                       extra=sampled(f"quality:{sensor_id}"))
+            if skipped:
+                logger.warning("Skipped %d readings encoded without JSON while the output mode changed", skipped,
+                               extra=sampled('skipped-frames'))
+            if lines:
+                # One append for the whole batch; the lines are already JSON
+                with open(self.config['outputPath'], 'ab') as f:
+                    f.write(b''.join(lines))
+            self.readings.inc(count)
+        except Exception as e:
+            self.write_errors.inc()
+            logger.error(f"Failed to write {count} readings: {e}")
+        self.write_time.record(time.perf_counter() - started)
+    
+    def take_reading(self, simulator):
+        """Generate and write one reading from a sensor"""
+        reading = simulator.generate_reading()
+        self.write_reading(reading)
+        
+        # Log warnings for out-of-range values
+        if reading['quality'] in ['warning', 'error']:
+            self.quality_warnings.inc()
+            logger.warning("Sensor %s quality: %s (value: %s)", reading['sensorId'], reading['quality'],
+                           reading['value'], extra=sampled(f"quality:{reading['sensorId']}"))
     
     def sensor_thread(self, simulator):
         """Thread function for individual sensor"""
         logger.info(f"Starting sensor thread: {simulator.config['id']}")
         
-        while self.running:
+        while self.running and simulator.active:
             try:
-                reading = simulator.generate_reading()
-                self.write_reading(reading)
-                
-                # Log warnings for out-of-range values
-                if reading['quality'] in ['warning', 'error']:
-                    logger.warning(f"Sensor {reading['sensorId']} quality: {reading['quality']} (value: {reading['value']})")
+                self.take_reading(simulator)
                 
-                time.sleep(simulator.config['interval'])
+                if simulator.wakeup.wait(simulator.config['interval']):
+                    simulator.wakeup.clear()
                 
             except Exception as e:
                 logger.error(f"Error in sensor thread {simulator.config['id']}: {e}")
                 time.sleep(5)  # Brief pause before retry
     
+    def start_sensor(self, simulator):
+        """Start the thread for one sensor, or schedule it on the shared loop"""
+        if self.loop:
+            self.loop.schedule(simulator)
+            return
+        thread = threading.Thread(
+            target=self.sensor_thread,
+            args=(simulator,),
+            daemon=True
+        )
+        thread.start()
+        self.threads[simulator.config['id']] = thread
+    
+    def answer_query(self, request):
+        """The reply to a history query
+
+        {"sensorId", "start", "end", "resolution"} returns raw readings or
+        rollup buckets; with "step" (seconds) it returns min, max, mean and
+        count per step instead. Without "sensorId" it lists the stored sensors.
+        """
+        reply = {'requestId': request.get('requestId')}
+        store = self.store
+        if store is None:
+            return {**reply, 'error': "History is only kept with outputMode 'store'"}
+        sensor_id = request.get('sensorId')
+        if sensor_id is None:
+            return {**reply, 'sensors': store.sensors()}
+        start, end = parse_time(request.get('start')), parse_time(request.get('end'))
+        limit = min(int(request.get('limit') or QUERY_LIMIT), QUERY_LIMIT)
+        step = request.get('step')
+        if step:
+            points = store.downsample(sensor_id, start, end, float(step), limit=limit)
+            reply.update({'sensorId': sensor_id, 'step': step, 'points': points})
+            page = float(step)
+        else:
+            resolution = request.get('resolution', 'raw')
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"Unsupported resolution: {resolution} (expected one of {', '.join(RESOLUTIONS)})")
+            points = store.query(sensor_id, start, end, resolution, limit=limit)
+            reply.update({'sensorId': sensor_id, 'resolution': resolution, 'points': points})
+            page = ROLLUPS.get(resolution)
+        if len(points) == limit:
+            last = points[-1]['time']
+            # Start of the next page: the next bucket, or just after the last raw reading
+            reply['next'] = last + page if page else math.nextafter(last, math.inf)
+        return reply
+    
+    def subscribe_queries(self):
+        """Answer history queries on storeQueryTopic; replies go to the request's replyTopic or <topic>/result"""
+        topic = self.config['storeQueryTopic']
+        if not topic or not IPC_AVAILABLE:
+            return
+        component = self
+        
+        class QueryHandler(ipc_client_module.SubscribeToTopicStreamHandler):
+            def on_stream_event(self, event):
+                # Answered on the query thread: blocking here would stall the IPC connection
+                try:
+                    component.query_queue.put_nowait(event)
+                except queue.Full:
+                    logger.warning("History query dropped: %d queries waiting", QUERY_BACKLOG,
+                                   extra=sampled('query-backlog'))
+            
+            def on_stream_error(self, error):
+                logger.error(f"History query stream error: {error}")
+                return False  # Keep the stream open
+        
+        threading.Thread(target=self.query_thread, args=(topic,), name='history-query', daemon=True).start()
+        try:
+            request = ipc_model.SubscribeToTopicRequest()
+            request.topic = topic
+            self.query_operation = ipc_client().new_subscribe_to_topic(QueryHandler())
+            self.query_operation.activate(request)
+            self.query_operation.get_response().result(timeout=10.0)
+            logger.info(f"Answering history queries on {topic}")
+        except Exception as e:
+            logger.error(f"Failed to subscribe to history queries on {topic}: {e}")
+            self.query_operation = None
+    
+    def query_thread(self, topic):
+        """Answer queued history queries until None is queued"""
+        while True:
+            event = self.query_queue.get()
+            if event is None:
+                return
+            request = {}
+            try:
+                if event.binary_message is not None:
+                    request = json.loads(event.binary_message.message or b'{}')
+                else:
+                    request = event.json_message.message or {}
+                reply = self.answer_query(request)
+            except Exception as e:
+                reply = {'requestId': request.get('requestId'), 'error': str(e)}
+            self.queries.inc()
+            self.publish_reply(request.get('replyTopic') or f"{topic}/result", reply)
+    
+    def publish_reply(self, topic, reply):
+        try:
+            request = ipc_model.PublishToTopicRequest()
+            request.topic = topic
+            request.publish_message = ipc_model.PublishMessage()
+            request.publish_message.binary_message = ipc_model.BinaryMessage()
+            request.publish_message.binary_message.message = json.dumps(reply).encode()
+            operation = ipc_client().new_publish_to_topic()
+            operation.activate(request)
+            operation.get_response().result(timeout=5.0)
+        except Exception as e:
+            logger.error(f"Failed to publish history reply to {topic}: {e}")
+    
+    def close_output(self):
+        """Stop answering queries and close the time-series store"""
+        if self.query_operation is not None:
+            try:
+                self.query_operation.close()
+            except Exception:
+                pass
+            self.query_operation = None
+            self.query_queue.put(None)
+        with self.output_lock:
+            if self.store:
+                self.store.close()
+                self.store = None
+    
     def run(self):
         """Main component loop"""
         logger.info("Sensor Simulator component starting...")
         logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
         
         try:
-            # Start a thread for each sensor
-            threads = []
-            for simulator in self.simulators:
-                thread = threading.Thread(
-                    target=self.sensor_thread,
-                    args=(simulator,),
-                    daemon=True
-                )
-                thread.start()
-                threads.append(thread)
+            # Start the shard workers, or a thread for each sensor (or the one shared loop)
+            if self.pool:
+                self.pool.start()
+                logger.info(f"Sharded mode: {len(self.config['sensors'])} sensors across {self.pool.shards} "
+                            f"worker processes")
+            elif self.loop:
+                self.loop.start()
+                logger.info(f"Low-memory mode: {len(self.simulators)} sensors on one thread")
+            for simulator in list(self.simulators.values()):
+                self.start_sensor(simulator)
+            self.config_watcher.watch()
+            self.subscribe_queries()
+            metrics.start('SensorSimulator')
+            profiling.install('SensorSimulator')
+            startup.ready(logger)
             
             # Keep main thread alive
             while self.running:
                 time.sleep(1)
+                if self.pool:
+                    self.pool.check()
                 
         except KeyboardInterrupt:
             logger.info("Sensor Simulator component stopping...")
             self.running = False
+            self.config_watcher.stop()
             
             # Wait for threads to finish
-            for thread in threads:
+            for simulator in list(self.simulators.values()):
+                simulator.wakeup.set()
+            for thread in list(self.threads.values()):
                 thread.join(timeout=5)
+            if self.loop:
+                self.loop.stop()
+            if self.pool:
+                self.pool.stop()
+            self.close_output()
                 
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
             sys.exit(1)
+        finally:
+            profiling.uninstall()
+            metrics.stop()
+            close_ipc_clients()
 
 if __name__ == "__main__":
     component = SensorSimulatorComponent()
@@ -0,0 +1,107 @@
+"""
+Simulated sensors: readings with drift and noise around a base value.
+
+Kept apart from the component so that the shard workers (shards.py) import
+only this, not the component and its IPC client.
+"""
+
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def parse_time(value):
+    """Epoch seconds from a number or an ISO 8601 string (None stays None)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class SensorSimulator:
+    # One per configured sensor, so no per-instance __dict__
+    __slots__ = ('config', 'drift_offset', 'last_value', 'start_time', 'active', 'wakeup', 'next_due')
+    
+    def __init__(self, sensor_config):
+        self.config = sensor_config
+        self.drift_offset = 0.0
+        self.last_value = sensor_config['baseValue']
+        self.start_time = time.time()
+        self.active = True
+        # Set to end the current interval early (configuration change or removal)
+        self.wakeup = threading.Event()
+        # When the shared sensor loop takes the next reading (low-memory mode)
+        self.next_due = None
+    
+    def reconfigure(self, sensor_config):
+        """Take new settings in place, keeping the random walk and drift state"""
+        self.config.clear()
+        self.config.update(sensor_config)
+        self.wakeup.set()
+    
+    def stop(self):
+        self.active = False
+        self.wakeup.set()
+        
+    def generate_reading(self):
+        """Generate a realistic sensor reading with drift and noise"""
+        current_time = time.time()
+        
+        # Base value with optional drift over time
+        base = self.config['baseValue']
+        if self.config.get('enableDrift', True):
+            # Slow drift over time (±10% over 1 hour)
+            drift_rate = 0.1 * self.config['baseValue'] / 3600  # per second
+            time_elapsed = current_time - self.start_time
+            self.drift_offset = math.sin(time_elapsed / 1800) * drift_rate * time_elapsed
+        
+        # Add variance and noise
+        variance = self.config.get('variance', 1.0)
+        if self.config.get('enableNoise', True):
+            # Random walk for realistic sensor behavior
+            change = random.gauss(0, variance * 0.1)
+            self.last_value += change
+            
+            # Keep within reasonable bounds
+            min_val = base - variance
+            max_val = base + variance
+            self.last_value = max(min_val, min(max_val, self.last_value))
+        else:
+            # Simple random value within variance
+            self.last_value = base + random.uniform(-variance, variance)
+        
+        # Apply drift
+        final_value = self.last_value + self.drift_offset
+        
+        # Round based on sensor type
+        if self.config['type'] in ['temperature', 'pressure']:
+            final_value = round(final_value, 2)
+        elif self.config['type'] in ['humidity', 'battery']:
+            final_value = round(final_value, 1)
+        else:
+            final_value = round(final_value, 2)
+        
+        return {
+            'sensorId': self.config['id'],
+            'sensorType': self.config['type'],
+            'value': final_value,
+            'unit': self.config.get('unit', 'units'),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'quality': self.get_quality_indicator(final_value)
+        }
+    
+    def get_quality_indicator(self, value):
+        """Determine data quality based on value ranges"""
+        base = self.config['baseValue']
+        variance = self.config.get('variance', 1.0)
+        
+        if abs(value - base) > variance * 0.8:
+            return 'warning'
+        elif abs(value - base) > variance * 1.2:
+            return 'error'
+        else:
+            return 'good'
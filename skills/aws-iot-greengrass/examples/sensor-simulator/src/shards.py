@@ -0,0 +1,323 @@
+"""
+Sharded sensor simulation: the configured sensors are partitioned across
+worker processes, so that generating and serializing readings is not held
+to one core by the GIL.
+
+Each worker runs its sensors from a heap of due times, as SensorLoop does on
+one thread, and packs each reading into a binary frame: the fields the
+time-series store needs, and the reading's JSON line unless the output is
+the store. Frames are batched into a ring buffer in shared memory, one ring
+per worker, so readings are copied, not pickled, on their way to the
+component. A single writer thread in the component takes every committed
+batch from the rings and writes it to the output.
+
+Sensors are assigned to workers by a hash of their id, so a sensor stays on
+its worker (and keeps its random walk and drift) across configuration
+changes. Only configuration changes go to the workers through a pipe.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+from sensors import SensorSimulator, parse_time
+from timeseries import QUALITY, QUALITY_CODES
+
+logger = logging.getLogger('SensorSimulator.Shards')
+
+# Frame size, sensor id length, epoch seconds, value, quality code; then the sensor id and the JSON line
+FRAME = struct.Struct('<IHddB')
+# Bytes ever committed by the worker, bytes ever taken by the writer
+HEADER = struct.Struct('<QQ')
+COUNTER = struct.Struct('<Q')
+HEADER_SIZE = 64
+RING_BYTES = 1 << 20
+# A worker hands over its batch once it holds this much, or when no sensor is due
+BATCH_BYTES = 64 * 1024
+# How long a worker waits for room when the writer is behind, before looking again
+FULL_WAIT = 0.001
+
+
+def shard_of(sensor_id, shards):
+    """The worker a sensor runs on; the same for the same id in every process"""
+    return zlib.crc32(sensor_id.encode('utf-8')) % shards
+
+
+def encode(reading, with_json=True):
+    """One reading as a frame"""
+    sensor_id = reading['sensorId'].encode('utf-8')
+    line = (json.dumps(reading) + '\n').encode('utf-8') if with_json else b''
+    return FRAME.pack(FRAME.size + len(sensor_id) + len(line), len(sensor_id), parse_time(reading['timestamp']),
+                      reading['value'], QUALITY_CODES.get(reading['quality'], 0)) + sensor_id + line
+
+
+def frames(data):
+    """(sensor id, epoch seconds, value, quality, JSON line bytes) of each frame in a batch"""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        size, id_length, t, value, quality = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        yield (str(view[start:start + id_length], 'utf-8'), t, value, QUALITY[quality],
+               view[start + id_length:offset + size])
+        offset += size
+
+
+class Ring:
+    """Byte ring in shared memory with one producer (a worker) and one consumer (the writer)
+
+    The producer appends whole batches of frames and the consumer takes
+    everything committed so far, so frames are never split between takes.
+    The two running totals in the header are read and written under the
+    lock, whose semaphore also orders the data copies before them on weakly
+    ordered CPUs.
+    """
+
+    def __init__(self, capacity=RING_BYTES, name=None, lock=None):
+        self.capacity = capacity
+        self.owner = name is None
+        # Attached by name in the worker, where the component's resource tracker is shared
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=HEADER_SIZE + capacity)
+        self.lock = lock or multiprocessing.get_context('spawn').Lock()
+        if self.owner:
+            HEADER.pack_into(self.memory.buf, 0, 0, 0)
+
+    def spec(self):
+        """What a worker needs to attach to this ring"""
+        return self.capacity, self.memory.name, self.lock
+
+    def put(self, data):
+        """Append a batch, waiting while the ring is too full for it"""
+        size = len(data)
+        if size > self.capacity:
+            raise ValueError(f"Batch of {size} bytes does not fit a {self.capacity}-byte ring")
+        buf = self.memory.buf
+        while True:
+            with self.lock:
+                written, taken = HEADER.unpack_from(buf, 0)
+            if self.capacity - (written - taken) >= size:
+                break
+            time.sleep(FULL_WAIT)
+        start = written % self.capacity
+        first = min(size, self.capacity - start)
+        data = memoryview(data)
+        buf[HEADER_SIZE + start:HEADER_SIZE + start + first] = data[:first]
+        if first < size:
+            buf[HEADER_SIZE:HEADER_SIZE + size - first] = data[first:]
+        with self.lock:
+            COUNTER.pack_into(buf, 0, written + size)
+
+    def take(self):
+        """Everything committed since the last take (b'' when nothing is)"""
+        buf = self.memory.buf
+        with self.lock:
+            written, taken = HEADER.unpack_from(buf, 0)
+        size = written - taken
+        if not size:
+            return b''
+        start = taken % self.capacity
+        first = min(size, self.capacity - start)
+        data = bytes(buf[HEADER_SIZE + start:HEADER_SIZE + start + first])
+        if first < size:
+            data += bytes(buf[HEADER_SIZE:HEADER_SIZE + size - first])
+        with self.lock:
+            COUNTER.pack_into(buf, COUNTER.size, written)
+        return data
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class Shard:
+    """The sensors of one worker process, run from a heap of due times"""
+
+    def __init__(self, ring, ready):
+        self.ring = ring
+        self.ready = ready
+        self.simulators = {}
+        self.heap = []
+        self.order = itertools.count()
+        self.with_json = True
+        self.batch = bytearray()
+
+    def schedule(self, simulator, due):
+        simulator.next_due = due
+        heapq.heappush(self.heap, (due, next(self.order), simulator))
+
+    def configure(self, sensors, with_json):
+        """Match the sensors by id: kept ones take their new settings in place, removed ones stop"""
+        self.with_json = with_json
+        settings_by_id = {settings['id']: settings for settings in sensors}
+        for sensor_id in [sensor_id for sensor_id in self.simulators if sensor_id not in settings_by_id]:
+            self.simulators.pop(sensor_id).stop()
+        now = time.monotonic()
+        for sensor_id, settings in settings_by_id.items():
+            simulator = self.simulators.get(sensor_id)
+            if simulator is None:
+                simulator = self.simulators[sensor_id] = SensorSimulator(settings)
+            elif simulator.config == settings:
+                continue
+            else:
+                simulator.reconfigure(settings)
+            self.schedule(simulator, now)
+
+    def take_readings(self):
+        """Encode the readings that are due into the batch; True if it filled up before they were all taken"""
+        now = time.monotonic()
+        while self.heap and self.heap[0][0] <= now:
+            if len(self.batch) >= BATCH_BYTES:
+                return True
+            due, _, simulator = heapq.heappop(self.heap)
+            # Skip removed sensors and deadlines replaced by a later schedule()
+            if not simulator.active or due != simulator.next_due:
+                continue
+            try:
+                self.batch += encode(simulator.generate_reading(), self.with_json)
+                self.schedule(simulator, now + simulator.config['interval'])
+            except Exception as e:
+                logger.error(f"Error reading sensor {simulator.config['id']}: {e}")
+                self.schedule(simulator, now + 5)  # Brief pause before retry
+        return False
+
+    def flush(self):
+        if self.batch:
+            self.ring.put(self.batch)
+            self.batch.clear()
+            self.ready.set()
+
+    def timeout(self):
+        """Seconds until the next sensor is due (None without sensors)"""
+        return max(0.0, self.heap[0][0] - time.monotonic()) if self.heap else None
+
+
+def run_shard(ring_spec, ready, connection):
+    """Worker process: run the sensors it is sent until it is sent None"""
+    capacity, name, lock = ring_spec
+    ring = Ring(capacity, name, lock)
+    shard = Shard(ring, ready)
+    try:
+        while True:
+            full = shard.take_readings()
+            shard.flush()
+            # Configuration changes end the wait for the next due sensor
+            if connection.poll(0 if full else shard.timeout()):
+                message = connection.recv()
+                if message is None:
+                    return
+                shard.configure(*message)
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        shard.flush()
+        ring.close()
+
+
+class ShardPool:
+    """Worker processes for the sensors, and the writer thread that takes their batches
+
+    write_batch(data) is called on the writer thread with each batch of
+    frames; see frames().
+    """
+
+    def __init__(self, shards, write_batch):
+        self.shards = shards
+        self.write_batch = write_batch
+        # Spawned, not forked: the component's threads (logging, metrics, IPC) hold locks a fork would copy
+        self.context = multiprocessing.get_context('spawn')
+        self.ready = self.context.Event()
+        self.rings = [Ring(lock=self.context.Lock()) for _ in range(shards)]
+        self.connections = [None] * shards
+        self.workers = [None] * shards
+        # What each worker was last sent, to start it again with
+        self.assigned = [([], True)] * shards
+        self.running = False
+        self.writer = None
+
+    def configure(self, sensors, with_json=True):
+        """Send each worker the settings of its sensors; with_json=False leaves out the JSON lines"""
+        assigned = [[] for _ in range(self.shards)]
+        for settings in sensors:
+            assigned[shard_of(settings['id'], self.shards)].append(settings)
+        for index, settings_list in enumerate(assigned):
+            message = (settings_list, with_json)
+            if message != self.assigned[index] and self.connections[index] is not None:
+                self.connections[index].send(message)
+            self.assigned[index] = message
+
+    def start_worker(self, index):
+        connection, worker_connection = self.context.Pipe()
+        worker = self.context.Process(target=run_shard, args=(self.rings[index].spec(), self.ready, worker_connection),
+                                      name=f"sensor-shard-{index}", daemon=True)
+        worker.start()
+        worker_connection.close()
+        connection.send(self.assigned[index])
+        self.connections[index] = connection
+        self.workers[index] = worker
+
+    def start(self):
+        self.running = True
+        self.writer = threading.Thread(target=self.write_loop, name='shard-writer', daemon=True)
+        self.writer.start()
+        for index in range(self.shards):
+            self.start_worker(index)
+
+    def check(self):
+        """Start again any worker that has exited; their sensors start over from their base values"""
+        for index, worker in enumerate(self.workers):
+            if self.running and worker is not None and not worker.is_alive():
+                logger.error(f"Sensor shard {index} exited with code {worker.exitcode}; starting it again")
+                self.connections[index].close()
+                self.start_worker(index)
+
+    def drain(self):
+        """Hand every committed batch to write_batch; the number of bytes taken"""
+        taken = 0
+        for ring in self.rings:
+            data = ring.take()
+            if data:
+                taken += len(data)
+                self.write_batch(data)
+        return taken
+
+    def write_loop(self):
+        while self.running:
+            self.ready.wait(0.5)
+            # Cleared before the rings are read, so a batch committed meanwhile sets it again
+            self.ready.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Error writing sensor readings: {e}")
+
+    def stop(self, timeout=5):
+        """Stop the workers, write what they committed, and release the rings"""
+        for connection in self.connections:
+            if connection is not None:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass
+        for worker in self.workers:
+            if worker is not None:
+                worker.join(timeout=timeout)
+                if worker.is_alive():
+                    worker.terminate()
+        self.running = False
+        self.ready.set()
+        if self.writer:
+            self.writer.join(timeout=timeout)
+        self.drain()
+        for connection in self.connections:
+            if connection is not None:
+                connection.close()
+        for ring in self.rings:
+            ring.close()
@@ -0,0 +1,295 @@
+"""
+Embedded time-series store: the recent history of each sensor in fixed-size,
+memory-mapped ring files, with 1-minute and 1-hour rollups.
+
+Each sensor has a directory with three rings. raw.ring keeps the newest
+readings; 1m.ring and 1h.ring keep the min, max, sum and count of each
+bucket. Rings are allocated up front, so disk use is fixed, and records are
+written in place through mmap, so a reading survives a restart of the
+component. Timestamps in a ring never decrease: a query finds the start of
+its range by binary search and then reads only the records it returns.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import urllib.parse
+
+logger = logging.getLogger('SensorSimulator.TimeSeries')
+
+MAGIC = b'GGTS'
+VERSION = 1
+# Magic, version, record size, capacity, records ever written
+HEADER = struct.Struct('<4sHHIQ')
+HEADER_SIZE = 64
+WRITTEN = struct.Struct('<Q')
+WRITTEN_OFFSET = 12
+TIME = struct.Struct('<d')
+
+# Epoch seconds, value, quality code
+RAW = struct.Struct('<ddB7x')
+# Bucket start, min, max, sum, count
+ROLLUP = struct.Struct('<ddddQ')
+
+QUALITY = ('good', 'warning', 'error')
+QUALITY_CODES = {quality: code for code, quality in enumerate(QUALITY)}
+# Rollup resolutions and their bucket length in seconds
+ROLLUPS = {'1m': 60, '1h': 3600}
+RESOLUTIONS = ('raw', *ROLLUPS)
+
+
+class Ring:
+    """A fixed number of fixed-size records in a memory-mapped file; the oldest is overwritten first"""
+
+    def __init__(self, path, record, capacity):
+        if capacity < 1:
+            raise ValueError(f"Ring capacity must be at least 1, got {capacity}")
+        self.path = path
+        self.record = record
+        self.capacity = capacity
+        kept = self.existing_records()
+        if kept is None:
+            self.file = open(path, 'r+b')
+            self.map = mmap.mmap(self.file.fileno(), 0)
+            self.written = HEADER.unpack_from(self.map)[4]
+            return
+        # New, or resized: rewrite with the newest records that fit
+        self.file = open(path, 'w+b')
+        self.file.truncate(HEADER_SIZE + record.size * capacity)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, record.size, capacity, 0)
+        self.written = 0
+        for values in kept[-capacity:]:
+            self.append(*values)
+
+    def existing_records(self):
+        """None if the file can be mapped as is, otherwise the records to carry over"""
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(HEADER.size)
+                magic, version, record_size, capacity, written = HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION or record_size != self.record.size:
+                    raise ValueError(f"not a version {VERSION} ring of {self.record.size}-byte records")
+                if os.fstat(f.fileno()).st_size != HEADER_SIZE + record_size * capacity:
+                    raise ValueError("truncated")
+                if capacity == self.capacity:
+                    return None
+                count = min(written, capacity)
+                records = []
+                for i in range(written - count, written):
+                    f.seek(HEADER_SIZE + (i % capacity) * record_size)
+                    records.append(self.record.unpack(f.read(record_size)))
+                logger.info(f"Resizing {self.path} from {capacity} to {self.capacity} records")
+                return records
+        except FileNotFoundError:
+            return []
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Replacing unreadable ring {self.path}: {e}")
+            return []
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def offset(self, index):
+        """Byte offset of the index-th record, oldest first"""
+        return HEADER_SIZE + ((self.written - len(self) + index) % self.capacity) * self.record.size
+
+    def get(self, index):
+        return self.record.unpack_from(self.map, self.offset(index))
+
+    def time_at(self, index):
+        return TIME.unpack_from(self.map, self.offset(index))[0]
+
+    def last(self):
+        return self.get(len(self) - 1) if self.written else None
+
+    def append(self, *values):
+        self.record.pack_into(self.map, HEADER_SIZE + (self.written % self.capacity) * self.record.size, *values)
+        self.written += 1
+        WRITTEN.pack_into(self.map, WRITTEN_OFFSET, self.written)
+
+    def replace_last(self, *values):
+        self.record.pack_into(self.map, self.offset(len(self) - 1), *values)
+
+    def bisect(self, t):
+        """Index of the first record at or after time t"""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.time_at(middle) < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, start=None, end=None):
+        """Records with start <= time < end, oldest first"""
+        first = 0 if start is None else self.bisect(start)
+        last = len(self) if end is None else self.bisect(end)
+        for index in range(first, last):
+            yield self.get(index)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class Series:
+    """One sensor's raw readings and rollups"""
+
+    def __init__(self, directory, capacities):
+        os.makedirs(directory, exist_ok=True)
+        self.raw = Ring(os.path.join(directory, 'raw.ring'), RAW, capacities['raw'])
+        self.rollups = {name: Ring(os.path.join(directory, f"{name}.ring"), ROLLUP, capacities[name])
+                        for name in ROLLUPS}
+        self.lock = threading.Lock()
+
+    def append(self, t, value, quality='good'):
+        with self.lock:
+            if self.raw.written:
+                # Keep time order through clock steps, so that queries can binary-search
+                t = max(t, self.raw.time_at(len(self.raw) - 1))
+            self.raw.append(t, value, QUALITY_CODES.get(quality, 0))
+            for name, seconds in ROLLUPS.items():
+                ring = self.rollups[name]
+                start = t - t % seconds
+                current = ring.last()
+                if current is not None and current[0] == start:
+                    _, low, high, total, count = current
+                    ring.replace_last(start, min(low, value), max(high, value), total + value, count + 1)
+                else:
+                    ring.append(start, value, value, value, 1)
+
+    def ring(self, resolution):
+        if resolution == 'raw':
+            return self.raw
+        if resolution not in ROLLUPS:
+            raise ValueError(f"Unsupported resolution: {resolution} (expected one of {', '.join(RESOLUTIONS)})")
+        return self.rollups[resolution]
+
+    def close(self):
+        with self.lock:
+            self.raw.close()
+            for ring in self.rollups.values():
+                ring.close()
+
+
+def raw_point(record):
+    t, value, quality = record
+    return {'time': t, 'value': value, 'quality': QUALITY[quality] if quality < len(QUALITY) else 'good'}
+
+
+def rollup_point(record):
+    start, low, high, total, count = record
+    return {'time': start, 'min': low, 'max': high, 'mean': total / count, 'count': count}
+
+
+class TimeSeriesStore:
+    """Ring series for each sensor id, in one directory
+
+    raw_points, minute_points and hour_points are the records kept per
+    sensor; a changed capacity resizes existing rings when they are opened.
+    """
+
+    def __init__(self, directory, raw_points=65536, minute_points=10080, hour_points=8760):
+        self.directory = directory
+        self.capacities = {'raw': raw_points, '1m': minute_points, '1h': hour_points}
+        os.makedirs(directory, exist_ok=True)
+        self.series_by_id = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def path(self, sensor_id):
+        name = urllib.parse.quote(str(sensor_id), safe='-_.')
+        if name in ('', '.', '..'):
+            raise ValueError(f"Invalid sensor id: {sensor_id!r}")
+        return os.path.join(self.directory, name)
+
+    def series(self, sensor_id, create=True):
+        """The sensor's series; None if it has no history and create is False"""
+        series = self.series_by_id.get(sensor_id)
+        if series is not None:
+            return series
+        with self.lock:
+            if self.closed:
+                raise ValueError("Time-series store is closed")
+            series = self.series_by_id.get(sensor_id)
+            if series is None:
+                path = self.path(sensor_id)
+                if not create and not os.path.isdir(path):
+                    return None
+                series = self.series_by_id[sensor_id] = Series(path, self.capacities)
+            return series
+
+    def append(self, sensor_id, t, value, quality='good'):
+        """Store a reading taken at t (epoch seconds)"""
+        self.series(sensor_id).append(t, value, quality)
+
+    def sensors(self):
+        """Ids of the sensors with stored history"""
+        return sorted(urllib.parse.unquote(name) for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)))
+
+    def query(self, sensor_id, start=None, end=None, resolution='raw', limit=None):
+        """Readings (raw) or rollup buckets with start <= time < end, oldest first, at most limit"""
+        series = self.series(sensor_id, create=False)
+        if series is None:
+            return []
+        ring = series.ring(resolution)
+        to_point = raw_point if resolution == 'raw' else rollup_point
+        points = []
+        with series.lock:
+            for record in ring.read(start, end):
+                if limit is not None and len(points) >= limit:
+                    break
+                points.append(to_point(record))
+        return points
+
+    def downsample(self, sensor_id, start, end, step, limit=None):
+        """Min, max, mean and count per step-second bucket in [start, end), at most limit buckets
+
+        Buckets are aligned to multiples of step since the epoch. They are
+        built from the coarsest rollup whose bucket divides step, so the
+        records read are at most step / 60 per bucket returned; other steps
+        read raw readings.
+        """
+        if step <= 0:
+            raise ValueError(f"step must be positive, got {step}")
+        resolution = next((name for name, seconds in sorted(ROLLUPS.items(), key=lambda item: -item[1])
+                           if step >= seconds and step % seconds == 0), 'raw')
+        series = self.series(sensor_id, create=False)
+        if series is None:
+            return []
+        if start is not None:
+            start -= start % step
+        ring = series.ring(resolution)
+        buckets = []
+        with series.lock:
+            for record in ring.read(start, end):
+                if resolution == 'raw':
+                    t, low, _ = record
+                    high = total = low
+                    count = 1
+                else:
+                    t, low, high, total, count = record
+                bucket_start = t - t % step
+                if buckets and buckets[-1][0] == bucket_start:
+                    bucket = buckets[-1]
+                    bucket[1] = min(bucket[1], low)
+                    bucket[2] = max(bucket[2], high)
+                    bucket[3] += total
+                    bucket[4] += count
+                elif limit is not None and len(buckets) >= limit:
+                    break
+                else:
+                    buckets.append([bucket_start, low, high, total, count])
+        return [rollup_point(bucket) for bucket in buckets]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            series_list, self.series_by_id = list(self.series_by_id.values()), {}
+        for series in series_list:
+            series.close()
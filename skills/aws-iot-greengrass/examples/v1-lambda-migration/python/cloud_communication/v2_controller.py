@@ -1,66 +1,359 @@
 from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
 from awsiot.greengrasscoreipc.model import QOS
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
+import queue
+import threading
 import time
 
-ipc_client = GreengrassCoreIPCClientV2()
+# Subscribe to every device's command topic: commands/<device_id>.
+COMMAND_TOPIC = os.environ.get('COMMAND_TOPIC', 'commands/+')
+WORKER_COUNT = int(os.environ.get('WORKER_COUNT', '8'))
+MAX_PENDING_COMMANDS = int(os.environ.get('MAX_PENDING_COMMANDS', '1000'))
+DEDUP_CACHE_SIZE = int(os.environ.get('DEDUP_CACHE_SIZE', '10000'))
+# Seconds a device status reading is reused; 0 still coalesces concurrent lookups.
+STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', '5'))
+# Telemetry replies per IoT Core publish; 1 publishes each reply on telemetry/<device_id>.
+TELEMETRY_BATCH_SIZE = int(os.environ.get('TELEMETRY_BATCH_SIZE', '1'))
+TELEMETRY_BATCH_WINDOW = float(os.environ.get('TELEMETRY_BATCH_WINDOW', '0.1'))
+TELEMETRY_BATCH_TOPIC = os.environ.get('TELEMETRY_BATCH_TOPIC', 'telemetry/batch')
+STATS_INTERVAL = float(os.environ.get('STATS_INTERVAL', '60'))
 
-def on_command(event):
+# The SDK runs stream callbacks on a thread pool by default; a single callback
+# thread keeps commands in arrival order on their way to the dispatcher.
+ipc_client = GreengrassCoreIPCClientV2(executor=ThreadPoolExecutor(max_workers=1))
+
+class CommandDispatcher:
     """
-    Receives commands from IoT Core,
-    processes them, and sends telemetry back to cloud
+    Runs commands on a bounded pool of worker threads.
+
+    Each device has its own FIFO of pending commands and is handled by at
+    most one worker at a time, so a device's commands run in arrival order
+    while a slow device never holds up the others. Commands carrying a
+    command_id are executed at most once: QoS 1 redeliveries are dropped
+    using a bounded LRU of recently seen IDs. dispatch() never blocks: once
+    max_pending commands are waiting or running, new ones are rejected and
+    counted at once.
     """
-    try:
-        # Receive command from IoT Core.
-        data = json.loads(event.message.payload.decode('utf-8'))
-        command = data.get('command')
-        device_id = data.get('device_id', 'device1')
 
-        print(f"Received command from cloud: {command}")
+    def __init__(self, handler, workers, max_pending, dedup_size):
+        self.handler = handler
+        self.dedup_size = dedup_size
+        self.seen = OrderedDict()
+        self.pending = {}
+        self.ready = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.stats = {'dispatched': 0, 'duplicates': 0, 'rejected': 0}
+        self.threads = [
+            threading.Thread(target=self.worker, name=f'command-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def is_duplicate(self, command_id):
+        """Record command_id and report whether it was seen recently"""
+        with self.lock:
+            if command_id in self.seen:
+                self.seen.move_to_end(command_id)
+                self.stats['duplicates'] += 1
+                return True
+            self.seen[command_id] = True
+            if len(self.seen) > self.dedup_size:
+                self.seen.popitem(last=False)
+            return False
 
-        # Process command.
-        if command == 'get_status':
-            status = get_device_status()
+    def dispatch(self, device_id, data):
+        """Queue a command for its device; returns False if it was not queued"""
+        command_id = data.get('command_id')
+        if command_id is not None and self.is_duplicate(command_id):
+            print(f"Dropping duplicate command {command_id} for {device_id}")
+            return False
+
+        # Reject rather than wait for a slot: this runs on the SDK's stream callback
+        # thread, and waiting would hold up delivery for every subscription.
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                if command_id is not None:
+                    # Let a redelivery of this command be accepted later.
+                    self.seen.pop(command_id, None)
+                self.stats['rejected'] += 1
+            print(f"Too many pending commands, rejected command for {device_id}")
+            return False
+
+        with self.lock:
+            self.stats['dispatched'] += 1
+            if device_id in self.pending:
+                # The device is already queued or running; its worker picks this up next.
+                self.pending[device_id].append(data)
+                return True
+            self.pending[device_id] = deque([data])
+        self.ready.put(device_id)
+        return True
+
+    def worker(self):
+        while True:
+            device_id = self.ready.get()
+            if device_id is None:
+                return
+            with self.lock:
+                data = self.pending[device_id][0]
+            try:
+                self.handler(device_id, data)
+            except Exception as e:
+                print(f"Error processing command: {e}")
+            finally:
+                with self.lock:
+                    commands = self.pending[device_id]
+                    commands.popleft()
+                    if commands:
+                        self.ready.put(device_id)
+                    else:
+                        del self.pending[device_id]
+                self.slots.release()
+
+    def stop(self):
+        for _ in self.threads:
+            self.ready.put(None)
+        for thread in self.threads:
+            thread.join()
+
+class StatusCache:
+    """
+    Caches the device status for a TTL and coalesces concurrent lookups.
 
-            # Send telemetry back to IoT Core.
-            telemetry_data = {
-                'device_id': device_id,
-                'status': status,
-                'timestamp': time.time()
-            }
+    When the cached value has expired, the first caller runs the probe and
+    any caller arriving meanwhile waits for that result instead of starting
+    a probe of its own.
+    """
+
+    def __init__(self, probe, ttl):
+        self.probe = probe
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.value = None
+        self.expires_at = 0.0
+        self.in_flight = None
+        self.error = None
+        self.stats = {'hits': 0, 'coalesced': 0, 'probes': 0, 'probe_seconds': 0.0}
+
+    def get(self):
+        with self.lock:
+            if self.value is not None and time.monotonic() < self.expires_at:
+                self.stats['hits'] += 1
+                return self.value
+            in_flight = self.in_flight
+            if in_flight is None:
+                in_flight = self.in_flight = threading.Event()
+                leader = True
+            else:
+                self.stats['coalesced'] += 1
+                leader = False
+
+        if not leader:
+            in_flight.wait()
+            with self.lock:
+                if self.error is not None:
+                    raise self.error
+                return self.value
+
+        started = time.monotonic()
+        try:
+            value = self.probe()
+            error = None
+        except Exception as e:
+            value, error = None, e
+        finished = time.monotonic()
+
+        with self.lock:
+            self.stats['probes'] += 1
+            self.stats['probe_seconds'] += finished - started
+            self.error = error
+            if error is None:
+                self.value = value
+                self.expires_at = finished + self.ttl
+            self.in_flight = None
+        in_flight.set()
+
+        if error is not None:
+            raise error
+        return value
+
+    def report(self):
+        """Hit rate and probe time saved since startup"""
+        with self.lock:
+            stats = dict(self.stats)
+        served = stats['hits'] + stats['coalesced']
+        requests = served + stats['probes']
+        mean_probe = stats['probe_seconds'] / stats['probes'] if stats['probes'] else 0.0
+        return {
+            'requests': requests,
+            'probes': stats['probes'],
+            'hits': stats['hits'],
+            'coalesced': stats['coalesced'],
+            'hitRate': round(served / requests, 3) if requests else 0.0,
+            'meanProbeMs': round(1000 * mean_probe, 2),
+            'latencySavedMs': round(1000 * mean_probe * served, 1)
+        }
+
+class TelemetryBatcher:
+    """
+    Combines telemetry replies into one IoT Core publish.
+
+    A batch is sent when it reaches batch_size replies or when the oldest
+    reply has waited window seconds.
+    """
 
+    def __init__(self, topic, batch_size, window):
+        self.topic = topic
+        self.batch_size = batch_size
+        self.window = window
+        self.batch = []
+        self.deadline = None
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.flush_loop, name='telemetry-batcher', daemon=True)
+        self.thread.start()
+
+    def add(self, telemetry_data):
+        with self.condition:
+            self.batch.append(telemetry_data)
+            if len(self.batch) == 1:
+                self.deadline = time.monotonic() + self.window
+            if len(self.batch) >= self.batch_size:
+                self.condition.notify()
+
+    def take_batch(self):
+        """Wait until a batch is due and remove it; returns [] when stopping"""
+        with self.condition:
+            while self.running:
+                if len(self.batch) >= self.batch_size:
+                    break
+                if self.batch and time.monotonic() >= self.deadline:
+                    break
+                timeout = self.deadline - time.monotonic() if self.batch else None
+                self.condition.wait(timeout)
+            batch, self.batch = self.batch, []
+            return batch
+
+    def flush_loop(self):
+        while True:
+            batch = self.take_batch()
+            if batch:
+                self.publish(batch)
+            elif not self.running:
+                return
+
+    def publish(self, batch):
+        try:
             ipc_client.publish_to_iot_core(
-                topic_name=f'telemetry/{device_id}',
+                topic_name=self.topic,
                 qos=QOS.AT_LEAST_ONCE,
-                payload=json.dumps(telemetry_data).encode('utf-8')
+                payload=json.dumps({'count': len(batch), 'telemetry': batch}).encode('utf-8')
             )
+            print(f"Telemetry batch of {len(batch)} sent to cloud")
+        except Exception as e:
+            print(f"Error publishing telemetry batch: {e}")
+
+    def stop(self):
+        """Publish anything still pending and stop the flush thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+def report_publish(future):
+    if future.exception() is not None:
+        print(f"Error publishing telemetry: {future.exception()}")
+
+def handle_command(device_id, data):
+    """Process one command and send telemetry back to cloud"""
+    command = data.get('command')
+
+    print(f"Received command from cloud for {device_id}: {command}")
+
+    # Process command.
+    if command == 'get_status':
+        status = status_cache.get() if status_cache else get_device_status()
+
+        # Send telemetry back to IoT Core.
+        telemetry_data = {
+            'device_id': device_id,
+            'status': status,
+            'timestamp': time.time()
+        }
+
+        if telemetry_batcher:
+            telemetry_batcher.add(telemetry_data)
+            return
+
+        # Don't hold the worker for the round trip; failures are reported when it completes.
+        ipc_client.publish_to_iot_core_async(
+            topic_name=f'telemetry/{device_id}',
+            qos=QOS.AT_LEAST_ONCE,
+            payload=json.dumps(telemetry_data).encode('utf-8')
+        ).add_done_callback(report_publish)
 
-            print(f"Telemetry sent to cloud: {telemetry_data}")
+        print(f"Telemetry sent to cloud: {telemetry_data}")
+
+dispatcher = None
+status_cache = None
+telemetry_batcher = None
+
+def on_command(event):
+    """
+    Receives commands from IoT Core and hands them to the dispatcher,
+    keeping the subscription callback free for the next message
+    """
+    try:
+        # Receive command from IoT Core.
+        data = json.loads(event.message.payload.decode('utf-8'))
+
+        # The device is the last level of commands/<device_id>.
+        topic_device = event.message.topic_name.rsplit('/', 1)[-1]
+        device_id = data.get('device_id', topic_device)
+
+        dispatcher.dispatch(device_id, data)
 
     except Exception as e:
         print(f"Error processing command: {e}")
 
 def get_device_status():
     """Get current device status"""
-    # Simulate getting device status.
+    # Simulate getting device status. On a real device this may query
+    # hardware or local services, which is why lookups go through StatusCache.
     return 'online'
 
 def main():
+    global dispatcher, status_cache, telemetry_batcher
+
     print("Device Controller component starting...")
 
+    status_cache = StatusCache(get_device_status, STATUS_CACHE_TTL)
+    if TELEMETRY_BATCH_SIZE > 1:
+        telemetry_batcher = TelemetryBatcher(TELEMETRY_BATCH_TOPIC, TELEMETRY_BATCH_SIZE, TELEMETRY_BATCH_WINDOW)
+    dispatcher = CommandDispatcher(handle_command, WORKER_COUNT, MAX_PENDING_COMMANDS, DEDUP_CACHE_SIZE)
+
     # Subscribe to commands from IoT Core.
     ipc_client.subscribe_to_iot_core(
-        topic_name='commands/device1',
+        topic_name=COMMAND_TOPIC,
         qos=QOS.AT_LEAST_ONCE,
         on_stream_event=on_command
     )
 
-    print("Subscribed to commands/device1 from IoT Core")
+    print(f"Subscribed to {COMMAND_TOPIC} from IoT Core with {WORKER_COUNT} workers")
     print("Waiting for commands from cloud...")
 
-    # Keep running.
+    # Keep running, reporting status cache effectiveness periodically.
+    next_report = time.monotonic() + STATS_INTERVAL
     while True:
         time.sleep(1)
+        if time.monotonic() >= next_report:
+            print(f"Status cache: {json.dumps(status_cache.report())}")
+            next_report += STATS_INTERVAL
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
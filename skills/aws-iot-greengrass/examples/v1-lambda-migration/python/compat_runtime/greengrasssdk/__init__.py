@@ -0,0 +1,46 @@
+"""
+Greengrass V1 SDK (greengrasssdk) shim for the V2 compatibility runtime.
+
+Unmodified V1 Lambda code imports this package instead of the real
+greengrasssdk. client('iot-data').publish() is forwarded to the runtime,
+which routes the message over Greengrass V2 IPC according to the V1 group
+subscriptions.
+"""
+
+import logging
+
+logger = logging.getLogger('LambdaRunner.greengrasssdk')
+
+_runtime = None
+
+
+def set_runtime(runtime):
+    """Called by lambda_runner before the Lambda code is imported"""
+    global _runtime
+    _runtime = runtime
+
+
+class IoTDataClient:
+    """Subset of the V1 'iot-data' client backed by GreengrassCoreIPCClientV2"""
+
+    def publish(self, topic, payload=b'', queueFullPolicy='AllOrException', **kwargs):
+        if _runtime is None:
+            raise RuntimeError("greengrasssdk shim used outside lambda_runner")
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        _runtime.publish(topic, payload)
+
+    def get_thing_shadow(self, thingName, **kwargs):
+        raise NotImplementedError("Local shadows are not supported; migrate to aws.greengrass.ShadowManager IPC")
+
+    def update_thing_shadow(self, thingName, payload, **kwargs):
+        raise NotImplementedError("Local shadows are not supported; migrate to aws.greengrass.ShadowManager IPC")
+
+    def delete_thing_shadow(self, thingName, **kwargs):
+        raise NotImplementedError("Local shadows are not supported; migrate to aws.greengrass.ShadowManager IPC")
+
+
+def client(client_type, *args, **kwargs):
+    if client_type == 'iot-data':
+        return IoTDataClient()
+    raise NotImplementedError(f"greengrasssdk client '{client_type}' is not supported by the compatibility runtime")
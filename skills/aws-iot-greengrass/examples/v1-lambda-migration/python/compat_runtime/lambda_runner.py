@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Run an unmodified Greengrass V1 Lambda handler as a Greengrass V2 component.
+
+The handler module is imported once and invoked by a pool of long-lived
+worker threads, like a pinned V1 Lambda. Messages arrive over V2 IPC
+according to the V1 group subscriptions, and greengrasssdk publishes are
+routed back out over IPC.
+"""
+
+import importlib
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import greengrasssdk
+from routing import RouteTable, load_subscriptions
+
+try:
+    from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+    from awsiot.greengrasscoreipc.model import BinaryMessage, PublishMessage, QOS
+    GREENGRASS_IPC_AVAILABLE = True
+except ImportError:
+    GREENGRASS_IPC_AVAILABLE = False
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('LambdaRunner')
+
+if not GREENGRASS_IPC_AVAILABLE:
+    logger.warning("Greengrass IPC not available - running in simulation mode")
+
+
+class ClientContext:
+    def __init__(self, subject):
+        self.custom = {'subject': subject}
+        self.env = {}
+        self.client = None
+
+
+class LambdaContext:
+    """The parts of the V1 Lambda context object that Greengrass populated"""
+
+    def __init__(self, function_arn, subject, timeout):
+        self.invoked_function_arn = function_arn
+        parts = function_arn.split(':')
+        self.function_name = parts[6] if len(parts) > 6 else function_arn
+        self.function_version = parts[7] if len(parts) > 7 else '$LATEST'
+        self.aws_request_id = str(uuid.uuid4())
+        self.client_context = ClientContext(subject)
+        self.identity = None
+        self.memory_limit_in_mb = None
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def get_remaining_time_in_millis(self):
+        if self.deadline is None:
+            # Pinned functions have no invocation timeout
+            return 2 ** 31 - 1
+        return max(0, int(1000 * (self.deadline - time.monotonic())))
+
+
+def decode_payload(payload):
+    """V1 passed JSON payloads to Python handlers as parsed objects, others as bytes"""
+    try:
+        return json.loads(payload)
+    except (ValueError, UnicodeDecodeError):
+        return payload
+
+
+class LambdaRunner:
+    def __init__(self):
+        self.config = self.load_configuration()
+        self.ipc_client = None
+        self.operations = []
+        self.running = False
+        self.queue = queue.Queue(maxsize=self.config['maxQueueSize'])
+        self.workers = []
+        self.stats_lock = threading.Lock()
+        self.stats = {'received': 0, 'invoked': 0, 'errors': 0, 'dropped': 0, 'published': 0, 'unrouted': 0}
+
+        subscriptions = self.config['subscriptions']
+        if self.config['subscriptionsFile']:
+            subscriptions = subscriptions + load_subscriptions(self.config['subscriptionsFile'])
+        self.routes = RouteTable(subscriptions, self.config['functionArn'])
+
+        self.setup_ipc_client()
+        greengrasssdk.set_runtime(self)
+        self.handler = self.load_handler()
+
+    def load_configuration(self):
+        """Load component configuration"""
+        try:
+            config = {
+                "handler": "lambda_function.lambda_handler",
+                "codeDirectory": ".",
+                "functionArn": "",
+                "subscriptionsFile": "",
+                "subscriptions": [],
+                "concurrency": 1,
+                "maxQueueSize": 1000,
+                "timeout": 0,
+                "qos": 1,
+                "statsInterval": 60
+            }
+
+            # Load from environment variables
+            config["handler"] = os.environ.get('GG_HANDLER', config["handler"])
+            config["codeDirectory"] = os.environ.get('GG_CODE_DIR', config["codeDirectory"])
+            config["functionArn"] = os.environ.get('GG_FUNCTION_ARN', config["functionArn"])
+            config["subscriptionsFile"] = os.environ.get('GG_SUBSCRIPTIONS_FILE', config["subscriptionsFile"])
+            subscriptions_env = os.environ.get('GG_SUBSCRIPTIONS')
+            if subscriptions_env:
+                config["subscriptions"] = json.loads(subscriptions_env)
+            config["concurrency"] = int(os.environ.get('GG_CONCURRENCY', config["concurrency"]))
+            config["maxQueueSize"] = int(os.environ.get('GG_MAX_QUEUE_SIZE', config["maxQueueSize"]))
+            config["timeout"] = float(os.environ.get('GG_TIMEOUT', config["timeout"]))
+            config["qos"] = int(os.environ.get('GG_QOS', config["qos"]))
+            config["statsInterval"] = float(os.environ.get('GG_STATS_INTERVAL', config["statsInterval"]))
+
+            return config
+        except Exception as e:
+            logger.error(f"Failed to load configuration: {e}")
+            raise
+
+    def setup_ipc_client(self):
+        """Initialize Greengrass IPC client"""
+        if GREENGRASS_IPC_AVAILABLE:
+            try:
+                # One callback thread keeps messages in arrival order on their way to the queue
+                self.ipc_client = GreengrassCoreIPCClientV2(executor=ThreadPoolExecutor(max_workers=1))
+                logger.info("Connected to Greengrass IPC")
+            except Exception as e:
+                logger.error(f"Failed to connect to Greengrass IPC: {e}")
+                self.ipc_client = None
+        else:
+            logger.info("Running in simulation mode")
+
+    def load_handler(self):
+        """Import the Lambda module once so every invocation is warm"""
+        module_name, _, function_name = self.config['handler'].rpartition('.')
+        code_directory = os.path.abspath(self.config['codeDirectory'])
+        if code_directory not in sys.path:
+            sys.path.insert(0, code_directory)
+        started = time.monotonic()
+        module = importlib.import_module(module_name)
+        logger.info(f"Loaded handler {self.config['handler']} in {1000 * (time.monotonic() - started):.1f} ms")
+        return getattr(module, function_name)
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    # -- outbound ----------------------------------------------------------
+
+    def publish(self, topic, payload):
+        """greengrasssdk publish: route by the V1 subscriptions whose Source is this function"""
+        destinations = self.routes.destinations(topic)
+        if not destinations:
+            # V1 dropped messages that matched no subscription
+            self.count('unrouted')
+            logger.debug(f"No subscription routes '{topic}', message dropped")
+            return
+
+        if not self.ipc_client:
+            logger.info(f"[SIMULATION] Would publish to {sorted(destinations)} topic '{topic}': {payload[:200]!r}")
+            return
+
+        if 'cloud' in destinations:
+            qos_map = {0: QOS.AT_MOST_ONCE, 1: QOS.AT_LEAST_ONCE}
+            qos = qos_map.get(self.config['qos'], QOS.AT_LEAST_ONCE)
+            self.ipc_client.publish_to_iot_core(topic_name=topic, qos=qos, payload=payload)
+        if 'local' in destinations:
+            self.ipc_client.publish_to_topic(
+                topic=topic, publish_message=PublishMessage(binary_message=BinaryMessage(message=payload)))
+        self.count('published')
+
+    # -- inbound -----------------------------------------------------------
+
+    def enqueue(self, topic, payload):
+        """Runs on the SDK thread; never blocks it"""
+        self.count('received')
+        try:
+            self.queue.put_nowait((topic, payload))
+        except queue.Full:
+            self.count('dropped')
+            logger.warning(f"Invocation queue full, dropped message on '{topic}'")
+
+    def on_local_message(self, event):
+        if event.binary_message is not None:
+            message = event.binary_message
+            self.enqueue(message.context.topic, message.message)
+        else:
+            message = event.json_message
+            self.enqueue(message.context.topic, json.dumps(message.message).encode('utf-8'))
+
+    def on_cloud_message(self, event):
+        self.enqueue(event.message.topic_name, event.message.payload)
+
+    def on_stream_error(self, error):
+        logger.error(f"Stream error: {error}")
+        return False  # Keep the stream open
+
+    def subscribe(self):
+        """Open one IPC stream per V1 input subscription"""
+        for source, subject in sorted(self.routes.inputs):
+            try:
+                if source == 'cloud':
+                    _, operation = self.ipc_client.subscribe_to_iot_core(
+                        topic_name=subject, qos=QOS.AT_LEAST_ONCE,
+                        on_stream_event=self.on_cloud_message, on_stream_error=self.on_stream_error)
+                else:
+                    _, operation = self.ipc_client.subscribe_to_topic(
+                        topic=subject, on_stream_event=self.on_local_message, on_stream_error=self.on_stream_error)
+                self.operations.append(operation)
+                logger.info(f"Subscribed to {source} topic: {subject}")
+            except Exception as e:
+                logger.error(f"Failed to subscribe to {source} topic {subject}: {e}")
+
+    # -- workers -----------------------------------------------------------
+
+    def invoke(self, topic, payload):
+        context = LambdaContext(self.config['functionArn'], topic, self.config['timeout'])
+        try:
+            self.handler(decode_payload(payload), context)
+            self.count('invoked')
+        except Exception:
+            self.count('errors')
+            logger.error(f"Handler failed for message on '{topic}':\n{traceback.format_exc()}")
+
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self.invoke(*item)
+
+    def start_workers(self):
+        """Start the pinned worker pool; concurrency 1 keeps V1 pinned-Lambda ordering"""
+        self.running = True
+        for i in range(self.config['concurrency']):
+            thread = threading.Thread(target=self.worker, name=f'lambda-worker-{i}', daemon=True)
+            thread.start()
+            self.workers.append(thread)
+
+    def stop(self, timeout=10.0):
+        """Close the streams, let queued invocations finish and stop the workers"""
+        self.running = False
+        for operation in self.operations:
+            try:
+                operation.close()
+            except Exception as e:
+                logger.debug(f"Error closing stream: {e}")
+        self.operations = []
+        for _ in self.workers:
+            self.queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self.workers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self.workers = []
+
+    def run(self):
+        """Main component loop"""
+        logger.info("Lambda compatibility runtime starting...")
+        logger.info(f"Configuration: {json.dumps(self.config, indent=2)}")
+
+        if not self.ipc_client:
+            logger.warning("No IPC client available - cannot subscribe")
+            return
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.start_workers()
+        self.subscribe()
+        logger.info(f"Running {self.config['handler']} with {self.config['concurrency']} warm workers")
+
+        try:
+            next_report = time.monotonic() + self.config['statsInterval']
+            while self.running:
+                time.sleep(1)
+                if time.monotonic() >= next_report:
+                    with self.stats_lock:
+                        logger.info(f"Invocation stats: {json.dumps(self.stats)}")
+                    next_report += self.config['statsInterval']
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Lambda compatibility runtime stopping...")
+        finally:
+            self.stop()
+            self.ipc_client.close()
+
+
+if __name__ == "__main__":
+    runner = LambdaRunner()
+    runner.run()
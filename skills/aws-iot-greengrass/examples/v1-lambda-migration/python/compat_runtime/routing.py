@@ -0,0 +1,73 @@
+import json
+import logging
+
+logger = logging.getLogger('LambdaRunner.Routing')
+
+CLOUD = 'cloud'
+SHADOW = 'GGShadowService'
+
+
+def unqualified(arn):
+    """Drop the version or alias from a Lambda function ARN"""
+    parts = arn.split(':')
+    if len(parts) == 8 and parts[5] == 'function':
+        return ':'.join(parts[:7])
+    return arn
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter match supporting + and #"""
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def load_subscriptions(path):
+    """Read subscriptions.json as written by the V1 exporter"""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data
+    return data.get('Definition', {}).get('Subscriptions', [])
+
+
+class RouteTable:
+    """V1 group subscriptions seen from one Lambda function
+
+    Subscriptions whose Target is the function become inputs: IoT Core
+    subscriptions when the Source is 'cloud', local IPC subscriptions
+    otherwise. Subscriptions whose Source is the function decide where each
+    publish goes: IoT Core for a 'cloud' Target, local IPC for anything else.
+    """
+
+    def __init__(self, subscriptions, function_arn):
+        self.function_arn = unqualified(function_arn)
+        self.inputs = set()
+        self.outputs = []
+        for subscription in subscriptions:
+            source = subscription['Source']
+            target = subscription['Target']
+            subject = subscription['Subject']
+            if unqualified(target) == self.function_arn:
+                self.inputs.add(('cloud' if source == CLOUD else 'local', subject))
+            if unqualified(source) == self.function_arn:
+                if target == SHADOW:
+                    logger.warning(f"Skipping shadow subscription on '{subject}'; use ShadowManager IPC instead")
+                    continue
+                self.outputs.append((subject, 'cloud' if target == CLOUD else 'local'))
+        self.cache = {}
+
+    def destinations(self, topic):
+        """Return the set of 'cloud'/'local' destinations for a published topic"""
+        destinations = self.cache.get(topic)
+        if destinations is None:
+            destinations = frozenset(
+                destination for subject, destination in self.outputs if topic_matches(subject, topic))
+            if len(self.cache) < 10000:
+                self.cache[topic] = destinations
+        return destinations
@@ -5,13 +5,22 @@ from awsiot.greengrasscoreipc.model import (
 )
 import time
 
+from component_runtime import AnomalyMonitor
+
 ipc_client = GreengrassCoreIPCClientV2()
 
+# Alert on readings that are unusual for each sensor instead of above a fixed
+# 80°F; an alert is sent when it is raised and when it clears, not for every
+# reading in between (see component_runtime/anomaly.py).
+anomalies = AnomalyMonitor({'temperature': {}})
+
 def on_sensor_data(event):
     """
     Receives temperature from sensor publisher component,
     processes it, and forwards to alert component
     """
+    # Arrival time for a trace context (microseconds, monotonic clock)
+    received = time.monotonic_ns() // 1000
     try:
         # Receive from publisher component.
         data = event.json_message.message
@@ -20,14 +29,25 @@ def on_sensor_data(event):
         
         print(f"Received from sensor {sensor_id}: {temperature}°F")
         
-        # Process: Check if temperature is high.
-        if temperature > 80:
+        # Process: Check if the temperature is anomalous for this sensor.
+        alert = anomalies.offer(sensor_id, 'temperature', temperature, data.get('timestamp'))
+        if alert is not None:
             alert_data = {
                 'sensor_id': sensor_id,
                 'temperature': temperature,
-                'alert': 'HIGH_TEMPERATURE'
+                'alert': 'TEMPERATURE_ANOMALY',
+                'state': alert['state'],
+                'check': alert['check']
             }
             
+            # Pass a trace context on with this component's hops
+            # (the format of component_runtime/tracing.py).
+            trace = data.get('trace')
+            if trace is not None:
+                trace['hops'].append(['TemperatureProcessor.receive', received])
+                trace['hops'].append(['TemperatureProcessor.publish', time.monotonic_ns() // 1000])
+                alert_data['trace'] = trace
+            
             # Publish to another component (AlertHandler).
             ipc_client.publish_to_topic(
                 topic='component/alerts',
@@ -36,7 +56,7 @@ def on_sensor_data(event):
                 )
             )
             
-            print(f"Alert sent to AlertHandler component")
+            print(f"Alert {alert['state']} sent to AlertHandler component")
     
     except Exception as e:
         print(f"Error processing sensor data: {e}")
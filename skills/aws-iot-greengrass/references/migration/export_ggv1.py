@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Export Greengrass V1 group configuration for migration to V2.
+
+Exports many groups at once. API calls and Lambda code downloads run on
+bounded thread pools, and code is cached by CodeSha256 so re-runs only fetch
+functions whose code changed. Each zip is read from the presigned URL in
+chunks, hash-verified on the way, into a SpooledTemporaryFile that holds up
+to 64 MiB in memory and spills larger zips to disk in the cache directory;
+it is extracted from there once the hash matches.
+
+Usage:
+    ./export_ggv1.py <group-id> [<group-id> ...] [--output-dir ./ggv1_export] [--region us-west-2]
+    ./export_ggv1.py --groups-file groups.txt --workers 16
+
+Output, one directory per group:
+    <output-dir>/<group-id>/group.json
+    <output-dir>/<group-id>/functions.json
+    <output-dir>/<group-id>/subscriptions.json
+    <output-dir>/<group-id>/lambda-code/<FUNCTION_NAME>/
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import boto3
+    from botocore.config import Config
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+CHUNK_SIZE = 1024 * 1024
+# Zips up to this size are buffered in memory; larger ones spill to a temp file
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+CODE_MARKER = '.code-sha256'
+
+
+def write_json(path, response):
+    """Write an API response the way `aws ... --output json` does"""
+    response = {key: value for key, value in response.items() if key != 'ResponseMetadata'}
+    with open(path, 'w') as f:
+        json.dump(response, f, indent=4, default=str)
+
+
+def definition_ids(version_arn):
+    """(definition id, version id) from .../definitions/<type>/<id>/versions/<version>"""
+    parts = version_arn.split('/')
+    return parts[-3], parts[-1]
+
+
+class CodeCache:
+    """Extracted Lambda code keyed by CodeSha256, shared by every group in a run
+
+    Concurrent requests for the same code share one download.
+    """
+
+    def __init__(self, directory, download_pool):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.download_pool = download_pool
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {'downloaded': 0, 'cached': 0, 'bytes': 0}
+
+    def path_for(self, code_sha256):
+        return self.directory / base64.b64decode(code_sha256).hex()
+
+    def get(self, code_sha256, location):
+        """Return a future for the extracted code directory"""
+        path = self.path_for(code_sha256)
+        with self.lock:
+            future = self.in_flight.get(code_sha256)
+            if future is None:
+                if path.is_dir():
+                    self.stats['cached'] += 1
+                    future = Future()
+                    future.set_result(path)
+                else:
+                    future = self.download_pool.submit(self.fetch, code_sha256, location, path)
+                self.in_flight[code_sha256] = future
+            return future
+
+    def note_reused(self):
+        """Count code that was already exported and needed no cache lookup"""
+        with self.lock:
+            self.stats['cached'] += 1
+
+    def fetch(self, code_sha256, location, path):
+        """Download the zip into a spooled buffer, verify CodeSha256 and extract it into the cache"""
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=self.directory) as buffer:
+            with urllib.request.urlopen(location, timeout=60) as response:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    buffer.write(chunk)
+                    size += len(chunk)
+            if base64.b64encode(digest.digest()).decode('ascii') != code_sha256:
+                raise ValueError(f"Downloaded code does not match CodeSha256 {code_sha256}")
+
+            # Extract beside the final path and rename, so an interrupted run never leaves a partial entry
+            staging = Path(tempfile.mkdtemp(dir=self.directory, prefix='.extract-'))
+            try:
+                with zipfile.ZipFile(buffer) as archive:
+                    archive.extractall(staging)
+                os.replace(staging, path)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+                if not path.is_dir():
+                    raise
+
+        with self.lock:
+            self.stats['downloaded'] += 1
+            self.stats['bytes'] += size
+        return path
+
+
+class GroupExporter:
+    def __init__(self, greengrass, lambda_client, output_dir, cache, api_pool):
+        self.greengrass = greengrass
+        self.lambda_client = lambda_client
+        self.output_dir = Path(output_dir)
+        self.cache = cache
+        self.api_pool = api_pool
+
+    def export_group(self, group_id):
+        """Export one group; returns the number of Lambda functions exported"""
+        group_dir = self.output_dir / group_id
+        group_dir.mkdir(parents=True, exist_ok=True)
+
+        version = self.greengrass.get_group(GroupId=group_id)['LatestVersion']
+        group = self.greengrass.get_group_version(GroupId=group_id, GroupVersionId=version)
+        write_json(group_dir / 'group.json', group)
+        definition = group.get('Definition', {})
+
+        subscriptions = None
+        subscription_arn = definition.get('SubscriptionDefinitionVersionArn')
+        if subscription_arn:
+            subscription_id, subscription_version = definition_ids(subscription_arn)
+            subscriptions = self.api_pool.submit(
+                self.greengrass.get_subscription_definition_version,
+                SubscriptionDefinitionId=subscription_id,
+                SubscriptionDefinitionVersionId=subscription_version)
+
+        exported = 0
+        function_arn = definition.get('FunctionDefinitionVersionArn')
+        if function_arn:
+            function_id, function_version = definition_ids(function_arn)
+            functions = self.greengrass.get_function_definition_version(
+                FunctionDefinitionId=function_id, FunctionDefinitionVersionId=function_version)
+            write_json(group_dir / 'functions.json', functions)
+            exported = self.export_code(group_dir / 'lambda-code', functions['Definition'].get('Functions', []))
+
+        if subscriptions is not None:
+            write_json(group_dir / 'subscriptions.json', subscriptions.result())
+        return exported
+
+    def export_code(self, code_dir, functions):
+        code_dir.mkdir(parents=True, exist_ok=True)
+        pending = []
+        for function in functions:
+            arn = function['FunctionArn']
+            # Skip AWS-managed Greengrass functions (ARN pattern: arn:aws:lambda:::function:GG*)
+            if ':::' in arn:
+                continue
+            pending.append((arn.split(':')[-2], self.api_pool.submit(self.lambda_client.get_function, FunctionName=arn)))
+
+        for name, response in pending:
+            response = response.result()
+            code_sha256 = response['Configuration']['CodeSha256']
+            target = code_dir / name
+            marker = target / CODE_MARKER
+            if marker.is_file() and marker.read_text() == code_sha256:
+                self.cache.note_reused()
+                continue
+            source = self.cache.get(code_sha256, response['Code']['Location']).result()
+            if target.exists():
+                shutil.rmtree(target)
+            shutil.copytree(source, target)
+            marker.write_text(code_sha256)
+        return len(pending)
+
+
+def export_groups(group_ids, greengrass, lambda_client, output_dir, cache_dir=None, workers=8):
+    """Export every group concurrently; returns (results, cache stats)
+
+    results maps group id to the number of functions exported, or to the
+    exception that stopped that group's export.
+    """
+    output_dir = Path(output_dir)
+    cache_dir = Path(cache_dir) if cache_dir else output_dir / '.code-cache'
+    results = {}
+    # Separate pools: group tasks block on API and download futures, so they must not share workers with them
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='group') as group_pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api') as api_pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as download_pool:
+        cache = CodeCache(cache_dir, download_pool)
+        exporter = GroupExporter(greengrass, lambda_client, output_dir, cache, api_pool)
+        futures = {group_id: group_pool.submit(exporter.export_group, group_id) for group_id in group_ids}
+        for group_id, future in futures.items():
+            try:
+                results[group_id] = future.result()
+                print(f"✓ {group_id}: {results[group_id]} Lambda functions")
+            except Exception as e:
+                results[group_id] = e
+                print(f"✗ {group_id}: {e}")
+    return results, cache.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('group_ids', nargs='*', help='Greengrass V1 group IDs')
+    parser.add_argument('--groups-file', help='file with one group ID per line')
+    parser.add_argument('--output-dir', default='./ggv1_export', help='directory to save exported files')
+    parser.add_argument('--region', default=os.environ.get('AWS_DEFAULT_REGION', 'us-west-2'), help='AWS region')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent API calls and downloads')
+    parser.add_argument('--cache-dir', help='Lambda code cache (default: <output-dir>/.code-cache)')
+    parser.add_argument('--endpoint-url', help='override the AWS endpoint, e.g. for a local stub')
+    args = parser.parse_args()
+
+    group_ids = list(args.group_ids)
+    if args.groups_file:
+        with open(args.groups_file) as f:
+            group_ids += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not group_ids:
+        parser.error("at least one group ID is required")
+    if not BOTO3_AVAILABLE:
+        sys.exit("boto3 is required: pip3 install boto3")
+
+    config = Config(retries={'mode': 'adaptive', 'max_attempts': 10}, max_pool_connections=3 * args.workers)
+    session = boto3.session.Session(region_name=args.region)
+    greengrass = session.client('greengrass', config=config, endpoint_url=args.endpoint_url)
+    lambda_client = session.client('lambda', config=config, endpoint_url=args.endpoint_url)
+
+    print(f"Exporting {len(group_ids)} Greengrass V1 groups")
+    print(f"Region: {args.region}")
+    print(f"Output: {args.output_dir}")
+    print("")
+
+    started = time.monotonic()
+    results, stats = export_groups(group_ids, greengrass, lambda_client, args.output_dir,
+                                   args.cache_dir, args.workers)
+    failed = [group_id for group_id, result in results.items() if isinstance(result, Exception)]
+
+    print("")
+    print(f"Export complete in {time.monotonic() - started:.1f}s: {len(results) - len(failed)} groups exported, "
+          f"{len(failed)} failed")
+    print(f"Lambda code: {stats['downloaded']} downloaded ({stats['bytes'] / 1048576:.1f} MiB), "
+          f"{stats['cached']} reused from cache")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()